@@ -0,0 +1,927 @@
+# acces_donnees.py - Accès aux données multi-moteurs (SQLite, PostgreSQL, MySQL)
+"""
+Couche d'accès commune à tous les moteurs de base de données:
+- Un dialecte par moteur: paramètres, fonctions de date, RETURNING, DDL, upsert
+- Les requêtes de l'application restent écrites en SQL SQLite; elles sont
+  traduites (une fois, puis mises en cache) pour PostgreSQL et MySQL
+- Les lignes se comportent comme sqlite3.Row sur tous les moteurs
+  (accès par nom ou par position, dict(ligne))
+- Connexions réutilisées via un pool par moteur: conn.close() rend la
+  connexion au pool au lieu de la fermer
+- Lectures analytiques routées vers un réplica (DB_REPLICA_*) s'il est à jour:
+  retard mesuré, et une session relit le primaire après ses propres écritures
+- Curseurs instrumentés (durées par empreinte de requête) quand
+  instrumentation_sql est actif
+
+Le moteur est choisi par DB_TYPE (voir config_helper.get_db_config):
+'sqlite' (défaut), 'postgresql' ou 'mysql'.
+"""
+
+import abc
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import instrumentation_sql
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Connexions inactives conservées par pool
+TAILLE_POOL = 8
+
+# Ports par défaut des serveurs
+PORTS_DEFAUT = {'postgresql': 5432, 'mysql': 3306}
+
+# Retard maximal toléré d'un réplica (secondes), et fréquence de sa mesure
+RETARD_MAX_REPLICA = 5.0
+INTERVALLE_MESURE_RETARD = 1.0
+
+# Modificateurs de date SQLite acceptés: '-7 days', '+2 hours', '-5 minutes'...
+_UNITES_SECONDES = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+# ==================== POOL DE CONNEXIONS ====================
+
+class PoolConnexions:
+    """
+    Pool de connexions d'un moteur.
+
+    Les connexions rendues sont annulées (rollback) puis conservées jusqu'à
+    TAILLE_POOL; au-delà elles sont réellement fermées.
+    """
+
+    def __init__(self, ouvrir, est_valide=None, taille_max: int = TAILLE_POOL):
+        self._ouvrir = ouvrir
+        self._est_valide = est_valide or (lambda conn: True)
+        self._libres = queue.LifoQueue(maxsize=taille_max)
+        self._lock = threading.Lock()
+        self.stats = {'ouvertes': 0, 'reutilisees': 0}
+
+    def acquerir(self):
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            if self._est_valide(conn):
+                with self._lock:
+                    self.stats['reutilisees'] += 1
+                conn._au_pool = False
+                return conn
+            conn.fermer()
+
+        conn = self._ouvrir()
+        conn._pool = self
+        conn._au_pool = False
+        with self._lock:
+            self.stats['ouvertes'] += 1
+        return conn
+
+    def restituer(self, conn):
+        if conn._au_pool:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            conn.fermer()
+            return
+        conn._au_pool = True
+        try:
+            self._libres.put_nowait(conn)
+        except queue.Full:
+            conn.fermer()
+
+    def vider(self):
+        """Ferme toutes les connexions inactives."""
+        while True:
+            try:
+                self._libres.get_nowait().fermer()
+            except queue.Empty:
+                return
+
+
+# ==================== LIGNES ====================
+
+class Ligne(tuple):
+    """Ligne de résultat compatible avec sqlite3.Row (index, nom de colonne, keys())."""
+
+    def __new__(cls, valeurs, index: Dict[str, int]):
+        ligne = super().__new__(cls, valeurs)
+        ligne._index = index
+        return ligne
+
+    def __getitem__(self, cle):
+        if isinstance(cle, str):
+            return tuple.__getitem__(self, self._index[cle.lower()])
+        return tuple.__getitem__(self, cle)
+
+    def keys(self) -> List[str]:
+        return list(self._index)
+
+
+def _valeur_sqlite(valeur):
+    """Ramène une valeur serveur au type que SQLite aurait retourné."""
+    if isinstance(valeur, datetime):
+        return valeur.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return int(valeur) if valeur == valeur.to_integral_value() else float(valeur)
+    return valeur
+
+
+# ==================== DIALECTES ====================
+
+def _secondes_modificateur(modificateur: str) -> float:
+    """Convertit un modificateur de date SQLite ('-7 days') en secondes."""
+    m = re.fullmatch(r"\s*([+-]?\d+(?:\.\d+)?)\s+(second|minute|hour|day)s?\s*", str(modificateur))
+    if not m:
+        raise ValueError(f"Modificateur de date non supporté: {modificateur!r}")
+    secondes = float(m.group(1)) * _UNITES_SECONDES[m.group(2)]
+    return int(secondes) if secondes.is_integer() else secondes
+
+
+class DialecteSQLite:
+    """SQLite: le SQL de l'application est natif, aucune traduction."""
+
+    nom = 'sqlite'
+    # Le verrou d'écriture de la base, pris par la première écriture, suffit
+    verrou_lecture = ''
+
+    def ouvrir(self, chemin: str, lecture_seule: bool = False):
+        if lecture_seule:
+            conn = sqlite3.connect(f"file:{chemin}?mode=ro", uri=True, factory=ConnexionSQLite,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(chemin, factory=ConnexionSQLite, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def colonnes_table(self, conn, table: str) -> List[str]:
+        return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+
+    def retard_replica(self, conn) -> Optional[float]:
+        """Âge de la copie (voir synchroniser_replica_sqlite), None si ce n'est pas un réplica."""
+        try:
+            ligne = conn.execute("SELECT horodatage FROM replication_etat WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return max(time.time() - ligne[0], 0.0) if ligne else None
+
+    def requete_version(self) -> str:
+        return 'SELECT sqlite_version()'
+
+
+class DialecteServeur(abc.ABC):
+    """
+    Base des dialectes serveur: traduit le SQL SQLite de l'application.
+
+    Seules les tournures utilisées par l'application sont traduites: paramètres ? et :nom,
+    DATE('now'[, modificateur]), datetime(...), strftime(...), INSERT OR IGNORE,
+    ON CONFLICT ... DO UPDATE, et le DDL (types, AUTOINCREMENT, index).
+    """
+
+    nom = None
+    _formats_date = {}
+    # Lecture verrouillante: voit la dernière version validée (pas l'instantané
+    # REPEATABLE READ de MySQL) et bloque les écritures concurrentes
+    verrou_lecture = ' FOR UPDATE'
+    # Le pilote interprète %% comme un % littéral quand des paramètres sont passés
+    double_pourcent = True
+
+    # -------- Tournures propres à chaque moteur --------
+
+    @abc.abstractmethod
+    def maintenant_decale(self, secondes: str) -> str:
+        """Horodatage courant décalé de secondes (expression SQL)."""
+
+    @abc.abstractmethod
+    def format_date(self, format_sqlite: str, expression: str) -> str:
+        """Équivalent de strftime(format_sqlite, expression)."""
+
+    @abc.abstractmethod
+    def vers_horodatage(self, expression: str) -> str:
+        """Équivalent de datetime(expression)."""
+
+    @abc.abstractmethod
+    def traduire_ddl(self, sql: str) -> str:
+        """CREATE / ALTER / DROP SQLite traduit pour le moteur."""
+
+    def traduire_upsert(self, sql: str) -> str:
+        return sql
+
+    @abc.abstractmethod
+    def inserer_ou_ignorer(self, sql: str) -> str:
+        """INSERT OR IGNORE traduit pour le moteur."""
+
+    # -------- Traduction --------
+
+    def traduire(self, sql: str, avec_params: bool):
+        """
+        Traduit une requête SQLite pour le moteur (résultat mis en cache).
+
+        Returns:
+            tuple: (sql traduit, positions des paramètres qui sont des modificateurs de date)
+        """
+        return _traduire(self, sql, avec_params)
+
+    def _traduire(self, sql: str, avec_params: bool):
+        debut = sql.lstrip().upper()
+        if debut.startswith(('CREATE', 'ALTER', 'DROP')):
+            sql = self.traduire_ddl(sql)
+
+        if re.search(r'\bINSERT\s+OR\s+IGNORE\b', sql, re.I):
+            sql = self.inserer_ou_ignorer(sql)
+        sql = self.traduire_upsert(sql)
+
+        # Fonctions de date; un modificateur passé en paramètre est marqué \x00
+        def decalage(m):
+            fonction, modificateur = m.group(1).upper(), m.group(2)
+            if modificateur == '?':
+                secondes = '\x00'
+            else:
+                secondes = repr(_secondes_modificateur(modificateur.strip("'")))
+            expression = self.maintenant_decale(secondes)
+            return f"DATE({expression})" if fonction == 'DATE' else expression
+
+        sql = re.sub(r"\b(DATE|DATETIME)\(\s*'now'\s*,\s*('[^']*'|\?)\s*\)", decalage, sql, flags=re.I)
+        sql = re.sub(r"\bDATE\(\s*'now'\s*\)", 'CURRENT_DATE', sql, flags=re.I)
+        sql = re.sub(r"\bDATETIME\(\s*'now'\s*\)", 'CURRENT_TIMESTAMP', sql, flags=re.I)
+        sql = re.sub(r"\bDATETIME\(\s*([\w.]+)\s*\)", lambda m: self.vers_horodatage(m.group(1)), sql, flags=re.I)
+        sql = re.sub(
+            r"\bstrftime\(\s*'([^']*)'\s*,\s*('now'|[\w.]+)\s*\)",
+            lambda m: self.format_date(m.group(1), 'CURRENT_TIMESTAMP' if m.group(2) == "'now'" else m.group(2)),
+            sql, flags=re.I
+        )
+
+        # Paramètres: ? et :nom -> %s et %(nom)s, hors littéraux; % doublés si paramètres
+        morceaux, modificateurs, position = [], [], 0
+        for i, morceau in enumerate(re.split(r"('(?:[^']|'')*')", sql)):
+            if avec_params and self.double_pourcent:
+                morceau = morceau.replace('%', '%%')
+            if i % 2 == 0:
+                def parametre(m):
+                    nonlocal position
+                    jeton = m.group(0)
+                    if jeton.startswith(':'):
+                        return f"%({jeton[1:]})s"
+                    if jeton == '\x00':
+                        modificateurs.append(position)
+                    position += 1
+                    return '%s'
+                morceau = re.sub(r"\?|\x00|(?<![:\w]):[A-Za-z_]\w*", parametre, morceau)
+            morceaux.append(morceau)
+
+        return ''.join(morceaux), tuple(modificateurs)
+
+
+class DialectePostgreSQL(DialecteServeur):
+    nom = 'postgresql'
+    _formats_date = {'%Y': 'YYYY', '%m': 'MM', '%d': 'DD', '%H': 'HH24', '%M': 'MI', '%S': 'SS', '%W': 'IW'}
+
+    def ouvrir(self, config: Dict, lecture_seule: bool = False):
+        import psycopg2
+
+        brute = psycopg2.connect(
+            host=config['host'], dbname=config['database'], user=config['user'],
+            password=config['password'], port=config['port'],
+        )
+        if lecture_seule:
+            brute.set_session(readonly=True)
+        return ConnexionServeur(brute, self)
+
+    def retard_replica(self, conn) -> Optional[float]:
+        """Retard de rejeu du standby (0 s'il a tout rejoué, ou si ce n'est pas un standby)."""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        retard = cursor.fetchone()[0]
+        return float(retard) if retard is not None else None
+
+    def est_valide(self, conn) -> bool:
+        return not conn.brute.closed
+
+    def maintenant_decale(self, secondes: str) -> str:
+        return f"(CURRENT_TIMESTAMP + {secondes} * INTERVAL '1 second')"
+
+    def format_date(self, format_sqlite: str, expression: str) -> str:
+        format_pg = re.sub(r'%\w', lambda m: self._formats_date.get(m.group(0), m.group(0)), format_sqlite)
+        return f"TO_CHAR(CAST({expression} AS TIMESTAMP), '{format_pg}')"
+
+    def vers_horodatage(self, expression: str) -> str:
+        return f"CAST({expression} AS TIMESTAMP)"
+
+    def traduire_ddl(self, sql: str) -> str:
+        sql = re.sub(r'\bINTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT\b', 'SERIAL PRIMARY KEY', sql, flags=re.I)
+        sql = re.sub(r'\bDATETIME\b', 'TIMESTAMP', sql, flags=re.I)
+        sql = re.sub(r'\bREAL\b', 'DOUBLE PRECISION', sql, flags=re.I)
+        # Les booléens de l'application sont des entiers 0/1 (comparés à 0 et 1)
+        return re.sub(r'\bBOOLEAN\b', 'SMALLINT', sql, flags=re.I)
+
+    def traduire_upsert(self, sql: str) -> str:
+        """
+        Qualifie par le nom de la table les colonnes citées sans préfixe dans DO UPDATE SET
+        (SQLite les rapporte à la ligne existante, PostgreSQL les juge ambiguës).
+        """
+        m = re.search(r'\bDO\s+UPDATE\s+SET\b', sql, re.I)
+        table = re.match(r'\s*INSERT\s+INTO\s+"?(\w+)"?', sql, re.I)
+        if not m or not table:
+            return sql
+        table = table.group(1)
+
+        def qualifier(expression):
+            morceaux = re.split(r"('(?:[^']|'')*')", expression)
+            for k in range(0, len(morceaux), 2):
+                morceaux[k] = re.sub(
+                    r'(?<![.\w])([A-Za-z_]\w*)\b(?!\s*[.(])',
+                    lambda c: c.group(1) if c.group(1).upper() in _MOTS_CLES_SQL else f"{table}.{c.group(1)}",
+                    morceaux[k]
+                )
+            return ''.join(morceaux)
+
+        affectations = [a.split('=', 1) for a in _separer_virgules(sql[m.end():])]
+        return sql[:m.end()] + ','.join(f"{colonne}={qualifier(expression)}" for colonne, expression in affectations)
+
+    def inserer_ou_ignorer(self, sql: str) -> str:
+        sql = re.sub(r'\bINSERT\s+OR\s+IGNORE\b', 'INSERT', sql, flags=re.I).rstrip().rstrip(';')
+        return f"{sql} ON CONFLICT DO NOTHING"
+
+    def colonnes_table(self, conn, table: str) -> List[str]:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = ? ORDER BY ordinal_position", (table,)
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+    def a_identifiant_serie(self, conn, table: str) -> bool:
+        """True si la table a une colonne id alimentée par une séquence (INSERT ... RETURNING id)."""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+            "AND table_name = ? AND column_name = 'id' AND column_default LIKE 'nextval%'", (table,)
+        )
+        return cursor.fetchone() is not None
+
+    def requete_version(self) -> str:
+        return 'SELECT version()'
+
+
+class DialecteMySQL(DialecteServeur):
+    nom = 'mysql'
+    double_pourcent = False
+    _formats_date = {'%M': '%i', '%S': '%s', '%W': '%v'}
+
+    def ouvrir(self, config: Dict, lecture_seule: bool = False):
+        import mysql.connector
+
+        brute = mysql.connector.connect(
+            host=config['host'], database=config['database'], user=config['user'],
+            password=config['password'], port=int(config['port']),
+        )
+        cursor = brute.cursor()
+        # "..." désigne un identifiant et || concatène, comme en SQLite
+        cursor.execute("SET SESSION sql_mode = CONCAT(@@SESSION.sql_mode, ',ANSI_QUOTES,PIPES_AS_CONCAT')")
+        if lecture_seule:
+            cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+        return ConnexionServeur(brute, self)
+
+    def retard_replica(self, conn) -> Optional[float]:
+        """Seconds_Behind_Source du réplica (0 si le serveur n'est pas un réplica)."""
+        cursor = conn.brute.cursor(dictionary=True, buffered=True)
+        cursor.execute("SHOW REPLICA STATUS")
+        statut = cursor.fetchone()
+        cursor.close()
+        if statut is None:
+            return 0.0
+        retard = statut.get('Seconds_Behind_Source')
+        return float(retard) if retard is not None else None
+
+    def est_valide(self, conn) -> bool:
+        return conn.brute.is_connected()
+
+    def maintenant_decale(self, secondes: str) -> str:
+        return f"(NOW() + INTERVAL {secondes} SECOND)"
+
+    def format_date(self, format_sqlite: str, expression: str) -> str:
+        format_mysql = re.sub(r'%\w', lambda m: self._formats_date.get(m.group(0), m.group(0)), format_sqlite)
+        return f"DATE_FORMAT({expression}, '{format_mysql}')"
+
+    def vers_horodatage(self, expression: str) -> str:
+        return f"TIMESTAMP({expression})"
+
+    def traduire_ddl(self, sql: str) -> str:
+        sql = re.sub(r'\bAUTOINCREMENT\b', 'AUTO_INCREMENT', sql, flags=re.I)
+        sql = re.sub(r'\bDATETIME\b', 'TIMESTAMP', sql, flags=re.I)
+        sql = re.sub(r'\bREAL\b', 'DOUBLE', sql, flags=re.I)
+        sql = re.sub(r'\bBOOLEAN\b', 'TINYINT(1)', sql, flags=re.I)
+        sql = re.sub(r'\bDEFAULT\s+CURRENT_DATE\b', 'DEFAULT (CURRENT_DATE)', sql, flags=re.I)
+
+        # Une colonne TEXT indexée (clé, UNIQUE) doit avoir une longueur
+        cles = set()
+        for liste in re.findall(r'\b(?:PRIMARY\s+KEY|UNIQUE)\s*\(([^)]*)\)', sql, flags=re.I):
+            cles.update(c.strip().lower() for c in liste.split(','))
+
+        def colonne_texte(m):
+            nom, suite = m.group(1), m.group(3)
+            if nom.lower() in cles or re.search(r'\b(PRIMARY\s+KEY|UNIQUE)\b', suite, re.I):
+                return f"{m.group(1)}{m.group(2)}VARCHAR(255){suite}"
+            return m.group(0)
+
+        sql = re.sub(r'(\w+)(\s+)TEXT\b([^,\n]*)', colonne_texte, sql, flags=re.I)
+
+        # CREATE INDEX IF NOT EXISTS n'existe pas: l'erreur "index existant" est ignorée
+        return re.sub(r'\bCREATE\s+(UNIQUE\s+)?INDEX\s+IF\s+NOT\s+EXISTS\b',
+                      lambda m: f"CREATE {m.group(1) or ''}INDEX", sql, flags=re.I)
+
+    def traduire_upsert(self, sql: str) -> str:
+        if not re.search(r'\bON\s+CONFLICT\b', sql, re.I):
+            return sql
+        sql = re.sub(r'\bON\s+CONFLICT\s*\([^)]*\)\s*DO\s+UPDATE\s+SET\b', 'ON DUPLICATE KEY UPDATE', sql, flags=re.I)
+        return re.sub(r'\bexcluded\.(\w+)', r'VALUES(\1)', sql, flags=re.I)
+
+    def inserer_ou_ignorer(self, sql: str) -> str:
+        return re.sub(r'\bINSERT\s+OR\s+IGNORE\b', 'INSERT IGNORE', sql, flags=re.I)
+
+    def colonnes_table(self, conn, table: str) -> List[str]:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = ? ORDER BY ordinal_position", (table,)
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+    def requete_version(self) -> str:
+        return 'SELECT VERSION()'
+
+
+# Mots réservés pouvant apparaître dans une expression DO UPDATE SET
+_MOTS_CLES_SQL = {'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'AND', 'OR', 'NOT', 'NULL', 'IS', 'IN',
+                  'CURRENT_TIMESTAMP', 'CURRENT_DATE', 'TRUE', 'FALSE', 'EXCLUDED'}
+
+
+def _separer_virgules(texte: str) -> List[str]:
+    """Découpe sur les virgules de premier niveau (hors parenthèses et littéraux)."""
+    parties, profondeur, courant, dans_litteral = [], 0, [], False
+    for caractere in texte:
+        if caractere == "'":
+            dans_litteral = not dans_litteral
+        elif not dans_litteral:
+            if caractere == '(':
+                profondeur += 1
+            elif caractere == ')':
+                profondeur -= 1
+            elif caractere == ',' and profondeur == 0:
+                parties.append(''.join(courant))
+                courant = []
+                continue
+        courant.append(caractere)
+    parties.append(''.join(courant))
+    return parties
+
+
+@lru_cache(maxsize=2048)
+def _traduire(dialecte: DialecteServeur, sql: str, avec_params: bool):
+    return dialecte._traduire(sql, avec_params)
+
+
+DIALECTES = {
+    'sqlite': DialecteSQLite(),
+    'postgresql': DialectePostgreSQL(),
+    'mysql': DialecteMySQL(),
+}
+
+
+# ==================== CONNEXIONS ====================
+
+class ConnexionSQLite(sqlite3.Connection):
+    """Connexion SQLite poolée: close() la rend au pool."""
+
+    dialecte = DIALECTES['sqlite']
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = instrumentation_sql.CurseurSQLite if instrumentation_sql.actif else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        if instrumentation_sql.actif:
+            return self.cursor().execute(sql, params)
+        return super().execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        if instrumentation_sql.actif:
+            return self.cursor().executemany(sql, seq_params)
+        return super().executemany(sql, seq_params)
+
+    def commit(self):
+        super().commit()
+        # total_changes est cumulatif: une hausse depuis le dernier commit est une écriture
+        if self.total_changes != getattr(self, '_changements_vus', 0):
+            self._changements_vus = self.total_changes
+            noter_ecriture()
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            super().close()
+        else:
+            pool.restituer(self)
+
+    def fermer(self):
+        super().close()
+
+
+class ConnexionServeur:
+    """Connexion PostgreSQL / MySQL exposant l'interface de sqlite3.Connection utilisée par l'application."""
+
+    def __init__(self, brute, dialecte: DialecteServeur):
+        self.brute = brute
+        self.dialecte = dialecte
+        self.row_factory = None
+        self._series = {}
+        self.a_ecrit = False
+
+    def cursor(self):
+        return CurseurServeur(self)
+
+    def execute(self, sql: str, params=()):
+        cursor = self.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def executemany(self, sql: str, params):
+        cursor = self.cursor()
+        cursor.executemany(sql, params)
+        return cursor
+
+    def commit(self):
+        self.brute.commit()
+        if self.a_ecrit:
+            self.a_ecrit = False
+            noter_ecriture()
+
+    def rollback(self):
+        self.brute.rollback()
+        self.a_ecrit = False
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            self.fermer()
+        else:
+            pool.restituer(self)
+
+    def fermer(self):
+        try:
+            self.brute.close()
+        except Exception:
+            pass
+
+    def a_identifiant_serie(self, table: str) -> bool:
+        if table not in self._series:
+            self._series[table] = self.dialecte.a_identifiant_serie(self, table)
+        return self._series[table]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_exc, exc, tb):
+        if type_exc is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+
+class CurseurServeur:
+    """Curseur qui traduit le SQL SQLite et retourne des lignes compatibles sqlite3.Row."""
+
+    def __init__(self, connexion: ConnexionServeur):
+        self.connexion = connexion
+        dialecte = connexion.dialecte
+        self._brut = connexion.brute.cursor(buffered=True) if dialecte.nom == 'mysql' else connexion.brute.cursor()
+        self.lastrowid = None
+        self._index = None
+        self._mesure = None
+
+    def _preparer(self, sql: str, params):
+        if not re.match(r'\s*(SELECT|WITH|SHOW)\b', sql, re.I):
+            self.connexion.a_ecrit = True
+        sql, modificateurs = self.connexion.dialecte.traduire(sql, bool(params))
+        if not params:
+            return sql, None
+        if isinstance(params, dict):
+            return sql, params
+        params = list(params)
+        for position in modificateurs:
+            params[position] = _secondes_modificateur(params[position])
+        return sql, params
+
+    def execute(self, sql: str, params=()):
+        if instrumentation_sql.actif:
+            return instrumentation_sql.executer(self, self._executer, sql, params)
+        return self._executer(sql, params)
+
+    def _executer(self, sql: str, params=()):
+        sql, params = self._preparer(sql, params)
+        retour_id = False
+        if self.connexion.dialecte.nom == 'postgresql':
+            m = re.match(r'\s*INSERT\s+INTO\s+"?(\w+)"?', sql, re.I)
+            if m and not re.search(r'\bRETURNING\b', sql, re.I) and self.connexion.a_identifiant_serie(m.group(1)):
+                sql = f"{sql.rstrip().rstrip(';')} RETURNING id"
+                retour_id = True
+
+        try:
+            self._brut.execute(sql, params)
+        except Exception as e:
+            # CREATE INDEX IF NOT EXISTS traduit pour MySQL: index déjà présent
+            if getattr(e, 'errno', None) == 1061 and re.match(r'\s*CREATE\s+(UNIQUE\s+)?INDEX', sql, re.I):
+                self._index = None
+                return self
+            raise _erreur_sqlite(e) from e
+
+        self._index = ({d[0].lower(): i for i, d in enumerate(self._brut.description)}
+                       if self._brut.description else None)
+        if retour_id:
+            ligne = self._brut.fetchone()
+            self.lastrowid = ligne[0] if ligne else None
+            self._index = None
+        elif self.connexion.dialecte.nom == 'mysql':
+            self.lastrowid = self._brut.lastrowid
+        return self
+
+    def executemany(self, sql: str, seq_params):
+        if instrumentation_sql.actif:
+            return instrumentation_sql.executer(self, self._executer_plusieurs, sql, seq_params)
+        return self._executer_plusieurs(sql, seq_params)
+
+    def _executer_plusieurs(self, sql: str, seq_params):
+        seq_params = list(seq_params)
+        if not seq_params:
+            return self
+        self.connexion.a_ecrit = True
+        sql, _ = self.connexion.dialecte.traduire(sql, True)
+        try:
+            self._brut.executemany(sql, seq_params)
+        except Exception as e:
+            raise _erreur_sqlite(e) from e
+        self._index = None
+        return self
+
+    def _ligne(self, valeurs):
+        return Ligne([_valeur_sqlite(v) for v in valeurs], self._index)
+
+    def fetchone(self):
+        if self._index is None:
+            return None
+        ligne = self._brut.fetchone()
+        return instrumentation_sql.compter_lignes(self, self._ligne(ligne) if ligne is not None else None)
+
+    def fetchall(self):
+        if self._index is None:
+            return []
+        return instrumentation_sql.compter_lignes(self, [self._ligne(l) for l in self._brut.fetchall()])
+
+    def fetchmany(self, taille: int = 1):
+        if self._index is None:
+            return []
+        return instrumentation_sql.compter_lignes(self, [self._ligne(l) for l in self._brut.fetchmany(taille)])
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def description(self):
+        return self._brut.description
+
+    @property
+    def rowcount(self):
+        return self._brut.rowcount
+
+    def close(self):
+        self._brut.close()
+
+
+def _erreur_sqlite(erreur: Exception) -> Exception:
+    """Ramène une erreur du pilote aux exceptions sqlite3 attendues par l'application."""
+    nom = type(erreur).__name__
+    if 'Integrity' in nom or 'UniqueViolation' in nom or 'ForeignKey' in nom:
+        return sqlite3.IntegrityError(str(erreur))
+    if 'Programming' in nom or 'Operational' in nom or 'Undefined' in nom:
+        return sqlite3.OperationalError(str(erreur))
+    return sqlite3.DatabaseError(str(erreur))
+
+
+# ==================== FOURNISSEUR ====================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def configuration() -> Dict:
+    """
+    Configuration du moteur (DB_TYPE, DB_HOST...), voir config_helper.
+
+    Le réplica de lecture est facultatif: DB_REPLICA_HOST (serveur; DB_REPLICA_PORT,
+    DB_REPLICA_NAME, DB_REPLICA_USER et DB_REPLICA_PASSWORD reprennent par défaut les
+    valeurs du primaire) ou DB_REPLICA_PATH (fichier SQLite). DB_REPLICA_MAX_RETARD fixe
+    le retard toléré en secondes.
+    """
+    from config_helper import get_config, get_db_config
+
+    config = get_db_config()
+    config['type'] = (config['type'] or 'sqlite').lower()
+    if config['type'] not in DIALECTES:
+        raise ValueError(f"DB_TYPE inconnu: {config['type']}")
+    config['port'] = get_config('DB_PORT', 'database', PORTS_DEFAUT.get(config['type']))
+
+    config['replica'] = None
+    if config['type'] == 'sqlite':
+        chemin = get_config('DB_REPLICA_PATH', 'database')
+        if chemin:
+            config['replica'] = {'chemin': chemin}
+    elif get_config('DB_REPLICA_HOST', 'database'):
+        config['replica'] = {
+            'host': get_config('DB_REPLICA_HOST', 'database'),
+            'port': get_config('DB_REPLICA_PORT', 'database', config['port']),
+            'database': get_config('DB_REPLICA_NAME', 'database', config['database']),
+            'user': get_config('DB_REPLICA_USER', 'database', config['user']),
+            'password': get_config('DB_REPLICA_PASSWORD', 'database', config['password']),
+        }
+    config['retard_max'] = float(get_config('DB_REPLICA_MAX_RETARD', 'database', RETARD_MAX_REPLICA))
+    return config
+
+
+@lru_cache(maxsize=1)
+def _config():
+    return configuration()
+
+
+def type_base() -> str:
+    """Moteur utilisé: 'sqlite', 'postgresql' ou 'mysql'."""
+    return _config()['type']
+
+
+def verrou_lecture() -> str:
+    """Suffixe d'un SELECT qui doit lire et verrouiller les lignes à jour (' FOR UPDATE' ou '')."""
+    return DIALECTES[type_base()].verrou_lecture
+
+
+def _pool(cle, ouvrir, est_valide=None) -> PoolConnexions:
+    with _pools_lock:
+        if cle not in _pools:
+            _pools[cle] = PoolConnexions(ouvrir, est_valide)
+        return _pools[cle]
+
+
+def _connexion(dialecte, config: Dict, chemin_sqlite: Optional[str], lecture_seule: bool = False):
+    if dialecte.nom == 'sqlite':
+        cle = ('sqlite', chemin_sqlite, lecture_seule)
+        return _pool(cle, lambda: dialecte.ouvrir(chemin_sqlite, lecture_seule)).acquerir()
+    cle = (dialecte.nom, config['host'], str(config['port']), config['database'], config['user'], lecture_seule)
+    return _pool(cle, lambda: dialecte.ouvrir(config, lecture_seule), dialecte.est_valide).acquerir()
+
+
+# ==================== ROUTAGE LECTURE / ÉCRITURE ====================
+
+# Dernière écriture validée par session (lecture de ses propres écritures)
+_ecritures: Dict = {}
+_routage_lock = threading.Lock()
+_etat_replica = {'mesure_le': None, 'retard': None}
+stats_routage = {'replica': 0, 'primaire': 0, 'replica_en_retard': 0, 'apres_ecriture': 0, 'replica_indisponible': 0}
+
+
+def _session():
+    """Session Streamlit courante si elle existe, sinon le thread."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            return ctx.session_id
+    except Exception:
+        pass
+    return threading.get_ident()
+
+
+def noter_ecriture():
+    """Enregistre l'heure de la dernière écriture validée par la session courante."""
+    with _routage_lock:
+        _ecritures[_session()] = time.time()
+        if len(_ecritures) > 1000:
+            limite = time.time() - 2 * _config()['retard_max']
+            for session in [s for s, t in _ecritures.items() if t < limite]:
+                del _ecritures[session]
+
+
+def _retard_replica(conn) -> Optional[float]:
+    """Retard du réplica, mesuré au plus une fois par INTERVALLE_MESURE_RETARD."""
+    maintenant = time.monotonic()
+    with _routage_lock:
+        if _etat_replica['mesure_le'] is not None and maintenant - _etat_replica['mesure_le'] < INTERVALLE_MESURE_RETARD:
+            return _etat_replica['retard']
+    try:
+        retard = conn.dialecte.retard_replica(conn)
+    except Exception as e:
+        logger.warning("Mesure du retard du réplica impossible: %s", e)
+        retard = None
+    with _routage_lock:
+        _etat_replica.update(mesure_le=maintenant, retard=retard)
+    return retard
+
+
+def _connexion_replica(config: Dict):
+    """Connexion au réplica s'il peut servir la lecture, sinon None (lecture sur le primaire)."""
+    dialecte = DIALECTES[config['type']]
+    replica = config['replica']
+    try:
+        if dialecte.nom == 'sqlite':
+            conn = _connexion(dialecte, config, replica['chemin'], lecture_seule=True)
+        else:
+            conn = _connexion(dialecte, {**config, **replica}, None, lecture_seule=True)
+    except Exception as e:
+        logger.warning("Réplica indisponible, lecture sur le primaire: %s", e)
+        stats_routage['replica_indisponible'] += 1
+        return None
+
+    retard = _retard_replica(conn)
+    if retard is None or retard > config['retard_max']:
+        stats_routage['replica_en_retard'] += 1
+        conn.close()
+        return None
+
+    # Le réplica reflète le primaire jusqu'à (maintenant - retard): une écriture plus récente
+    # de cette session n'y est peut-être pas encore
+    derniere_ecriture = _ecritures.get(_session())
+    if derniere_ecriture is not None and derniere_ecriture >= time.time() - retard - INTERVALLE_MESURE_RETARD:
+        stats_routage['apres_ecriture'] += 1
+        conn.close()
+        return None
+
+    stats_routage['replica'] += 1
+    return conn
+
+
+def get_connection(chemin_sqlite: Optional[str] = None, lecture: bool = False):
+    """
+    Retourne une connexion poolée au moteur configuré.
+
+    Args:
+        chemin_sqlite: Fichier de la base quand le moteur est SQLite
+        lecture: Lecture analytique, servie par le réplica s'il est configuré et à jour
+
+    Returns:
+        Connexion avec l'interface de sqlite3.Connection (close() la rend au pool)
+    """
+    config = _config()
+    if lecture and config['replica']:
+        conn = _connexion_replica(config)
+        if conn is not None:
+            return conn
+    stats_routage['primaire'] += 1
+    return _connexion(DIALECTES[config['type']], config, chemin_sqlite)
+
+
+def synchroniser_replica_sqlite(source: str, replica: str):
+    """
+    Copie une base SQLite vers un fichier réplica (API de sauvegarde) et y date la copie.
+
+    Sert de réplica local pour les tests et les postes sans serveur: à relancer
+    périodiquement; au-delà de DB_REPLICA_MAX_RETARD, les lectures reviennent au primaire.
+    """
+    debut = time.time()
+    origine = sqlite3.connect(source)
+    copie = sqlite3.connect(replica)
+    try:
+        origine.backup(copie)
+        copie.execute("CREATE TABLE IF NOT EXISTS replication_etat "
+                      "(id INTEGER PRIMARY KEY CHECK (id = 1), horodatage REAL NOT NULL)")
+        copie.execute("INSERT OR REPLACE INTO replication_etat (id, horodatage) VALUES (1, ?)", (debut,))
+        copie.commit()
+    finally:
+        copie.close()
+        origine.close()
+
+
+def colonnes_table(conn, table: str) -> List[str]:
+    """Colonnes d'une table, quel que soit le moteur (liste vide si la table n'existe pas)."""
+    return conn.dialecte.colonnes_table(conn, table)
+
+
+def fermer_pools():
+    """Ferme les connexions inactives de tous les pools."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.vider()
@@ -1,188 +1,253 @@
-# ai_forecast.py - Module de prédiction IA pour les stocks
+# ai_forecast.py - Module de prédiction IA pour les stocks et les recettes
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from datetime import datetime, timedelta
-import random
+from datetime import datetime, date, timedelta
+import threading
+import database_mairie as db
+import generateur_donnees
+import stocks_formulaires
+from logger import get_logger
+
+logger = get_logger(__name__)
 
 # Génération de données historiques simulées (car on n'a pas encore assez d'historique réel)
 def generate_fake_history(matiere, days=90):
-    """Génère un historique de consommation cohérent pour une matière."""
-    dates = [datetime.now() - timedelta(days=i) for i in range(days)]
-    dates.reverse()
-    
-    # Simulation: stock qui baisse (consommation) et remonte (réapprovisionnement)
-    stock_levels = []
-    current_stock = 100
-    daily_consumption_base = random.uniform(2, 8) # Consommation moyenne par jour
-    
-    data = []
-    
-    for date in dates:
-        # Variation aléatoire de la consommation
-        consumption = max(0, np.random.normal(daily_consumption_base, 1.5))
-        
-        current_stock -= consumption
-        
-        # Réapprovisionnement si stock bas
-        if current_stock < 15:
-            current_stock += random.randint(50, 100)
-            
-        data.append({
-            "date": date,
-            "stock": current_stock,
-            "consumption": consumption,
-            "matiere": matiere
-        })
-        
-    return pd.DataFrame(data)
+    """
+    Génère un historique de consommation cohérent pour une matière.
+
+    Déterministe: la graine est dérivée du nom de la matière (voir generateur_donnees).
+    """
+    df = generateur_donnees.serie_stock(
+        days, graine=generateur_donnees.graine_depuis_texte(matiere), fin=date.today()
+    )
+    df['matiere'] = matiere
+    return df
 
 
 def predict_stock_depletion(matiere):
     """
-    Prédit la date de rupture de stock pour une matière donnée.
-    Utilise une régression linéaire sur les 30 derniers jours.
+    Prédit la date de rupture de stock d'un formulaire.
+
+    Utilise la consommation moyenne tenue à jour à chaque vente (stocks_formulaires):
+    aucune relecture de l'historique.
+
+    Args:
+        matiere: ID du formulaire ou nom du document
+
+    Returns:
+        dict: days_until_empty, predicted_date, status, slope, quantite,
+              consommation_journaliere; None si le formulaire n'est pas suivi
     """
-    # 1. Obtenir/Générer les données
-    df = generate_fake_history(matiere)
-    
-    # On prend les 30 derniers jours pour la tendance récente
-    recent_df = df.tail(30).copy()
-    
-    # Préparer les données pour Scikit-Learn
-    # X = jours écoulés depuis le début de la période récente
-    recent_df['days_passed'] = (recent_df['date'] - recent_df['date'].min()).dt.days
-    
-    X = recent_df[['days_passed']]
-    y = recent_df['stock']
-    
-    # 2. Entraîner le modèle
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # 3. Prédire quand le stock sera à 0
-    # y = ax + b  =>  0 = ax + b  =>  x = -b / a
-    slope = model.coef_[0]
-    intercept = model.intercept_
-    
-    if slope >= 0:
-        return {
-            "days_until_empty": float('inf'),
-            "predicted_date": None,
-            "status": "STABLE", # Le stock monte ou stagne
-            "slope": slope,
-            "history": df
-        }
-        
-    days_until_zero = -intercept / slope
-    
-    # Date actuelle (relative aux données d'entraînement)
-    current_day_index = recent_df['days_passed'].max()
-    remaining_days = days_until_zero - current_day_index
-    
-    if remaining_days < 0:
-        predicted_date = datetime.now() # Déjà en rupture théorique
+    if isinstance(matiere, int):
+        stock = db.get_stock_formulaire(matiere)
     else:
-        predicted_date = datetime.now() + timedelta(days=remaining_days)
-        
-    return {
-        "days_until_empty": max(0, round(remaining_days, 1)),
-        "predicted_date": predicted_date,
-        "status": "CRITICAL" if remaining_days < 7 else "OK",
-        "slope": slope,
-        "history": df
-    }
+        stock = next((s for s in db.get_stocks_formulaires() if s['nom_document'] == matiere), None)
+
+    if stock is None:
+        return None
+    return stocks_formulaires.prevoir_rupture(stock)
+
+
+def predict_all_stock_depletions():
+    """Prévision de rupture de chaque formulaire suivi, triée du plus urgent au moins urgent."""
+    previsions = [
+        {'formulaire_id': s['formulaire_id'], 'nom_document': s['nom_document'],
+         'seuil_alerte': s['seuil_alerte'], **stocks_formulaires.prevoir_rupture(s)}
+        for s in db.get_stocks_formulaires()
+    ]
+    return sorted(previsions, key=lambda p: p['days_until_empty'])
+
+# ==================== PRÉVISION DES RECETTES ====================
+
+# Série prévue: recettes des taxes et des actes administratifs
+SERIE_RECETTES = 'RECETTES_TAXES_ACTES'
+PREFIXES_RECETTES = ('TAXE', 'ACTE')
+HORIZON_JOURS = 30
+
+# En dessous de ce nombre de jours réels, on complète avec une simulation
+MIN_JOURS_REELS = 3
+
+# Volume de la simulation de repli (~15 000 FCFA de recettes par jour)
+TRANSACTIONS_SIMULEES_PAR_JOUR = 2
+
+# Cache process: la prévision ne change que lorsqu'un nouveau jour se clôt
+_cache_lock = threading.Lock()
+_cache = {'jour': None, 'prevision': None}
+
+
+def coefficients_regression(n, somme_x, somme_y, somme_xx, somme_xy):
+    """Pente et ordonnée à l'origine des moindres carrés à partir des statistiques suffisantes."""
+    if n == 0:
+        return 0.0, 0.0
+    denominateur = n * somme_xx - somme_x * somme_x
+    if denominateur == 0:
+        return 0.0, somme_y / n
+    pente = (n * somme_xy - somme_x * somme_y) / denominateur
+    return pente, (somme_y - pente * somme_x) / n
+
+
+def _simuler_historique(days, real_data):
+    """Historique simulé (déterministe) de recettes, complété par les quelques jours réels disponibles."""
+    recettes = generateur_donnees.serie_recettes(
+        days, transactions_par_jour=TRANSACTIONS_SIMULEES_PAR_JOUR, fin=date.today() - timedelta(days=1)
+    )
+    simulated_data = [{"date": d.date(), "revenue": r} for d, r in recettes.items()]
+
+    # Fusionner simulation et vraies données
+    return pd.DataFrame(simulated_data + real_data)
+
 
 def get_revenue_history(days=90):
     """
-    Récupère l'historique des recettes (Taxes + Actes) depuis la base de données.
+    Récupère l'historique des recettes (Taxes + Actes) des jours clos.
+
+    Lit l'agrégat recettes_journalieres (jamais les transactions brutes).
     Si pas assez de données, génère une simulation réaliste.
     """
-    # Import local pour éviter boucle
-    import database as db
-    
-    conn = db.get_connection()
-    c = conn.cursor()
-    
-    # Récupérer les transactions de type TAXE ou ACTE
-    c.execute('''
-        SELECT date(date_creation) as day, SUM(montant) as total 
-        FROM transactions 
-        WHERE type LIKE 'TAXE%' OR type LIKE 'ACTE%'
-        GROUP BY day 
-        ORDER BY day ASC
-    ''')
-    rows = c.fetchall()
-    conn.close()
-    
-    df = pd.DataFrame(rows, columns=['date', 'revenue'])
-    
-    # Si pas assez de données (moins de 3 jours), on complète avec de la simulation
-    # Sinon on utilise les vraies données
-    if len(df) < 3:
-        # Toujours ajouter les vraies données si elles existent
+    aujourd_hui = date.fromisoformat(db.get_jour_courant())
+    rows = db.get_recettes_par_jour(
+        PREFIXES_RECETTES,
+        apres=(aujourd_hui - timedelta(days=days + 1)).isoformat(),
+        avant=aujourd_hui.isoformat()
+    )
+    df = pd.DataFrame(rows, columns=['jour', 'montant_total']).rename(
+        columns={'jour': 'date', 'montant_total': 'revenue'}
+    )
+
+    if len(df) < MIN_JOURS_REELS:
         real_data = df.to_dict('records') if not df.empty else []
-        
-        dates = [datetime.now().date() - timedelta(days=i) for i in range(days)]
-        dates.reverse()
-        
-        simulated_data = []
-        for d in dates:
-            # Recette aléatoire entre 5000 et 25000 FCFA avec tendance
-            base = 15000
-            noise = random.randint(-5000, 10000)
-            trend = (days - len(simulated_data)) * 50
-            
-            simulated_data.append({
-                "date": d,
-                "revenue": max(2000, base + noise + trend)
-            })
-        
-        # Fusionner simulation et vraies données
-        combined = simulated_data + real_data
-        return pd.DataFrame(combined)
-        
+        return _simuler_historique(days, real_data)
+
     df['date'] = pd.to_datetime(df['date']).dt.date
     return df
 
-def predict_revenue():
-    """Prédit les recettes futures."""
-    df = get_revenue_history()
-    
-    # Préparation données
-    df['date'] = pd.to_datetime(df['date'])
-    df['days_passed'] = (df['date'] - df['date'].min()).dt.days
-    
-    X = df[['days_passed']]
-    y = df['revenue']
-    
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # Prédiction sur 30 jours futurs
-    last_day = df['days_passed'].max()
-    future_days = np.array(range(last_day + 1, last_day + 31)).reshape(-1, 1)
-    future_revenue = model.predict(future_days)
-    
-    future_dates = [df['date'].max() + timedelta(days=i) for i in range(1, 31)]
-    
-    future_df = pd.DataFrame({
-        "date": future_dates,
-        "revenue": future_revenue,
-        "type": "PREDICTION"
-    })
-    
-    df['type'] = "HISTORIQUE"
-    
-    # Tendance
-    slope = model.coef_[0]
-    trend = "HAUSSIERE" if slope > 0 else "BAISSIERE"
-    
+
+def mettre_a_jour_modele(serie=SERIE_RECETTES):
+    """
+    Met à jour le modèle persisté avec les jours clos depuis son dernier ajustement.
+
+    Le modèle ne stocke que ses statistiques suffisantes (n, Σx, Σy, Σx², Σxy):
+    intégrer un nouveau jour est en O(1), sans relire l'historique. Les jours
+    clos ne changent plus (les paiements sont datés à l'encaissement).
+
+    Un jour intégré n'est jamais relu: les jours clos sont ceux d'avant le jour
+    courant de la base (l'horloge qui date les agrégats), lus sur le primaire.
+
+    Returns:
+        dict: état du modèle (table modeles_prevision) ou None si aucune donnée
+    """
+    modele = db.get_modele_prevision(serie)
+    nouveaux_jours = db.get_recettes_par_jour(
+        PREFIXES_RECETTES,
+        apres=modele['dernier_jour'] if modele else None,
+        avant=db.get_jour_courant(),
+        lecture=False
+    )
+    if not nouveaux_jours:
+        return modele
+
+    if modele is None:
+        modele = {
+            'serie': serie, 'origine': nouveaux_jours[0]['jour'], 'dernier_jour': None,
+            'n': 0, 'somme_x': 0.0, 'somme_y': 0.0, 'somme_xx': 0.0, 'somme_xy': 0.0,
+        }
+
+    origine = date.fromisoformat(modele['origine'])
+    for ligne in nouveaux_jours:
+        x = (date.fromisoformat(ligne['jour']) - origine).days
+        y = ligne['montant_total']
+        modele['n'] += 1
+        modele['somme_x'] += x
+        modele['somme_y'] += y
+        modele['somme_xx'] += x * x
+        modele['somme_xy'] += x * y
+    modele['dernier_jour'] = nouveaux_jours[-1]['jour']
+
+    pente, ordonnee = coefficients_regression(
+        modele['n'], modele['somme_x'], modele['somme_y'], modele['somme_xx'], modele['somme_xy']
+    )
+    modele['pente'] = pente
+    modele['ordonnee'] = ordonnee
+
+    dernier_jour = date.fromisoformat(modele['dernier_jour'])
+    dernier_x = (dernier_jour - origine).days
+    previsions = [
+        ((dernier_jour + timedelta(days=i)).isoformat(), ordonnee + pente * (dernier_x + i))
+        for i in range(1, HORIZON_JOURS + 1)
+    ]
+    db.save_modele_prevision(modele, previsions)
+
+    logger.info(f"Modèle {serie} mis à jour: +{len(nouveaux_jours)} jour(s), dernier jour {modele['dernier_jour']}")
+    return modele
+
+
+def _prevision_simulee(history):
+    """Prévision sur un historique simulé (pas assez de données réelles)."""
+    dates = pd.to_datetime(history['date'])
+    x = (dates - dates.min()).dt.days.to_numpy(dtype=float)
+    y = history['revenue'].to_numpy(dtype=float)
+    pente, ordonnee = coefficients_regression(len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum())
+
+    futurs = np.arange(x.max() + 1, x.max() + HORIZON_JOURS + 1)
+    return pd.DataFrame({
+        "date": [dates.max() + timedelta(days=i) for i in range(1, HORIZON_JOURS + 1)],
+        "revenue": ordonnee + pente * futurs,
+    }), pente
+
+
+def _calculer_prevision():
+    """Construit le résultat de predict_revenue à partir du modèle persisté."""
+    modele = mettre_a_jour_modele()
+    history = get_revenue_history()
+
+    if modele is None or modele['n'] < MIN_JOURS_REELS:
+        future_df, slope = _prevision_simulee(history)
+    else:
+        previsions = db.get_previsions_recettes(SERIE_RECETTES)
+        future_df = pd.DataFrame({
+            "date": pd.to_datetime([p['jour'] for p in previsions]),
+            "revenue": [p['montant_prevu'] for p in previsions],
+        })
+        slope = modele['pente']
+
+    history['date'] = pd.to_datetime(history['date'])
+    history['days_passed'] = (history['date'] - history['date'].min()).dt.days
+    history['type'] = "HISTORIQUE"
+    future_df['type'] = "PREDICTION"
+
     return {
-        "history": df,
+        "history": history,
         "forecast": future_df,
-        "trend": trend,
+        "trend": "HAUSSIERE" if slope > 0 else "BAISSIERE",
         "slope": slope,
-        "expected_revenue_30d": future_revenue.sum()
+        "expected_revenue_30d": future_df['revenue'].sum()
+    }
+
+
+def predict_revenue():
+    """
+    Prédit les recettes futures.
+
+    Le modèle n'est réajusté (de façon incrémentale) que lorsqu'un nouveau jour
+    se clôt; le reste du temps, la prévision est servie depuis le cache.
+    """
+    aujourd_hui = db.get_jour_courant()
+    with _cache_lock:
+        if _cache['jour'] != aujourd_hui:
+            _cache['prevision'] = _calculer_prevision()
+            _cache['jour'] = aujourd_hui
+        prevision = _cache['prevision']
+
+    # Copies: l'appelant peut modifier les DataFrames sans altérer le cache
+    return {
+        **prevision,
+        "history": prevision['history'].copy(),
+        "forecast": prevision['forecast'].copy(),
     }
+
+
+def invalider_cache():
+    """Oublie la prévision en cache: le prochain predict_revenue() la recalcule."""
+    with _cache_lock:
+        _cache['jour'] = None
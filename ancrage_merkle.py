@@ -0,0 +1,548 @@
+# ancrage_merkle.py - Ancrage des transactions par lots d'arbres de Merkle
+"""
+Intégrité des transactions sans publier chaque paiement:
+- Les transactions validées sont regroupées en lots (taille ou délai atteint)
+- Chaque lot forme un arbre de Merkle (SHA-256); seule la racine est publiée
+  sur un registre externe (Hedera, ou un fichier local en remplacement)
+- Chaque transaction garde sa preuve d'inclusion (chemin vers la racine):
+  vérifier un reçu coûte O(log n) hachages, sans relire le reste de la table
+
+Feuilles et nœuds sont préfixés (0x00 / 0x01) pour qu'une feuille ne puisse
+pas se faire passer pour un nœud interne; un nœud sans frère remonte tel quel.
+
+Configuration (section 'ancrage'): ANCRAGE_ACTIF, ANCRAGE_TAILLE_LOT,
+ANCRAGE_INTERVALLE, ANCRAGE_REGISTRE ('fichier' ou 'hedera'), ANCRAGE_FICHIER.
+
+Usage:
+    python ancrage_merkle.py --ancrer
+    python ancrage_merkle.py --verifier REC-20250115103000-A1B20001
+    python ancrage_merkle.py --statut
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database_mairie as db
+from config_helper import get_config, get_hedera_config
+from logger import LOG_DIR, get_logger, log_hedera_publish
+
+logger = get_logger(__name__)
+
+# Un lot est ancré dès TAILLE_LOT transactions en attente, ou après INTERVALLE secondes
+TAILLE_LOT = int(get_config('ANCRAGE_TAILLE_LOT', 'ancrage', 256))
+INTERVALLE = float(get_config('ANCRAGE_INTERVALLE', 'ancrage', 60))
+# Fréquence à laquelle le service compte les transactions en attente
+VERIFICATION = 5.0
+
+# Transactions en attente cherchées juste sous le dernier identifiant ancré: une
+# transaction serveur peut être validée après une autre de numéro supérieur
+FENETRE_RATTRAPAGE = 1000
+
+FICHIER_REGISTRE = os.path.join(LOG_DIR, "ancrages", "registre.jsonl")
+
+# Champs immuables d'une transaction qui entrent dans sa feuille
+CHAMPS_FEUILLE = ('id', 'numero_recu', 'type', 'libelle', 'montant', 'mode_paiement',
+                  'agent_id', 'citoyen_id', 'marche_id', 'date_creation')
+
+
+def actif() -> bool:
+    return str(get_config('ANCRAGE_ACTIF', 'ancrage', '0')).lower() in ('1', 'true', 'oui', 'yes')
+
+
+# ==================== ARBRE DE MERKLE ====================
+
+def hacher_feuille(transaction) -> str:
+    """
+    Hachage d'une transaction: sérialisation canonique de CHAMPS_FEUILLE.
+
+    Le montant est formaté à deux décimales pour donner le même hachage sur
+    SQLite (REAL) et sur les moteurs serveur (DECIMAL).
+    """
+    valeurs = {champ: transaction[champ] for champ in CHAMPS_FEUILLE}
+    valeurs['montant'] = f"{float(valeurs['montant']):.2f}"
+    contenu = json.dumps(valeurs, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(b'\x00' + contenu.encode('utf-8')).hexdigest()
+
+
+def _noeud(gauche: str, droite: str) -> str:
+    return hashlib.sha256(b'\x01' + bytes.fromhex(gauche) + bytes.fromhex(droite)).hexdigest()
+
+
+def construire_arbre(feuilles: List[str]) -> Tuple[str, List[List[Tuple[str, str]]]]:
+    """
+    Racine et preuve d'inclusion de chaque feuille.
+
+    Returns:
+        tuple: (racine, preuves) où preuves[i] = [(côté du frère 'G' ou 'D', hachage), ...]
+               de la feuille i vers la racine
+    """
+    if not feuilles:
+        raise ValueError("Arbre de Merkle vide")
+    preuves = [[] for _ in feuilles]
+    # Indices des feuilles portées par chaque nœud du niveau courant
+    niveau = list(feuilles)
+    porteurs = [[i] for i in range(len(feuilles))]
+    while len(niveau) > 1:
+        suivant, porteurs_suivants = [], []
+        for j in range(0, len(niveau) - 1, 2):
+            for i in porteurs[j]:
+                preuves[i].append(('D', niveau[j + 1]))
+            for i in porteurs[j + 1]:
+                preuves[i].append(('G', niveau[j]))
+            suivant.append(_noeud(niveau[j], niveau[j + 1]))
+            porteurs_suivants.append(porteurs[j] + porteurs[j + 1])
+        if len(niveau) % 2:
+            suivant.append(niveau[-1])
+            porteurs_suivants.append(porteurs[-1])
+        niveau, porteurs = suivant, porteurs_suivants
+    return niveau[0], preuves
+
+
+def racine_depuis_preuve(feuille: str, chemin: List[Tuple[str, str]]) -> str:
+    """Remonte de la feuille à la racine en len(chemin) hachages."""
+    courant = feuille
+    for cote, frere in chemin:
+        courant = _noeud(frere, courant) if cote == 'G' else _noeud(courant, frere)
+    return courant
+
+
+# ==================== REGISTRES ====================
+
+class RegistreFichier:
+    """
+    Registre local en remplacement d'un registre distribué (tests, développement).
+
+    Fichier JSON lines en ajout seul; chaque entrée porte le hachage de la
+    précédente, si bien qu'une entrée réécrite après coup casse la chaîne.
+    """
+
+    nom = 'fichier'
+
+    def __init__(self, chemin: str = None):
+        self.chemin = chemin or get_config('ANCRAGE_FICHIER', 'ancrage', FICHIER_REGISTRE)
+        os.makedirs(os.path.dirname(os.path.abspath(self.chemin)), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _entrees(self) -> List[Dict]:
+        if not os.path.exists(self.chemin):
+            return []
+        with open(self.chemin, encoding='utf-8') as f:
+            return [json.loads(ligne) for ligne in f if ligne.strip()]
+
+    def publier(self, message: str) -> Dict:
+        with self._lock:
+            precedent = '0' * 64
+            sequence = 1
+            if os.path.exists(self.chemin):
+                with open(self.chemin, 'rb') as f:
+                    lignes = f.read().splitlines()
+                if lignes:
+                    precedent = hashlib.sha256(lignes[-1]).hexdigest()
+                    sequence = json.loads(lignes[-1])['sequence'] + 1
+            entree = {'sequence': sequence, 'horodatage': time.time(), 'precedent': precedent, 'message': message}
+            with open(self.chemin, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entree, ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        return {'reference': f"{self.nom}:{sequence}", 'url': None}
+
+    def consulter(self, reference: str) -> Optional[str]:
+        sequence = int(reference.split(':', 1)[1])
+        return next((e['message'] for e in self._entrees() if e['sequence'] == sequence), None)
+
+    def verifier_chaine(self) -> bool:
+        """True si chaque entrée référence bien le hachage de la précédente."""
+        if not os.path.exists(self.chemin):
+            return True
+        precedent = '0' * 64
+        with open(self.chemin, 'rb') as f:
+            for ligne in f.read().splitlines():
+                if json.loads(ligne)['precedent'] != precedent:
+                    return False
+                precedent = hashlib.sha256(ligne).hexdigest()
+        return True
+
+
+class RegistreHedera:
+    """
+    Publication des racines sur un topic Hedera Consensus Service (config [hedera]).
+
+    Nécessite le SDK hedera (pip install hedera-sdk-py); la relecture passe par
+    l'API REST publique du mirror node.
+    """
+
+    nom = 'hedera'
+
+    def __init__(self, reseau: str = None):
+        self.config = get_hedera_config()
+        self.reseau = reseau or get_config('HEDERA_RESEAU', 'hedera', 'testnet')
+        if not self.config['topic_id'] or not self.config['operator_id']:
+            raise ValueError("Configuration Hedera incomplète (OPERATOR_ID, OPERATOR_KEY, TOPIC_ID)")
+        self._client = None
+
+    def _sdk(self):
+        try:
+            import hedera
+        except ImportError:
+            raise RuntimeError("SDK Hedera non installé: pip install hedera-sdk-py")
+        if self._client is None:
+            client = hedera.Client.forTestnet() if self.reseau == 'testnet' else hedera.Client.forMainnet()
+            client.setOperator(hedera.AccountId.fromString(self.config['operator_id']),
+                               hedera.PrivateKey.fromString(self.config['operator_key']))
+            self._client = client
+        return hedera
+
+    def publier(self, message: str) -> Dict:
+        hedera = self._sdk()
+        reponse = (hedera.TopicMessageSubmitTransaction()
+                   .setTopicId(hedera.TopicId.fromString(self.config['topic_id']))
+                   .setMessage(message)
+                   .execute(self._client))
+        recu = reponse.getReceipt(self._client)
+        tx_id = reponse.transactionId.toString()
+        log_hedera_publish(self.config['topic_id'], tx_id)
+        return {'reference': f"{self.nom}:{self.config['topic_id']}:{recu.topicSequenceNumber}",
+                'url': f"https://hashscan.io/{self.reseau}/transaction/{tx_id}"}
+
+    def consulter(self, reference: str) -> Optional[str]:
+        _, topic, sequence = reference.split(':')
+        url = f"https://{self.reseau}.mirrornode.hedera.com/api/v1/topics/{topic}/messages/{sequence}"
+        with urllib.request.urlopen(url, timeout=10) as reponse:
+            return base64.b64decode(json.load(reponse)['message']).decode('utf-8')
+
+
+# Registres disponibles (ANCRAGE_REGISTRE); un autre client s'ajoute avec enregistrer_registre()
+REGISTRES: Dict[str, Callable] = {
+    'fichier': RegistreFichier,
+    'hedera': RegistreHedera,
+}
+_registre = None
+
+
+def enregistrer_registre(nom: str, fabrique: Callable):
+    """Déclare un client de registre: un objet avec publier(message) et consulter(reference)."""
+    REGISTRES[nom] = fabrique
+
+
+def get_registre():
+    global _registre
+    if _registre is None:
+        nom = get_config('ANCRAGE_REGISTRE', 'ancrage', 'fichier')
+        if nom not in REGISTRES:
+            raise ValueError(f"Registre d'ancrage inconnu: {nom}")
+        _registre = REGISTRES[nom]()
+    return _registre
+
+
+def _registre_de(reference: str):
+    """Client capable de relire une référence (le registre configuré a pu changer depuis)."""
+    registre = get_registre()
+    nom = reference.split(':', 1)[0]
+    return registre if registre.nom == nom else REGISTRES[nom]()
+
+
+# ==================== LOTS ====================
+
+def transactions_en_attente(conn, limite: int = None) -> List:
+    """Transactions sans preuve, autour et au-delà du dernier identifiant ancré."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(dernier_tx_id), 0) FROM ancrages")
+    plancher = cursor.fetchone()[0] - FENETRE_RATTRAPAGE
+    requete = f'''
+        SELECT {', '.join('t.' + c for c in CHAMPS_FEUILLE)}
+        FROM transactions t
+        WHERE t.id > ?
+        AND NOT EXISTS (SELECT 1 FROM preuves_ancrage p WHERE p.transaction_id = t.id)
+        ORDER BY t.id
+    '''
+    if limite:
+        requete += f" LIMIT {int(limite)}"
+    cursor.execute(requete, (plancher,))
+    return cursor.fetchall()
+
+
+def _message(ancrage_id: int, racine: str, nb: int, premier: int, dernier: int) -> str:
+    """Message publié sur le registre: la racine et l'étendue du lot."""
+    return json.dumps({'v': 1, 'lot': ancrage_id, 'racine': racine, 'n': nb,
+                       'premier': premier, 'dernier': dernier}, separators=(',', ':'))
+
+
+def ancrer_lot(taille: int = TAILLE_LOT) -> Optional[int]:
+    """
+    Forme un lot avec au plus taille transactions en attente et publie sa racine.
+
+    Les preuves sont enregistrées avant la publication: si le registre est
+    indisponible, le lot reste EN_ATTENTE et publier_en_attente() le reprendra.
+
+    Returns:
+        ID du lot, None s'il n'y avait rien à ancrer (ou si un autre processus l'a fait)
+    """
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    lignes = transactions_en_attente(conn, taille)
+    if not lignes:
+        conn.close()
+        return None
+
+    racine, preuves = construire_arbre([hacher_feuille(l) for l in lignes])
+    try:
+        cursor.execute('''
+            INSERT INTO ancrages (racine, nb_transactions, premier_tx_id, dernier_tx_id, statut)
+            VALUES (?, ?, ?, ?, 'EN_ATTENTE')
+        ''', (racine, len(lignes), lignes[0]['id'], lignes[-1]['id']))
+        ancrage_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO preuves_ancrage (transaction_id, ancrage_id, indice, chemin)
+            VALUES (?, ?, ?, ?)
+        ''', [(l['id'], ancrage_id, i, json.dumps(preuve, separators=(',', ':')))
+              for i, (l, preuve) in enumerate(zip(lignes, preuves))])
+        conn.commit()
+    except sqlite3.IntegrityError:
+        # Un autre processus vient d'ancrer une partie de ces transactions
+        conn.rollback()
+        conn.close()
+        logger.info("Lot d'ancrage abandonné: transactions déjà ancrées ailleurs")
+        return None
+    conn.close()
+
+    logger.info("🌳 Lot %s: %d transactions, racine %s", ancrage_id, len(lignes), racine[:16])
+    _publier(ancrage_id, _message(ancrage_id, racine, len(lignes), lignes[0]['id'], lignes[-1]['id']))
+    return ancrage_id
+
+
+def _publier(ancrage_id: int, message: str) -> bool:
+    try:
+        publication = get_registre().publier(message)
+    except Exception as e:
+        logger.error("Publication du lot %s impossible: %s", ancrage_id, e)
+        return False
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE ancrages SET statut = 'ANCRE', reference_registre = ?, url = ?, date_ancrage = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (publication['reference'], publication['url'], ancrage_id))
+    if publication['url']:
+        cursor.execute('''
+            UPDATE transactions SET hashscan_url = ?
+            WHERE id IN (SELECT transaction_id FROM preuves_ancrage WHERE ancrage_id = ?)
+        ''', (publication['url'], ancrage_id))
+    conn.commit()
+    conn.close()
+    logger.info("⚓ Lot %s ancré: %s", ancrage_id, publication['reference'])
+    return True
+
+
+def publier_en_attente() -> int:
+    """Republie les racines des lots restés EN_ATTENTE (registre indisponible)."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, racine, nb_transactions, premier_tx_id, dernier_tx_id FROM ancrages "
+                   "WHERE statut = 'EN_ATTENTE' ORDER BY id")
+    lots = cursor.fetchall()
+    conn.close()
+    publies = 0
+    for lot in lots:
+        message = _message(lot['id'], lot['racine'], lot['nb_transactions'], lot['premier_tx_id'], lot['dernier_tx_id'])
+        if not _publier(lot['id'], message):
+            break
+        publies += 1
+    return publies
+
+
+def ancrer_tout(taille: int = TAILLE_LOT) -> int:
+    """Ancre toutes les transactions en attente (rattrapage de l'historique). Retourne le nombre de lots."""
+    publier_en_attente()
+    nb = 0
+    while ancrer_lot(taille) is not None:
+        nb += 1
+    return nb
+
+
+# ==================== VÉRIFICATION ====================
+
+def verifier_transaction(transaction_id: int, consulter_registre: bool = True) -> Dict:
+    """
+    Vérifie une transaction contre la racine de son lot: une ligne lue, len(chemin) hachages.
+
+    Returns:
+        dict: {'valide': bool, 'raison': str, 'ancrage_id', 'racine', 'reference', 'url', 'hachages'}
+    """
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(CHAMPS_FEUILLE)} FROM transactions WHERE id = ?", (transaction_id,))
+    transaction = cursor.fetchone()
+    cursor.execute('''
+        SELECT p.chemin, a.id, a.racine, a.statut, a.reference_registre, a.url
+        FROM preuves_ancrage p
+        JOIN ancrages a ON a.id = p.ancrage_id
+        WHERE p.transaction_id = ?
+    ''', (transaction_id,))
+    preuve = cursor.fetchone()
+    conn.close()
+
+    resultat = {'valide': False, 'raison': '', 'ancrage_id': None, 'racine': None,
+                'reference': None, 'url': None, 'hachages': 0}
+    if transaction is None:
+        resultat['raison'] = "Transaction introuvable"
+        return resultat
+    if preuve is None:
+        resultat['raison'] = "Transaction pas encore ancrée"
+        return resultat
+
+    chemin = json.loads(preuve['chemin'])
+    resultat.update(ancrage_id=preuve['id'], racine=preuve['racine'], reference=preuve['reference_registre'],
+                    url=preuve['url'], hachages=len(chemin) + 1)
+    if racine_depuis_preuve(hacher_feuille(transaction), chemin) != preuve['racine']:
+        resultat['raison'] = "Transaction modifiée depuis son ancrage"
+        return resultat
+    if preuve['statut'] != 'ANCRE':
+        resultat['raison'] = "Racine pas encore publiée sur le registre"
+        return resultat
+
+    if consulter_registre:
+        try:
+            message = _registre_de(preuve['reference_registre']).consulter(preuve['reference_registre'])
+        except Exception as e:
+            resultat['raison'] = f"Registre injoignable: {e}"
+            return resultat
+        if message is None or json.loads(message).get('racine') != preuve['racine']:
+            resultat['raison'] = "Racine absente du registre ou différente"
+            return resultat
+
+    resultat['valide'] = True
+    resultat['raison'] = "Preuve d'inclusion valide"
+    return resultat
+
+
+def verifier_recu(numero_recu: str, consulter_registre: bool = True) -> Dict:
+    """verifier_transaction() à partir du numéro de reçu."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM transactions WHERE numero_recu = ?", (numero_recu,))
+    ligne = cursor.fetchone()
+    conn.close()
+    if ligne is None:
+        return {'valide': False, 'raison': "Reçu introuvable", 'ancrage_id': None, 'racine': None,
+                'reference': None, 'url': None, 'hachages': 0}
+    return verifier_transaction(ligne[0], consulter_registre)
+
+
+def statut() -> Dict:
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT statut, COUNT(*), COALESCE(SUM(nb_transactions), 0) FROM ancrages GROUP BY statut")
+    lots = {r[0]: {'lots': r[1], 'transactions': r[2]} for r in cursor.fetchall()}
+    en_attente = len(transactions_en_attente(conn))
+    conn.close()
+    return {'lots': lots, 'en_attente': en_attente}
+
+
+# ==================== SERVICE ====================
+
+class ServiceAncrage:
+    """Thread de fond: ancre un lot dès TAILLE_LOT transactions en attente, ou après INTERVALLE secondes."""
+
+    def __init__(self, taille: int = TAILLE_LOT, intervalle: float = INTERVALLE,
+                 verification: float = VERIFICATION):
+        self.taille = taille
+        self.intervalle = intervalle
+        self.verification = min(verification, intervalle)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._dernier_ancrage = time.time()
+
+    def start(self):
+        """Démarre le thread d'ancrage (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ancrage-merkle", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.verification + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.verification):
+            try:
+                self.cycle()
+            except Exception as e:
+                logger.error("Erreur du service d'ancrage: %s", e)
+
+    def cycle(self) -> int:
+        """Ancre les lots dus; retourne le nombre de lots formés."""
+        publier_en_attente()
+        conn = db.get_connection()
+        en_attente = len(transactions_en_attente(conn, self.taille))
+        conn.close()
+        echu = time.time() - self._dernier_ancrage >= self.intervalle
+        nb = 0
+        while en_attente >= self.taille or (en_attente and echu):
+            if ancrer_lot(self.taille) is None:
+                break
+            nb += 1
+            echu = False
+            conn = db.get_connection()
+            en_attente = len(transactions_en_attente(conn, self.taille))
+            conn.close()
+        if nb:
+            self._dernier_ancrage = time.time()
+        elif not en_attente:
+            # Rien en attente: le délai court à partir de la prochaine transaction
+            self._dernier_ancrage = time.time()
+        return nb
+
+
+_service: Optional[ServiceAncrage] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> ServiceAncrage:
+    """Retourne le service d'ancrage du processus, démarré au premier appel."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ServiceAncrage()
+            _service.start()
+            logger.info("Service d'ancrage démarré (lots de %d, au plus toutes les %.0fs)",
+                        _service.taille, _service.intervalle)
+        return _service
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Ancrage des transactions par arbres de Merkle")
+    parser.add_argument('--ancrer', action='store_true', help="Ancre toutes les transactions en attente")
+    parser.add_argument('--taille', type=int, default=TAILLE_LOT, help="Transactions par lot")
+    parser.add_argument('--verifier', metavar='NUMERO_RECU', help="Vérifie la preuve d'un reçu")
+    parser.add_argument('--statut', action='store_true', help="Lots ancrés et transactions en attente")
+    args = parser.parse_args()
+
+    db.init_database()
+    if args.ancrer:
+        debut = time.perf_counter()
+        nb = ancrer_tout(args.taille)
+        print(f"⚓ {nb} lot(s) ancré(s) en {time.perf_counter() - debut:.1f}s")
+    if args.verifier:
+        resultat = verifier_recu(args.verifier)
+        print(f"{'✅' if resultat['valide'] else '❌'} {resultat['raison']} "
+              f"(lot {resultat['ancrage_id']}, {resultat['hachages']} hachages, {resultat['reference']})")
+    if args.statut or not (args.ancrer or args.verifier):
+        print(json.dumps(statut(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
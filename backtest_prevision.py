@@ -0,0 +1,235 @@
+# backtest_prevision.py - Évaluation des modèles de prévision (précision et vitesse)
+"""
+Banc d'essai des prévisions:
+- Évaluation à origine glissante sur un historique de recettes journalières
+- MAE / MAPE par horizon, latence d'ajustement et de prévision
+- Jeux de données synthétiques déterministes de 1, 5 et 10 ans (graine fixe)
+- Même protocole pour la prévision de rupture de stock
+
+Usage:
+    python backtest_prevision.py
+    python backtest_prevision.py --annees 1 5 --origines 12 --json resultats_backtest.json
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import ai_forecast
+import generateur_donnees
+import prevision_series
+import stocks_formulaires
+
+ANNEES_DEFAUT = (1, 5, 10)
+GRAINE_DEFAUT = generateur_donnees.GRAINE_DEFAUT
+HORIZONS_RECETTES = (1, 7, 30, 90)
+HORIZONS_STOCK = (1, 7, 14)
+N_ORIGINES_DEFAUT = 24
+
+# Historique minimal avant la première origine de prévision
+MIN_JOURS_APPRENTISSAGE = 90
+
+# Volume des jeux synthétiques (la date de fin est fixée par generateur_donnees)
+TRANSACTIONS_PAR_JOUR = 300
+
+
+# ==================== JEUX DE DONNÉES SYNTHÉTIQUES ====================
+
+def serie_recettes_synthetique(annees: int, graine: int = GRAINE_DEFAUT) -> pd.Series:
+    """Recettes journalières (Taxes + Actes) simulées par generateur_donnees."""
+    return generateur_donnees.serie_recettes(int(annees * 365), TRANSACTIONS_PAR_JOUR, graine)
+
+
+def serie_stock_synthetique(annees: int, graine: int = GRAINE_DEFAUT) -> pd.Series:
+    """Niveau de stock journalier simulé par generateur_donnees."""
+    df = generateur_donnees.serie_stock(int(annees * 365), graine)
+    return pd.Series(df['stock'].to_numpy(), index=df['date'], name='stock')
+
+
+# ==================== MODÈLES ÉVALUÉS ====================
+
+def _ajuster_lineaire(jours: pd.DatetimeIndex, y: np.ndarray):
+    """Régression linéaire globale de ai_forecast (jours avec encaissement uniquement)."""
+    x = (jours - jours[0]).days.to_numpy(dtype=float)
+    observe = y > 0
+    x, y = x[observe], y[observe]
+    pente, ordonnee = ai_forecast.coefficients_regression(len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum())
+    return {'origine': jours[0], 'pente': pente, 'ordonnee': ordonnee}
+
+
+def _prevoir_lineaire(etat, jours_futurs: pd.DatetimeIndex) -> np.ndarray:
+    x = (jours_futurs - etat['origine']).days.to_numpy(dtype=float)
+    return etat['ordonnee'] + etat['pente'] * x
+
+
+def _ajuster_saisonnier(jours: pd.DatetimeIndex, y: np.ndarray):
+    """Modèle saisonnier de prevision_series (une seule série, même fenêtre qu'en production)."""
+    jours, y = jours[-prevision_series.FENETRE_JOURS:], y[-prevision_series.FENETRE_JOURS:]
+    X = prevision_series.matrice_conception(jours, jours[0])
+    W = np.maximum.accumulate(y > 0).astype(float)
+    return {'origine': jours[0], 'modele': prevision_series.ajuster_series(y[None, :], W[None, :], X)}
+
+
+def _prevoir_saisonnier(etat, jours_futurs: pd.DatetimeIndex) -> np.ndarray:
+    X = prevision_series.matrice_conception(jours_futurs, etat['origine'])
+    ouvert = np.ones((1, len(jours_futurs)), dtype=bool)
+    return prevision_series.prevoir(etat['modele'], X, ouvert)['prevision'][0]
+
+
+def _ajuster_stock(jours: pd.DatetimeIndex, y: np.ndarray):
+    """
+    Consommation moyenne lissée (stocks_formulaires), rejouée jour par jour sur l'historique.
+
+    La consommation d'un jour est la baisse du stock; les jours de réapprovisionnement
+    (hausse) sont ignorés, comme l'est un mouvement REAPPRO dans le registre.
+    """
+    etat = {'quantite': y[-1], 'seuil_alerte': 0, 'conso_moyenne': 0.0, 'poids_moyenne': 0.0,
+            'jour_courant': None, 'conso_jour_courant': 0}
+    baisses = np.diff(y, prepend=y[0])
+    for jour, baisse in zip(jours.strftime('%Y-%m-%d'), baisses):
+        etat = stocks_formulaires.avancer_consommation(etat, jour)
+        if baisse < 0:
+            etat['conso_jour_courant'] += -baisse
+    lendemain = (jours[-1] + pd.Timedelta(days=1)).date()
+    return {'dernier_jour': jours[-1], 'niveau': y[-1], 'prevision': stocks_formulaires.prevoir_rupture(etat, lendemain)}
+
+
+def _prevoir_stock(etat, jours_futurs: pd.DatetimeIndex) -> np.ndarray:
+    ecart = (jours_futurs - etat['dernier_jour']).days.to_numpy(dtype=float)
+    return etat['niveau'] + etat['prevision']['slope'] * ecart
+
+
+# Modèle -> (ajustement, prévision)
+MODELES_RECETTES: Dict[str, Tuple[Callable, Callable]] = {
+    'lineaire (ai_forecast)': (_ajuster_lineaire, _prevoir_lineaire),
+    'saisonnier (prevision_series)': (_ajuster_saisonnier, _prevoir_saisonnier),
+}
+MODELES_STOCK: Dict[str, Tuple[Callable, Callable]] = {
+    'conso. lissée (predict_stock_depletion)': (_ajuster_stock, _prevoir_stock),
+}
+
+
+# ==================== ÉVALUATION À ORIGINE GLISSANTE ====================
+
+def origines_glissantes(n_jours: int, horizon_max: int, n_origines: int) -> np.ndarray:
+    """Indices des origines de prévision, régulièrement espacés sur l'historique disponible."""
+    premiere = MIN_JOURS_APPRENTISSAGE
+    derniere = n_jours - horizon_max
+    if derniere < premiere:
+        return np.array([], dtype=int)
+    return np.unique(np.linspace(premiere, derniere, n_origines).astype(int))
+
+
+def backtest(serie: pd.Series, ajuster: Callable, prevoir: Callable,
+             horizons: Sequence[int], n_origines: int = N_ORIGINES_DEFAUT) -> Dict:
+    """
+    Évalue un modèle à origine glissante: à chaque origine, ajustement sur le passé
+    puis prévision des horizon_max jours suivants.
+
+    Returns:
+        dict: {'precision': [{horizon, mae, mape, n}], 'latence': {ajustement_ms, prevision_ms, ...}}
+    """
+    jours = serie.index
+    y = serie.to_numpy(dtype=float)
+    horizon_max = max(horizons)
+    origines = origines_glissantes(len(y), horizon_max, n_origines)
+
+    erreurs = {h: [] for h in horizons}
+    reels = {h: [] for h in horizons}
+    durees_ajustement, durees_prevision = [], []
+
+    for origine in origines:
+        debut = time.perf_counter()
+        etat = ajuster(jours[:origine], y[:origine])
+        milieu = time.perf_counter()
+        prevision = prevoir(etat, jours[origine:origine + horizon_max])
+        fin = time.perf_counter()
+
+        durees_ajustement.append((milieu - debut) * 1000)
+        durees_prevision.append((fin - milieu) * 1000)
+        for h in horizons:
+            reel = y[origine + h - 1]
+            erreurs[h].append(prevision[h - 1] - reel)
+            reels[h].append(reel)
+
+    precision = []
+    for h in horizons:
+        e, r = np.array(erreurs[h]), np.array(reels[h])
+        non_nul = r != 0
+        precision.append({
+            'horizon': h,
+            'mae': float(np.abs(e).mean()) if len(e) else float('nan'),
+            # MAPE sur les jours avec recette (un jour de fermeture à 0 la rendrait infinie)
+            'mape': float((np.abs(e[non_nul]) / np.abs(r[non_nul])).mean() * 100) if non_nul.any() else float('nan'),
+            'n': len(e),
+        })
+
+    latence = {
+        'origines': len(origines),
+        'jours_historique_max': int(origines[-1]) if len(origines) else 0,
+        'ajustement_ms_moyen': float(np.mean(durees_ajustement)) if durees_ajustement else float('nan'),
+        'ajustement_ms_p95': float(np.percentile(durees_ajustement, 95)) if durees_ajustement else float('nan'),
+        'prevision_ms_moyen': float(np.mean(durees_prevision)) if durees_prevision else float('nan'),
+    }
+    return {'precision': precision, 'latence': latence}
+
+
+def executer_backtest(annees: Sequence[int] = ANNEES_DEFAUT, graine: int = GRAINE_DEFAUT,
+                      n_origines: int = N_ORIGINES_DEFAUT) -> Dict[str, pd.DataFrame]:
+    """
+    Lance le banc d'essai complet (recettes et stocks) sur chaque jeu synthétique.
+
+    Returns:
+        dict: {'precision': DataFrame (jeu, cible, modele, horizon, mae, mape, n),
+               'latence': DataFrame (jeu, cible, modele, origines, ... ms)}
+    """
+    lignes_precision, lignes_latence = [], []
+
+    for nb_annees in annees:
+        jeux = [
+            ('recettes', serie_recettes_synthetique(nb_annees, graine), MODELES_RECETTES, HORIZONS_RECETTES),
+            ('stock', serie_stock_synthetique(nb_annees, graine), MODELES_STOCK, HORIZONS_STOCK),
+        ]
+        for cible, serie, modeles, horizons in jeux:
+            for nom, (ajuster, prevoir) in modeles.items():
+                resultat = backtest(serie, ajuster, prevoir, horizons, n_origines)
+                contexte = {'jeu': f"{nb_annees} an(s)", 'cible': cible, 'modele': nom}
+                lignes_precision += [{**contexte, **p} for p in resultat['precision']]
+                lignes_latence.append({**contexte, **resultat['latence']})
+
+    return {'precision': pd.DataFrame(lignes_precision), 'latence': pd.DataFrame(lignes_latence)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest des modèles de prévision")
+    parser.add_argument('--annees', type=int, nargs='+', default=list(ANNEES_DEFAUT),
+                        help="Durées des jeux synthétiques, en années")
+    parser.add_argument('--graine', type=int, default=GRAINE_DEFAUT, help="Graine des jeux synthétiques")
+    parser.add_argument('--origines', type=int, default=N_ORIGINES_DEFAUT, help="Nombre d'origines glissantes")
+    parser.add_argument('--json', help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    resultats = executer_backtest(args.annees, args.graine, args.origines)
+
+    print("=" * 70)
+    print("  PRÉCISION PAR HORIZON")
+    print("=" * 70)
+    print(resultats['precision'].to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    print()
+    print("=" * 70)
+    print("  LATENCE")
+    print("=" * 70)
+    print(resultats['latence'].to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({cle: df.to_dict('records') for cle, df in resultats.items()}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Résultats enregistrés dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+Suite de benchmarks de bout en bout (SQLite): enregistrement des paiements,
+lectures du tableau de bord, surveillance IA et prévisions.
+
+Usage (depuis la racine du projet):
+    python -m benchmarks
+    python -m benchmarks --tailles 10k 100k 1M --json resultats.json
+    python -m benchmarks --enregistrer-reference   # référence locale (non versionnée)
+"""
@@ -0,0 +1,96 @@
+# benchmarks/jeux_donnees.py - Bases de test déterministes
+"""
+Bases SQLite de 10k, 100k ou 1M transactions, construites par generateur_donnees.
+
+Même graine et même date de fin => mêmes données. La date de fin est la veille
+par défaut, pour que les fenêtres « 30 derniers jours » des lectures ne soient pas vides.
+Les bases sont conservées dans benchmarks/donnees et réutilisées d'une exécution à l'autre.
+"""
+
+import glob
+import os
+import sqlite3
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+
+import acces_donnees
+import database_mairie as db
+import generateur_donnees
+
+DOSSIER_DONNEES = os.path.join(os.path.dirname(__file__), "donnees")
+
+TAILLES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+# Historique couvert par chaque jeu (le volume quotidien s'adapte à la taille)
+NB_JOURS = 730
+
+
+def transactions_exactes(nb: int, graine: int, fin: date):
+    """
+    Exactement nb transactions simulées sur NB_JOURS jours.
+
+    Le nombre tiré par generateur_donnees suit une loi de Poisson: on génère avec
+    une intensité un peu trop forte puis on garde les nb dernières (les plus récentes).
+    """
+    intensite = nb / NB_JOURS
+    while True:
+        transactions = generateur_donnees.generer_transactions(NB_JOURS, intensite * 1.25, graine, fin)
+        if len(transactions['montant']) >= nb:
+            break
+        intensite *= 1.5
+    debut = len(transactions['montant']) - nb
+    return {cle: (valeurs if cle == 'jours' else valeurs[debut:]) for cle, valeurs in transactions.items()}
+
+
+def chemin_base(taille: str, graine: int, fin: date) -> str:
+    return os.path.join(DOSSIER_DONNEES, f"bench_{taille}_{graine}_{fin.isoformat()}.db")
+
+
+def preparer_base(taille: str, graine: int = generateur_donnees.GRAINE_DEFAUT,
+                  fin: Optional[date] = None) -> str:
+    """
+    Retourne le chemin de la base de référence pour cette taille, en la créant si besoin.
+
+    La base n'est pas modifiée par les benchmarks: ils travaillent sur une copie.
+    """
+    fin = fin or date.today() - timedelta(days=1)
+    chemin = chemin_base(taille, graine, fin)
+    if os.path.exists(chemin):
+        return chemin
+
+    os.makedirs(DOSSIER_DONNEES, exist_ok=True)
+    # Jeux des jours précédents (même taille, même graine): remplacés par celui-ci
+    for ancien in glob.glob(os.path.join(DOSSIER_DONNEES, f"bench_{taille}_{graine}_*.db")):
+        os.remove(ancien)
+    provisoire = chemin + ".tmp"
+    if os.path.exists(provisoire):
+        os.remove(provisoire)
+
+    ancien_chemin = db.DB_PATH
+    try:
+        generateur_donnees.charger_dans_base(transactions_exactes(TAILLES[taille], graine, fin), graine, provisoire)
+    finally:
+        db.DB_PATH = ancien_chemin
+        # Les connexions poolées vers le fichier provisoire doivent être fermées avant de le renommer
+        acces_donnees.fermer_pools()
+
+    conn = sqlite3.connect(provisoire)
+    nb = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    if nb != TAILLES[taille]:
+        raise RuntimeError(f"Jeu {taille}: {nb} transactions au lieu de {TAILLES[taille]}")
+    os.replace(provisoire, chemin)
+    return chemin
+
+
+def empreinte_base(chemin: str) -> str:
+    """Somme de contrôle du contenu des transactions (vérifie le déterminisme d'un jeu)."""
+    conn = sqlite3.connect(chemin)
+    montants = np.array([r[0] for r in conn.execute("SELECT montant FROM transactions ORDER BY id")])
+    dates = conn.execute("SELECT MIN(date_creation), MAX(date_creation) FROM transactions").fetchone()
+    conn.close()
+    return f"{len(montants)}:{montants.sum():.0f}:{dates[0]}:{dates[1]}"
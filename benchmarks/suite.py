@@ -0,0 +1,279 @@
+# benchmarks/suite.py - Scénarios, mesures et comparaison à la référence
+"""
+Pour chaque taille de jeu (voir jeux_donnees):
+- Débit d'enregistrement des paiements (taxe, acte, location) via services_mairie
+- Latence des lectures du tableau de bord (get_statistics, get_all_transactions)
+- Latence de la surveillance IA et des prévisions (recalcul, hors cache)
+
+Chaque taille travaille sur une copie de la base de référence. Les résultats
+sont écrits en JSON et comparés à benchmarks/reference.json: une médiane plus
+lente que la référence de plus de --seuil (25 % par défaut) est une régression,
+et le code de sortie vaut alors 1.
+
+Les durées dépendent de la machine: la référence n'est pas versionnée. Elle est
+créée sur la machine qui compare (CI ou poste) avec --enregistrer-reference,
+au commit de base, puis la suite est relancée sur le commit à vérifier.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import acces_donnees
+import ai_forecast
+import database_mairie as db
+import disponibilites
+import ia_surveillance
+import journal_audit
+import prevision_series
+import services_mairie as services
+from benchmarks import jeux_donnees
+
+FICHIER_REFERENCE = os.path.join(os.path.dirname(__file__), "reference.json")
+DOSSIER_RESULTATS = os.path.join(os.path.dirname(__file__), "resultats")
+
+TAILLES_DEFAUT = ('10k', '100k', '1M')
+SEUIL_DEFAUT = 0.25
+# En dessous de cet écart absolu, une différence relève du bruit (fsync des écritures de l'ordre de la ms)
+ECART_MINIMAL_MS = 0.5
+
+# Écritures: nombre d'opérations par scénario; lectures: répétitions, bornées par un budget de temps
+NB_ECRITURES = 200
+NB_REPETITIONS = 20
+BUDGET_SECONDES = 15.0
+
+
+# ==================== SCÉNARIOS ====================
+
+class Contexte:
+    """Identifiants de référence de la base de travail (une taxe à montant fixe, un acte, une location)."""
+
+    def __init__(self):
+        self.taxe_id = next(t['id'] for t in db.get_taxes() if t['montant_fixe'])
+        self.formulaire_id = db.get_formulaires()[0]['id']
+        location = db.get_locations()[0]
+        self.location_id = location['id']
+        self.jours_location = disponibilites.jours_reservation(location['frequence'], 1)
+        self.debut_locations = date.today() + timedelta(days=3650)
+
+
+def _payer_taxe(ctx: Contexte, i: int):
+    services.enregistrer_paiement_taxe(ctx.taxe_id, agent_id=1, nom_commercant=f"Bench {i}",
+                                       numero_commercant=f"B{i:06d}")
+
+
+def _payer_acte(ctx: Contexte, i: int):
+    services.enregistrer_paiement_acte(ctx.formulaire_id, agent_id=1, nom_commercant=f"Bench {i}")
+
+
+def _payer_location(ctx: Contexte, i: int):
+    # Une période distincte par réservation, loin dans le futur
+    debut = (ctx.debut_locations + timedelta(days=ctx.jours_location * i)).isoformat()
+    services.enregistrer_paiement_location(ctx.location_id, 1, debut, f"Bench {i}", agent_id=1)
+
+
+def _prevision_recettes(ctx: Contexte, i: int):
+    ai_forecast.invalider_cache()
+    ai_forecast.predict_revenue()
+
+
+# (nom, fonction(contexte, i), écriture)
+SCENARIOS: List[tuple] = [
+    ('paiement_taxe', _payer_taxe, True),
+    ('paiement_acte', _payer_acte, True),
+    ('paiement_location', _payer_location, True),
+    ('get_statistics', lambda ctx, i: db.get_statistics(), False),
+    ('get_all_transactions', lambda ctx, i: db.get_all_transactions(), False),
+    ('surveillance_recettes_journalieres', lambda ctx, i: ia_surveillance.ia_surveillance.surveillance_recettes_journalieres(), False),
+    ('detecter_patterns_frauduleux', lambda ctx, i: ia_surveillance.ia_surveillance.detecter_patterns_frauduleux(jours=7), False),
+    ('score_integrite_global', lambda ctx, i: ia_surveillance.ia_surveillance.get_score_integrite_global(), False),
+    ('prevision_recettes', _prevision_recettes, False),
+    ('prevision_series', lambda ctx, i: prevision_series.prevoir_toutes_series(), False),
+]
+
+
+def mesurer(fonction: Callable, ctx: Contexte, nb: int, budget: float = None) -> Dict:
+    """
+    Exécute fonction(ctx, i) nb fois (au moins une, et pas au-delà du budget de temps).
+
+    Returns:
+        dict: {'n', 'moyenne_ms', 'p50_ms', 'p95_ms', 'max_ms', 'debit_par_s'}
+    """
+    durees = []
+    debut_total = time.perf_counter()
+    for i in range(nb):
+        debut = time.perf_counter()
+        fonction(ctx, i)
+        durees.append(time.perf_counter() - debut)
+        if budget and time.perf_counter() - debut_total > budget:
+            break
+    durees = np.array(durees) * 1000
+    return {
+        'n': len(durees),
+        'moyenne_ms': float(durees.mean()),
+        'p50_ms': float(np.percentile(durees, 50)),
+        'p95_ms': float(np.percentile(durees, 95)),
+        'max_ms': float(durees.max()),
+        'debit_par_s': float(1000 * len(durees) / durees.sum()),
+    }
+
+
+def executer_taille(taille: str, graine: int, nb_ecritures: int, nb_repetitions: int,
+                    budget: float, scenarios: List[str] = None) -> Dict[str, Dict]:
+    """Exécute les scénarios sur une copie de la base de référence de cette taille."""
+    reference = jeux_donnees.preparer_base(taille, graine)
+    with tempfile.TemporaryDirectory() as dossier:
+        travail = os.path.join(dossier, os.path.basename(reference))
+        shutil.copyfile(reference, travail)
+
+        ancien_chemin = db.DB_PATH
+        db.DB_PATH = travail
+        try:
+            # Migrations du code courant (jeu construit par une version antérieure)
+            db.init_database()
+            # Caches de prévision calculés sur une autre base
+            ai_forecast.invalider_cache()
+            prevision_series.invalider_cache()
+            ctx = Contexte()
+            db.reapprovisionner_formulaire(ctx.formulaire_id, nb_ecritures)
+
+            resultats = {}
+            for nom, fonction, ecriture in SCENARIOS:
+                if scenarios and nom not in scenarios:
+                    continue
+                if ecriture:
+                    resultats[nom] = mesurer(fonction, ctx, nb_ecritures)
+                else:
+                    fonction(ctx, -1)  # échauffement: caches SQLite et pool de connexions
+                    resultats[nom] = mesurer(fonction, ctx, nb_repetitions, budget)
+                print(f"  {taille:>5} {nom:<36} p50 {resultats[nom]['p50_ms']:10.2f} ms"
+                      f"  ({resultats[nom]['debit_par_s']:,.1f}/s, n={resultats[nom]['n']})")
+        finally:
+            # Journal d'audit des paiements écrit avant la suppression de la copie
+            journal_audit.vider()
+            db.DB_PATH = ancien_chemin
+            acces_donnees.fermer_pools()
+    return resultats
+
+
+# ==================== RÉFÉRENCE ====================
+
+def comparer(resultats: Dict, reference: Dict, seuil: float = SEUIL_DEFAUT) -> List[Dict]:
+    """
+    Compare les médianes aux valeurs de référence. Une régression dépasse à la fois
+    le seuil relatif et ECART_MINIMAL_MS.
+
+    Returns:
+        list: [{'taille', 'scenario', 'reference_ms', 'mesure_ms', 'ecart', 'regression'}]
+    """
+    comparaison = []
+    for taille, scenarios in resultats['resultats'].items():
+        for nom, mesure in scenarios.items():
+            ref = reference.get('resultats', {}).get(taille, {}).get(nom)
+            if ref is None:
+                continue
+            ecart = mesure['p50_ms'] / ref['p50_ms'] - 1 if ref['p50_ms'] > 0 else 0.0
+            comparaison.append({'taille': taille, 'scenario': nom, 'reference_ms': ref['p50_ms'],
+                                'mesure_ms': mesure['p50_ms'], 'ecart': ecart,
+                                'regression': ecart > seuil and mesure['p50_ms'] - ref['p50_ms'] > ECART_MINIMAL_MS})
+    return comparaison
+
+
+def _commit_git() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de bout en bout")
+    parser.add_argument('--tailles', nargs='+', choices=list(jeux_donnees.TAILLES), default=list(TAILLES_DEFAUT))
+    parser.add_argument('--scenarios', nargs='+', choices=[nom for nom, _, _ in SCENARIOS],
+                        help="Sous-ensemble de scénarios (tous par défaut)")
+    parser.add_argument('--graine', type=int, default=jeux_donnees.generateur_donnees.GRAINE_DEFAUT)
+    parser.add_argument('--ecritures', type=int, default=NB_ECRITURES, help="Paiements par scénario d'écriture")
+    parser.add_argument('--repetitions', type=int, default=NB_REPETITIONS, help="Répétitions par lecture")
+    parser.add_argument('--budget', type=float, default=BUDGET_SECONDES,
+                        help="Temps maximal par scénario de lecture, en secondes")
+    parser.add_argument('--json', help="Fichier de résultats (défaut: benchmarks/resultats/<date>.json)")
+    parser.add_argument('--reference', default=FICHIER_REFERENCE, help="Fichier de référence")
+    parser.add_argument('--seuil', type=float, default=SEUIL_DEFAUT, help="Ralentissement toléré (0.25 = 25 %%)")
+    parser.add_argument('--enregistrer-reference', action='store_true',
+                        help="Enregistre ces résultats comme nouvelle référence")
+    parser.add_argument('--avec-logs', action='store_true',
+                        help="Garde les logs INFO et WARNING (coupés par défaut; le coût d'un log se mesure avec python logger.py)")
+    args = parser.parse_args(argv)
+
+    if not args.avec_logs:
+        logging.disable(logging.WARNING)
+
+    resultats = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': _commit_git(),
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'processeur': platform.processor() or platform.machine(),
+            'graine': args.graine,
+            'ecritures': args.ecritures,
+            'repetitions': args.repetitions,
+        },
+        'resultats': {},
+    }
+    for taille in args.tailles:
+        print(f"📦 Jeu {taille}")
+        resultats['resultats'][taille] = executer_taille(taille, args.graine, args.ecritures, args.repetitions,
+                                                         args.budget, args.scenarios)
+        resultats['meta'].setdefault('jeux', {})[taille] = jeux_donnees.empreinte_base(
+            jeux_donnees.preparer_base(taille, args.graine))
+
+    chemin = args.json
+    if not chemin:
+        os.makedirs(DOSSIER_RESULTATS, exist_ok=True)
+        chemin = os.path.join(DOSSIER_RESULTATS, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Résultats enregistrés dans {chemin}")
+
+    if args.enregistrer_reference:
+        with open(args.reference, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"📌 Référence mise à jour: {args.reference}")
+        return 0
+
+    if not os.path.exists(args.reference):
+        print("ℹ️ Aucune référence: lancer avec --enregistrer-reference pour en créer une")
+        return 0
+
+    with open(args.reference, encoding='utf-8') as f:
+        reference = json.load(f)
+    comparaison = comparer(resultats, reference, args.seuil)
+    regressions = [c for c in comparaison if c['regression']]
+
+    print(f"\nComparaison à la référence ({reference['meta'].get('date')}, commit {reference['meta'].get('commit') or '?'}):")
+    for c in comparaison:
+        marque = "❌" if c['regression'] else "  "
+        print(f"  {marque} {c['taille']:>5} {c['scenario']:<36} {c['reference_ms']:10.2f} -> {c['mesure_ms']:10.2f} ms"
+              f"  ({c['ecart']:+.0%})")
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.seuil:.0%}")
+        return 1
+    print(f"\n✅ Aucune régression au-delà de {args.seuil:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# carte_marches.py - Couche géographique de la cartographie des marchés
+"""
+Prépare les données de la carte des marchés municipaux:
+- Textes de survol construits de façon vectorisée
+- Figure Plotly sérialisée et tableau, mis en cache par version de la table marches
+- Regroupement (clustering) des marqueurs quand on dézoome
+- Calque d'intensité des recettes par marché, lu depuis l'agrégat recettes_marches_jour
+"""
+
+import threading
+from datetime import date
+import pandas as pd
+import plotly.graph_objects as go
+import database_mairie as db
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Centre de la carte: Franceville, Gabon (-1.6332°S, 13.5833°E)
+CENTRE_CARTE = dict(lat=-1.6332, lon=13.5833)
+ZOOM_INITIAL = 13
+
+# En dessous de ce niveau de zoom, les marchés proches sont regroupés
+ZOOM_MAX_CLUSTER = 12
+
+# Période couverte par le calque des recettes
+PERIODE_RECETTES_JOURS = 30
+
+# Colonnes du tableau détaillé et leurs libellés
+COLONNES_TABLEAU = {
+    'nom_marche': 'Nom du Marché',
+    'quartier': 'Quartier',
+    'nombre_etals': 'Nb Étals',
+    'tarif_etal_jour': 'Tarif (FCFA)',
+    'type_marche': 'Type',
+    'jours_ouverture': 'Jours Ouverture',
+    'horaires': 'Horaires',
+}
+
+# Cache process: une seule entrée, remplacée quand la version change
+_cache_lock = threading.Lock()
+_cache = {'version': None, 'geodata': None}
+
+
+def build_hover_texts(df_marches: pd.DataFrame) -> pd.Series:
+    """Construit les textes de survol de tous les marchés en une seule passe vectorisée."""
+    tarifs = df_marches['tarif_etal_jour'].map('{:,.0f}'.format)
+    return (
+        "<b>" + df_marches['nom_marche'].astype(str) + "</b><br>"
+        + "📍 Quartier: " + df_marches['quartier'].astype(str) + "<br>"
+        + "🛒 Étals: " + df_marches['nombre_etals'].astype(str) + "<br>"
+        + "💰 Tarif: " + tarifs + " FCFA<br>"
+        + "📅 " + df_marches['jours_ouverture'].astype(str) + "<br>"
+        + "🕐 " + df_marches['horaires'].astype(str)
+    )
+
+
+def build_figure(df_marches: pd.DataFrame, calques=()) -> dict:
+    """
+    Construit la figure de la carte et la retourne sous forme sérialisée (dict Plotly).
+
+    Args:
+        df_marches: DataFrame des marchés (latitude, longitude, ...)
+        calques: Traces Plotly supplémentaires dessinées sous les marqueurs
+
+    Returns:
+        dict: Figure sérialisée, directement utilisable par st.plotly_chart
+    """
+    fig = go.Figure()
+
+    for calque in calques:
+        fig.add_trace(calque)
+
+    # Marqueurs des marchés, regroupés automatiquement quand on dézoome
+    fig.add_trace(go.Scattermapbox(
+        lat=df_marches['latitude'],
+        lon=df_marches['longitude'],
+        mode='markers',  # Seulement les marqueurs, pas de texte pour éviter superposition
+        marker=dict(
+            size=25,  # Taille augmentée pour meilleure visibilité
+            color='#FF4444',  # Rouge vif
+            opacity=0.95,
+            symbol='circle'
+        ),
+        cluster=dict(
+            enabled=True,
+            maxzoom=ZOOM_MAX_CLUSTER,
+            color='#C62828',
+            opacity=0.9,
+            size=30
+        ),
+        hovertext=build_hover_texts(df_marches),
+        hoverinfo='text',
+        name='Marchés de Franceville'
+    ))
+
+    # Configuration de la carte (OpenStreetMap)
+    fig.update_layout(
+        mapbox=dict(
+            style="open-street-map",
+            center=CENTRE_CARTE,
+            zoom=ZOOM_INITIAL
+        ),
+        height=500,  # Hauteur réduite pour meilleure compatibilité mobile
+        margin={"r": 0, "t": 10, "l": 0, "b": 0},  # Marges réduites
+        showlegend=False,  # Masquer la légende pour plus d'espace
+        # Activer les interactions (zoom, pan, etc.)
+        dragmode='zoom',
+        hovermode='closest'
+    )
+
+    return fig.to_dict()
+
+
+def build_calque_recettes(df_recettes: pd.DataFrame):
+    """
+    Construit le calque de chaleur des recettes encaissées par marché.
+
+    Args:
+        df_recettes: Résultat de db.get_recettes_marches()
+
+    Returns:
+        go.Densitymapbox ou None si aucune recette sur la période
+    """
+    if df_recettes.empty or df_recettes['montant_total'].sum() <= 0:
+        return None
+
+    return go.Densitymapbox(
+        lat=df_recettes['latitude'],
+        lon=df_recettes['longitude'],
+        z=df_recettes['montant_total'],
+        radius=40,
+        colorscale='YlOrRd',
+        opacity=0.6,
+        showscale=False,
+        hovertext=(
+            "<b>" + df_recettes['nom_marche'].astype(str) + "</b><br>"
+            + "💵 Recettes " + str(PERIODE_RECETTES_JOURS) + "j: "
+            + df_recettes['montant_total'].map('{:,.0f}'.format) + " FCFA<br>"
+            + "🧾 " + df_recettes['nb_transactions'].astype(str) + " transaction(s)"
+        ),
+        hoverinfo='text',
+        name='Recettes par marché'
+    )
+
+
+def build_table(df_marches: pd.DataFrame) -> pd.DataFrame:
+    """Prépare le tableau détaillé des marchés."""
+    return df_marches[list(COLONNES_TABLEAU)].rename(columns=COLONNES_TABLEAU)
+
+
+def _build_geodata(df_marches: pd.DataFrame, df_recettes: pd.DataFrame) -> dict:
+    """Calcule tout ce que la page cartographie affiche à partir des marchés et de leurs recettes."""
+    calque_recettes = build_calque_recettes(df_recettes)
+    return {
+        'marches': df_marches,
+        'recettes': df_recettes,
+        'figure': build_figure(df_marches, calques=[calque_recettes] if calque_recettes is not None else ()),
+        'tableau': build_table(df_marches),
+        'stats': {
+            'total_marches': len(df_marches),
+            'total_etals': df_marches['nombre_etals'].sum(),
+            'tarif_moyen': df_marches['tarif_etal_jour'].mean(),
+        },
+    }
+
+
+def get_marches_geodata() -> dict:
+    """
+    Retourne les données de la cartographie, recalculées seulement si la table marches
+    ou l'agrégat des recettes par marché a changé.
+
+    Returns:
+        dict: {
+            'version': (empreinte marches, empreinte recettes, jour),
+            'marches': DataFrame des marchés actifs,
+            'recettes': DataFrame des recettes par marché sur la période,
+            'figure': figure sérialisée,
+            'tableau': DataFrame d'affichage,
+            'stats': statistiques globales
+        } ou None si aucun marché
+    """
+    # La date du jour fait partie de la clé: la fenêtre glissante des recettes avance chaque jour
+    version = (db.get_marches_version(), db.get_recettes_marches_version(), date.today())
+
+    with _cache_lock:
+        if _cache['version'] == version:
+            return _cache['geodata']
+
+    marches = db.get_all_marches()
+    geodata = None
+    if marches:
+        df_recettes = pd.DataFrame(db.get_recettes_marches(PERIODE_RECETTES_JOURS))
+        geodata = _build_geodata(pd.DataFrame(marches), df_recettes)
+        geodata['version'] = version
+
+    with _cache_lock:
+        _cache['version'] = version
+        _cache['geodata'] = geodata
+
+    logger.debug(f"Carte des marchés recalculée (version {version})")
+    return geodata
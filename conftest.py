@@ -0,0 +1,54 @@
+# conftest.py - Fixtures pytest communes
+"""
+Les tests tournent sur une base SQLite temporaire: database_mairie.DB_PATH est
+redirigé vers tmp_path, la configuration du moteur est forcée à SQLite sans réplica.
+Le log texte et le journal d'événements sont écrits dans un dossier temporaire,
+jamais dans logs/ du dépôt.
+"""
+
+import os
+
+import pytest
+
+import acces_donnees
+import database_mairie as db
+import journal_audit
+import journal_evenements
+import logger
+
+# Scripts manuels (base réelle, serveur MySQL), pas des tests pytest
+collect_ignore = ['test_clients.py', 'test_wampserver_connection.py']
+
+
+@pytest.fixture(scope='session', autouse=True)
+def journaux_temporaires(tmp_path_factory):
+    """app.log et evenements.jsonl dans un dossier temporaire pour toute la session."""
+    dossier = str(tmp_path_factory.mktemp('logs'))
+    logger.rediriger_journalisation(dossier)
+
+    dossier_evenements = os.path.join(dossier, 'evenements')
+    ancien_dossier, ancien_ecrivain = journal_evenements.DOSSIER_EVENEMENTS, journal_evenements._ecrivain
+    journal_evenements.DOSSIER_EVENEMENTS = dossier_evenements
+    journal_evenements._ecrivain = journal_evenements.EcrivainEvenements(dossier_evenements)
+    yield dossier
+
+    journal_evenements._ecrivain.fermer()
+    journal_evenements.DOSSIER_EVENEMENTS, journal_evenements._ecrivain = ancien_dossier, ancien_ecrivain
+
+
+@pytest.fixture
+def base_sqlite(tmp_path, monkeypatch):
+    """Base SQLite initialisée dans un répertoire temporaire; retourne son chemin."""
+    monkeypatch.setenv('DB_TYPE', 'sqlite')
+    monkeypatch.delenv('DB_REPLICA_PATH', raising=False)
+    monkeypatch.delenv('DB_REPLICA_MAX_RETARD', raising=False)
+    acces_donnees._config.cache_clear()
+
+    chemin = str(tmp_path / 'mairie.db')
+    monkeypatch.setattr(db, 'DB_PATH', chemin)
+    db.init_database()
+    yield chemin
+
+    journal_audit.vider()
+    acces_donnees.fermer_pools()
+    acces_donnees._config.cache_clear()
@@ -5,12 +5,19 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
 import time
 import database_mairie as db
 import services_mairie as services
 import guichet_mairie as guichet
 import paiement_client
 import ia_surveillance
+import carte_marches
+import metriques_partagees
+import instrumentation_sql
+import profil_rendu
+import ancrage_merkle
 
 # Configuration de la page avec support mobile
 st.set_page_config(
@@ -267,8 +274,76 @@ st.markdown("""
 
 
 def init_db():
-    """Initialise la base de données si nécessaire."""
+    """Initialise la base de données si nécessaire (et démarre l'ancrage s'il est activé)."""
     db.init_database()
+    if ancrage_merkle.actif():
+        ancrage_merkle.get_service()
+
+
+# Colonnes chargées pour les pages du dashboard, avec leur type pandas explicite
+TRANSACTION_FRAME_DTYPES = {
+    'id': 'int64',
+    'date_creation': 'string',
+    'type': 'category',
+    'libelle': 'string',
+    'montant': 'float64',
+    'mode_paiement': 'category',
+    'statut': 'category',
+    'nom_commercant': 'string',
+    'numero_commercant': 'string',
+    'numero_recu': 'string',
+    'categorie': 'category',
+    'reference': 'string',
+}
+
+# Catégorie et référence dérivées directement en SQL (pas d'apply ligne à ligne)
+TRANSACTION_FRAME_QUERY = '''
+    SELECT
+        id, date_creation, type, libelle, montant,
+        COALESCE(mode_paiement, '') AS mode_paiement,
+        statut,
+        COALESCE(nom_commercant, '') AS nom_commercant,
+        COALESCE(numero_commercant, '') AS numero_commercant,
+        COALESCE(numero_recu, '') AS numero_recu,
+        CASE
+            WHEN type LIKE '%TAXE%' THEN 'Taxes & Impôts'
+            WHEN type LIKE '%ACTE%' THEN 'Actes Administratifs'
+            WHEN type LIKE '%LOCATION%' THEN 'Locations'
+            ELSE 'Divers'
+        END AS categorie,
+        COALESCE(numero_recu, '') AS reference
+    FROM transactions
+'''
+
+
+@profil_rendu.phase("données: transactions")
+def load_transactions_frame(categories=None) -> pd.DataFrame:
+    """
+    Construit le DataFrame des transactions partagé par toutes les pages.
+
+    Args:
+        categories: Liste de catégories à conserver (ex: ['Taxes & Impôts']),
+            filtrées côté SQL. None = toutes les transactions.
+
+    Returns:
+        DataFrame trié par date décroissante, avec une colonne 'date' (datetime)
+    """
+    query = f"SELECT * FROM ({TRANSACTION_FRAME_QUERY}) AS frame"
+    params = ()
+    if categories:
+        query += f" WHERE categorie IN ({', '.join('?' * len(categories))})"
+        params = tuple(categories)
+    query += " ORDER BY date_creation DESC"
+
+    conn = db.get_connection(lecture=True)
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+    df = df.astype(TRANSACTION_FRAME_DTYPES)
+    df['date'] = pd.to_datetime(df['date_creation'], format='mixed')
+    return df
 
 
 def activer_surveillance_ia():
@@ -284,16 +359,7 @@ def activer_surveillance_ia():
         # Si aucune alerte n'a jamais été créée, créer des alertes de démonstration
         # Cela évite de recréer les alertes après "Tout marquer comme traité"
         if total_alertes == 0:
-            # Alerte 1: Stock critique
-            db.create_alerte(
-                titre="Stock formulaires CNI faible",
-                description="Il ne reste que 12 formulaires de CNI en stock",
-                type_alerte="STOCK_CRITIQUE",
-                montant=12,
-                niveau="URGENT"
-            )
-
-            # Alerte 2: Gros paiement
+            # Alerte 1: Gros paiement
             db.create_alerte(
                 titre="Transaction importante détectée",
                 description="Paiement de 450,000 FCFA reçu pour taxe foncière",
@@ -302,7 +368,7 @@ def activer_surveillance_ia():
                 niveau="INFO"
             )
 
-            # Alerte 3: Anomalie de taxe
+            # Alerte 2: Anomalie de taxe
             db.create_alerte(
                 titre="Montant suspect - Taxe habitation",
                 description="Taxe de 500 FCFA enregistrée (attendu: environ 50,000 FCFA)",
@@ -311,7 +377,7 @@ def activer_surveillance_ia():
                 niveau="URGENT"
             )
 
-            # Alerte 4: Recette faible
+            # Alerte 3: Recette faible
             db.create_alerte(
                 titre="Baisse anormale des recettes",
                 description="Recettes du jour: 35,000 FCFA (moyenne: 180,000 FCFA) - Baisse de 81%",
@@ -320,6 +386,9 @@ def activer_surveillance_ia():
                 niveau="ATTENTION"
             )
 
+        # Alertes de stock des formulaires, à partir de leur consommation réelle
+        services.verifier_stocks_formulaires()
+
         # Lancer la surveillance quotidienne (en mode silencieux pour ne pas ralentir l'app)
         # ia_surveillance.lancer_surveillance_quotidienne()
 
@@ -330,7 +399,12 @@ def activer_surveillance_ia():
 
 def show_metrics(show_last_update=False):
     """Affiche les métriques principales pour la mairie."""
-    stats = db.get_statistics()
+    # Instantané calculé en arrière-plan et partagé par toutes les sessions
+    snapshot = metriques_partagees.get_snapshot()
+    if snapshot is None:
+        st.warning("Métriques indisponibles pour le moment.")
+        return
+    stats = snapshot.stats
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -357,22 +431,21 @@ def show_metrics(show_last_update=False):
         delta_color="inverse"
     )
 
-    # Afficher "Dernière MAJ" uniquement sur le Dashboard
+    # Afficher la fraîcheur des données uniquement sur le Dashboard
     if show_last_update:
-        st.caption(f"🕐 Dernière MAJ: {datetime.now().strftime('%H:%M:%S')}")
+        calcule_le = datetime.fromtimestamp(snapshot.calcule_le).strftime('%H:%M:%S')
+        st.caption(f"🕐 Données calculées il y a {snapshot.age:.0f} s ({calcule_le})")
 
 
 def show_revenue_distribution():
     """Affiche la répartition des recettes municipales."""
     st.subheader("📊 Répartition des Recettes Mairie")
     
-    transactions = db.get_all_transactions()
-    if not transactions:
+    df = load_transactions_frame()
+    if df.empty:
         st.info("Aucune donnée financière disponible.")
         return
 
-    df = pd.DataFrame(transactions)
-    
     # Filtrer uniquement les recettes (Taxes, Actes, Locations...)
     # On considère tout ce qui a un montant > 0 et status COMPLETE comme recette potentielle
     df_recettes = df[(df['montant'] > 0) & (df['statut'] == 'COMPLETE')]
@@ -381,48 +454,40 @@ def show_revenue_distribution():
         st.info("Pas encore de recettes validées.")
         return
         
-    # Catégorisation simplifiée
-    def categorize(t):
-        if "TAXE" in t: return "Taxes & Impôts"
-        if "ACTE" in t: return "Actes Administratifs"
-        if "LOCATION" in t: return "Locations"
-        return "Divers"
-        
-    df_recettes['categorie'] = df_recettes['type'].apply(categorize)
-    
     # Agrégation par catégorie
-    df_grouped = df_recettes.groupby('categorie')['montant'].sum().reset_index()
+    df_grouped = df_recettes.groupby('categorie', observed=True)['montant'].sum().reset_index()
     
     # Calcul des pourcentages
     total = df_grouped['montant'].sum()
     df_grouped['percent'] = (df_grouped['montant'] / total) * 100
     
-    # Chart Pie Interactif centré
-    fig = px.pie(
-        df_grouped,
-        values='montant',
-        names='categorie',
-        title='Pourcentage des Recettes par Source',
-        hole=0.4,
-        color_discrete_sequence=px.colors.sequential.RdBu
-    )
+    with profil_rendu.phase("graphique: répartition"):
+        # Chart Pie Interactif centré
+        fig = px.pie(
+            df_grouped,
+            values='montant',
+            names='categorie',
+            title='Pourcentage des Recettes par Source',
+            hole=0.4,
+            color_discrete_sequence=px.colors.sequential.RdBu
+        )
 
-    fig.update_traces(textinfo='percent+label')
-
-    # Centrer le graphique avec layout amélioré
-    fig.update_layout(
-        title={'x': 0.5, 'xanchor': 'center'},  # Centrer le titre
-        showlegend=True,
-        legend=dict(
-            orientation="h",  # Légende horizontale
-            yanchor="bottom",
-            y=-0.2,
-            xanchor="center",
-            x=0.5
-        ),
-        margin=dict(t=80, b=80, l=50, r=50),  # Marges équilibrées
-        height=500
-    )
+        fig.update_traces(textinfo='percent+label')
+
+        # Centrer le graphique avec layout amélioré
+        fig.update_layout(
+            title={'x': 0.5, 'xanchor': 'center'},  # Centrer le titre
+            showlegend=True,
+            legend=dict(
+                orientation="h",  # Légende horizontale
+                yanchor="bottom",
+                y=-0.2,
+                xanchor="center",
+                x=0.5
+            ),
+            margin=dict(t=80, b=80, l=50, r=50),  # Marges équilibrées
+            height=500
+        )
 
     # Utiliser des colonnes pour centrer le graphique
     col_left, col_chart, col_right = st.columns([1, 3, 1])
@@ -449,6 +514,7 @@ def show_revenue_distribution():
 from fpdf import FPDF
 import base64
 
+@profil_rendu.phase("export PDF")
 def export_to_pdf(data):
     """Génère un PDF à partir d'une liste de dictionnaires avec informations clients."""
     pdf = FPDF(orientation='L')  # Landscape pour plus de colonnes
@@ -497,61 +563,40 @@ def show_revenue_history():
     st.subheader("💰 Historique des Recettes")
     
     # On récupère les transactions de type Recette (Taxe ou Acte)
-    transactions = db.get_all_transactions()
-    recettes = [t for t in transactions if "TAXE" in t['type'] or "ACTE" in t['type']]
+    df_recettes = load_transactions_frame(categories=['Taxes & Impôts', 'Actes Administratifs'])
     
     # Statistiques des Recettes
     col1, col2 = st.columns(2)
 
     with col1:
-        total_recettes = sum(t['montant'] for t in recettes)
+        total_recettes = df_recettes['montant'].sum()
         st.metric("💵 Total Recettes", f"{total_recettes:,.0f} FCFA")
 
     with col2:
-        nb_transactions = len(recettes)
+        nb_transactions = len(df_recettes)
         avg_panier = total_recettes / nb_transactions if nb_transactions > 0 else 0
         st.metric("📊 Panier Moyen", f"{avg_panier:,.0f} FCFA")
     
     st.subheader("Détails des Encaissements")
 
-    if recettes:
-        df_recettes = pd.DataFrame(recettes)
-        # Trier par date décroissante (si pas déjà fait)
-        if 'date_creation' in df_recettes.columns:
-            df_recettes = df_recettes.sort_values(by='date_creation', ascending=False)
-
-            # S'assurer que les colonnes existent
-            if 'nom_commercant' not in df_recettes.columns:
-                df_recettes['nom_commercant'] = ''
-            if 'numero_commercant' not in df_recettes.columns:
-                df_recettes['numero_commercant'] = ''
-            if 'mode_paiement' not in df_recettes.columns:
-                df_recettes['mode_paiement'] = ''
-
-            # Construire une colonne de référence lisible (numéro de reçu seulement)
-            def make_ref(r):
-                nr = r['numero_recu'] if 'numero_recu' in r and r['numero_recu'] else ''
-                return nr
-
-            df_recettes['reference'] = df_recettes.apply(make_ref, axis=1)
-
-            st.dataframe(
-                df_recettes[['date_creation', 'type', 'montant', 'nom_commercant', 'numero_commercant', 'mode_paiement', 'reference']],
-                column_config={
-                    "date_creation": "Date",
-                    "type": "Libellé",
-                    "montant": st.column_config.NumberColumn("Montant", format="%.0f FCFA"),
-                    "nom_commercant": "Nom Client",
-                    "numero_commercant": "N° CNI/Contribuable",
-                    "mode_paiement": "Mode Paiement / Téléphone",
-                    "reference": "N° Reçu"
-                },
-                use_container_width=True,
-                hide_index=True
-            )
+    if not df_recettes.empty:
+        st.dataframe(
+            df_recettes[['date_creation', 'type', 'montant', 'nom_commercant', 'numero_commercant', 'mode_paiement', 'reference']],
+            column_config={
+                "date_creation": "Date",
+                "type": "Libellé",
+                "montant": st.column_config.NumberColumn("Montant", format="%.0f FCFA"),
+                "nom_commercant": "Nom Client",
+                "numero_commercant": "N° CNI/Contribuable",
+                "mode_paiement": "Mode Paiement / Téléphone",
+                "reference": "N° Reçu"
+            },
+            use_container_width=True,
+            hide_index=True
+        )
         
         # Bouton Export PDF Direct
-        pdf_bytes = export_to_pdf(recettes)
+        pdf_bytes = export_to_pdf(df_recettes.to_dict('records'))
         st.download_button(
             label="📄 Télécharger le Tableau en PDF",
             data=pdf_bytes,
@@ -564,15 +609,12 @@ def show_transactions():
     """Affiche l'historique interactif des transactions avec filtres et graphiques."""
     st.subheader("📜 Historique des Transactions & Recettes")
 
-    transactions = db.get_all_transactions()
+    df = load_transactions_frame()
 
-    if not transactions:
+    if df.empty:
         st.info("Aucune transaction enregistrée.")
         return
 
-    df = pd.DataFrame(transactions)
-    df['date'] = pd.to_datetime(df['date_creation'], format='mixed')
-
     # === FILTRES INTERACTIFS ===
     st.markdown("### 🔍 Filtres")
     col_f1, col_f2, col_f3 = st.columns(3)
@@ -586,7 +628,7 @@ def show_transactions():
 
     with col_f2:
         # Filtre par type
-        types_disponibles = ["Tous"] + sorted(df['type'].unique().tolist())
+        types_disponibles = ["Tous"] + sorted(df['type'].unique().astype(str).tolist())
         type_filtre = st.selectbox("🏷️ Type de transaction", types_disponibles)
 
     with col_f3:
@@ -655,37 +697,38 @@ def show_transactions():
             }).reset_index()
             daily.columns = ['date', 'montant_total', 'nb_transactions']
 
-            fig_ev = go.Figure()
-
-            # Barres pour montants
-            fig_ev.add_trace(go.Bar(
-                x=daily['date'],
-                y=daily['montant_total'],
-                name='Recettes',
-                marker_color='#4CAF50',
-                hovertemplate='<b>%{x}</b><br>Recettes: %{y:,.0f} FCFA<extra></extra>'
-            ))
-
-            # Ligne pour nb transactions
-            fig_ev.add_trace(go.Scatter(
-                x=daily['date'],
-                y=daily['nb_transactions'],
-                name='Nombre',
-                mode='lines+markers',
-                line=dict(color='#FF9800', width=3),
-                marker=dict(size=8),
-                yaxis='y2',
-                hovertemplate='<b>%{x}</b><br>Transactions: %{y}<extra></extra>'
-            ))
-
-            fig_ev.update_layout(
-                title='Évolution quotidienne',
-                xaxis_title='Date',
-                yaxis_title='Montant (FCFA)',
-                yaxis2=dict(title='Nombre', overlaying='y', side='right'),
-                height=400,
-                hovermode='x unified'
-            )
+            with profil_rendu.phase("graphique: évolution"):
+                fig_ev = go.Figure()
+
+                # Barres pour montants
+                fig_ev.add_trace(go.Bar(
+                    x=daily['date'],
+                    y=daily['montant_total'],
+                    name='Recettes',
+                    marker_color='#4CAF50',
+                    hovertemplate='<b>%{x}</b><br>Recettes: %{y:,.0f} FCFA<extra></extra>'
+                ))
+
+                # Ligne pour nb transactions
+                fig_ev.add_trace(go.Scatter(
+                    x=daily['date'],
+                    y=daily['nb_transactions'],
+                    name='Nombre',
+                    mode='lines+markers',
+                    line=dict(color='#FF9800', width=3),
+                    marker=dict(size=8),
+                    yaxis='y2',
+                    hovertemplate='<b>%{x}</b><br>Transactions: %{y}<extra></extra>'
+                ))
+
+                fig_ev.update_layout(
+                    title='Évolution quotidienne',
+                    xaxis_title='Date',
+                    yaxis_title='Montant (FCFA)',
+                    yaxis2=dict(title='Nombre', overlaying='y', side='right'),
+                    height=400,
+                    hovermode='x unified'
+                )
 
             st.plotly_chart(fig_ev, use_container_width=True)
         else:
@@ -694,30 +737,31 @@ def show_transactions():
     with tab_rep:
         # Camembert répartition par type
         if len(df_filtre) > 0:
-            repartition = df_filtre.groupby('type')['montant'].sum().reset_index()
-
-            fig_pie = px.pie(
-                repartition,
-                values='montant',
-                names='type',
-                title='Répartition par type de transaction',
-                hole=0.4,
-                color_discrete_sequence=px.colors.sequential.RdBu
-            )
+            repartition = df_filtre.groupby('type', observed=True)['montant'].sum().reset_index()
+
+            with profil_rendu.phase("graphique: répartition par type"):
+                fig_pie = px.pie(
+                    repartition,
+                    values='montant',
+                    names='type',
+                    title='Répartition par type de transaction',
+                    hole=0.4,
+                    color_discrete_sequence=px.colors.sequential.RdBu
+                )
 
-            fig_pie.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                hovertemplate='<b>%{label}</b><br>%{value:,.0f} FCFA<br>%{percent}<extra></extra>'
-            )
+                fig_pie.update_traces(
+                    textposition='inside',
+                    textinfo='percent+label',
+                    hovertemplate='<b>%{label}</b><br>%{value:,.0f} FCFA<br>%{percent}<extra></extra>'
+                )
 
-            fig_pie.update_layout(height=400)
+                fig_pie.update_layout(height=400)
 
             st.plotly_chart(fig_pie, use_container_width=True)
 
             # Tableau récapitulatif par type
             st.markdown("#### 📋 Détail par type")
-            recap = df_filtre.groupby('type').agg({
+            recap = df_filtre.groupby('type', observed=True).agg({
                 'montant': ['sum', 'count', 'mean']
             }).reset_index()
             recap.columns = ['Type', 'Total (FCFA)', 'Nb', 'Moyenne (FCFA)']
@@ -767,11 +811,6 @@ def show_transactions():
     st.markdown("### 📋 Détail des transactions")
 
     if len(df_filtre) > 0:
-        # S'assurer que les colonnes existent
-        for col in ['nom_commercant', 'numero_commercant', 'mode_paiement', 'numero_recu']:
-            if col not in df_filtre.columns:
-                df_filtre[col] = ''
-
         # Afficher le tableau
         st.dataframe(
             df_filtre[['date_creation', 'type', 'montant', 'nom_commercant', 'numero_commercant',
@@ -893,6 +932,7 @@ def show_alerts():
 
 from streamlit_autorefresh import st_autorefresh
 import ai_forecast
+import prevision_series
 
 
 def show_predictions():
@@ -913,7 +953,8 @@ def show_predictions():
         st.metric("Recettes attendues (30j)", f"{forecast['expected_revenue_30d']:,.0f} FCFA")
         
     with col_f3:
-        st.caption("Basé sur une régression linéaire des transactions (Taxes & Actes).")
+        st.caption("Basé sur une régression linéaire des recettes journalières (Taxes & Actes), "
+                   "réajustée à la clôture de chaque journée.")
         
     # Graphique Finance
     hist = forecast['history']
@@ -945,6 +986,139 @@ def show_predictions():
     
     st.plotly_chart(fig_fin, use_container_width=True)
 
+    show_predictions_series()
+    show_predictions_stocks()
+
+
+def show_predictions_stocks():
+    """Affiche la prévision de rupture de stock de chaque formulaire."""
+    st.markdown("### 📦 Stocks de Formulaires")
+
+    previsions = ai_forecast.predict_all_stock_depletions()
+    if not previsions:
+        st.info("Aucun formulaire suivi en stock.")
+        return
+
+    df = pd.DataFrame(previsions)
+    critiques = df[df['status'] == 'CRITICAL']
+    if not critiques.empty:
+        st.warning(f"⚠️ {len(critiques)} formulaire(s) en stock critique")
+
+    df['predicted_date'] = df['predicted_date'].map(lambda d: d.strftime('%d/%m/%Y') if d else '—')
+    df['days_until_empty'] = df['days_until_empty'].map(lambda j: '∞' if j == float('inf') else f"{j:.0f}")
+    colonnes = {
+        'nom_document': 'Formulaire', 'quantite': 'En stock', 'seuil_alerte': 'Seuil',
+        'consommation_journaliere': 'Conso./jour', 'days_until_empty': 'Jours restants',
+        'predicted_date': 'Rupture prévue', 'status': 'Statut',
+    }
+    st.dataframe(df[list(colonnes)].rename(columns=colonnes), use_container_width=True, hide_index=True,
+                 column_config={'Conso./jour': st.column_config.NumberColumn(format="%.1f")})
+
+    # Saisie d'une livraison de formulaires
+    noms = dict(zip(df['formulaire_id'], df['nom_document']))
+    col_r1, col_r2, col_r3 = st.columns([2, 1, 1])
+    with col_r1:
+        formulaire_id = st.selectbox("Formulaire livré", list(noms), format_func=noms.get, key="reappro_formulaire")
+    with col_r2:
+        quantite = st.number_input("Quantité reçue", min_value=1, value=100, step=10, key="reappro_quantite")
+    with col_r3:
+        st.write("")
+        if st.button("📦 Réapprovisionner", key="btn_reappro", use_container_width=True):
+            db.reapprovisionner_formulaire(int(formulaire_id), int(quantite))
+            st.rerun()
+
+
+def show_predictions_series():
+    """Affiche les prévisions saisonnières par famille, type de transaction et marché."""
+    st.markdown("### 📊 Prévisions par Famille, Type et Marché")
+
+    resultat = prevision_series.get_previsions_series()
+    resume = resultat['resume']
+    if resume.empty:
+        st.info("Pas encore assez de recettes enregistrées pour des prévisions détaillées.")
+        return
+
+    col_s1, col_s2, col_s3 = st.columns([1, 2, 1])
+    with col_s1:
+        groupe = st.selectbox("Regrouper par", [g for g in prevision_series.GROUPES if g in set(resume['groupe'])],
+                              key="prev_groupe")
+    lignes = resume[resume['groupe'] == groupe]
+    with col_s2:
+        index = st.selectbox("Série", lignes.index.tolist(),
+                             format_func=lambda i: str(resume.loc[i, 'libelle']), key="prev_serie")
+    with col_s3:
+        horizon = st.radio("Horizon", prevision_series.HORIZONS_RESUME, horizontal=True,
+                           format_func=lambda h: f"{h} j", key="prev_horizon")
+
+    df = prevision_series.serie_to_frame(resultat, index)
+    hist = df[df['type'] == 'HISTORIQUE'].tail(90)
+    pred = df[df['type'] == 'PREDICTION'].head(horizon)
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=hist['date'], y=hist['revenue'], name='Recettes Réelles', marker_color='#4CAF50'))
+    fig.add_trace(go.Scatter(
+        x=pd.concat([pred['date'], pred['date'][::-1]]),
+        y=pd.concat([pred['borne_haute'], pred['borne_basse'][::-1]]),
+        fill='toself', fillcolor='rgba(255, 193, 7, 0.2)', line=dict(width=0),
+        hoverinfo='skip', name='Intervalle 95 %'
+    ))
+    fig.add_trace(go.Scatter(
+        x=pred['date'], y=pred['revenue'], mode='lines', name='Prévision',
+        line=dict(color='#FFC107', width=3, dash='dot')
+    ))
+    fig.update_layout(height=400, hovermode="x unified", xaxis_title="Date", yaxis_title="Montant (FCFA)")
+    st.plotly_chart(fig, use_container_width=True)
+
+    ligne = resume.loc[index]
+    st.metric(f"Recettes attendues ({horizon}j)", f"{ligne[f'prevision_{horizon}j']:,.0f} FCFA",
+              help=f"Intervalle 95 %: {ligne[f'basse_{horizon}j']:,.0f} – {ligne[f'haute_{horizon}j']:,.0f} FCFA")
+
+    colonnes = {'libelle': 'Série', 'jours_observes': 'Jours observés',
+                f'prevision_{horizon}j': f'Prévision {horizon}j (FCFA)',
+                f'basse_{horizon}j': 'Borne basse', f'haute_{horizon}j': 'Borne haute'}
+    st.dataframe(lignes[list(colonnes)].rename(columns=colonnes), use_container_width=True, hide_index=True)
+    st.caption(f"🧮 {len(resume)} séries ajustées en {resultat['duree_calcul'] * 1000:.0f} ms "
+               "(jour de la semaine, mois et tendance; jours de fermeture des marchés exclus).")
+
+
+# Nombre de cartes clients rendues par page dans chaque catégorie
+CLIENTS_PAR_PAGE = 20
+
+
+def _client_row_version(client: dict) -> tuple:
+    """Version d'une ligne client: les champs affichés (toute modification change la clé)."""
+    return (
+        client['id'], client['statut'], client['nom_complet'], client['numero_cni'],
+        client['telephone'], client['numero_etal'], client['type_produits'],
+        client['date_inscription']
+    )
+
+
+@lru_cache(maxsize=4096)
+def _client_card_html(row_version: tuple) -> str:
+    """Construit (une seule fois par version de ligne) la carte HTML d'un client."""
+    _, statut, nom_complet, numero_cni, telephone, numero_etal, type_produits, date_inscription = row_version
+    statut_color = "#4CAF50" if statut == 'Actif' else "#FFA726"
+    statut_icon = "✅" if statut == 'Actif' else "⏸️"
+
+    return f"""
+    <div style='background-color: #f8f9fa; padding: 1rem; border-radius: 8px; margin-bottom: 1rem; border-left: 4px solid {statut_color};'>
+        <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.5rem;'>
+            <h4 style='margin: 0; color: #1E88E5;'>👤 {nom_complet}</h4>
+            <span style='background-color: {statut_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 12px; font-size: 0.85em;'>
+                {statut_icon} {statut}
+            </span>
+        </div>
+        <div style='display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 0.5rem; font-size: 0.9em;'>
+            <div><strong>🆔 CNI:</strong> {numero_cni or 'N/A'}</div>
+            <div><strong>📱 Téléphone:</strong> {telephone or 'N/A'}</div>
+            <div><strong>🏪 Étal N°:</strong> {numero_etal or 'N/A'}</div>
+            <div><strong>📦 Produits:</strong> {type_produits or 'N/A'}</div>
+            <div><strong>📅 Inscription:</strong> {date_inscription}</div>
+        </div>
+    </div>
+    """
+
 
 def show_marches_map():
     """Affiche la cartographie des marchés municipaux de Franceville."""
@@ -955,18 +1129,18 @@ def show_marches_map():
     </h2>
     """, unsafe_allow_html=True)
 
-    # Récupérer les données des marchés
-    marches = db.get_all_marches()
+    # Récupérer les données des marchés (figure et tableau en cache tant que la table ne change pas)
+    with profil_rendu.phase("données: carte des marchés"):
+        geodata = carte_marches.get_marches_geodata()
 
-    if not marches:
+    if not geodata:
         st.info("Aucun marché enregistré pour le moment.")
         return
 
-    # Convertir en DataFrame
-    df_marches = pd.DataFrame(marches)
+    df_marches = geodata['marches']
 
     # Statistiques globales
-    stats = db.get_marches_stats()
+    stats = geodata['stats']
 
     col1, col2, col3 = st.columns(3)
 
@@ -981,54 +1155,6 @@ def show_marches_map():
 
     st.markdown("---")
 
-    # Créer la carte avec Plotly - Centrée sur Franceville, Gabon
-    # Franceville: -1.6332°S, 13.5833°E
-
-    # Préparer les informations de hover personnalisées
-    hover_texts = []
-    for _, row in df_marches.iterrows():
-        hover_text = f"<b>{row['nom_marche']}</b><br>"
-        hover_text += f"📍 Quartier: {row['quartier']}<br>"
-        hover_text += f"🛒 Étals: {row['nombre_etals']}<br>"
-        hover_text += f"💰 Tarif: {row['tarif_etal_jour']:,.0f} FCFA<br>"
-        hover_text += f"📅 {row['jours_ouverture']}<br>"
-        hover_text += f"🕐 {row['horaires']}"
-        hover_texts.append(hover_text)
-
-    # Créer la figure avec des marqueurs bien visibles
-    fig = go.Figure()
-
-    # Ajouter les marqueurs des marchés avec une taille fixe et visible
-    fig.add_trace(go.Scattermapbox(
-        lat=df_marches['latitude'],
-        lon=df_marches['longitude'],
-        mode='markers',  # Seulement les marqueurs, pas de texte pour éviter superposition
-        marker=dict(
-            size=25,  # Taille augmentée pour meilleure visibilité
-            color='#FF4444',  # Rouge vif
-            opacity=0.95,
-            symbol='circle'
-        ),
-        hovertext=hover_texts,
-        hoverinfo='text',
-        name='Marchés de Franceville'
-    ))
-
-    # Configuration de la carte (OpenStreetMap)
-    fig.update_layout(
-        mapbox=dict(
-            style="open-street-map",
-            center=dict(lat=-1.6332, lon=13.5833),  # Centre sur Franceville, Gabon
-            zoom=13
-        ),
-        height=500,  # Hauteur réduite pour meilleure compatibilité mobile
-        margin={"r": 0, "t": 10, "l": 0, "b": 0},  # Marges réduites
-        showlegend=False,  # Masquer la légende pour plus d'espace
-        # Activer les interactions (zoom, pan, etc.)
-        dragmode='zoom',
-        hovermode='closest'
-    )
-
     # Activer tous les boutons de contrôle
     config = {
         'scrollZoom': True,  # Zoom avec la molette
@@ -1037,21 +1163,16 @@ def show_marches_map():
         'modeBarButtonsToAdd': ['zoom2d', 'pan2d', 'zoomIn2d', 'zoomOut2d', 'resetScale2d']
     }
 
-    st.plotly_chart(fig, use_container_width=True, config=config)
+    st.plotly_chart(geodata['figure'], use_container_width=True, config=config)
+
+    if geodata['recettes']['montant_total'].sum() > 0:
+        st.caption(f"🔥 Zones colorées: intensité des recettes encaissées par marché sur les "
+                   f"{carte_marches.PERIODE_RECETTES_JOURS} derniers jours.")
 
     # Détails des marchés sous forme de tableau
     st.markdown("### 📋 Liste détaillée des marchés")
 
-    # Préparer le tableau
-    df_display = df_marches[[
-        'nom_marche', 'quartier', 'nombre_etals', 'tarif_etal_jour',
-        'type_marche', 'jours_ouverture', 'horaires'
-    ]].copy()
-
-    df_display.columns = [
-        'Nom du Marché', 'Quartier', 'Nb Étals', 'Tarif (FCFA)',
-        'Type', 'Jours Ouverture', 'Horaires'
-    ]
+    df_display = geodata['tableau']
 
     st.dataframe(
         df_display,
@@ -1125,69 +1246,108 @@ def show_marches_map():
 
     if marche_selected:
         # Obtenir l'ID du marché sélectionné
-        marche_id = df_marches[df_marches['nom_marche'] == marche_selected].iloc[0]['id']
+        marche_id = int(df_marches[df_marches['nom_marche'] == marche_selected].iloc[0]['id'])
 
-        # Récupérer les catégories et leur nombre de clients
-        categories = db.get_categories_by_marche(marche_id)
+        # Une seule requête pour tout le marché (triée par catégorie puis nom),
+        # regroupée en mémoire au lieu d'une requête par catégorie
+        all_clients = db.get_clients_by_marche(marche_id)
+        clients_par_categorie = [
+            (categorie_nom, list(clients))
+            for categorie_nom, clients in groupby(all_clients, key=lambda c: c['categorie_etal'])
+        ]
 
-        if not categories:
+        if not clients_par_categorie:
             st.info(f"ℹ️ Aucun client enregistré pour le marché **{marche_selected}**")
         else:
-            st.success(f"📋 **{len(categories)}** catégorie(s) d'étals avec clients")
+            st.success(f"📋 **{len(clients_par_categorie)}** catégorie(s) d'étals avec clients")
 
             # Afficher chaque catégorie avec ses clients
-            for cat in categories:
-                categorie_nom = cat['categorie_etal']
-                nombre_clients = cat['nombre_clients']
+            for categorie_nom, clients in clients_par_categorie:
+                nombre_clients = len(clients)
 
                 # Expander pour chaque catégorie
                 with st.expander(f"🏷️ **{categorie_nom}** ({nombre_clients} client{'s' if nombre_clients > 1 else ''})"):
-                    # Récupérer les clients de cette catégorie
-                    clients = db.get_clients_by_categorie(marche_id, categorie_nom)
-
-                    for i, client in enumerate(clients, 1):
-                        # Afficher les informations du client dans une card
-                        statut_color = "#4CAF50" if client['statut'] == 'Actif' else "#FFA726"
-                        statut_icon = "✅" if client['statut'] == 'Actif' else "⏸️"
-
-                        st.markdown(f"""
-                        <div style='background-color: #f8f9fa; padding: 1rem; border-radius: 8px; margin-bottom: 1rem; border-left: 4px solid {statut_color};'>
-                            <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 0.5rem;'>
-                                <h4 style='margin: 0; color: #1E88E5;'>👤 {client['nom_complet']}</h4>
-                                <span style='background-color: {statut_color}; color: white; padding: 0.25rem 0.75rem; border-radius: 12px; font-size: 0.85em;'>
-                                    {statut_icon} {client['statut']}
-                                </span>
-                            </div>
-                            <div style='display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 0.5rem; font-size: 0.9em;'>
-                                <div><strong>🆔 CNI:</strong> {client['numero_cni'] or 'N/A'}</div>
-                                <div><strong>📱 Téléphone:</strong> {client['telephone'] or 'N/A'}</div>
-                                <div><strong>🏪 Étal N°:</strong> {client['numero_etal'] or 'N/A'}</div>
-                                <div><strong>📦 Produits:</strong> {client['type_produits'] or 'N/A'}</div>
-                                <div><strong>📅 Inscription:</strong> {client['date_inscription']}</div>
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # Pagination: seules les cartes de la page courante sont rendues
+                    nb_pages = (nombre_clients - 1) // CLIENTS_PAR_PAGE + 1
+                    page = 1
+                    if nb_pages > 1:
+                        page = st.number_input(
+                            f"Page (sur {nb_pages})",
+                            min_value=1,
+                            max_value=nb_pages,
+                            value=1,
+                            step=1,
+                            key=f"page_clients_{marche_id}_{categorie_nom}"
+                        )
+                    debut = (page - 1) * CLIENTS_PAR_PAGE
+                    page_clients = clients[debut:debut + CLIENTS_PAR_PAGE]
+
+                    # Un seul bloc HTML par page, assemblé à partir des cartes en cache
+                    st.markdown(
+                        "".join(_client_card_html(_client_row_version(client)) for client in page_clients),
+                        unsafe_allow_html=True
+                    )
 
             # Option d'export CSV
             st.markdown("---")
-            all_clients = db.get_clients_by_marche(marche_id)
-            if all_clients:
-                df_clients = pd.DataFrame(all_clients)
-                st.download_button(
-                    label=f"📥 Télécharger tous les clients de {marche_selected} (CSV)",
-                    data=df_clients.to_csv(index=False).encode('utf-8'),
-                    file_name=f"clients_{marche_selected.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv"
-                )
+            df_clients = pd.DataFrame(all_clients)
+            st.download_button(
+                label=f"📥 Télécharger tous les clients de {marche_selected} (CSV)",
+                data=df_clients.to_csv(index=False).encode('utf-8'),
+                file_name=f"clients_{marche_selected.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv"
+            )
+
+
+def show_profil_sql():
+    """Page cachée (?debug=sql): statistiques de l'instrumentation des requêtes."""
+    st.subheader("🔬 Profil des requêtes SQL")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        actif = st.toggle("Instrumentation active", value=instrumentation_sql.actif)
+    with col2:
+        taux = st.slider("Échantillonnage", 0.01, 1.0, float(instrumentation_sql.taux), 0.01)
+    with col3:
+        if st.button("🔄 Remettre à zéro"):
+            instrumentation_sql.reinitialiser()
+
+    if actif:
+        instrumentation_sql.activer(taux)
+    else:
+        instrumentation_sql.desactiver()
+
+    lignes = instrumentation_sql.rapport()
+    if not lignes:
+        st.info("Aucune requête mesurée pour l'instant.")
+        return
+
+    df = pd.DataFrame(lignes)
+    st.caption(f"{df['appels'].sum():,} requêtes, {len(df)} empreintes. "
+               "Temps total estimé = durée moyenne de l'échantillon x nombre d'appels.")
+    colonnes = {
+        'empreinte': 'Requête', 'appels': 'Appels', 'echantillons': 'Échantillons',
+        'temps_total_ms': 'Total (ms)', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+        'p99_ms': 'p99 (ms)', 'lignes_moyennes': 'Lignes/appel',
+    }
+    format_ms = st.column_config.NumberColumn(format="%.2f")
+    st.dataframe(df[list(colonnes)].rename(columns=colonnes), use_container_width=True, hide_index=True,
+                 column_config={nom: format_ms for nom in ('Total (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)')})
+    st.download_button("📥 Exporter (JSON)", data=df.to_json(orient='records', force_ascii=False),
+                       file_name=f"profil_sql_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                       mime="application/json")
 
 
 def main():
     """Point d'entrée principal."""
     # Auto-refresh toutes les 5 secondes pour meilleure performance mobile
     count = st_autorefresh(interval=5000, limit=None, key="fizzbuzzcounter")
+    profil_rendu.debut_rendu()
 
-    init_db()
-    activer_surveillance_ia()  # Activer la surveillance et créer alertes de démo
+    with profil_rendu.phase("init_db"):
+        init_db()
+    with profil_rendu.phase("surveillance IA"):
+        activer_surveillance_ia()  # Activer la surveillance et créer alertes de démo
 
     # Header
     st.markdown('<div class="main-header">🏛️ SYSTÈME DE GESTION MUNICIPALE</div>',
@@ -1198,10 +1358,11 @@ def main():
 
         st.markdown("---")
         
-        page = st.radio(
-            "Navigation",
-            ["📊 Dashboard", "🗺️ Cartographie Marchés", "💳 Paiement en Ligne", "🏛️ Guichet Mairie", "💰 Historique Recettes", "📜 Historique Transactions", "🚨 Alertes"]
-        )
+        pages = ["📊 Dashboard", "🗺️ Cartographie Marchés", "💳 Paiement en Ligne", "🏛️ Guichet Mairie", "💰 Historique Recettes", "📜 Historique Transactions", "🚨 Alertes"]
+        # Page de diagnostic, seulement avec ?debug=sql dans l'URL
+        if st.query_params.get("debug") == "sql":
+            pages.append("🔬 Profil SQL")
+        page = st.radio("Navigation", pages)
         
         st.markdown("---")
 
@@ -1212,27 +1373,34 @@ def main():
     
     # Contenu principal
 
-    if page == "📊 Dashboard":
-        # Afficher les métriques UNIQUEMENT sur le Dashboard
-        show_metrics(show_last_update=True)
-        st.markdown("---")
-        show_revenue_distribution()
-        st.markdown("---")
+    with profil_rendu.phase(f"page: {page}"):
+        if page == "📊 Dashboard":
+            # Afficher les métriques UNIQUEMENT sur le Dashboard
+            show_metrics(show_last_update=True)
+            st.markdown("---")
+            show_revenue_distribution()
+            st.markdown("---")
+
+        elif page == "🗺️ Cartographie Marchés":
+            show_marches_map()
+
+        elif page == "💳 Paiement en Ligne":
+            paiement_client.show_paiement_client_page()
+        elif page == "🏛️ Guichet Mairie":
+            guichet.show_guichet_page()
+        elif page == "💰 Historique Recettes":
+            show_revenue_history()
+        elif page == "📜 Historique Transactions":
+            show_transactions()
+        elif page == "🚨 Alertes":
+            show_alerts()
+        elif page == "🔬 Profil SQL":
+            show_profil_sql()
+
+    profil_rendu.fin_rendu(page)
+    if profil_rendu.panneau_demande():
+        profil_rendu.afficher_panneau(page)
 
-    elif page == "🗺️ Cartographie Marchés":
-        show_marches_map()
-
-    elif page == "💳 Paiement en Ligne":
-        paiement_client.show_paiement_client_page()
-    elif page == "🏛️ Guichet Mairie":
-        guichet.show_guichet_page()
-    elif page == "💰 Historique Recettes":
-        show_revenue_history()
-    elif page == "📜 Historique Transactions":
-        show_transactions()
-    elif page == "🚨 Alertes":
-        show_alerts()
-    
     # Footer
     # ...
 
@@ -1,11 +1,18 @@
 # database_mairie.py - Gestion de la base de données pour la MAIRIE
 # Application: Système de Gestion des Recettes Municipales avec Blockchain
 
+import hashlib
+import itertools
 import sqlite3
 import os
-from datetime import datetime
+import secrets
+from datetime import datetime, date
 from typing import Optional, List, Dict, Any
 from logger import get_logger
+import acces_donnees
+import journal_audit
+import journal_evenements
+import stocks_formulaires
 
 logger = get_logger(__name__)
 
@@ -13,11 +20,15 @@ logger = get_logger(__name__)
 DB_PATH = os.path.join(os.path.dirname(__file__), "mairie.db")
 
 
-def get_connection():
-    """Retourne une connexion à la base de données."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_connection(lecture: bool = False):
+    """
+    Retourne une connexion poolée à la base de données (SQLite par défaut,
+    PostgreSQL ou MySQL selon DB_TYPE, voir acces_donnees).
+
+    lecture=True réserve la connexion aux lectures analytiques: elle peut être
+    servie par le réplica configuré (DB_REPLICA_*) s'il est à jour.
+    """
+    return acces_donnees.get_connection(DB_PATH, lecture=lecture)
 
 
 def migrate_database():
@@ -25,16 +36,53 @@ def migrate_database():
     conn = get_connection()
     cursor = conn.cursor()
 
+    colonnes_transactions = acces_donnees.colonnes_table(conn, 'transactions')
+
     # Migration: Ajouter les colonnes nom_commercant et numero_commercant si elles n'existent pas
-    try:
-        cursor.execute("SELECT nom_commercant FROM transactions LIMIT 1")
-    except sqlite3.OperationalError:
+    if 'nom_commercant' not in colonnes_transactions:
         logger.info("Migration: Ajout des colonnes nom_commercant et numero_commercant")
         cursor.execute("ALTER TABLE transactions ADD COLUMN nom_commercant VARCHAR(200)")
         cursor.execute("ALTER TABLE transactions ADD COLUMN numero_commercant VARCHAR(50)")
         conn.commit()
         logger.info("✅ Migration terminée: colonnes merchant ajoutées")
 
+    # Migration: rattacher les transactions à un marché (carte des recettes par marché)
+    if 'marche_id' not in colonnes_transactions:
+        logger.info("Migration: Ajout de la colonne marche_id aux transactions")
+        cursor.execute("ALTER TABLE transactions ADD COLUMN marche_id INTEGER REFERENCES marches(id)")
+        # Rattacher l'historique via le numéro CNI des commerçants inscrits sur les marchés
+        cursor.execute('''
+            UPDATE transactions
+            SET marche_id = (
+                SELECT cm.marche_id FROM clients_marches cm
+                WHERE cm.numero_cni = transactions.numero_commercant
+                LIMIT 1
+            )
+            WHERE marche_id IS NULL AND numero_commercant IS NOT NULL
+        ''')
+        conn.commit()
+        rebuild_recettes_marches_jour()
+        logger.info("✅ Migration terminée: transactions rattachées aux marchés")
+
+    # Migration: chaînage des entrées du journal d'audit, puis index de recherche par agent et par date
+    if 'hash' not in acces_donnees.colonnes_table(conn, 'audit_log'):
+        logger.info("Migration: Ajout du chaînage au journal d'audit")
+        cursor.execute("ALTER TABLE audit_log ADD COLUMN hash_precedent VARCHAR(64)")
+        cursor.execute("ALTER TABLE audit_log ADD COLUMN hash VARCHAR(64)")
+        conn.commit()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_agent_date ON audit_log(agent_id, date_action)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_date ON audit_log(date_action)")
+    conn.commit()
+
+    # Migration: alimenter l'agrégat des recettes journalières à partir de l'historique
+    cursor.execute("SELECT 1 FROM recettes_journalieres LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT 1 FROM transactions LIMIT 1")
+        if cursor.fetchone() is not None:
+            logger.info("Migration: Construction de l'agrégat recettes_journalieres")
+            rebuild_recettes_journalieres()
+            logger.info("✅ Migration terminée: recettes journalières agrégées")
+
     conn.close()
 
 
@@ -115,6 +163,26 @@ def init_database():
         )
     ''')
 
+    # 11. MARCHÉS MUNICIPAUX (créée avant les transactions, qui y font référence)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS marches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom_marche VARCHAR(200) NOT NULL,
+            adresse TEXT NOT NULL,
+            quartier VARCHAR(100),
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            nombre_etals INTEGER DEFAULT 0,
+            tarif_etal_jour REAL DEFAULT 6500.0,
+            type_marche VARCHAR(50) DEFAULT 'Permanent',
+            jours_ouverture TEXT,
+            horaires TEXT,
+            description TEXT,
+            actif BOOLEAN DEFAULT 1,
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     # 6. TRANSACTIONS / PAIEMENTS
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS transactions (
@@ -131,9 +199,11 @@ def init_database():
             statut VARCHAR(50) DEFAULT 'COMPLETE',
             nom_commercant VARCHAR(200),
             numero_commercant VARCHAR(50),
+            marche_id INTEGER,
             date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (citoyen_id) REFERENCES citoyens(id),
-            FOREIGN KEY (agent_id) REFERENCES agents(id)
+            FOREIGN KEY (agent_id) REFERENCES agents(id),
+            FOREIGN KEY (marche_id) REFERENCES marches(id)
         )
     ''')
 
@@ -155,6 +225,11 @@ def init_database():
             FOREIGN KEY (citoyen_id) REFERENCES citoyens(id)
         )
     ''')
+    # Contrôle de chevauchement des réservations (voir disponibilites)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservations_location_periode "
+        "ON reservations(location_id, date_debut, date_fin)"
+    )
 
     # 8. ALERTES FINANCIÈRES
     cursor.execute('''
@@ -193,29 +268,21 @@ def init_database():
             table_concernee VARCHAR(50),
             details TEXT,
             date_action TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            hash_precedent VARCHAR(64),
+            hash VARCHAR(64),
             FOREIGN KEY (agent_id) REFERENCES agents(id)
         )
     ''')
-
-    # 11. MARCHÉS MUNICIPAUX
+    # Tête de la chaîne de hachage du journal d'audit (voir journal_audit)
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS marches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nom_marche VARCHAR(200) NOT NULL,
-            adresse TEXT NOT NULL,
-            quartier VARCHAR(100),
-            latitude REAL NOT NULL,
-            longitude REAL NOT NULL,
-            nombre_etals INTEGER DEFAULT 0,
-            tarif_etal_jour REAL DEFAULT 6500.0,
-            type_marche VARCHAR(50) DEFAULT 'Permanent',
-            jours_ouverture TEXT,
-            horaires TEXT,
-            description TEXT,
-            actif BOOLEAN DEFAULT 1,
-            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE TABLE IF NOT EXISTS audit_chaine (
+            id INTEGER PRIMARY KEY,
+            dernier_hash VARCHAR(64) NOT NULL,
+            nb_entrees INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    cursor.execute("INSERT OR IGNORE INTO audit_chaine (id, dernier_hash, nb_entrees) VALUES (1, ?, 0)",
+                   (journal_audit.HASH_INITIAL,))
 
     # 12. CLIENTS DES MARCHÉS (Commerçants/Vendeurs par marché et catégorie)
     cursor.execute('''
@@ -233,6 +300,122 @@ def init_database():
             FOREIGN KEY (marche_id) REFERENCES marches(id)
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_marches_cni ON clients_marches(numero_cni)")
+
+    # 13. RECETTES PAR MARCHÉ ET PAR JOUR (agrégat alimenté à chaque paiement)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recettes_marches_jour (
+            marche_id INTEGER NOT NULL,
+            jour DATE NOT NULL,
+            montant_total REAL NOT NULL DEFAULT 0,
+            nb_transactions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (marche_id, jour),
+            FOREIGN KEY (marche_id) REFERENCES marches(id)
+        )
+    ''')
+
+    # 14. RECETTES PAR JOUR ET PAR TYPE (agrégat alimenté à chaque paiement)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recettes_journalieres (
+            jour DATE NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            montant_total REAL NOT NULL DEFAULT 0,
+            nb_transactions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (jour, type)
+        )
+    ''')
+
+    # 15. MODÈLES DE PRÉVISION (statistiques suffisantes de la régression, par série)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modeles_prevision (
+            serie VARCHAR(50) PRIMARY KEY,
+            origine DATE NOT NULL,
+            dernier_jour DATE NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            somme_x REAL NOT NULL DEFAULT 0,
+            somme_y REAL NOT NULL DEFAULT 0,
+            somme_xx REAL NOT NULL DEFAULT 0,
+            somme_xy REAL NOT NULL DEFAULT 0,
+            pente REAL,
+            ordonnee REAL,
+            date_maj TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 16. PRÉVISIONS CALCULÉES (lues telles quelles par le tableau de bord)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS previsions_recettes (
+            serie VARCHAR(50) NOT NULL,
+            jour DATE NOT NULL,
+            montant_prevu REAL NOT NULL,
+            PRIMARY KEY (serie, jour),
+            FOREIGN KEY (serie) REFERENCES modeles_prevision(serie)
+        )
+    ''')
+
+    # 17. STOCKS DE FORMULAIRES (état courant et statistiques de consommation)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stocks_formulaires (
+            formulaire_id INTEGER PRIMARY KEY,
+            quantite INTEGER NOT NULL DEFAULT 0,
+            seuil_alerte INTEGER NOT NULL DEFAULT 20,
+            conso_moyenne REAL NOT NULL DEFAULT 0,
+            poids_moyenne REAL NOT NULL DEFAULT 0,
+            jour_courant DATE,
+            conso_jour_courant INTEGER NOT NULL DEFAULT 0,
+            alerte_active BOOLEAN DEFAULT 0,
+            date_maj TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (formulaire_id) REFERENCES formulaires(id)
+        )
+    ''')
+
+    # 18. MOUVEMENTS DE STOCK DES FORMULAIRES (registre)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mouvements_stock_formulaires (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            formulaire_id INTEGER NOT NULL,
+            quantite INTEGER NOT NULL,
+            motif VARCHAR(20) NOT NULL,
+            transaction_id INTEGER,
+            agent_id INTEGER,
+            date_mouvement TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (formulaire_id) REFERENCES formulaires(id),
+            FOREIGN KEY (transaction_id) REFERENCES transactions(id),
+            FOREIGN KEY (agent_id) REFERENCES agents(id)
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mouvements_stock_formulaire "
+        "ON mouvements_stock_formulaires(formulaire_id, date_mouvement)"
+    )
+
+    # 19. LOTS D'ANCRAGE (racines de Merkle publiées sur le registre, voir ancrage_merkle)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ancrages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            racine VARCHAR(64) NOT NULL,
+            nb_transactions INTEGER NOT NULL,
+            premier_tx_id INTEGER NOT NULL,
+            dernier_tx_id INTEGER NOT NULL,
+            statut VARCHAR(20) NOT NULL DEFAULT 'EN_ATTENTE',
+            reference_registre VARCHAR(100),
+            url VARCHAR(255),
+            date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            date_ancrage TIMESTAMP
+        )
+    ''')
+
+    # 20. PREUVES D'INCLUSION (chemin de chaque transaction vers la racine de son lot)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS preuves_ancrage (
+            transaction_id INTEGER PRIMARY KEY,
+            ancrage_id INTEGER NOT NULL,
+            indice INTEGER NOT NULL,
+            chemin TEXT NOT NULL,
+            FOREIGN KEY (transaction_id) REFERENCES transactions(id),
+            FOREIGN KEY (ancrage_id) REFERENCES ancrages(id)
+        )
+    ''')
 
     # ==================== SEEDING DES DONNÉES ====================
 
@@ -343,6 +526,12 @@ def init_database():
         )
         logger.info("✅ Formulaires par défaut créés")
 
+    # Stock initial de chaque formulaire qui n'en a pas encore
+    cursor.execute('''
+        INSERT OR IGNORE INTO stocks_formulaires (formulaire_id, quantite, seuil_alerte)
+        SELECT id, ?, ? FROM formulaires
+    ''', (stocks_formulaires.STOCK_INITIAL, stocks_formulaires.SEUIL_ALERTE))
+
     # 3. LOCATIONS
     cursor.execute("SELECT COUNT(*) FROM locations")
     if cursor.fetchone()[0] == 0:
@@ -526,7 +715,7 @@ def init_database():
 
 def get_all_transactions() -> List[Dict]:
     """Récupère toutes les transactions."""
-    conn = get_connection()
+    conn = get_connection(lecture=True)
     cursor = conn.cursor()
     cursor.execute('''
         SELECT
@@ -543,17 +732,51 @@ def get_all_transactions() -> List[Dict]:
     return [dict(row) for row in rows]
 
 
+# L'horodatage seul se répète pour deux paiements dans la même seconde (contrainte
+# UNIQUE sur numero_recu): il est complété par un préfixe tiré au démarrage du
+# processus et un compteur, uniques tant que moins de 10 000 reçus sont émis par seconde
+_PREFIXE_RECUS = secrets.token_hex(2).upper()
+_compteur_recus = itertools.count(1)
+
+
+def _suffixe_recu() -> str:
+    return f"{_PREFIXE_RECUS}{next(_compteur_recus) % 10000:04d}"
+
+
 def create_transaction(type_tx: str, libelle: str, montant: float,
                        citoyen_id: int = None, agent_id: int = None,
                        mode_paiement: str = 'Espèces',
                        transaction_id: str = None, hashscan_url: str = None,
-                       nom_commercant: str = None, numero_commercant: str = None) -> int:
-    """Crée une transaction de paiement."""
-    conn = get_connection()
+                       nom_commercant: str = None, numero_commercant: str = None,
+                       marche_id: int = None, conn: sqlite3.Connection = None) -> int:
+    """
+    Crée une transaction de paiement.
+
+    Si marche_id n'est pas fourni, il est déduit du numéro du commerçant
+    lorsqu'il est inscrit sur un marché (clients_marches). Les agrégats
+    recettes_marches_jour et recettes_journalieres sont mis à jour dans
+    la même transaction SQL.
+
+    Si conn est fourni, l'écriture se fait dans la transaction de l'appelant,
+    qui se charge du commit (ou du rollback) et de la fermeture, puis appelle
+    notifier_transaction(tx_id) une fois le commit fait.
+    """
+    connexion_propre = conn is None
+    if connexion_propre:
+        conn = get_connection()
     cursor = conn.cursor()
 
-    # Générer numéro de reçu unique
-    numero_recu = f"REC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    if marche_id is None and numero_commercant:
+        cursor.execute(
+            "SELECT marche_id FROM clients_marches WHERE numero_cni = ? LIMIT 1",
+            (numero_commercant,)
+        )
+        row = cursor.fetchone()
+        if row:
+            marche_id = row[0]
+
+    # Générer numéro de reçu unique (voir _suffixe_recu)
+    numero_recu = f"REC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{_suffixe_recu()}"
 
     # Si aucune transaction_id explicite fournie, construire une référence lisible
     # combinant le numéro de reçu et, si disponible, le nom du commerçant/demandeur
@@ -566,20 +789,69 @@ def create_transaction(type_tx: str, libelle: str, montant: float,
 
     cursor.execute('''
         INSERT INTO transactions
-        (citoyen_id, agent_id, type, libelle, montant, mode_paiement, numero_recu, transaction_id, hashscan_url, statut, nom_commercant, numero_commercant)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'COMPLETE', ?, ?)
-    ''', (citoyen_id, agent_id, type_tx, libelle, montant, mode_paiement, numero_recu, transaction_id_value, hashscan_url, nom_commercant, numero_commercant))
+        (citoyen_id, agent_id, type, libelle, montant, mode_paiement, numero_recu, transaction_id, hashscan_url, statut, nom_commercant, numero_commercant, marche_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'COMPLETE', ?, ?, ?)
+    ''', (citoyen_id, agent_id, type_tx, libelle, montant, mode_paiement, numero_recu, transaction_id_value, hashscan_url, nom_commercant, numero_commercant, marche_id))
 
     tx_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    logger.info(f"💰 Transaction créée: {libelle} - {montant} FCFA")
+
+    if marche_id is not None:
+        cursor.execute('''
+            INSERT INTO recettes_marches_jour (marche_id, jour, montant_total, nb_transactions)
+            VALUES (?, DATE('now'), ?, 1)
+            ON CONFLICT (marche_id, jour) DO UPDATE SET
+                montant_total = montant_total + excluded.montant_total,
+                nb_transactions = nb_transactions + excluded.nb_transactions
+        ''', (marche_id, montant))
+
+    cursor.execute('''
+        INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions)
+        VALUES (DATE('now'), ?, ?, 1)
+        ON CONFLICT (jour, type) DO UPDATE SET
+            montant_total = montant_total + excluded.montant_total,
+            nb_transactions = nb_transactions + excluded.nb_transactions
+    ''', (type_tx, montant))
+
+    if connexion_propre:
+        conn.commit()
+        conn.close()
+        _notifier_transaction({'id': tx_id, 'numero_recu': numero_recu, 'type': type_tx, 'libelle': libelle,
+                               'montant': montant, 'mode_paiement': mode_paiement, 'marche_id': marche_id,
+                               'agent_id': agent_id})
+    logger.info("💰 Transaction créée: %s - %s FCFA", libelle, montant)
     return tx_id
 
 
+def notifier_transaction(tx_id: int):
+    """
+    Journalise une transaction créée avec create_transaction(conn=...), après le
+    commit de l'appelant: un paiement annulé ne laisse ni entrée d'audit ni
+    événement 'transaction'.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, numero_recu, type, libelle, montant, mode_paiement, marche_id, agent_id
+        FROM transactions WHERE id = ?
+    ''', (tx_id,))
+    row = cursor.fetchone()
+    conn.close()
+    if row:
+        _notifier_transaction(dict(row))
+
+
+def _notifier_transaction(tx: Dict):
+    journal_evenements.emettre('transaction', id=tx['id'], type=tx['type'], libelle=tx['libelle'],
+                               montant=tx['montant'], mode_paiement=tx['mode_paiement'],
+                               marche_id=tx['marche_id'], agent_id=tx['agent_id'])
+    journal_audit.enregistrer('TRANSACTION_CREEE', tx['agent_id'], 'transactions',
+                              {'id': tx['id'], 'numero_recu': tx['numero_recu'], 'type': tx['type'],
+                               'montant': tx['montant']})
+
+
 def get_statistics() -> Dict:
     """Récupère les statistiques de la mairie."""
-    conn = get_connection()
+    conn = get_connection(lecture=True)
     cursor = conn.cursor()
 
     # Total recettes du jour
@@ -683,7 +955,8 @@ def create_alerte(titre: str, description: str = None, type_alerte: str = "FINAN
     alerte_id = cursor.lastrowid
     conn.commit()
     conn.close()
-    logger.warning(f"🚨 Alerte créée: {titre}")
+    logger.warning("🚨 Alerte créée: %s", titre)
+    journal_evenements.emettre('alerte', id=alerte_id, type=type_alerte, niveau=niveau, titre=titre, montant=montant)
     return alerte_id
 
 
@@ -701,7 +974,7 @@ def get_pending_alertes() -> List[Dict]:
     return [dict(row) for row in rows]
 
 
-def mark_alerte_treated(alerte_id: int):
+def mark_alerte_treated(alerte_id: int, agent_id: int = None):
     """Marque une alerte comme traitée."""
     conn = get_connection()
     cursor = conn.cursor()
@@ -712,18 +985,21 @@ def mark_alerte_treated(alerte_id: int):
     ''', (datetime.now(), alerte_id))
     conn.commit()
     conn.close()
+    journal_audit.enregistrer('ALERTE_TRAITEE', agent_id, 'alertes', {'id': alerte_id})
 
 
-def mark_all_alertes_treated():
+def mark_all_alertes_treated(agent_id: int = None):
     """Marque toutes les alertes comme traitées."""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE alertes SET traitee = 1, date_traitement = CURRENT_TIMESTAMP WHERE traitee = 0")
+    nb = cursor.rowcount
     conn.commit()
     conn.close()
+    journal_audit.enregistrer('ALERTES_TOUTES_TRAITEES', agent_id, 'alertes', {'nombre': nb})
 
 
-def update_all_taxes(df_taxes):
+def update_all_taxes(df_taxes, agent_id: int = None):
     """Met à jour toutes les taxes."""
     conn = get_connection()
     cursor = conn.cursor()
@@ -736,33 +1012,230 @@ def update_all_taxes(df_taxes):
             ''', (row['nom_taxe'], row['categorie'], row.get('montant_fixe'),
                   row.get('taux_pourcentage'), row['unite'], row.get('description', ''), 1))
         conn.commit()
+        journal_audit.enregistrer('TAXES_MISES_A_JOUR', agent_id, 'taxes', {'nombre': len(df_taxes)})
     except Exception as e:
-        logger.error(f"Erreur update taxes: {e}")
+        logger.error("Erreur update taxes: %s", e)
         conn.rollback()
     finally:
         conn.close()
 
 
-def update_all_formulaires(df_docs):
-    """Met à jour tous les formulaires."""
+def update_all_formulaires(df_docs, agent_id: int = None):
+    """
+    Met à jour tous les formulaires.
+
+    Les formulaires sont mis à jour par nom (leur identifiant ne change pas, ce qui
+    préserve leur stock et l'historique). Ceux retirés de la liste sont supprimés,
+    sauf s'ils ont des mouvements de stock: ils sont alors désactivés (actif = 0),
+    l'historique les référençant.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM formulaires")
+        noms = []
         for _, row in df_docs.iterrows():
+            noms.append(row['nom_document'])
             cursor.execute('''
                 INSERT INTO formulaires (nom_document, cout_standard, type_personne, delai_traitement_jours, description, actif)
                 VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (nom_document) DO UPDATE SET
+                    cout_standard = excluded.cout_standard,
+                    type_personne = excluded.type_personne,
+                    delai_traitement_jours = excluded.delai_traitement_jours,
+                    description = excluded.description,
+                    actif = excluded.actif
             ''', (row['nom_document'], row['cout_standard'], row.get('type_personne'),
                   row.get('delai_traitement_jours', 3), row.get('description', ''), 1))
+
+        marqueurs = ", ".join("?" for _ in noms) or "NULL"
+        mouvementes = "SELECT formulaire_id FROM mouvements_stock_formulaires"
+        cursor.execute(f'''
+            UPDATE formulaires SET actif = 0
+            WHERE nom_document NOT IN ({marqueurs}) AND id IN ({mouvementes})
+        ''', noms)
+        cursor.execute(f'''
+            DELETE FROM stocks_formulaires WHERE formulaire_id IN (
+                SELECT id FROM formulaires WHERE nom_document NOT IN ({marqueurs}) AND id NOT IN ({mouvementes})
+            )
+        ''', noms)
+        cursor.execute(f'''
+            DELETE FROM formulaires WHERE nom_document NOT IN ({marqueurs}) AND id NOT IN ({mouvementes})
+        ''', noms)
+        cursor.execute('''
+            INSERT OR IGNORE INTO stocks_formulaires (formulaire_id, quantite, seuil_alerte)
+            SELECT id, ?, ? FROM formulaires
+        ''', (stocks_formulaires.STOCK_INITIAL, stocks_formulaires.SEUIL_ALERTE))
         conn.commit()
+        journal_audit.enregistrer('FORMULAIRES_MIS_A_JOUR', agent_id, 'formulaires', {'nombre': len(noms)})
     except Exception as e:
-        logger.error(f"Erreur update formulaires: {e}")
+        logger.error("Erreur update formulaires: %s", e)
         conn.rollback()
     finally:
         conn.close()
 
 
+# ==================== FONCTIONS STOCKS DES FORMULAIRES ====================
+
+def get_stocks_formulaires() -> List[Dict]:
+    """Retourne l'état du stock de chaque formulaire actif."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT f.nom_document, s.*
+        FROM stocks_formulaires s
+        JOIN formulaires f ON f.id = s.formulaire_id
+        WHERE f.actif = 1
+        ORDER BY f.nom_document
+    ''')
+    stocks = cursor.fetchall()
+    conn.close()
+    return [dict(s) for s in stocks]
+
+
+def get_stock_formulaire(formulaire_id: int) -> Optional[Dict]:
+    """Retourne l'état du stock d'un formulaire (ou None s'il n'est pas suivi)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT f.nom_document, s.*
+        FROM stocks_formulaires s
+        JOIN formulaires f ON f.id = s.formulaire_id
+        WHERE s.formulaire_id = ?
+    ''', (formulaire_id,))
+    stock = cursor.fetchone()
+    conn.close()
+    return dict(stock) if stock else None
+
+
+def sortir_stock_formulaire(formulaire_id: int, quantite: int = 1, transaction_id: int = None,
+                            conn: sqlite3.Connection = None) -> Optional[Dict]:
+    """
+    Décrémente le stock d'un formulaire et met à jour sa consommation moyenne (O(1)).
+
+    La sortie est une décrémentation conditionnelle (quantite = quantite - n) qui
+    verrouille la ligne: deux guichets qui vendent le même formulaire ne perdent
+    pas de mise à jour. Un stock insuffisant ne bloque pas la vente: le stock
+    enregistré passe à 0 et l'écart est rendu dans 'manque' (inventaire à corriger).
+
+    Args:
+        formulaire_id: ID du formulaire délivré
+        quantite: Nombre d'exemplaires délivrés
+        transaction_id: Transaction de paiement associée
+        conn: Connexion de l'appelant (même transaction SQL que le paiement)
+
+    Returns:
+        dict: Nouvel état du stock avec 'manque' (exemplaires vendus au-delà du
+        stock enregistré), ou None si le formulaire n'est pas suivi
+    """
+    connexion_propre = conn is None
+    if connexion_propre:
+        conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            UPDATE stocks_formulaires SET quantite = quantite - ?
+            WHERE formulaire_id = ? AND quantite >= ?
+        ''', (quantite, formulaire_id, quantite))
+        servi = cursor.rowcount == 1
+        if not servi:
+            # Stock insuffisant (ou formulaire non suivi): verrouiller la ligne avant de la lire
+            cursor.execute("UPDATE stocks_formulaires SET quantite = quantite WHERE formulaire_id = ?",
+                           (formulaire_id,))
+        # Ligne verrouillée par cette transaction: la lecture voit sa version courante
+        cursor.execute("SELECT * FROM stocks_formulaires WHERE formulaire_id = ?", (formulaire_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        etat = stocks_formulaires.avancer_consommation(dict(row), date.today().isoformat())
+        etat['manque'] = 0
+        if not servi:
+            etat['manque'] = quantite - etat['quantite']
+            etat['quantite'] = 0
+            logger.warning("Formulaire %s vendu sans stock enregistré (%s exemplaire(s) manquant(s))",
+                           formulaire_id, etat['manque'])
+        etat['conso_jour_courant'] += quantite
+
+        cursor.execute('''
+            UPDATE stocks_formulaires
+            SET quantite = ?, conso_moyenne = ?, poids_moyenne = ?, jour_courant = ?,
+                conso_jour_courant = ?, date_maj = CURRENT_TIMESTAMP
+            WHERE formulaire_id = ?
+        ''', (etat['quantite'], etat['conso_moyenne'], etat['poids_moyenne'], etat['jour_courant'],
+              etat['conso_jour_courant'], formulaire_id))
+        cursor.execute('''
+            INSERT INTO mouvements_stock_formulaires (formulaire_id, quantite, motif, transaction_id)
+            VALUES (?, ?, 'VENTE', ?)
+        ''', (formulaire_id, -quantite, transaction_id))
+
+        if connexion_propre:
+            conn.commit()
+        return etat
+    finally:
+        if connexion_propre:
+            conn.close()
+
+
+def reapprovisionner_formulaire(formulaire_id: int, quantite: int, agent_id: int = None) -> int:
+    """
+    Ajoute des exemplaires au stock d'un formulaire (réarme l'alerte si le seuil est dépassé).
+
+    Returns:
+        int: Nouvelle quantité en stock
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO stocks_formulaires (formulaire_id, quantite, seuil_alerte)
+        VALUES (?, ?, ?)
+        ON CONFLICT (formulaire_id) DO UPDATE SET
+            alerte_active = CASE WHEN quantite + excluded.quantite > seuil_alerte THEN 0 ELSE alerte_active END,
+            quantite = quantite + excluded.quantite,
+            date_maj = CURRENT_TIMESTAMP
+    ''', (formulaire_id, quantite, stocks_formulaires.SEUIL_ALERTE))
+    cursor.execute('''
+        INSERT INTO mouvements_stock_formulaires (formulaire_id, quantite, motif, agent_id)
+        VALUES (?, ?, 'REAPPRO', ?)
+    ''', (formulaire_id, quantite, agent_id))
+    cursor.execute("SELECT quantite FROM stocks_formulaires WHERE formulaire_id = ?", (formulaire_id,))
+    nouvelle_quantite = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    logger.info("📦 Formulaire %s réapprovisionné: +%s (stock: %s)", formulaire_id, quantite, nouvelle_quantite)
+    journal_audit.enregistrer('FORMULAIRE_REAPPROVISIONNE', agent_id, 'stocks_formulaires',
+                              {'formulaire_id': formulaire_id, 'quantite': quantite, 'stock': nouvelle_quantite})
+    return nouvelle_quantite
+
+
+def activer_alerte_stock(formulaire_id: int) -> bool:
+    """
+    Marque l'alerte de stock d'un formulaire comme émise.
+
+    Returns:
+        bool: True si l'alerte n'était pas encore émise (l'appelant doit la créer)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE stocks_formulaires SET alerte_active = 1 WHERE formulaire_id = ? AND alerte_active = 0",
+        (formulaire_id,)
+    )
+    a_emettre = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return a_emettre
+
+
+def alerte_ouverte(titre: str) -> bool:
+    """Une alerte non traitée porte-t-elle déjà ce titre?"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM alertes WHERE titre = ? AND traitee = 0 LIMIT 1", (titre,))
+    ouverte = cursor.fetchone() is not None
+    conn.close()
+    return ouverte
+
+
 # ==================== FONCTIONS MARCHÉS MUNICIPAUX ====================
 
 def get_all_marches():
@@ -798,9 +1271,28 @@ def get_marche_by_id(marche_id: int):
     return dict(marche) if marche else None
 
 
+def get_marches_version() -> str:
+    """
+    Retourne une empreinte (SHA-256) du contenu de la table marches.
+
+    L'empreinte change dès qu'une valeur d'une ligne change (renommage, échange de
+    coordonnées...), y compris par une modification faite hors de l'application:
+    elle sert de clé de cache pour la cartographie et les prévisions. La table
+    compte une ligne par marché, la relire entièrement reste négligeable.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM marches ORDER BY id")
+    empreinte = hashlib.sha256()
+    for row in cursor.fetchall():
+        empreinte.update(repr(tuple(str(v) for v in row)).encode('utf-8'))
+    conn.close()
+    return empreinte.hexdigest()
+
+
 def get_marches_stats():
     """Retourne les statistiques sur les marchés municipaux."""
-    conn = get_connection()
+    conn = get_connection(lecture=True)
     cursor = conn.cursor()
 
     cursor.execute("SELECT COUNT(*) FROM marches WHERE actif = 1")
@@ -820,6 +1312,233 @@ def get_marches_stats():
     }
 
 
+def rebuild_recettes_marches_jour():
+    """Reconstruit entièrement l'agrégat recettes_marches_jour à partir des transactions."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM recettes_marches_jour")
+    cursor.execute('''
+        INSERT INTO recettes_marches_jour (marche_id, jour, montant_total, nb_transactions)
+        SELECT marche_id, DATE(date_creation), SUM(montant), COUNT(*)
+        FROM transactions
+        WHERE marche_id IS NOT NULL AND statut = 'COMPLETE'
+        GROUP BY marche_id, DATE(date_creation)
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def get_recettes_marches(jours: int = 30) -> List[Dict]:
+    """
+    Retourne les recettes encaissées par marché sur les derniers jours.
+
+    Lit uniquement l'agrégat recettes_marches_jour (aucun parcours des transactions).
+    """
+    conn = get_connection(lecture=True)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT m.id AS marche_id, m.nom_marche, m.latitude, m.longitude,
+               COALESCE(SUM(r.montant_total), 0) AS montant_total,
+               COALESCE(SUM(r.nb_transactions), 0) AS nb_transactions
+        FROM marches m
+        LEFT JOIN recettes_marches_jour r
+            ON r.marche_id = m.id AND r.jour >= DATE('now', ?)
+        WHERE m.actif = 1
+        GROUP BY m.id, m.nom_marche, m.latitude, m.longitude
+        ORDER BY m.nom_marche
+    ''', (f'-{jours} days',))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_recettes_marches_version() -> tuple:
+    """Retourne une empreinte de l'agrégat recettes_marches_jour (clé de cache de la carte)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(nb_transactions), 0), MAX(jour)
+        FROM recettes_marches_jour
+    ''')
+    version = tuple(cursor.fetchone())
+    conn.close()
+    return version
+
+
+# ==================== FONCTIONS RECETTES JOURNALIÈRES & PRÉVISIONS ====================
+
+def get_jour_courant() -> str:
+    """
+    Jour courant selon l'horloge de la base (YYYY-MM-DD).
+
+    Les agrégats sont datés par DATE('now') de la base (UTC sous SQLite): un jour
+    n'est clos que lorsque la base est passée au suivant, quel que soit le fuseau
+    du poste qui lit.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DATE('now')")
+    jour = cursor.fetchone()[0]
+    conn.close()
+    return jour
+
+
+def rebuild_recettes_journalieres():
+    """Reconstruit entièrement l'agrégat recettes_journalieres à partir des transactions."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM recettes_journalieres")
+    cursor.execute('''
+        INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions)
+        SELECT DATE(date_creation), type, SUM(montant), COUNT(*)
+        FROM transactions
+        WHERE statut = 'COMPLETE'
+        GROUP BY DATE(date_creation), type
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def get_recettes_par_jour(prefixes: tuple = ('TAXE', 'ACTE'), apres: str = None,
+                          avant: str = None, lecture: bool = True) -> List[Dict]:
+    """
+    Retourne le total des recettes par jour pour les types commençant par l'un des préfixes.
+
+    Lit uniquement l'agrégat recettes_journalieres (une ligne par jour et par type).
+
+    Args:
+        prefixes: Préfixes des types de transaction retenus
+        apres: Jour exclu à partir duquel lire (YYYY-MM-DD), None = depuis le début
+        avant: Jour exclu jusqu'auquel lire (YYYY-MM-DD), None = jusqu'à aujourd'hui inclus
+        lecture: False pour lire le primaire (jamais un réplica en retard)
+
+    Returns:
+        Liste de {'jour', 'montant_total'} triée par jour
+    """
+    conn = get_connection(lecture=lecture)
+    cursor = conn.cursor()
+    conditions = ["(" + " OR ".join("type LIKE ?" for _ in prefixes) + ")"]
+    params = [f"{p}%" for p in prefixes]
+    if apres:
+        conditions.append("jour > ?")
+        params.append(apres)
+    if avant:
+        conditions.append("jour < ?")
+        params.append(avant)
+    cursor.execute(f'''
+        SELECT jour, SUM(montant_total) AS montant_total
+        FROM recettes_journalieres
+        WHERE {" AND ".join(conditions)}
+        GROUP BY jour
+        ORDER BY jour
+    ''', params)
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_recettes_par_jour_et_type(apres: str = None, avant: str = None) -> List[Dict]:
+    """
+    Retourne les recettes de chaque type de transaction, jour par jour (agrégat recettes_journalieres).
+
+    Args:
+        apres: Jour exclu à partir duquel lire (YYYY-MM-DD), None = depuis le début
+        avant: Jour exclu jusqu'auquel lire (YYYY-MM-DD), None = jusqu'à aujourd'hui inclus
+    """
+    conn = get_connection(lecture=True)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT jour, type, montant_total
+        FROM recettes_journalieres
+        WHERE (? IS NULL OR jour > ?) AND (? IS NULL OR jour < ?)
+        ORDER BY jour
+    ''', (apres, apres, avant, avant))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_recettes_marches_par_jour(apres: str = None, avant: str = None) -> List[Dict]:
+    """
+    Retourne les recettes de chaque marché, jour par jour (agrégat recettes_marches_jour).
+
+    Args:
+        apres: Jour exclu à partir duquel lire (YYYY-MM-DD), None = depuis le début
+        avant: Jour exclu jusqu'auquel lire (YYYY-MM-DD), None = jusqu'à aujourd'hui inclus
+    """
+    conn = get_connection(lecture=True)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT marche_id, jour, montant_total
+        FROM recettes_marches_jour
+        WHERE (? IS NULL OR jour > ?) AND (? IS NULL OR jour < ?)
+        ORDER BY jour
+    ''', (apres, apres, avant, avant))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_modele_prevision(serie: str) -> Optional[Dict]:
+    """Retourne l'état persisté du modèle de prévision d'une série (ou None)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM modeles_prevision WHERE serie = ?", (serie,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def save_modele_prevision(modele: Dict, previsions: List[tuple]):
+    """
+    Enregistre l'état du modèle et remplace ses prévisions, dans une seule transaction SQL.
+
+    Args:
+        modele: Colonnes de modeles_prevision (serie, origine, dernier_jour, n, sommes, pente, ordonnee)
+        previsions: Liste de (jour, montant_prevu)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO modeles_prevision
+        (serie, origine, dernier_jour, n, somme_x, somme_y, somme_xx, somme_xy, pente, ordonnee, date_maj)
+        VALUES (:serie, :origine, :dernier_jour, :n, :somme_x, :somme_y, :somme_xx, :somme_xy,
+                :pente, :ordonnee, CURRENT_TIMESTAMP)
+        ON CONFLICT (serie) DO UPDATE SET
+            origine = excluded.origine,
+            dernier_jour = excluded.dernier_jour,
+            n = excluded.n,
+            somme_x = excluded.somme_x,
+            somme_y = excluded.somme_y,
+            somme_xx = excluded.somme_xx,
+            somme_xy = excluded.somme_xy,
+            pente = excluded.pente,
+            ordonnee = excluded.ordonnee,
+            date_maj = excluded.date_maj
+    ''', modele)
+    cursor.execute("DELETE FROM previsions_recettes WHERE serie = ?", (modele['serie'],))
+    cursor.executemany(
+        "INSERT INTO previsions_recettes (serie, jour, montant_prevu) VALUES (?, ?, ?)",
+        [(modele['serie'], jour, montant) for jour, montant in previsions]
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_previsions_recettes(serie: str) -> List[Dict]:
+    """Retourne les prévisions persistées d'une série, triées par jour."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT jour, montant_prevu FROM previsions_recettes
+        WHERE serie = ?
+        ORDER BY jour
+    ''', (serie,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
 # ==================== FONCTIONS CLIENTS DES MARCHÉS ====================
 
 def get_clients_by_marche(marche_id: int):
@@ -872,7 +1591,7 @@ def get_categories_by_marche(marche_id: int):
 
 def get_clients_stats():
     """Retourne les statistiques globales sur les clients des marchés."""
-    conn = get_connection()
+    conn = get_connection(lecture=True)
     cursor = conn.cursor()
 
     cursor.execute("SELECT COUNT(*) FROM clients_marches WHERE statut = 'Actif'")
@@ -0,0 +1,412 @@
+# disponibilites.py - Disponibilité des locations et contrôle des réservations
+"""
+Moteur de disponibilité des locations (salles, véhicules, bureaux):
+- Une réservation occupe les jours [date_debut, date_fin[ (date_fin exclue)
+- Contrôle de chevauchement en SQL sur l'index (location_id, date_debut, date_fin),
+  dans la transaction du paiement, après verrouillage de la location et par une
+  lecture verrouillante: deux guichets ne peuvent pas réserver la même période
+- Calendrier en mémoire par location (intervalles triés et fusionnés): test de
+  disponibilité et prochain créneau libre par recherche dichotomique (bisect)
+- Occupation jour par jour de toutes les locations sur l'année glissante (un entier
+  Python par location, un bit par jour): jours libres d'une période et locations
+  libres à une date par opérations bit à bit, calendrier mensuel des guichets
+
+Le calendrier en mémoire sert aux suggestions du guichet; il est rechargé après
+DUREE_CACHE secondes pour voir les réservations des autres processus. La décision
+finale reste le contrôle SQL de reserver().
+"""
+
+import bisect
+import calendar
+import math
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import acces_donnees
+import database_mairie as db
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DUREE_CACHE = 30.0
+
+# Jours occupés par unité de location; les unités plus courtes qu'un jour occupent
+# des jours entiers (les réservations sont datées au jour)
+JOURS_PAR_UNITE = {'Jour': 1, 'Semaine': 7, 'Mois': 30}
+UNITES_PAR_JOUR = {'Heure': 24, 'Demi-journée': 2}
+
+# Recherche du prochain créneau libre au plus loin à cet horizon
+HORIZON_RECHERCHE = 3 * 365
+
+# Jours couverts par les bitmaps d'occupation, à partir d'aujourd'hui
+JOURS_OCCUPATION = 366
+
+# Calendrier des guichets
+COULEUR_LIBRE = '#D4EDDA'
+COULEUR_RESERVE = '#F8D7DA'
+COULEUR_PASSE = '#E9ECEF'
+COULEUR_SELECTION = '#0066CC'
+NOMS_MOIS = ('Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 'Juillet', 'Août',
+             'Septembre', 'Octobre', 'Novembre', 'Décembre')
+
+
+def jours_reservation(frequence: str, duree: int) -> int:
+    """Nombre de jours occupés par une location de duree unités de cette fréquence."""
+    frequence = (frequence or 'Jour').strip()
+    if frequence in UNITES_PAR_JOUR:
+        return max(1, math.ceil(duree / UNITES_PAR_JOUR[frequence]))
+    return max(1, duree * JOURS_PAR_UNITE.get(frequence, 1))
+
+
+def periode(location: Dict, date_debut, duree: int) -> Tuple[date, date]:
+    """(début, fin exclue) de la réservation d'une location."""
+    debut = _date(date_debut)
+    return debut, debut + timedelta(days=jours_reservation(location['frequence'], duree))
+
+
+def _date(valeur) -> date:
+    if isinstance(valeur, date):
+        return valeur
+    return date.fromisoformat(str(valeur)[:10])
+
+
+# ==================== CALENDRIER EN MÉMOIRE ====================
+
+class CalendrierLocation:
+    """
+    Réservations d'une location sous forme d'intervalles disjoints triés.
+
+    debuts et fins sont deux listes parallèles; les réservations qui se chevauchent
+    (historique antérieur au contrôle) sont fusionnées au chargement, si bien que
+    l'intervalle qui peut gêner [debut, fin[ est toujours le dernier qui commence avant fin.
+    """
+
+    def __init__(self, intervalles: List[Tuple[date, date]]):
+        self.debuts: List[date] = []
+        self.fins: List[date] = []
+        for debut, fin in sorted(intervalles):
+            self._ajouter_trie(debut, fin)
+        self.charge_le = time.monotonic()
+
+    def _ajouter_trie(self, debut: date, fin: date):
+        if self.fins and debut <= self.fins[-1]:
+            self.fins[-1] = max(self.fins[-1], fin)
+        else:
+            self.debuts.append(debut)
+            self.fins.append(fin)
+
+    def est_libre(self, debut: date, fin: date) -> bool:
+        """O(log n)."""
+        i = bisect.bisect_left(self.debuts, fin) - 1
+        return i < 0 or self.fins[i] <= debut
+
+    def prochain_creneau(self, nb_jours: int, a_partir_de: date) -> Optional[date]:
+        """Premier jour >= a_partir_de où nb_jours consécutifs sont libres (None au-delà de l'horizon)."""
+        debut = a_partir_de
+        i = bisect.bisect_right(self.debuts, debut) - 1
+        if i >= 0 and self.fins[i] > debut:
+            debut = self.fins[i]
+        i += 1
+        limite = a_partir_de + timedelta(days=HORIZON_RECHERCHE)
+        while i < len(self.debuts) and self.debuts[i] < debut + timedelta(days=nb_jours):
+            debut = self.fins[i]
+            i += 1
+            if debut > limite:
+                return None
+        return debut
+
+    def ajouter(self, debut: date, fin: date):
+        """Insère une réservation (déjà contrôlée) en gardant l'ordre."""
+        i = bisect.bisect_left(self.debuts, debut)
+        self.debuts.insert(i, debut)
+        self.fins.insert(i, fin)
+
+
+_calendriers: Dict[int, CalendrierLocation] = {}
+_lock = threading.Lock()
+
+
+def _charger(location_id: int) -> CalendrierLocation:
+    """Réservations confirmées non terminées de la location (index location_id, date_debut, date_fin)."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT date_debut, date_fin FROM reservations
+        WHERE location_id = ? AND date_fin > ? AND statut = 'CONFIRMEE'
+        ORDER BY date_debut
+    ''', (location_id, date.today().isoformat()))
+    rows = cursor.fetchall()
+    conn.close()
+    return CalendrierLocation([(_date(r[0]), _date(r[1])) for r in rows])
+
+
+def calendrier(location_id: int) -> CalendrierLocation:
+    with _lock:
+        cal = _calendriers.get(location_id)
+        if cal is not None and time.monotonic() - cal.charge_le < DUREE_CACHE:
+            return cal
+    cal = _charger(location_id)
+    with _lock:
+        _calendriers[location_id] = cal
+    return cal
+
+
+def invalider(location_id: int = None):
+    """Oublie le calendrier d'une location (ou de toutes) et les bitmaps d'occupation."""
+    global _occupation
+    with _lock:
+        _occupation = None
+        if location_id is None:
+            _calendriers.clear()
+        else:
+            _calendriers.pop(location_id, None)
+
+
+def est_disponible(location_id: int, debut, fin) -> bool:
+    """La location est-elle libre sur [debut, fin[ (calendrier en mémoire)?"""
+    return calendrier(location_id).est_libre(_date(debut), _date(fin))
+
+
+def prochain_creneau(location_id: int, nb_jours: int = 1, a_partir_de=None) -> Optional[date]:
+    """Premier jour à partir duquel la location est libre nb_jours consécutifs."""
+    a_partir_de = max(_date(a_partir_de), date.today()) if a_partir_de else date.today()
+    return calendrier(location_id).prochain_creneau(nb_jours, a_partir_de)
+
+
+# ==================== CONTRÔLE TRANSACTIONNEL ====================
+
+def chevauchements(conn, location_id: int, debut, fin, verrouiller: bool = False) -> List[Dict]:
+    """
+    Réservations confirmées de la location qui chevauchent [debut, fin[ (lecture SQL).
+
+    verrouiller=True en fait une lecture verrouillante sur les moteurs serveur
+    (FOR UPDATE): elle voit les réservations validées par les autres guichets même
+    si la transaction a déjà lu un instantané (REPEATABLE READ de MySQL).
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, demandeur, date_debut, date_fin FROM reservations
+        WHERE location_id = ? AND date_debut < ? AND date_fin > ? AND statut = 'CONFIRMEE'
+        ORDER BY date_debut{acces_donnees.verrou_lecture() if verrouiller else ''}
+    ''', (location_id, _date(fin).isoformat(), _date(debut).isoformat()))
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def reserver(conn, location: Dict, date_debut, duree: int, demandeur: str, montant_total: float,
+             transaction_id: str = None, citoyen_id: int = None) -> int:
+    """
+    Crée la réservation dans la transaction de l'appelant (qui valide ou annule).
+
+    La location est d'abord verrouillée (UPDATE de sa ligne: verrou d'écriture
+    SQLite, verrou de ligne PostgreSQL/MySQL), ce qui sérialise deux réservations
+    concurrentes de la même location. La période est ensuite contrôlée par une
+    lecture verrouillante: sous MySQL (REPEATABLE READ), une lecture simple
+    relirait l'instantané pris avant l'attente du verrou et manquerait la
+    réservation que l'autre guichet vient de valider.
+
+    Raises:
+        ValueError: Période déjà réservée (message avec le prochain créneau libre)
+
+    Returns:
+        ID de la réservation
+    """
+    debut, fin = periode(location, date_debut, duree)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE locations SET disponible = disponible WHERE id = ?", (location['id'],))
+
+    conflits = chevauchements(conn, location['id'], debut, fin, verrouiller=True)
+    if conflits:
+        # Calendrier rechargé: la réservation gênante vient peut-être d'un autre processus
+        invalider(location['id'])
+        suivant = prochain_creneau(location['id'], (fin - debut).days, debut)
+        conflit = conflits[0]
+        raise ValueError(
+            f"{location['designation']} déjà réservé(e) du {_date(conflit['date_debut']).strftime('%d/%m/%Y')} "
+            f"au {_date(conflit['date_fin']).strftime('%d/%m/%Y')}"
+            + (f"; prochain créneau libre: {suivant.strftime('%d/%m/%Y')}" if suivant else "")
+        )
+
+    cursor.execute('''
+        INSERT INTO reservations
+        (location_id, citoyen_id, demandeur, date_debut, date_fin, duree_jours, montant_total, transaction_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (location['id'], citoyen_id, demandeur, debut.isoformat(), fin.isoformat(), (fin - debut).days,
+          montant_total, transaction_id))
+    return cursor.lastrowid
+
+
+def noter_reservation(location_id: int, debut, fin):
+    """Reporte une réservation validée dans les calendriers en mémoire (à appeler après le commit)."""
+    with _lock:
+        cal = _calendriers.get(location_id)
+        if cal is not None:
+            cal.ajouter(_date(debut), _date(fin))
+        if _occupation is not None:
+            _occupation.ajouter(location_id, _date(debut), _date(fin))
+
+
+# ==================== OCCUPATION (BITMAPS) ====================
+
+class OccupationLocations:
+    """
+    Occupation des locations actives sur [origine, origine + JOURS_OCCUPATION[.
+
+    bitmaps[location_id] est un entier dont le bit i vaut 1 si le jour origine + i
+    est réservé: une période se teste par un ET avec son masque, pour toutes les
+    locations sans relire reservations.
+    """
+
+    def __init__(self, origine: date, location_ids: List[int], reservations: List[Tuple[int, date, date]]):
+        self.origine = origine
+        self.fin = origine + timedelta(days=JOURS_OCCUPATION)
+        self.bitmaps: Dict[int, int] = {location_id: 0 for location_id in location_ids}
+        for location_id, debut, fin in reservations:
+            self.ajouter(location_id, debut, fin)
+        self.charge_le = time.monotonic()
+
+    def masque(self, debut: date, fin: date) -> int:
+        """Bits des jours de [debut, fin[ compris dans la fenêtre."""
+        i = max((debut - self.origine).days, 0)
+        j = min((fin - self.origine).days, JOURS_OCCUPATION)
+        return ((1 << (j - i)) - 1) << i if j > i else 0
+
+    def ajouter(self, location_id: int, debut: date, fin: date):
+        if location_id in self.bitmaps:
+            self.bitmaps[location_id] |= self.masque(debut, fin)
+
+    def jours_libres(self, location_id: int, debut: date, fin: date) -> List[date]:
+        """Jours libres de [debut, fin[ dans la fenêtre, dans l'ordre."""
+        libres = self.masque(debut, fin) & ~self.bitmaps.get(location_id, 0)
+        jours = []
+        while libres:
+            bit = libres & -libres
+            jours.append(self.origine + timedelta(days=bit.bit_length() - 1))
+            libres ^= bit
+        return jours
+
+    def locations_libres(self, debut: date, fin: date) -> List[int]:
+        """Locations sans aucun jour réservé sur [debut, fin[ (dans la fenêtre)."""
+        masque = self.masque(debut, fin)
+        return [location_id for location_id, bits in self.bitmaps.items() if not bits & masque]
+
+
+_occupation: Optional[OccupationLocations] = None
+
+
+def _charger_occupation(origine: date) -> OccupationLocations:
+    """Locations actives et leurs réservations confirmées qui touchent la fenêtre."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM locations WHERE disponible = 1")
+    location_ids = [r[0] for r in cursor.fetchall()]
+    cursor.execute('''
+        SELECT r.location_id, r.date_debut, r.date_fin
+        FROM reservations r
+        JOIN locations l ON l.id = r.location_id
+        WHERE l.disponible = 1 AND r.statut = 'CONFIRMEE' AND r.date_fin > ? AND r.date_debut < ?
+    ''', (origine.isoformat(), (origine + timedelta(days=JOURS_OCCUPATION)).isoformat()))
+    reservations = [(r[0], _date(r[1]), _date(r[2])) for r in cursor.fetchall()]
+    conn.close()
+    return OccupationLocations(origine, location_ids, reservations)
+
+
+def occupation() -> OccupationLocations:
+    """Bitmaps d'occupation, reconstruits chaque jour et après DUREE_CACHE secondes."""
+    global _occupation
+    aujourd_hui = date.today()
+    with _lock:
+        occ = _occupation
+        if occ is not None and occ.origine == aujourd_hui and time.monotonic() - occ.charge_le < DUREE_CACHE:
+            return occ
+    occ = _charger_occupation(aujourd_hui)
+    with _lock:
+        _occupation = occ
+    return occ
+
+
+def jours_libres(location_id: int, debut, fin) -> List[date]:
+    """
+    Jours libres de la location sur [debut, fin[.
+
+    Les jours passés ne sont jamais libres; au-delà de l'année glissante, les jours
+    sont testés sur le calendrier d'intervalles.
+    """
+    debut, fin = _date(debut), _date(fin)
+    occ = occupation()
+    jours = occ.jours_libres(location_id, debut, fin)
+    jour = max(debut, occ.fin)
+    if jour < fin:
+        cal = calendrier(location_id)
+        while jour < fin:
+            if cal.est_libre(jour, jour + timedelta(days=1)):
+                jours.append(jour)
+            jour += timedelta(days=1)
+    return jours
+
+
+def locations_libres(jour, nb_jours: int = 1) -> List[int]:
+    """IDs des locations actives libres nb_jours consécutifs à partir de jour."""
+    debut = _date(jour)
+    fin = debut + timedelta(days=max(nb_jours, 1))
+    occ = occupation()
+    libres = occ.locations_libres(debut, fin)
+    if fin > occ.fin:
+        libres = [location_id for location_id in libres
+                  if calendrier(location_id).est_libre(max(debut, occ.fin), fin)]
+    return libres
+
+
+# ==================== CALENDRIER DES GUICHETS ====================
+
+def calendrier_html(location_id: int, annee: int, mois: int, selection: Tuple[date, date] = None) -> str:
+    """
+    Calendrier mensuel de la location, à afficher avec st.markdown(..., unsafe_allow_html=True).
+
+    Args:
+        location_id: ID de la location
+        annee: Année affichée
+        mois: Mois affiché (1-12)
+        selection: Période (début, fin exclue) encadrée, ex: la réservation en cours de saisie
+    """
+    premier = date(annee, mois, 1)
+    libres = set(jours_libres(location_id, premier,
+                              premier + timedelta(days=calendar.monthrange(annee, mois)[1])))
+    aujourd_hui = date.today()
+
+    lignes = []
+    for semaine in calendar.monthcalendar(annee, mois):
+        cellules = []
+        for numero in semaine:
+            if not numero:
+                cellules.append("<td></td>")
+                continue
+            jour = date(annee, mois, numero)
+            if jour < aujourd_hui:
+                fond = COULEUR_PASSE
+            else:
+                fond = COULEUR_LIBRE if jour in libres else COULEUR_RESERVE
+            if selection and selection[0] <= jour < selection[1]:
+                bordure = f"2px solid {COULEUR_SELECTION}"
+            else:
+                bordure = "1px solid white"
+            cellules.append(f"<td style='background-color: {fond}; border: {bordure}; "
+                            f"text-align: center; padding: 4px;'>{numero}</td>")
+        lignes.append(f"<tr>{''.join(cellules)}</tr>")
+
+    entete = ''.join(f"<th style='text-align: center;'>{j}</th>" for j in ('Lu', 'Ma', 'Me', 'Je', 'Ve', 'Sa', 'Di'))
+    return (f"<p style='font-weight: bold; margin: 0;'>{NOMS_MOIS[mois - 1]} {annee}</p>"
+            f"<table style='width: 100%; border-collapse: collapse;'><tr>{entete}</tr>{''.join(lignes)}</table>")
+
+
+def legende_html() -> str:
+    """Légende des couleurs du calendrier."""
+    return (f"<span style='background-color: {COULEUR_LIBRE}; padding: 2px 8px;'>Libre</span> "
+            f"<span style='background-color: {COULEUR_RESERVE}; padding: 2px 8px;'>Réservé</span> "
+            f"<span style='border: 2px solid {COULEUR_SELECTION}; padding: 0 8px;'>Période choisie</span>")
+
+
+def mois_affiches(jour: date, nb: int = 2) -> List[Tuple[int, int]]:
+    """(année, mois) de jour et des nb - 1 mois suivants."""
+    return [(jour.year + (jour.month - 1 + k) // 12, (jour.month - 1 + k) % 12 + 1) for k in range(nb)]
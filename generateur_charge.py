@@ -0,0 +1,388 @@
+# generateur_charge.py - Générateur de charge sur les services de paiement
+"""
+Rejoue des paiements de guichet (taxes, actes, locations) à travers services_mairie
+pour dimensionner les heures de pointe:
+- Concurrence configurable: N threads ou N processus (--workers, --mode)
+- Arrivées de Poisson à un débit cible (--debit, transactions/s au total),
+  ou boucle fermée au plus vite si --debit 0
+- Mix de tarifs (--mix taxe=70,acte=25,location=5) et d'agents (--agents 1=3,2=1)
+- Rapport: TPS atteint, centiles de latence par opération, erreurs de verrou
+
+En boucle ouverte, la latence est comptée depuis l'arrivée prévue: un worker
+en retard accumule de l'attente au lieu de ralentir silencieusement le débit offert.
+
+Sur SQLite, la charge s'exécute par défaut sur une copie de la base (--sur-place
+pour écrire dans la base configurée). Sur PostgreSQL/MySQL, elle écrit dans la
+base configurée par DB_*: pointer DB_NAME vers une base de test.
+
+Usage:
+    python generateur_charge.py --workers 8 --debit 40 --duree 60
+    python generateur_charge.py --mode processus --workers 4 --debit 0 --nb 2000 --json charge.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import acces_donnees
+import database_mairie as db
+import disponibilites
+import journal_audit
+import services_mairie as services
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+MIX_DEFAUT = {'taxe': 70, 'acte': 25, 'location': 5}
+MODES = ('thread', 'processus')
+
+# Messages d'erreur de contention (SQLite, PostgreSQL, MySQL)
+MESSAGES_VERROU = ('database is locked', 'database table is locked', 'busy', 'deadlock',
+                   'lock wait timeout', 'could not serialize', 'lock timeout')
+
+# Les réservations générées commencent loin dans le futur, une période distincte par paiement
+DEBUT_RESERVATIONS = date(2100, 1, 1)
+
+# Préfixe des contribuables générés
+PREFIXE_NOM = "CHARGE"
+
+
+# ==================== CATALOGUE ====================
+
+def catalogue() -> Dict:
+    """
+    Éléments utilisables par la charge, avec leur montant: taxes à montant fixe,
+    actes, locations (et leur période en jours), agents actifs.
+    """
+    conn = db.get_connection()
+    agents = [r['id'] for r in conn.execute("SELECT id FROM agents WHERE actif = 1 ORDER BY id").fetchall()]
+    conn.close()
+    return {
+        'taxes': [(t['id'], t['montant_fixe']) for t in db.get_taxes()
+                  if t['montant_fixe'] and t['montant_fixe'] > 0],
+        'actes': [(f['id'], f['cout_standard']) for f in db.get_formulaires()],
+        'locations': [(l['id'], l['prix_base'], disponibilites.jours_reservation(l['frequence'], 1))
+                      for l in db.get_locations()],
+        'agents': agents,
+    }
+
+
+def lire_poids(texte: str, cles=None) -> Dict:
+    """'taxe=70,acte=25' -> {'taxe': 70.0, 'acte': 25.0} (clés entières si cles est None)."""
+    poids = {}
+    for element in filter(None, (e.strip() for e in texte.split(','))):
+        cle, _, valeur = element.partition('=')
+        cle = cle.strip() if cles else int(cle)
+        if cles and cle not in cles:
+            raise ValueError(f"Clé inconnue {cle!r} (attendu: {', '.join(cles)})")
+        poids[cle] = float(valeur or 1)
+    return poids
+
+
+def _tirage(poids: Dict):
+    cles = list(poids)
+    cumul = np.cumsum([poids[c] for c in cles])
+    return cles, cumul / cumul[-1]
+
+
+# ==================== WORKERS ====================
+
+def categorie_erreur(erreur: Exception) -> str:
+    """'verrou' pour une contention de verrou, sinon le nom de l'exception."""
+    message = str(erreur).lower()
+    if any(m in message for m in MESSAGES_VERROU):
+        return 'verrou'
+    return type(erreur).__name__
+
+
+def _executer_worker(index: int, params: Dict) -> List[tuple]:
+    """
+    Boucle d'un worker: ses arrivées forment un processus de Poisson de débit
+    params['debit'] / params['workers'] (la somme des workers reste poissonnienne).
+
+    Returns:
+        tuple: (départ réel en heure murale, [(operation, prevu, debut, fin, erreur, montant)]
+               en secondes depuis ce départ)
+    """
+    # Processus frais (spawn): reprendre la base et le niveau de logs du parent
+    if params['processus']:
+        if params['chemin_sqlite']:
+            db.DB_PATH = params['chemin_sqlite']
+        if not params['avec_logs']:
+            logging.disable(logging.WARNING)
+
+    rng = random.Random(params['graine'] * 1009 + index)
+    cat = params['catalogue']
+    operations, cumul_ops = params['tirage_ops']
+    agents, cumul_agents = params['tirage_agents']
+    intervalle = params['workers'] / params['debit'] if params['debit'] > 0 else 0.0
+    quota = params['quotas'][index]
+    prochaines_periodes = {}
+
+    # Départ commun à tous les workers (horloge murale: comparable entre processus)
+    time.sleep(max(params['depart'] - time.time(), 0.0))
+    depart = time.time()
+    origine = time.perf_counter()
+    prevu = 0.0
+    mesures = []
+    while quota is None or len(mesures) < quota:
+        if intervalle:
+            prevu += rng.expovariate(1.0 / intervalle)
+            if prevu > params['duree']:
+                break
+            attente = prevu - (time.perf_counter() - origine)
+            if attente > 0:
+                time.sleep(attente)
+        else:
+            prevu = time.perf_counter() - origine
+            if quota is None and prevu > params['duree']:
+                break
+
+        operation = operations[int(np.searchsorted(cumul_ops, rng.random(), side='right'))]
+        agent_id = agents[int(np.searchsorted(cumul_agents, rng.random(), side='right'))] if agents else None
+        numero = f"{PREFIXE_NOM}-{index}-{len(mesures)}"
+
+        debut = time.perf_counter() - origine
+        erreur, montant = None, 0.0
+        try:
+            if operation == 'taxe':
+                taxe_id, prix = rng.choice(cat['taxes'])
+                services.enregistrer_paiement_taxe(taxe_id, agent_id=agent_id,
+                                                   nom_commercant=numero, numero_commercant=numero)
+            elif operation == 'acte':
+                formulaire_id, prix = rng.choice(cat['actes'])
+                services.enregistrer_paiement_acte(formulaire_id, agent_id=agent_id, nom_commercant=numero)
+            else:
+                location_id, prix, periode = rng.choice(cat['locations'])
+                # Périodes distinctes par location et par worker: aucune réservation ne se chevauche
+                rang = prochaines_periodes.get(location_id, 0)
+                prochaines_periodes[location_id] = rang + 1
+                debut_location = DEBUT_RESERVATIONS + timedelta(days=(rang * params['workers'] + index) * periode)
+                services.enregistrer_paiement_location(location_id, 1, debut_location.isoformat(), numero,
+                                                       agent_id=agent_id)
+            montant = float(prix)
+        except Exception as e:
+            erreur = categorie_erreur(e)
+        fin = time.perf_counter() - origine
+        mesures.append((operation, prevu, debut, fin, erreur, montant))
+
+    if params['processus']:
+        # Les processus du pool sortent sans atexit: écrire leur journal d'audit maintenant
+        journal_audit.vider()
+        acces_donnees.fermer_pools()
+    return depart, mesures
+
+
+# ==================== CHARGE ====================
+
+def _centiles(valeurs_ms: np.ndarray) -> Dict:
+    if len(valeurs_ms) == 0:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(valeurs_ms, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(valeurs_ms.max())}
+
+
+def generer_charge(workers: int = 4, mode: str = 'thread', debit: float = 0.0, duree: float = 10.0,
+                   nb: Optional[int] = None, mix: Optional[Dict] = None, agents: Optional[Dict] = None,
+                   graine: int = 42, avec_logs: bool = False) -> Dict:
+    """
+    Génère la charge sur la base configurée (db.DB_PATH pour SQLite).
+
+    Args:
+        workers: Nombre de threads ou de processus
+        mode: 'thread' ou 'processus'
+        debit: Débit offert total en transactions/s (0 = boucle fermée, au plus vite)
+        duree: Durée de la charge en secondes (ignorée si nb est fourni en boucle fermée)
+        nb: Nombre total de paiements (réparti entre les workers)
+        mix: Poids par opération ('taxe', 'acte', 'location'), MIX_DEFAUT par défaut
+        agents: Poids par agent_id (agents actifs à poids égaux par défaut)
+        graine: Graine des tirages (arrivées, tarifs, agents)
+        avec_logs: Garde les logs INFO/WARNING des services (coupés par défaut)
+
+    Returns:
+        dict: rapport (voir rapport())
+    """
+    if mode not in MODES:
+        raise ValueError(f"Mode inconnu: {mode} (attendu: {', '.join(MODES)})")
+    workers = max(1, int(workers))
+    cat = catalogue()
+    mix = {op: p for op, p in (mix or MIX_DEFAUT).items() if p > 0}
+    for op, cle in (('taxe', 'taxes'), ('acte', 'actes'), ('location', 'locations')):
+        if op in mix and not cat[cle]:
+            logger.warning("Aucun élément pour l'opération %s: retirée du mix", op)
+            mix.pop(op)
+    if not mix:
+        raise ValueError("Mix de charge vide")
+    agents = agents or {a: 1.0 for a in cat['agents']}
+
+    quotas = [None] * workers
+    if nb is not None:
+        quotas = [nb // workers + (1 if i < nb % workers else 0) for i in range(workers)]
+    params = {
+        'workers': workers, 'debit': float(debit), 'duree': float(duree), 'quotas': quotas,
+        'graine': graine, 'avec_logs': avec_logs, 'catalogue': cat, 'processus': mode == 'processus',
+        'tirage_ops': _tirage(mix), 'tirage_agents': _tirage(agents) if agents else ([], None),
+        'chemin_sqlite': db.DB_PATH if acces_donnees.type_base() == 'sqlite' else None,
+        'depart': time.time() + (1.0 if mode == 'processus' else 0.05),
+    }
+
+    logger.info("Charge: %d %s(s), débit %s tx/s, mix %s", workers, mode, debit or 'max', mix)
+    if mode == 'thread':
+        executeur = ThreadPoolExecutor(max_workers=workers)
+    else:
+        # spawn: pas de fork d'un processus qui porte déjà des threads (journalisation, pools)
+        executeur = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+    niveau_coupe = logging.root.manager.disable
+    if not avec_logs:
+        logging.disable(logging.WARNING)
+    try:
+        with executeur:
+            futures = [executeur.submit(_executer_worker, i, params) for i in range(workers)]
+            retours = [f.result() for f in futures]
+    finally:
+        logging.disable(niveau_coupe)
+    mesures = [m for _, mesures_worker in retours for m in mesures_worker]
+    # Du premier départ effectif (un processus peut démarrer en retard) à la dernière fin
+    premier = min(depart for depart, _ in retours)
+    fin = max((depart + m[-1][3] for depart, m in retours if m), default=premier)
+    # En boucle ouverte sur une durée, la fenêtre d'arrivées compte même si elle finit creuse
+    fenetre = params['duree'] if params['debit'] and nb is None else 0.0
+    params['duree_reelle'] = max(fin - premier, fenetre, 1e-9)
+
+    return rapport(mesures, params, mode, mix)
+
+
+def rapport(mesures: List[tuple], params: Dict, mode: str, mix: Dict) -> Dict:
+    """
+    Returns:
+        dict: {'workers', 'mode', 'debit_offert', 'duree_s', 'total', 'succes', 'tps', 'recettes',
+               'erreurs': {categorie: n}, 'taux_verrou', 'latence', 'attente_p95_ms', 'par_operation'}
+    """
+    ok = [m for m in mesures if m[4] is None]
+    duree = params['duree_reelle']
+
+    erreurs = {}
+    for m in mesures:
+        if m[4] is not None:
+            erreurs[m[4]] = erreurs.get(m[4], 0) + 1
+
+    par_operation = {}
+    for op in mix:
+        latences = np.array([(m[3] - m[1]) * 1000 for m in ok if m[0] == op])
+        par_operation[op] = {'succes': len(latences),
+                             'erreurs': sum(1 for m in mesures if m[0] == op and m[4] is not None),
+                             **_centiles(latences)}
+
+    latences = np.array([(m[3] - m[1]) * 1000 for m in ok])
+    attentes = np.array([(m[2] - m[1]) * 1000 for m in mesures])
+    return {
+        'workers': params['workers'],
+        'mode': mode,
+        'debit_offert': params['debit'] or None,
+        'duree_s': duree,
+        'total': len(mesures),
+        'succes': len(ok),
+        'tps': len(ok) / duree,
+        'recettes': float(sum(m[5] for m in ok)),
+        'erreurs': erreurs,
+        'taux_verrou': erreurs.get('verrou', 0) / len(mesures) if mesures else 0.0,
+        'latence': _centiles(latences),
+        'attente_p95_ms': float(np.percentile(attentes, 95)) if len(attentes) else None,
+        'par_operation': par_operation,
+    }
+
+
+def afficher_rapport(r: Dict):
+    offert = f"{r['debit_offert']:.1f} tx/s offerts" if r['debit_offert'] else "boucle fermée"
+    print(f"\n⚙️  {r['workers']} {r['mode']}(s), {offert}, {r['duree_s']:.1f}s")
+    print(f"✅ {r['succes']:,}/{r['total']:,} paiements, {r['tps']:.1f} TPS, {r['recettes']:,.0f} FCFA")
+    if r['latence']['p50_ms'] is not None:
+        print(f"⏱️  Latence p50 {r['latence']['p50_ms']:.1f} ms, p95 {r['latence']['p95_ms']:.1f} ms, "
+              f"p99 {r['latence']['p99_ms']:.1f} ms, max {r['latence']['max_ms']:.1f} ms "
+              f"(attente p95 {r['attente_p95_ms']:.1f} ms)")
+    for op, s in r['par_operation'].items():
+        if s['p50_ms'] is None:
+            print(f"   {op:<9} {s['succes']:>7,} ok  {s['erreurs']:>5,} erreurs")
+        else:
+            print(f"   {op:<9} {s['succes']:>7,} ok  {s['erreurs']:>5,} erreurs  "
+                  f"p50 {s['p50_ms']:8.1f} ms  p95 {s['p95_ms']:8.1f} ms")
+    if r['erreurs']:
+        print(f"❌ Erreurs: {', '.join(f'{k}={v}' for k, v in sorted(r['erreurs'].items()))} "
+              f"(verrou: {r['taux_verrou']:.1%})")
+
+
+# ==================== CLI ====================
+
+def _copie_sqlite(source: str, dossier: str) -> str:
+    """Copie cohérente de la base (API de sauvegarde SQLite) dans dossier."""
+    copie = os.path.join(dossier, os.path.basename(source))
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(copie)
+    src.backup(dst)
+    dst.close()
+    src.close()
+    return copie
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Génère une charge de paiements sur les services municipaux")
+    parser.add_argument('--workers', type=int, default=4, help="Threads ou processus concurrents")
+    parser.add_argument('--mode', choices=MODES, default='thread')
+    parser.add_argument('--debit', type=float, default=0.0,
+                        help="Débit offert total en transactions/s, arrivées de Poisson (0 = au plus vite)")
+    parser.add_argument('--duree', type=float, default=10.0, help="Durée de la charge, en secondes")
+    parser.add_argument('--nb', type=int, help="Nombre total de paiements (à la place de --duree en boucle fermée)")
+    parser.add_argument('--mix', type=lambda t: lire_poids(t, tuple(MIX_DEFAUT)),
+                        default=MIX_DEFAUT, help="Poids des opérations, ex: taxe=70,acte=25,location=5")
+    parser.add_argument('--agents', type=lire_poids, help="Poids des agents, ex: 1=3,2=1 (agents actifs à parts égales par défaut)")
+    parser.add_argument('--graine', type=int, default=42)
+    parser.add_argument('--base', default=None, help=f"Base SQLite (défaut: {db.DB_PATH})")
+    parser.add_argument('--sur-place', action='store_true', help="SQLite: écrit dans la base configurée au lieu d'une copie")
+    parser.add_argument('--json', help="Fichier où enregistrer le rapport")
+    parser.add_argument('--avec-logs', action='store_true', help="Garde les logs INFO/WARNING des services")
+    args = parser.parse_args(argv)
+
+    if not args.avec_logs:
+        logging.disable(logging.INFO)
+    ancien_chemin = db.DB_PATH
+    if args.base:
+        db.DB_PATH = args.base
+    db.init_database()
+    with tempfile.TemporaryDirectory() as dossier:
+        if acces_donnees.type_base() == 'sqlite' and not args.sur_place:
+            db.DB_PATH = _copie_sqlite(db.DB_PATH, dossier)
+            # La copie de travail ne doit pas manquer de formulaires
+            for formulaire in db.get_formulaires():
+                db.reapprovisionner_formulaire(formulaire['id'], args.nb or 100_000)
+        elif acces_donnees.type_base() != 'sqlite':
+            print(f"⚠️ Charge écrite dans la base {acces_donnees.type_base()} configurée")
+        try:
+            r = generer_charge(args.workers, args.mode, args.debit, args.duree, args.nb, args.mix,
+                               args.agents, args.graine, args.avec_logs)
+        finally:
+            # Journal d'audit de la charge écrit avant la suppression de la copie de travail
+            journal_audit.vider()
+            db.DB_PATH = ancien_chemin
+            acces_donnees.fermer_pools()
+
+    afficher_rapport(r)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(r, f, ensure_ascii=False, indent=2)
+        print(f"💾 Rapport enregistré dans {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
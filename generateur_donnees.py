@@ -0,0 +1,287 @@
+# generateur_donnees.py - Générateur déterministe de données simulées
+"""
+Génération vectorisée (NumPy) de jeux de données réalistes pour les tests et benchmarks:
+- Transactions sur plusieurs années: types, agents, modes de paiement, marchés
+- Recettes journalières agrégées à partir de ces transactions
+- Historique de stock (consommation et réapprovisionnements)
+- Chargement en masse dans la base SQLite (mairie.db par défaut)
+
+Tout est piloté par une graine: mêmes paramètres => mêmes données.
+
+Usage:
+    python generateur_donnees.py --annees 5 --par-jour 300 --base bench.db
+"""
+
+import argparse
+import sqlite3
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import database_mairie as db
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+GRAINE_DEFAUT = 42
+FIN_DEFAUT = date(2025, 12, 31)
+TAILLE_LOT = 50_000
+
+# Préfixe des numéros de reçu simulés (permet de les purger)
+PREFIXE_RECU = 'SIM'
+
+# Catalogue: (famille, désignation, montant FCFA, poids relatif, perçu sur un marché)
+CATALOGUE = [
+    ('TAXE', 'Étal de marché', 6500.0, 40, True),
+    ('TAXE', 'Taxe de propreté', 25000.0, 6, False),
+    ('TAXE', 'Taxe des Box', 35000.0, 4, True),
+    ('TAXE', 'Taxe sur la publicité', 12000.0, 2, False),
+    ('ACTE', "Extrait d'acte de naissance", 3000.0, 15, False),
+    ('ACTE', "Copie intégrale d'acte de naissance", 5000.0, 8, False),
+    ('ACTE', 'Procuration', 5000.0, 5, False),
+    ('ACTE', 'Certificat de conformité', 5000.0, 4, False),
+    ('ACTE', 'Convention commerçant', 20000.0, 1, False),
+    ('LOCATION', 'Transport', 25000.0, 2, False),
+    ('LOCATION', 'Salle de réunion', 15000.0, 2, False),
+    ('LOCATION', 'Bureau', 50000.0, 1, False),
+]
+
+# Types tels que construits par services_mairie (TAXE_/ACTE_ tronqués à 20 caractères)
+TYPES = np.array([
+    f"{famille}_{nom.upper()}" if famille == 'LOCATION' else f"{famille}_{nom[:20].upper()}"
+    for famille, nom, _, _, _ in CATALOGUE
+])
+FAMILLES = np.array([famille for famille, _, _, _, _ in CATALOGUE])
+LIBELLES = np.array([f"{famille}_{nom.upper()}" for famille, nom, _, _, _ in CATALOGUE])
+MONTANTS = np.array([montant for _, _, montant, _, _ in CATALOGUE])
+POIDS_TYPES = np.array([poids for _, _, _, poids, _ in CATALOGUE], dtype=float)
+SUR_MARCHE = np.array([marche for _, _, _, _, marche in CATALOGUE])
+
+MODES_PAIEMENT = np.array(["Espèces", "Airtel Money", "MobiCash", "Virement Bancaire"])
+POIDS_MODES = np.array([0.55, 0.25, 0.15, 0.05])
+
+# Profils d'activité (lundi = 0) et campagnes de recouvrement (janvier, juillet)
+PROFIL_SEMAINE = np.array([1.0, 1.05, 1.0, 1.1, 1.2, 1.35, 0.4])
+PROFIL_MOIS = np.array([1.6, 1.1, 1.0, 1.0, 1.0, 1.0, 1.3, 1.0, 0.9, 1.0, 1.0, 1.1])
+CROISSANCE_ANNUELLE = 0.08
+
+# Heures d'ouverture des guichets (secondes depuis minuit)
+OUVERTURE_GUICHET = 7 * 3600
+FERMETURE_GUICHET = 18 * 3600
+
+
+def graine_depuis_texte(texte: str, graine: int = GRAINE_DEFAUT) -> int:
+    """Graine stable dérivée d'un texte (ex: nom d'une matière), indépendante de hash()."""
+    return zlib.crc32(texte.encode('utf-8')) ^ graine
+
+
+def calendrier(nb_jours: int, fin: date = FIN_DEFAUT) -> pd.DatetimeIndex:
+    """Jours consécutifs se terminant à la date de fin incluse."""
+    return pd.date_range(end=pd.Timestamp(fin), periods=nb_jours, freq='D')
+
+
+def generer_transactions(nb_jours: int, transactions_par_jour: float = 300, graine: int = GRAINE_DEFAUT,
+                         fin: date = FIN_DEFAUT, nb_agents: int = 3, nb_marches: int = 4) -> Dict[str, np.ndarray]:
+    """
+    Génère des transactions simulées, entièrement vectorisées.
+
+    Le nombre de transactions par jour suit une loi de Poisson dont l'intensité
+    combine tendance de croissance, profil hebdomadaire et campagnes mensuelles.
+
+    Args:
+        nb_jours: Durée de l'historique
+        transactions_par_jour: Intensité moyenne (jour ordinaire, début de période)
+        graine: Graine du générateur
+        fin: Dernier jour simulé
+        nb_agents: Agents numérotés 1..nb_agents
+        nb_marches: Marchés numérotés 1..nb_marches
+
+    Returns:
+        dict de tableaux NumPy de même longueur:
+            'jours' (DatetimeIndex du calendrier), 'jour' (indice dans le calendrier),
+            'date_creation' (datetime64[s]), 'type' (indice dans TYPES), 'montant',
+            'agent_id', 'mode' (indice dans MODES_PAIEMENT), 'marche_id' (0 = aucun)
+    """
+    rng = np.random.default_rng(graine)
+    jours = calendrier(nb_jours, fin)
+
+    annees_ecoulees = np.arange(nb_jours) / 365.25
+    intensite = (transactions_par_jour * (1 + CROISSANCE_ANNUELLE) ** annees_ecoulees
+                 * PROFIL_SEMAINE[jours.dayofweek] * PROFIL_MOIS[jours.month - 1])
+    par_jour = rng.poisson(intensite)
+    n = int(par_jour.sum())
+
+    jour = np.repeat(np.arange(nb_jours), par_jour)
+    secondes = rng.integers(OUVERTURE_GUICHET, FERMETURE_GUICHET, size=n)
+    date_creation = (jours.to_numpy().astype('datetime64[s]')[jour] + secondes.astype('timedelta64[s]'))
+    # Ordre chronologique, comme des identifiants auto-incrémentés
+    ordre = np.argsort(date_creation, kind='stable')
+
+    types = rng.choice(len(CATALOGUE), size=n, p=POIDS_TYPES / POIDS_TYPES.sum())
+    marche_id = np.where(SUR_MARCHE[types], rng.integers(1, nb_marches + 1, size=n), 0)
+
+    return {
+        'jours': jours,
+        'jour': jour[ordre],
+        'date_creation': date_creation[ordre],
+        'type': types[ordre],
+        'montant': MONTANTS[types][ordre],
+        'agent_id': rng.integers(1, nb_agents + 1, size=n)[ordre],
+        'mode': rng.choice(len(MODES_PAIEMENT), size=n, p=POIDS_MODES)[ordre],
+        'marche_id': marche_id[ordre],
+    }
+
+
+def recettes_journalieres(transactions: Dict[str, np.ndarray], familles=('TAXE', 'ACTE')) -> pd.Series:
+    """Total des recettes par jour du calendrier (0 les jours sans encaissement)."""
+    retenues = np.isin(FAMILLES[transactions['type']], familles)
+    totaux = np.bincount(transactions['jour'][retenues], weights=transactions['montant'][retenues],
+                         minlength=len(transactions['jours']))
+    return pd.Series(totaux, index=transactions['jours'], name='revenue')
+
+
+def serie_recettes(nb_jours: int, transactions_par_jour: float = 300, graine: int = GRAINE_DEFAUT,
+                   fin: date = FIN_DEFAUT, familles=('TAXE', 'ACTE')) -> pd.Series:
+    """Recettes journalières simulées (raccourci: génération puis agrégation)."""
+    return recettes_journalieres(
+        generer_transactions(nb_jours, transactions_par_jour, graine, fin), familles
+    )
+
+
+def serie_stock(nb_jours: int, graine: int = GRAINE_DEFAUT, fin: date = FIN_DEFAUT,
+                stock_initial: float = 100.0, seuil: float = 15.0) -> pd.DataFrame:
+    """
+    Historique de stock: consommation journalière bruitée, réapprovisionnement sous le seuil.
+
+    Les niveaux sont calculés par cumul vectorisé entre deux réapprovisionnements:
+    la boucle ne porte que sur les cycles (quelques dizaines par an), pas sur les jours.
+
+    Returns:
+        DataFrame: date, stock, consumption
+    """
+    rng = np.random.default_rng(graine)
+    consommation = np.maximum(0, rng.normal(rng.uniform(2, 8), 1.5, size=nb_jours))
+    reappro = rng.integers(50, 101, size=nb_jours)
+
+    stock = np.empty(nb_jours)
+    niveau, debut = stock_initial, 0
+    while debut < nb_jours:
+        niveaux = niveau - np.cumsum(consommation[debut:])
+        sous_seuil = np.flatnonzero(niveaux < seuil)
+        if len(sous_seuil) == 0:
+            stock[debut:] = niveaux
+            break
+        jour_reappro = debut + sous_seuil[0]
+        stock[debut:jour_reappro] = niveaux[:sous_seuil[0]]
+        niveau = niveaux[sous_seuil[0]] + reappro[jour_reappro]
+        stock[jour_reappro] = niveau
+        debut = jour_reappro + 1
+
+    return pd.DataFrame({'date': calendrier(nb_jours, fin), 'stock': stock, 'consumption': consommation})
+
+
+# ==================== CHARGEMENT EN BASE ====================
+
+def _lignes(transactions: Dict[str, np.ndarray], graine: int, debut: int, fin: int, decalage: int = 0):
+    """Tuples d'insertion d'un lot, construits colonne par colonne."""
+    indices = np.arange(debut, fin) + decalage
+    dates = np.char.replace(np.datetime_as_string(transactions['date_creation'][debut:fin], unit='s'), 'T', ' ')
+    recus = np.char.add(f"{PREFIXE_RECU}-{graine}-", np.char.zfill(indices.astype(str), 9))
+    marches = transactions['marche_id'][debut:fin]
+    return zip(
+        transactions['agent_id'][debut:fin].tolist(),
+        TYPES[transactions['type'][debut:fin]].tolist(),
+        LIBELLES[transactions['type'][debut:fin]].tolist(),
+        transactions['montant'][debut:fin].tolist(),
+        MODES_PAIEMENT[transactions['mode'][debut:fin]].tolist(),
+        recus.tolist(),
+        recus.tolist(),
+        [m if m else None for m in marches.tolist()],
+        dates.tolist(),
+    )
+
+
+def charger_dans_base(transactions: Dict[str, np.ndarray], graine: int = GRAINE_DEFAUT,
+                      db_path: Optional[str] = None, taille_lot: int = TAILLE_LOT) -> int:
+    """
+    Insère les transactions simulées en masse puis reconstruit les agrégats de recettes.
+
+    Les reçus sont préfixés 'SIM-<graine>-' (voir supprimer_donnees_simulees).
+
+    Returns:
+        int: Nombre de transactions insérées
+    """
+    if db_path:
+        db.DB_PATH = db_path
+    db.init_database()
+
+    n = len(transactions['montant'])
+    debut_chargement = time.perf_counter()
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        conn.execute("PRAGMA synchronous = OFF")
+        # Décalage des numéros de reçu: plusieurs chargements peuvent cohabiter
+        decalage = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        for debut in range(0, n, taille_lot):
+            conn.executemany('''
+                INSERT INTO transactions
+                (agent_id, type, libelle, montant, mode_paiement, numero_recu, transaction_id,
+                 statut, marche_id, date_creation)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'COMPLETE', ?, ?)
+            ''', _lignes(transactions, graine, debut, min(debut + taille_lot, n), decalage))
+            conn.commit()
+    finally:
+        conn.close()
+
+    db.rebuild_recettes_journalieres()
+    db.rebuild_recettes_marches_jour()
+
+    duree = time.perf_counter() - debut_chargement
+    logger.info(f"✅ {n:,} transactions simulées chargées en {duree:.1f}s ({n / max(duree, 1e-9):,.0f} lignes/s)")
+    return n
+
+
+def supprimer_donnees_simulees(db_path: Optional[str] = None) -> int:
+    """Supprime les transactions simulées (reçus 'SIM-') et reconstruit les agrégats."""
+    if db_path:
+        db.DB_PATH = db_path
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM transactions WHERE numero_recu LIKE ?", (f"{PREFIXE_RECU}-%",))
+    supprimees = cursor.rowcount
+    conn.commit()
+    conn.close()
+
+    db.rebuild_recettes_journalieres()
+    db.rebuild_recettes_marches_jour()
+    logger.info(f"🗑️ {supprimees:,} transactions simulées supprimées")
+    return supprimees
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère et charge des transactions simulées")
+    parser.add_argument('--annees', type=float, default=1, help="Durée de l'historique, en années")
+    parser.add_argument('--par-jour', type=float, default=300, help="Transactions par jour (intensité moyenne)")
+    parser.add_argument('--graine', type=int, default=GRAINE_DEFAUT, help="Graine du générateur")
+    parser.add_argument('--fin', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="Dernier jour simulé (YYYY-MM-DD), hier par défaut")
+    parser.add_argument('--base', default=None, help=f"Base SQLite cible (défaut: {db.DB_PATH})")
+    parser.add_argument('--purger', action='store_true', help="Supprime les données simulées au lieu d'en ajouter")
+    args = parser.parse_args()
+
+    if args.purger:
+        supprimer_donnees_simulees(args.base)
+        return
+
+    debut = time.perf_counter()
+    transactions = generer_transactions(int(args.annees * 365), args.par_jour, args.graine, args.fin)
+    print(f"🎲 {len(transactions['montant']):,} transactions générées en {time.perf_counter() - debut:.2f}s")
+    charger_dans_base(transactions, args.graine, args.base)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ Interface pour les agents municipaux pour enregistrer les paiements RÉELS:
 import streamlit as st
 import database_mairie as db
 import services_mairie as services
-from datetime import datetime, date
+import disponibilites
+from datetime import datetime, date, timedelta
 
 def show_guichet_page():
     """Affiche la page du guichet municipal."""
@@ -112,6 +113,16 @@ def show_guichet_page():
             contrib_numero = st.text_input("Numéro de commerçant/contribuable *", key="taxe_num",
                                           help="Numéro d'identification fiscale ou de commerçant")
 
+        # Marché de perception (alimente la carte des recettes par marché)
+        marches = db.get_all_marches()
+        marche_id = st.selectbox(
+            "🗺️ Marché de perception (optionnel)",
+            options=[None] + [m['id'] for m in marches],
+            format_func=lambda x: "Aucun / hors marché" if x is None else next(m['nom_marche'] for m in marches if m['id'] == x),
+            key="taxe_marche",
+            help="Si vide, le marché est déduit du numéro CNI du commerçant inscrit"
+        )
+
         # Mode de paiement
         st.markdown("#### 💳 Mode de paiement")
         col_pay1, col_pay2 = st.columns(2)
@@ -154,7 +165,8 @@ def show_guichet_page():
                             montant_base=montant_base,
                             nom_commercant=contrib_nom,
                             numero_commercant=contrib_numero,
-                            mode_paiement=payment_info
+                            mode_paiement=payment_info,
+                            marche_id=marche_id
                         )
                     else:
                         tx_id = services.enregistrer_paiement_taxe(
@@ -163,7 +175,8 @@ def show_guichet_page():
                             montant_custom=montant_final if montant_custom else None,
                             nom_commercant=contrib_nom,
                             numero_commercant=contrib_numero,
-                            mode_paiement=payment_info
+                            mode_paiement=payment_info,
+                            marche_id=marche_id
                         )
 
                     st.success(f"✅ Paiement enregistré avec succès!")
@@ -327,8 +340,28 @@ def show_guichet_page():
                 min_value=date.today(),
                 value=date.today()
             )
+            debut_periode, fin_periode = disponibilites.periode(location, date_debut, duree)
+            if disponibilites.est_disponible(location['id'], debut_periode, fin_periode):
+                st.success(f"✅ Libre jusqu'au {(fin_periode - timedelta(days=1)).strftime('%d/%m/%Y')}")
+            else:
+                suivant = disponibilites.prochain_creneau(location['id'], (fin_periode - debut_periode).days, date_debut)
+                st.warning("⚠️ Période déjà réservée"
+                           + (f" - prochain créneau libre: {suivant.strftime('%d/%m/%Y')}" if suivant else ""))
+                libres = set(disponibilites.locations_libres(date_debut, (fin_periode - debut_periode).days))
+                autres = [l for l in locations if l['id'] in libres]
+                if autres:
+                    st.caption("Libres à cette date: " + ", ".join(l['designation'] for l in autres))
             motif = st.text_area("Motif de la réservation")
 
+        # Calendrier d'occupation
+        with st.expander("📅 Calendrier de disponibilité", expanded=True):
+            st.markdown(disponibilites.legende_html(), unsafe_allow_html=True)
+            for col_mois, (annee, mois) in zip(st.columns(2), disponibilites.mois_affiches(date_debut)):
+                with col_mois:
+                    st.markdown(disponibilites.calendrier_html(location['id'], annee, mois,
+                                                               (debut_periode, fin_periode)),
+                                unsafe_allow_html=True)
+
         # Mode de paiement
         st.markdown("#### 💳 Mode de paiement")
         col_pay_loc1, col_pay_loc2 = st.columns(2)
@@ -405,9 +438,6 @@ def show_guichet_page():
             st.write(f"- **{cat}:** {data['nombre']} transaction(s) - {data['total']:,.0f} FCFA")
 
 
-# Import nécessaire pour les délais
-from datetime import timedelta
-
 # Fonction pour affichage standalone
 if __name__ == "__main__":
     show_guichet_page()
@@ -9,9 +9,11 @@ Système IA qui surveille en temps réel les recettes municipales pour détecter
 """
 
 import database_mairie as db
+import journal_evenements
 from datetime import datetime, timedelta
 from logger import get_logger
 import statistics
+import time
 
 logger = get_logger(__name__)
 
@@ -178,7 +180,7 @@ class SurveillanceIA:
 
         # Logger l'analyse
         if status != 'OK':
-            logger.warning(f"IA: Transaction #{transaction_id} - Status {status} - Score {score_confiance}%")
+            logger.warning("IA: Transaction #%s - Status %s - Score %s%%", transaction_id, status, score_confiance)
 
             # Créer une alerte automatique
             if anomalies:
@@ -209,7 +211,7 @@ class SurveillanceIA:
         Returns:
             dict: Rapport de surveillance
         """
-        conn = db.get_connection()
+        conn = db.get_connection(lecture=True)
         cursor = conn.cursor()
 
         # Recettes du jour
@@ -230,7 +232,7 @@ class SurveillanceIA:
                 AND date_creation < DATE('now')
                 AND statut = 'COMPLETE'
                 GROUP BY DATE(date_creation)
-            )
+            ) AS jours
         ''')
         moyenne_semaine, moyenne_tx = cursor.fetchone()
 
@@ -308,7 +310,7 @@ class SurveillanceIA:
         Returns:
             list: Liste des patterns suspects détectés
         """
-        conn = db.get_connection()
+        conn = db.get_connection(lecture=True)
         cursor = conn.cursor()
 
         patterns_suspects = []
@@ -318,10 +320,10 @@ class SurveillanceIA:
             SELECT agent_id, COUNT(*) as nb_ronds, SUM(montant) as total
             FROM transactions
             WHERE date_creation >= DATE('now', ?)
-            AND montant % 10000 = 0
+            AND montant = ROUND(montant / 10000.0) * 10000
             AND statut = 'COMPLETE'
             GROUP BY agent_id
-            HAVING nb_ronds > 10
+            HAVING COUNT(*) > 10
         ''', (f'-{jours} days',))
 
         for row in cursor.fetchall():
@@ -340,7 +342,7 @@ class SurveillanceIA:
             WHERE date_creation >= DATE('now', ?)
             AND statut = 'COMPLETE'
             GROUP BY agent_id, montant
-            HAVING repetitions > 5
+            HAVING COUNT(*) > 5
         ''', (f'-{jours} days',))
 
         for row in cursor.fetchall():
@@ -408,7 +410,7 @@ class SurveillanceIA:
         score = 100
         facteurs = []
 
-        conn = db.get_connection()
+        conn = db.get_connection(lecture=True)
         cursor = conn.cursor()
 
         # Facteur 1: Nombre d'alertes critiques non résolues
@@ -509,11 +511,14 @@ def analyser_nouvelle_transaction(transaction_id: int):
 
 def lancer_surveillance_quotidienne():
     """Lance la surveillance quotidienne des recettes."""
+    debut = time.perf_counter()
     rapport = ia_surveillance.surveillance_recettes_journalieres()
     patterns = ia_surveillance.detecter_patterns_frauduleux(jours=7)
+    journal_evenements.emettre('surveillance', anomalies=len(rapport.get('anomalies', [])), patterns=len(patterns),
+                               duree_ms=round((time.perf_counter() - debut) * 1000, 1))
 
-    logger.info(f"IA Surveillance: {len(rapport.get('anomalies', []))} anomalies détectées")
-    logger.info(f"IA Surveillance: {len(patterns)} patterns suspects détectés")
+    logger.info("IA Surveillance: %d anomalies détectées", len(rapport.get('anomalies', [])))
+    logger.info("IA Surveillance: %d patterns suspects détectés", len(patterns))
 
     return {
         'rapport_quotidien': rapport,
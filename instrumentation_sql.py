@@ -0,0 +1,257 @@
+# instrumentation_sql.py - Mesure des requêtes SQL par empreinte
+"""
+Instrumentation optionnelle de la couche d'accès aux données (acces_donnees):
+- Chaque requête est rattachée à son empreinte (SQL normalisé: littéraux
+  remplacés par ?, listes IN (...) repliées, espaces compactés)
+- Nombre d'appels exact; durée et lignes mesurées sur un échantillon
+  (SQL_PROFILING_TAUX, 10 % par défaut)
+- Latences dans un histogramme logarithmique (4 classes par octave) d'où
+  sont tirés p50 / p95 / p99
+- Compteurs propres à chaque thread: aucun verrou sur le chemin d'exécution,
+  la fusion se fait à la lecture du rapport
+
+Activation: SQL_PROFILING=1 dans l'environnement, ou activer() à chaud.
+Le rapport est visible dans le tableau de bord avec ?debug=sql dans l'URL.
+"""
+
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from config_helper import get_config
+
+TAUX_DEFAUT = 0.1
+
+# Histogramme des latences: classe k = [2^(k/4), 2^((k+1)/4)) microsecondes
+CLASSES_PAR_OCTAVE = 4
+NB_CLASSES = 128
+
+actif = str(get_config('SQL_PROFILING', default='0')).lower() in ('1', 'true', 'oui', 'yes')
+taux = float(get_config('SQL_PROFILING_TAUX', default=TAUX_DEFAUT))
+
+
+# ==================== EMPREINTES ====================
+
+_LITTERAUX = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTES = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ESPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def empreinte(sql: str) -> str:
+    """SQL normalisé: deux requêtes qui ne diffèrent que par leurs valeurs ont la même empreinte."""
+    sql = _LITTERAUX.sub('?', sql)
+    sql = _LISTES.sub('(...)', sql)
+    return _ESPACES.sub(' ', sql).strip()
+
+
+# ==================== COMPTEURS PAR THREAD ====================
+
+class Mesure:
+    """Compteurs d'une empreinte dans un thread."""
+
+    __slots__ = ('appels', 'echantillons', 'duree', 'lignes', 'histogramme')
+
+    def __init__(self):
+        self.appels = 0
+        self.echantillons = 0
+        self.duree = 0.0
+        self.lignes = 0
+        self.histogramme = [0] * NB_CLASSES
+
+    def enregistrer(self, duree: float):
+        self.echantillons += 1
+        self.duree += duree
+        micro = duree * 1e6
+        classe = int(math.log2(micro) * CLASSES_PAR_OCTAVE) if micro > 1 else 0
+        self.histogramme[min(classe, NB_CLASSES - 1)] += 1
+
+    def fusionner(self, autre: 'Mesure'):
+        self.appels += autre.appels
+        self.echantillons += autre.echantillons
+        self.duree += autre.duree
+        self.lignes += autre.lignes
+        self.histogramme = [a + b for a, b in zip(self.histogramme, autre.histogramme)]
+
+
+_local = threading.local()
+# Compteurs de chaque thread vivant (thread -> {empreinte: Mesure}) et cumul des threads terminés
+_threads: Dict = {}
+_cumul: Dict[str, Mesure] = {}
+_registre_lock = threading.Lock()
+_generation = 0
+
+
+def _compteurs() -> Dict:
+    """Compteurs du thread courant, créés et enregistrés au premier appel (ou après reinitialiser())."""
+    compteurs = getattr(_local, 'compteurs', None)
+    if compteurs is None or _local.generation != _generation:
+        compteurs = {'par_sql': {}, 'par_empreinte': {}}
+        _local.compteurs = compteurs
+        _local.generation = _generation
+        with _registre_lock:
+            _recuperer_threads_termines()
+            _threads[threading.current_thread()] = compteurs
+    return compteurs
+
+
+def _mesure(sql: str) -> Mesure:
+    compteurs = _compteurs()
+    mesure = compteurs['par_sql'].get(sql)
+    if mesure is None:
+        cle = empreinte(sql)
+        mesure = compteurs['par_empreinte'].get(cle)
+        if mesure is None:
+            mesure = compteurs['par_empreinte'][cle] = Mesure()
+        compteurs['par_sql'][sql] = mesure
+    return mesure
+
+
+def _recuperer_threads_termines():
+    """Verse les compteurs des threads terminés dans le cumul (appelé sous _registre_lock)."""
+    for thread in [t for t in _threads if not t.is_alive()]:
+        for cle, mesure in _threads.pop(thread)['par_empreinte'].items():
+            _cumul.setdefault(cle, Mesure()).fusionner(mesure)
+
+
+def executer(curseur, execute, sql: str, params):
+    """
+    Exécute une requête via execute(sql, params) en la comptant, et la chronomètre si elle est échantillonnée.
+
+    Le curseur garde la mesure (attribut _mesure) pour y ajouter les lignes lues par fetch*.
+    """
+    mesure = _mesure(sql)
+    mesure.appels += 1
+    if random.random() >= taux:
+        curseur._mesure = None
+        return execute(sql, params)
+
+    curseur._mesure = mesure
+    debut = time.perf_counter()
+    try:
+        return execute(sql, params)
+    finally:
+        mesure.enregistrer(time.perf_counter() - debut)
+        # Requête d'écriture: lignes touchées
+        if curseur.description is None and curseur.rowcount > 0:
+            mesure.lignes += curseur.rowcount
+
+
+def compter_lignes(curseur, lignes):
+    """Ajoute les lignes lues à la mesure de la dernière requête du curseur (si échantillonnée)."""
+    mesure = curseur._mesure
+    if mesure is not None and lignes:
+        mesure.lignes += len(lignes) if isinstance(lignes, list) else 1
+    return lignes
+
+
+class CurseurSQLite(sqlite3.Cursor):
+    """Curseur SQLite instrumenté (voir ConnexionSQLite.cursor). Les lignes sont comptées par fetch*."""
+
+    _mesure = None
+
+    def execute(self, sql, params=()):
+        return executer(self, super().execute, sql, params)
+
+    def executemany(self, sql, seq_params):
+        return executer(self, super().executemany, sql, seq_params)
+
+    def fetchone(self):
+        return compter_lignes(self, super().fetchone())
+
+    def fetchall(self):
+        return compter_lignes(self, super().fetchall())
+
+    def fetchmany(self, *args):
+        return compter_lignes(self, super().fetchmany(*args))
+
+
+# ==================== ACTIVATION ====================
+
+def activer(nouveau_taux: Optional[float] = None):
+    """Active l'instrumentation pour les prochains curseurs (taux d'échantillonnage entre 0 et 1)."""
+    global actif, taux
+    if nouveau_taux is not None:
+        taux = min(max(float(nouveau_taux), 0.0), 1.0)
+    actif = True
+
+
+def desactiver():
+    global actif
+    actif = False
+
+
+def reinitialiser():
+    """Remet les compteurs à zéro (chaque thread repart de zéro à sa prochaine requête)."""
+    global _generation
+    with _registre_lock:
+        _generation += 1
+        _threads.clear()
+        _cumul.clear()
+
+
+# ==================== RAPPORT ====================
+
+def _centile(histogramme: List[int], total: int, q: float) -> Optional[float]:
+    """Centile q (0-1) en millisecondes: centre géométrique de la classe qui le contient."""
+    if total == 0:
+        return None
+    rang = q * total
+    cumul = 0
+    for classe, n in enumerate(histogramme):
+        cumul += n
+        if cumul >= rang:
+            return 2 ** ((classe + 0.5) / CLASSES_PAR_OCTAVE) / 1000
+    return None
+
+
+def rapport(limite: Optional[int] = None) -> List[Dict]:
+    """
+    Statistiques par empreinte, de la plus coûteuse à la moins coûteuse.
+
+    Les durées et lignes totales sont estimées à partir de l'échantillon
+    (moyenne de l'échantillon x nombre d'appels).
+
+    Returns:
+        list: [{'empreinte', 'appels', 'echantillons', 'temps_total_ms', 'temps_moyen_ms',
+                'p50_ms', 'p95_ms', 'p99_ms', 'lignes_moyennes'}]
+    """
+    fusion: Dict[str, Mesure] = {}
+    with _registre_lock:
+        _recuperer_threads_termines()
+        sources = [_cumul] + [compteurs['par_empreinte'] for compteurs in _threads.values()]
+        for source in sources:
+            # Copie: les threads continuent d'écrire dans leurs compteurs pendant la lecture
+            for cle, mesure in list(source.items()):
+                fusion.setdefault(cle, Mesure()).fusionner(mesure)
+
+    lignes = []
+    for cle, mesure in fusion.items():
+        moyenne = mesure.duree / mesure.echantillons if mesure.echantillons else None
+        lignes.append({
+            'empreinte': cle,
+            'appels': mesure.appels,
+            'echantillons': mesure.echantillons,
+            'temps_total_ms': moyenne * mesure.appels * 1000 if moyenne is not None else None,
+            'temps_moyen_ms': moyenne * 1000 if moyenne is not None else None,
+            'p50_ms': _centile(mesure.histogramme, mesure.echantillons, 0.50),
+            'p95_ms': _centile(mesure.histogramme, mesure.echantillons, 0.95),
+            'p99_ms': _centile(mesure.histogramme, mesure.echantillons, 0.99),
+            'lignes_moyennes': mesure.lignes / mesure.echantillons if mesure.echantillons else None,
+        })
+    lignes.sort(key=lambda l: l['temps_total_ms'] or 0, reverse=True)
+    return lignes[:limite] if limite else lignes
+
+
+def exporter_json(chemin: str) -> int:
+    """Écrit le rapport dans un fichier JSON; retourne le nombre d'empreintes."""
+    lignes = rapport()
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump({'actif': actif, 'taux': taux, 'requetes': lignes}, f, ensure_ascii=False, indent=2)
+    return len(lignes)
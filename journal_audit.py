@@ -0,0 +1,315 @@
+# journal_audit.py - Journal d'audit en ajout seul, écrit par lots
+"""
+Traçabilité des actions (paiements, alertes traitées, mises à jour des tarifs...)
+sans ajouter un INSERT synchrone sur le chemin du guichet:
+- enregistrer() dépose l'entrée dans un tampon circulaire en mémoire
+- Un thread de fond la vide dans audit_log par lots, une transaction SQL par lot
+- Chaque entrée porte le hachage de la précédente (hash, hash_precedent): une
+  entrée modifiée ou supprimée après coup casse la chaîne (verifier_chaine)
+- rechercher() interroge une plage par agent et par date via les index
+  (agent_id, date_action) et (date_action)
+
+La tête de chaîne est dans audit_chaine (une ligne): chaque lot la verrouille en
+la mettant à jour en premier, si bien que deux processus ne forment jamais deux chaînes.
+Chaque entrée retient la base où l'action a eu lieu (db.DB_PATH au moment de
+enregistrer()): un changement de base avant le vidage ne la déplace pas.
+
+Usage:
+    python journal_audit.py --agent 3 --depuis 2025-01-15
+    python journal_audit.py --verifier
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import acces_donnees
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Tampon de 10 000 entrées; vidé dès 100 entrées ou au plus tard après 1 seconde
+CAPACITE = 10_000
+TAILLE_LOT = 100
+DELAI_VIDAGE = 1.0
+
+HASH_INITIAL = '0' * 64
+
+
+def hacher_entree(precedent: str, entree: Dict) -> str:
+    """Hachage d'une entrée chaînée à la précédente."""
+    contenu = json.dumps([entree['agent_id'], entree['action'], entree['table_concernee'],
+                          entree['details'], entree['date_action']],
+                         ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256((precedent + contenu).encode('utf-8')).hexdigest()
+
+
+# ==================== ÉCRITURE ====================
+
+class EcrivainAudit:
+    """
+    Tampon circulaire d'entrées d'audit, vidé dans audit_log par un thread de fond.
+
+    Un tampon plein est vidé par l'appelant lui-même (contre-pression). Si la base
+    est indisponible à ce moment, l'entrée la plus ancienne est perdue et comptée
+    dans stats['perdues'].
+    """
+
+    def __init__(self, capacite: int = CAPACITE, taille_lot: int = TAILLE_LOT,
+                 delai_vidage: float = DELAI_VIDAGE):
+        self.taille_lot = taille_lot
+        self.delai_vidage = delai_vidage
+        self._tampon = deque(maxlen=capacite)
+        self._lock = threading.Lock()
+        # Un seul vidage à la fois dans le processus (l'ordre du tampon est celui de la chaîne)
+        self._vidage_lock = threading.Lock()
+        self._reveil = threading.Event()
+        self._arret = threading.Event()
+        self.stats = {'ecrites': 0, 'perdues': 0, 'lots': 0, 'echecs': 0}
+        self._thread = threading.Thread(target=self._vider_periodiquement, name="ecrivain-audit", daemon=True)
+        self._thread.start()
+
+    def ecrire(self, entree: Dict):
+        if len(self._tampon) == self._tampon.maxlen:
+            self.vider()
+        with self._lock:
+            if len(self._tampon) == self._tampon.maxlen:
+                self.stats['perdues'] += 1
+            self._tampon.append(entree)
+            if len(self._tampon) >= self.taille_lot:
+                self._reveil.set()
+
+    def _vider_periodiquement(self):
+        while not self._arret.is_set():
+            self._reveil.wait(self.delai_vidage)
+            self._reveil.clear()
+            self.vider()
+
+    def vider(self):
+        """Écrit tout le tampon, lot par lot (s'arrête au premier échec)."""
+        with self._vidage_lock:
+            while True:
+                with self._lock:
+                    # Un lot ne mélange pas deux bases
+                    lot = []
+                    while (self._tampon and len(lot) < self.taille_lot
+                           and (not lot or self._tampon[0]['base'] == lot[0]['base'])):
+                        lot.append(self._tampon.popleft())
+                if not lot:
+                    return
+                try:
+                    _ecrire_lot(lot)
+                except Exception as e:
+                    self.stats['echecs'] += 1
+                    logger.error("Écriture du journal d'audit impossible (%d entrées en attente): %s",
+                                 len(lot) + len(self._tampon), e)
+                    with self._lock:
+                        # Remises en tête, dans l'ordre; au-delà de la capacité les plus anciennes sont perdues
+                        place = self._tampon.maxlen - len(self._tampon)
+                        self.stats['perdues'] += max(len(lot) - place, 0)
+                        self._tampon.extendleft(reversed(lot[len(lot) - place:] if place else []))
+                    return
+                self.stats['ecrites'] += len(lot)
+                self.stats['lots'] += 1
+
+    def en_attente(self) -> int:
+        return len(self._tampon)
+
+    def fermer(self):
+        self._arret.set()
+        self._reveil.set()
+        self.vider()
+
+
+def _ecrire_lot(lot: List[Dict]):
+    """Insère un lot chaîné dans audit_log de sa base et avance la tête de chaîne, en une transaction."""
+    conn = acces_donnees.get_connection(lot[0]['base'])
+    cursor = conn.cursor()
+    try:
+        # Mise à jour en premier: elle verrouille la tête de chaîne jusqu'au commit
+        cursor.execute("UPDATE audit_chaine SET nb_entrees = nb_entrees + ? WHERE id = 1", (len(lot),))
+        cursor.execute("SELECT dernier_hash FROM audit_chaine WHERE id = 1")
+        precedent = cursor.fetchone()[0]
+        lignes = []
+        for entree in lot:
+            courant = hacher_entree(precedent, entree)
+            lignes.append((entree['agent_id'], entree['action'], entree['table_concernee'], entree['details'],
+                           entree['date_action'], precedent, courant))
+            precedent = courant
+        cursor.executemany('''
+            INSERT INTO audit_log (agent_id, action, table_concernee, details, date_action, hash_precedent, hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', lignes)
+        cursor.execute("UPDATE audit_chaine SET dernier_hash = ? WHERE id = 1", (precedent,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+_ecrivain: Optional[EcrivainAudit] = None
+_ecrivain_lock = threading.Lock()
+
+
+def _get_ecrivain() -> EcrivainAudit:
+    global _ecrivain
+    if _ecrivain is None:
+        with _ecrivain_lock:
+            if _ecrivain is None:
+                _ecrivain = EcrivainAudit()
+                atexit.register(_ecrivain.fermer)
+    return _ecrivain
+
+
+def enregistrer(action: str, agent_id: int = None, table: str = None, details=None):
+    """
+    Ajoute une entrée au journal d'audit (écrite en base de façon asynchrone).
+
+    Args:
+        action: Code de l'action (ex: 'TRANSACTION_CREEE', 'ALERTE_TRAITEE')
+        agent_id: Agent à l'origine de l'action (None pour le système)
+        table: Table concernée
+        details: Texte ou dict (sérialisé en JSON)
+    """
+    import database_mairie as db  # import différé: database_mairie importe ce module
+
+    if details is not None and not isinstance(details, str):
+        details = json.dumps(details, ensure_ascii=False, separators=(',', ':'), default=str)
+    _get_ecrivain().ecrire({
+        'base': db.DB_PATH,
+        'agent_id': agent_id,
+        'action': action,
+        'table_concernee': table,
+        'details': details,
+        'date_action': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+def vider():
+    """Force l'écriture des entrées en attente."""
+    if _ecrivain is not None:
+        _ecrivain.vider()
+
+
+def stats_audit() -> Dict:
+    if _ecrivain is None:
+        return {'ecrites': 0, 'perdues': 0, 'lots': 0, 'echecs': 0, 'en_attente': 0}
+    return {**_ecrivain.stats, 'en_attente': _ecrivain.en_attente()}
+
+
+# ==================== LECTURE ====================
+
+def rechercher(agent_id: int = None, debut: str = None, fin: str = None, action: str = None,
+               table: str = None, limite: int = 1000) -> List[Dict]:
+    """
+    Entrées d'audit d'une plage, les plus récentes en premier.
+
+    Les entrées encore en mémoire sont écrites avant la lecture.
+
+    Args:
+        agent_id: Filtre par agent (index (agent_id, date_action))
+        debut: Date/heure minimale incluse ('YYYY-MM-DD' ou 'YYYY-MM-DD HH:MM:SS')
+        fin: Date/heure maximale exclue
+        action: Filtre par code d'action
+        table: Filtre par table concernée
+        limite: Nombre maximal d'entrées
+    """
+    import database_mairie as db
+
+    vider()
+    conditions, params = [], []
+    for colonne, operateur, valeur in (('agent_id', '=', agent_id), ('date_action', '>=', debut),
+                                       ('date_action', '<', fin), ('action', '=', action),
+                                       ('table_concernee', '=', table)):
+        if valeur is not None:
+            conditions.append(f"{colonne} {operateur} ?")
+            params.append(valeur)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = db.get_connection(lecture=True)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, agent_id, action, table_concernee, details, date_action
+        FROM audit_log
+        {where}
+        ORDER BY date_action DESC, id DESC
+        LIMIT {int(limite)}
+    ''', params)
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def verifier_chaine(taille_page: int = 10_000) -> Dict:
+    """
+    Recalcule la chaîne de tout le journal.
+
+    Returns:
+        dict: {'valide': bool, 'nb_entrees': int, 'rupture_id': id de la première entrée invalide ou None}
+    """
+    import database_mairie as db
+
+    vider()
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    precedent = HASH_INITIAL
+    nb = 0
+    dernier_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, agent_id, action, table_concernee, details, date_action, hash_precedent, hash
+            FROM audit_log WHERE id > ? AND hash IS NOT NULL ORDER BY id LIMIT ?
+        ''', (dernier_id, taille_page))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for row in rows:
+            if row['hash_precedent'] != precedent or hacher_entree(precedent, row) != row['hash']:
+                conn.close()
+                return {'valide': False, 'nb_entrees': nb, 'rupture_id': row['id']}
+            precedent = row['hash']
+            nb += 1
+        dernier_id = rows[-1]['id']
+    cursor.execute("SELECT dernier_hash FROM audit_chaine WHERE id = 1")
+    tete = cursor.fetchone()[0]
+    conn.close()
+    # Entrées supprimées en fin de journal: la tête ne correspond plus à la dernière entrée
+    if tete != precedent:
+        return {'valide': False, 'nb_entrees': nb, 'rupture_id': None}
+    return {'valide': True, 'nb_entrees': nb, 'rupture_id': None}
+
+
+# ==================== CLI ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultation du journal d'audit")
+    parser.add_argument('--agent', type=int, help="ID de l'agent")
+    parser.add_argument('--depuis', help="Date minimale (YYYY-MM-DD[ HH:MM:SS])")
+    parser.add_argument('--jusqu', help="Date maximale exclue")
+    parser.add_argument('--action', help="Code d'action")
+    parser.add_argument('--limite', type=int, default=50)
+    parser.add_argument('--verifier', action='store_true', help="Vérifie la chaîne de hachage")
+    args = parser.parse_args()
+
+    if args.verifier:
+        debut = time.perf_counter()
+        resultat = verifier_chaine()
+        etat = "✅ Chaîne intacte" if resultat['valide'] else f"❌ Chaîne rompue (entrée {resultat['rupture_id']})"
+        print(f"{etat}: {resultat['nb_entrees']:,} entrées vérifiées en {time.perf_counter() - debut:.2f}s")
+        return
+
+    for entree in rechercher(args.agent, args.depuis, args.jusqu, args.action, limite=args.limite):
+        print(f"{entree['date_action']}  agent={entree['agent_id']}  {entree['action']:<22} "
+              f"{entree['table_concernee'] or '':<16} {entree['details'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
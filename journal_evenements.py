@@ -0,0 +1,271 @@
+# journal_evenements.py - Journal structuré des événements métier (JSON lines)
+"""
+Flux d'événements structurés, à côté du log texte:
+- Une ligne JSON par événement, un schéma fixe par type d'événement
+  (transaction, alerte, surveillance, migration_lot)
+- Écriture tamponnée (vidée par taille de tampon ou après un délai) et rotation
+  du fichier par taille ou par âge, avec un nombre d'archives borné
+- Lecteur qui agrège les événements par minute: débit et taux d'anomalies
+  sans interroger la base
+
+Usage:
+    python journal_evenements.py
+    python journal_evenements.py --depuis 2025-01-15T08:00 --evenement transaction
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from logger import LOG_DIR, get_logger
+
+logger = get_logger(__name__)
+
+DOSSIER_EVENEMENTS = os.path.join(LOG_DIR, "evenements")
+NOM_FICHIER = "evenements.jsonl"
+
+# Rotation: 5 Mo ou 24 h par fichier, 10 archives conservées
+TAILLE_MAX_FICHIER = 5_000_000
+DUREE_MAX_FICHIER = 24 * 3600
+NB_ARCHIVES = 10
+
+# Tampon vidé à 200 événements ou au plus tard après 2 secondes
+TAILLE_TAMPON = 200
+DELAI_VIDAGE = 2.0
+
+# Type d'événement -> champs attendus (en plus de 'evenement' et 'ts')
+SCHEMAS = {
+    'transaction': ('id', 'type', 'libelle', 'montant', 'mode_paiement', 'marche_id', 'agent_id'),
+    'alerte': ('id', 'type', 'niveau', 'titre', 'montant'),
+    'surveillance': ('anomalies', 'patterns', 'duree_ms'),
+    'migration_lot': ('table', 'index', 'lignes', 'erreurs', 'duree_ms'),
+}
+
+# Agrégation par minute: champs numériques sommés et champ dont on compte les valeurs
+CHAMPS_SOMMES = {
+    'transaction': ('montant',),
+    'alerte': ('montant',),
+    'surveillance': ('anomalies', 'patterns', 'duree_ms'),
+    'migration_lot': ('lignes', 'erreurs', 'duree_ms'),
+}
+CHAMP_REPARTITION = {
+    'transaction': 'type',
+    'alerte': 'niveau',
+    'migration_lot': 'table',
+}
+
+
+# ==================== ÉCRITURE ====================
+
+class EcrivainEvenements:
+    """
+    Écrit des événements JSON lines avec tampon et rotation.
+
+    Un thread de fond vide le tampon toutes les delai_vidage secondes, pour
+    qu'un événement isolé ne reste pas en mémoire; vider() et fermer() forcent l'écriture.
+    """
+
+    def __init__(self, dossier: str = DOSSIER_EVENEMENTS, nom: str = NOM_FICHIER,
+                 taille_max: int = TAILLE_MAX_FICHIER, duree_max: float = DUREE_MAX_FICHIER,
+                 nb_archives: int = NB_ARCHIVES, taille_tampon: int = TAILLE_TAMPON,
+                 delai_vidage: float = DELAI_VIDAGE):
+        os.makedirs(dossier, exist_ok=True)
+        self.dossier = dossier
+        self.chemin = os.path.join(dossier, nom)
+        self.taille_max = taille_max
+        self.duree_max = duree_max
+        self.nb_archives = nb_archives
+        self.taille_tampon = taille_tampon
+        self.delai_vidage = delai_vidage
+
+        self._tampon: List[str] = []
+        self._lock = threading.Lock()
+        self._ouvert_le = self._debut_fichier()
+        self._arret = threading.Event()
+        self._thread = threading.Thread(target=self._vider_periodiquement, name="ecrivain-evenements", daemon=True)
+        self._thread.start()
+
+    def _debut_fichier(self) -> Optional[float]:
+        """Horodatage du premier événement du fichier courant (None s'il est vide)."""
+        try:
+            with open(self.chemin, encoding='utf-8') as f:
+                premiere = f.readline()
+            return datetime.fromisoformat(json.loads(premiere)['ts']).timestamp()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def ecrire(self, evenement: Dict):
+        ligne = json.dumps(evenement, ensure_ascii=False, default=str)
+        with self._lock:
+            self._tampon.append(ligne)
+            if len(self._tampon) >= self.taille_tampon:
+                self._vider()
+
+    def vider(self):
+        with self._lock:
+            self._vider()
+
+    def _vider(self):
+        if not self._tampon:
+            return
+        donnees = "\n".join(self._tampon) + "\n"
+        self._tampon = []
+        try:
+            if self._doit_tourner(len(donnees.encode('utf-8'))):
+                self._faire_tourner()
+            with open(self.chemin, 'a', encoding='utf-8') as f:
+                f.write(donnees)
+            if self._ouvert_le is None:
+                self._ouvert_le = time.time()
+        except OSError as e:
+            logger.error("Écriture du journal d'événements impossible: %s", e)
+
+    def _doit_tourner(self, taille_ajout: int) -> bool:
+        if self._ouvert_le is None:
+            return False
+        if time.time() - self._ouvert_le >= self.duree_max:
+            return True
+        try:
+            return os.path.getsize(self.chemin) + taille_ajout > self.taille_max
+        except OSError:
+            return False
+
+    def _faire_tourner(self):
+        """Archive le fichier courant (suffixe horodaté) et supprime les archives en trop."""
+        base, extension = os.path.splitext(self.chemin)
+        archive = f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{extension}"
+        os.replace(self.chemin, archive)
+        self._ouvert_le = None
+        for ancienne in archives(self.dossier, os.path.basename(self.chemin))[:-self.nb_archives or None]:
+            os.remove(ancienne)
+
+    def _vider_periodiquement(self):
+        while not self._arret.wait(self.delai_vidage):
+            self.vider()
+
+    def fermer(self):
+        self._arret.set()
+        self.vider()
+
+
+def archives(dossier: str = DOSSIER_EVENEMENTS, nom: str = NOM_FICHIER) -> List[str]:
+    """Fichiers archivés, du plus ancien au plus récent."""
+    base, extension = os.path.splitext(nom)
+    return sorted(glob.glob(os.path.join(dossier, f"{base}-*{extension}")))
+
+
+_ecrivain: Optional[EcrivainEvenements] = None
+_ecrivain_lock = threading.Lock()
+
+
+def _get_ecrivain() -> EcrivainEvenements:
+    global _ecrivain
+    if _ecrivain is None:
+        with _ecrivain_lock:
+            if _ecrivain is None:
+                _ecrivain = EcrivainEvenements()
+                atexit.register(_ecrivain.fermer)
+    return _ecrivain
+
+
+def emettre(evenement: str, **champs):
+    """
+    Ajoute un événement au journal.
+
+    Args:
+        evenement: Type d'événement (clé de SCHEMAS)
+        **champs: Exactement les champs du schéma de ce type
+
+    Raises:
+        ValueError: Type inconnu, champ manquant ou inattendu
+    """
+    schema = SCHEMAS.get(evenement)
+    if schema is None:
+        raise ValueError(f"Type d'événement inconnu: {evenement}")
+    if len(champs) != len(schema) or any(champ not in champs for champ in schema):
+        raise ValueError(f"Champs de l'événement {evenement}: attendus {schema}, reçus {tuple(champs)}")
+    _get_ecrivain().ecrire({'evenement': evenement, 'ts': datetime.now().isoformat(timespec='milliseconds'), **champs})
+
+
+# ==================== LECTURE ET AGRÉGATION ====================
+
+def lire_evenements(dossier: str = DOSSIER_EVENEMENTS, depuis: str = None,
+                    evenement: str = None) -> Iterator[Dict]:
+    """
+    Parcourt les événements des archives puis du fichier courant, dans l'ordre d'écriture.
+
+    Args:
+        depuis: Horodatage ISO minimal (comparaison de chaînes, ex. '2025-01-15T08:00')
+        evenement: Ne garder qu'un type d'événement
+
+    Les lignes illisibles (fichier tronqué par un arrêt brutal) sont ignorées.
+    """
+    for chemin in archives(dossier) + [os.path.join(dossier, NOM_FICHIER)]:
+        if not os.path.exists(chemin):
+            continue
+        with open(chemin, encoding='utf-8') as f:
+            for ligne in f:
+                try:
+                    evt = json.loads(ligne)
+                except ValueError:
+                    continue
+                if depuis and evt.get('ts', '') < depuis:
+                    continue
+                if evenement and evt.get('evenement') != evenement:
+                    continue
+                yield evt
+
+
+def agreger_par_minute(evenements: Iterable[Dict]) -> List[Dict]:
+    """
+    Agrège les événements par minute et par type.
+
+    Returns:
+        list: [{'minute', 'evenement', 'nombre', <sommes de CHAMPS_SOMMES>,
+                'repartition': {valeur de CHAMP_REPARTITION: nombre}}] triés par minute
+    """
+    agregats: Dict[tuple, Dict] = {}
+    for evt in evenements:
+        type_evt = evt.get('evenement')
+        cle = (evt.get('ts', '')[:16], type_evt)
+        ligne = agregats.get(cle)
+        if ligne is None:
+            ligne = agregats[cle] = {'minute': cle[0], 'evenement': type_evt, 'nombre': 0,
+                                     **{champ: 0 for champ in CHAMPS_SOMMES.get(type_evt, ())},
+                                     'repartition': {}}
+        ligne['nombre'] += 1
+        for champ in CHAMPS_SOMMES.get(type_evt, ()):
+            ligne[champ] += evt.get(champ) or 0
+        champ = CHAMP_REPARTITION.get(type_evt)
+        if champ:
+            valeur = evt.get(champ)
+            ligne['repartition'][valeur] = ligne['repartition'].get(valeur, 0) + 1
+    return [agregats[cle] for cle in sorted(agregats)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégats par minute du journal d'événements")
+    parser.add_argument('--dossier', default=DOSSIER_EVENEMENTS)
+    parser.add_argument('--depuis', help="Horodatage ISO minimal, ex. 2025-01-15T08:00")
+    parser.add_argument('--evenement', choices=sorted(SCHEMAS))
+    args = parser.parse_args()
+
+    lignes = agreger_par_minute(lire_evenements(args.dossier, args.depuis, args.evenement))
+    if not lignes:
+        print("Aucun événement.")
+        return
+    for ligne in lignes:
+        mesures = " ".join(f"{champ}={ligne[champ]:,.0f}" for champ in CHAMPS_SOMMES.get(ligne['evenement'], ()))
+        repartition = ", ".join(f"{valeur}: {n}" for valeur, n in ligne['repartition'].items())
+        print(f"{ligne['minute']}  {ligne['evenement']:<14} {ligne['nombre']:>6}  {mesures}"
+              + (f"  [{repartition}]" if repartition else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
 # logger.py - Système de logging centralisé
+"""
+Journalisation non bloquante:
+- Les loggers ne font que déposer l'enregistrement dans une file bornée (QueueHandler)
+- Un unique thread d'écriture (QueueListener) formate et écrit console + fichier
+- File pleine: le message est abandonné et compté (jamais d'attente côté appelant)
+- Formatage paresseux: logger.info("... %s", valeur) n'est formaté que s'il est écrit;
+  un argument mutable (dict, liste, objet) est formaté dès l'appel, tel qu'il est alors
+- Après arreter_journalisation(), les messages sont écrits directement (synchrone)
 
+Micro-benchmark du coût par appel (synchrone vs file): python logger.py
+"""
+
+import atexit
+import io
 import logging
+import numbers
 import os
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+import queue
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, time as heure, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Créer le dossier logs s'il n'existe pas
 LOGS_DIR = os.path.join(os.path.dirname(__file__), "logs")
@@ -13,26 +32,150 @@ LOG_DIR = "logs"
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Capacité de la file d'attente (au-delà, les messages sont perdus et comptés)
+TAILLE_FILE = 10000
+
+FORMAT_CONSOLE = logging.Formatter('%(asctime)s | %(levelname)-8s | %(name)s | %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+FORMAT_FICHIER = logging.Formatter('%(asctime)s | %(levelname)-8s | %(name)s | %(message)s')
+
+# Arguments de log qui ne peuvent pas changer entre l'appel et l'écriture
+IMMUABLES = (str, bytes, numbers.Number, type(None), date, heure, timedelta)
+
+
+# ==================== FILE D'ATTENTE ====================
+
+class QueueHandlerBorne(QueueHandler):
+    """
+    Dépose les enregistrements dans une file bornée sans jamais bloquer.
+
+    Le message n'est pas formaté ici (contrairement à QueueHandler.prepare):
+    la file reste dans le processus, le thread d'écriture s'en charge. Seuls
+    les arguments mutables et la trace d'exception sont figés dès l'appel.
+    Une fois le thread d'écriture arrêté, repli contient ses handlers et les
+    messages y sont écrits directement.
+    """
+
+    def __init__(self, file_attente: queue.Queue):
+        super().__init__(file_attente)
+        self.perdus = 0
+        self._lock_perdus = threading.Lock()
+        self.repli = None
+
+    def prepare(self, record):
+        if record.args and not (isinstance(record.args, tuple) and all(isinstance(a, IMMUABLES) for a in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = FORMAT_FICHIER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        repli = self.repli
+        if repli is not None:
+            _ecrire_direct(repli, record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_perdus:
+                self.perdus += 1
+
+
+def _ecrire_direct(handlers, record):
+    for handler in handlers:
+        if record.levelno >= handler.level:
+            handler.handle(record)
+
+
+def _handlers_sortie(dossier: str = LOG_DIR, console=None):
+    """Handlers réels (console INFO, fichier tournant DEBUG), utilisés par le thread d'écriture."""
+    c_handler = logging.StreamHandler(console)
+    c_handler.setLevel(logging.INFO)
+    c_handler.setFormatter(FORMAT_CONSOLE)
+
+    # Fichier ouvert au premier message écrit (pas de app.log vide)
+    f_handler = RotatingFileHandler(os.path.join(dossier, 'app.log'), maxBytes=1000000, backupCount=5,
+                                    encoding='utf-8', delay=True)
+    f_handler.setLevel(logging.DEBUG)
+    f_handler.setFormatter(FORMAT_FICHIER)
+    return c_handler, f_handler
+
+
+_file_attente = queue.Queue(maxsize=TAILLE_FILE)
+_queue_handler = QueueHandlerBorne(_file_attente)
+_ecrivain = None
+_ecrivain_lock = threading.Lock()
+
+
+def _demarrer_ecrivain(dossier: str = LOG_DIR):
+    """Démarre le thread d'écriture à la première demande de logger."""
+    global _ecrivain
+    with _ecrivain_lock:
+        # Arrêté explicitement: pas de redémarrage implicite (messages écrits via repli)
+        if _ecrivain is None and _queue_handler.repli is None:
+            _ecrivain = QueueListener(_file_attente, *_handlers_sortie(dossier), respect_handler_level=True)
+            _ecrivain.start()
+            atexit.unregister(arreter_journalisation)
+            atexit.register(arreter_journalisation)
+
+
+def arreter_journalisation():
+    """
+    Vide la file puis arrête le thread d'écriture (appelé automatiquement à la sortie).
+
+    Les messages émis ensuite sont écrits directement par les mêmes handlers,
+    fermés par logging.shutdown() à la sortie du processus.
+    """
+    global _ecrivain
+    with _ecrivain_lock:
+        if _ecrivain is None:
+            return
+        _ecrivain.stop()
+        handlers = _ecrivain.handlers
+        if _queue_handler.perdus:
+            _ecrire_direct(handlers, logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': "%d message(s) de log perdu(s), file d'attente pleine",
+                'args': (_queue_handler.perdus,),
+            }))
+        _queue_handler.repli = handlers
+        # Messages déposés entre l'arrêt du thread et la bascule
+        while True:
+            try:
+                record = _file_attente.get_nowait()
+            except queue.Empty:
+                break
+            if record is not None:
+                _ecrire_direct(handlers, record)
+        _ecrivain = None
+
+
+def rediriger_journalisation(dossier: str):
+    """Écrit désormais app.log dans dossier (tests, outils qui ne doivent pas toucher logs/)."""
+    os.makedirs(dossier, exist_ok=True)
+    arreter_journalisation()
+    with _ecrivain_lock:
+        anciens, _queue_handler.repli = _queue_handler.repli, None
+    for handler in anciens or ():
+        handler.close()
+    _demarrer_ecrivain(dossier)
+
+
+def stats_journalisation() -> dict:
+    """Messages en attente d'écriture et messages perdus depuis le démarrage."""
+    return {'en_attente': _file_attente.qsize(), 'capacite': TAILLE_FILE, 'perdus': _queue_handler.perdus}
+
+
 def get_logger(name):
     """Récupère un logger configuré."""
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
     if not logger.handlers:
-        # 1. Console Handler
-        c_handler = logging.StreamHandler()
-        c_handler.setLevel(logging.INFO)
-        c_format = logging.Formatter('%(asctime)s | %(levelname)-8s | %(name)s | %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-        c_handler.setFormatter(c_format)
-        logger.addHandler(c_handler)
-
-        # 2. File Handler
-        f_handler = RotatingFileHandler(os.path.join(LOG_DIR, 'app.log'), maxBytes=1000000, backupCount=5)
-        f_handler.setLevel(logging.DEBUG)
-        f_format = logging.Formatter('%(asctime)s | %(levelname)-8s | %(name)s | %(message)s')
-        f_handler.setFormatter(f_format)
-        logger.addHandler(f_handler)# 
-#
+        _demarrer_ecrivain()
+        logger.addHandler(_queue_handler)
+
     return logger
 
 
@@ -42,24 +185,74 @@ main_logger = get_logger("iot_blockchain")
 
 def log_transaction(tx_type: str, details: dict):
     """Log une transaction avec ses détails."""
-    main_logger.info(f"[TRANSACTION] Type: {tx_type} | Détails: {details}")
+    main_logger.info("[TRANSACTION] Type: %s | Détails: %s", tx_type, details)
 
 
 def log_alert(matiere: str, quantite: int):
     """Log une alerte de stock critique."""
-    main_logger.warning(f"[ALERTE] Stock critique - Matière: {matiere}, Quantité: {quantite}")
+    main_logger.warning("[ALERTE] Stock critique - Matière: %s, Quantité: %s", matiere, quantite)
 
 
 def log_mqtt_message(topic: str, payload: str):
     """Log un message MQTT reçu."""
-    main_logger.debug(f"[MQTT] Topic: {topic} | Payload: {payload}")
+    main_logger.debug("[MQTT] Topic: %s | Payload: %s", topic, payload)
 
 
 def log_hedera_publish(topic_id: str, tx_id: str):
     """Log une publication Hedera."""
-    main_logger.info(f"[HEDERA] Topic: {topic_id} | Transaction: {tx_id}")
+    main_logger.info("[HEDERA] Topic: %s | Transaction: %s", topic_id, tx_id)
 
 
 def log_error(context: str, error: Exception):
     """Log une erreur avec le contexte."""
-    main_logger.error(f"[ERREUR] {context}: {str(error)}", exc_info=True)
\ No newline at end of file
+    main_logger.error("[ERREUR] %s: %s", context, error, exc_info=True)
+
+
+# ==================== MICRO-BENCHMARK ====================
+
+def mesurer_cout_par_appel(n: int = 20000) -> dict:
+    """
+    Coût moyen d'un logger.info côté appelant (µs), handlers synchrones puis file d'attente.
+
+    Les deux configurations écrivent dans un dossier temporaire, la console vers un tampon
+    mémoire; le temps de vidage de la file n'est pas compté (il se fait hors du thread appelant).
+    """
+    resultats = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        for mode in ('synchrone', 'file'):
+            bench = logging.getLogger(f"bench_journal.{mode}")
+            bench.propagate = False
+            bench.setLevel(logging.DEBUG)
+            handlers = _handlers_sortie(dossier, io.StringIO())
+            ecrivain = None
+            if mode == 'synchrone':
+                for handler in handlers:
+                    bench.addHandler(handler)
+            else:
+                file_bench = queue.Queue(maxsize=n + 1)
+                bench.addHandler(QueueHandlerBorne(file_bench))
+                ecrivain = QueueListener(file_bench, *handlers, respect_handler_level=True)
+                ecrivain.start()
+
+            debut = time.perf_counter()
+            for i in range(n):
+                bench.info("Transaction créée: %s - %s FCFA", f"Taxe {i}", 1000 + i)
+            duree = time.perf_counter() - debut
+
+            if ecrivain is not None:
+                ecrivain.stop()
+            for handler in list(bench.handlers):
+                bench.removeHandler(handler)
+            for handler in handlers:
+                handler.close()
+            resultats[mode] = duree / n * 1e6
+    return resultats
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    couts = mesurer_cout_par_appel(n)
+    print(f"Coût par appel logger.info ({n:,} appels):")
+    for mode, cout in couts.items():
+        print(f"  - {mode:<10}: {cout:6.1f} µs")
+    print(f"  Gain: x{couts['synchrone'] / couts['file']:.1f}")
@@ -0,0 +1,112 @@
+# metriques_partagees.py - Instantané des métriques partagé par toutes les sessions
+"""
+Service de métriques commun à tout le processus Streamlit:
+- Un seul thread de fond recalcule les KPI (db.get_statistics) à cadence fixe
+- Le résultat est publié dans un instantané immuable
+- Toutes les sessions navigateur lisent ce même instantané au lieu de relancer les requêtes
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional
+
+import database_mairie as db
+from config_helper import get_config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cadence de rafraîchissement par défaut (secondes)
+INTERVALLE_DEFAUT = float(get_config('METRIQUES_INTERVALLE', 'dashboard', 5))
+
+
+@dataclass(frozen=True)
+class MetricsSnapshot:
+    """Instantané immuable des KPI, avec l'horodatage de son calcul."""
+    stats: Mapping[str, Any]
+    calcule_le: float
+    duree_calcul: float
+
+    @property
+    def age(self) -> float:
+        """Âge des données en secondes (fraîcheur réelle, pas l'heure d'affichage)."""
+        return max(0.0, time.time() - self.calcule_le)
+
+
+class MetricsSnapshotService:
+    """Calcule périodiquement les KPI dans un thread unique et publie un instantané."""
+
+    def __init__(self, calcul: Callable[[], dict] = db.get_statistics,
+                 intervalle: float = INTERVALLE_DEFAUT):
+        self.calcul = calcul
+        self.intervalle = intervalle
+        self._snapshot: Optional[MetricsSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Démarre le thread de rafraîchissement (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metriques-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Arrête le thread de rafraîchissement."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.intervalle + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.intervalle)
+
+    def refresh(self) -> Optional[MetricsSnapshot]:
+        """Recalcule les KPI et remplace l'instantané publié (l'ancien reste valide en cas d'erreur)."""
+        with self._refresh_lock:
+            debut = time.perf_counter()
+            try:
+                stats = self.calcul()
+            except Exception as e:
+                logger.error(f"Erreur calcul des métriques partagées: {e}")
+                return self._snapshot
+            # Remplacement atomique de la référence: les lecteurs ne voient jamais d'état partiel
+            self._snapshot = MetricsSnapshot(
+                stats=MappingProxyType(dict(stats)),
+                calcule_le=time.time(),
+                duree_calcul=time.perf_counter() - debut
+            )
+            return self._snapshot
+
+    def get_snapshot(self) -> Optional[MetricsSnapshot]:
+        """Retourne le dernier instantané (calculé de façon synchrone s'il n'existe pas encore)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+
+# Instance unique pour tout le processus
+_service: Optional[MetricsSnapshotService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> MetricsSnapshotService:
+    """Retourne le service partagé, démarré au premier appel."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MetricsSnapshotService()
+            _service.start()
+            logger.info(f"Service de métriques partagées démarré (toutes les {_service.intervalle:.0f}s)")
+        return _service
+
+
+def get_snapshot() -> Optional[MetricsSnapshot]:
+    """Raccourci: dernier instantané des métriques partagées."""
+    return get_service().get_snapshot()
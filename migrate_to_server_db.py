@@ -2,11 +2,25 @@
 """
 Script de migration de SQLite vers PostgreSQL/MySQL
 Pour déployer la base de données sur un serveur.
+
+Les données sont lues en flux et écrites dans un format d'import en masse:
+- PostgreSQL: blocs COPY ... FROM stdin (par défaut) ou INSERT multi-lignes
+- MySQL: INSERT multi-lignes (par défaut) ou fichiers TSV chargés par LOAD DATA
+
+Usage:
+    python migrate_to_server_db.py [--format insert|copy|tsv] [--lot 1000]
+    python migrate_to_server_db.py --verifier   # aller-retour local, sans serveur
 """
 
+import argparse
+import re
 import sqlite3
 import os
 import sys
+import time
+from datetime import datetime
+
+import acces_donnees
 
 def check_dependencies():
     """Vérifie les dépendances nécessaires."""
@@ -33,11 +47,11 @@ def check_dependencies():
     return has_postgres, has_mysql
 
 
-def export_sqlite_schema():
+def export_sqlite_schema(source='mairie.db'):
     """Exporte le schéma SQLite."""
     print("\n[EXPORT] Exportation du schema SQLite...")
 
-    conn = sqlite3.connect('mairie.db')
+    conn = sqlite3.connect(source)
     cursor = conn.cursor()
 
     # Récupérer toutes les tables
@@ -57,134 +71,330 @@ def export_sqlite_schema():
 
 
 def convert_schema_to_postgresql(sqlite_schema):
-    """Convertit le schéma SQLite en PostgreSQL."""
+    """
+    Convertit le schéma SQLite en PostgreSQL.
+
+    Même traduction que celle de l'application (acces_donnees): la base importée
+    a les types que database_mairie crée et attend (booléens en SMALLINT...).
+    """
     print("\n[CONVERT] Conversion du schema pour PostgreSQL...")
 
+    dialecte = acces_donnees.DIALECTES['postgresql']
     pg_schema = {}
 
     for table_name, create_sql in sqlite_schema.items():
-        # Remplacements de base
-        pg_sql = create_sql
-
-        # SQLite -> PostgreSQL conversions
-        pg_sql = pg_sql.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'SERIAL PRIMARY KEY')
-        pg_sql = pg_sql.replace('AUTOINCREMENT', '')
-        pg_sql = pg_sql.replace('DATETIME', 'TIMESTAMP')
-        pg_sql = pg_sql.replace('REAL', 'NUMERIC')
-        pg_sql = pg_sql.replace('BOOLEAN', 'BOOLEAN')
-        pg_sql = pg_sql.replace('VARCHAR', 'VARCHAR')
-
-        pg_schema[table_name] = pg_sql
+        pg_schema[table_name] = dialecte.traduire_ddl(create_sql)
         print(f"  [OK] Converti: {table_name}")
 
     return pg_schema
 
 
 def convert_schema_to_mysql(sqlite_schema):
-    """Convertit le schéma SQLite en MySQL."""
+    """Convertit le schéma SQLite en MySQL (traduction de l'application, voir acces_donnees)."""
     print("\n[CONVERT] Conversion du schema pour MySQL...")
 
+    dialecte = acces_donnees.DIALECTES['mysql']
     mysql_schema = {}
 
     for table_name, create_sql in sqlite_schema.items():
-        # Remplacements de base
-        mysql_sql = create_sql
-
-        # SQLite -> MySQL conversions
-        mysql_sql = mysql_sql.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'INT PRIMARY KEY AUTO_INCREMENT')
-        mysql_sql = mysql_sql.replace('AUTOINCREMENT', 'AUTO_INCREMENT')
-        mysql_sql = mysql_sql.replace('DATETIME', 'TIMESTAMP')
-        mysql_sql = mysql_sql.replace('REAL', 'DECIMAL(10,2)')
-        mysql_sql = mysql_sql.replace('BOOLEAN', 'TINYINT(1)')
-
-        # Ajouter ENGINE=InnoDB
-        if not mysql_sql.strip().endswith(';'):
-            mysql_sql += ';'
-        mysql_sql = mysql_sql.replace(';', ' ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;')
-
-        mysql_schema[table_name] = mysql_sql
+        mysql_sql = dialecte.traduire_ddl(create_sql).rstrip().rstrip(';')
+        mysql_schema[table_name] = f"{mysql_sql} ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;"
         print(f"  [OK] Converti: {table_name}")
 
     return mysql_schema
 
 
-def export_data_from_sqlite():
-    """Exporte toutes les données de SQLite."""
-    print("\n[EXPORT] Exportation des donnees SQLite...")
+# ==================== EXPORT DES DONNÉES (FLUX) ====================
 
-    conn = sqlite3.connect('mairie.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+# Formats d'import en masse
+FORMATS = ('insert', 'copy', 'tsv')
+FORMAT_DEFAUT = {'postgresql': 'copy', 'mysql': 'insert'}
 
-    # Récupérer toutes les tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-    tables = [t[0] for t in cursor.fetchall()]
+# Lignes par lecture SQLite et par INSERT multi-lignes
+TAILLE_LOT = 1000
 
-    data = {}
-    total_rows = 0
+# Délimiteurs des sections schéma et données (relues par la vérification aller-retour)
+DEBUT_SCHEMA = "-- SCHEMA"
+DEBUT_DONNEES = "-- DATA"
+FIN_DONNEES = "-- FIN DATA"
 
-    for table in tables:
-        cursor.execute(f"SELECT * FROM {table}")
-        rows = cursor.fetchall()
-        data[table] = [dict(row) for row in rows]
-        total_rows += len(rows)
-        print(f"  [OK] {table}: {len(rows)} lignes")
 
-    conn.close()
-    print(f"\n  [TOTAL] {total_rows} lignes exportees")
-    return data
+def iterer_donnees_sqlite(source='mairie.db', taille_lot=TAILLE_LOT):
+    """
+    Parcourt les données SQLite table par table, par lots (fetchmany), sans tout charger en mémoire.
 
+    Yields:
+        tuple: (table, colonnes, itérateur de lots de tuples)
+    """
+    conn = sqlite3.connect(source)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+    tables = [t[0] for t in cursor.fetchall()]
 
-def generate_sql_export_file(schema, data, db_type='postgresql'):
-    """Génère un fichier SQL d'export."""
-    print(f"\n[GENERATE] Generation du fichier SQL pour {db_type}...")
+    def lots(cursor):
+        while True:
+            lot = cursor.fetchmany(taille_lot)
+            if not lot:
+                return
+            yield lot
 
-    filename = f'export_{db_type}.sql'
+    try:
+        for table in tables:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT * FROM "{table}"')
+            colonnes = [d[0] for d in cursor.description]
+            yield table, colonnes, lots(cursor)
+    finally:
+        conn.close()
+
+
+def litteral_sql(valeur):
+    """
+    Littéral SQL standard d'une valeur.
+
+    Les apostrophes sont doublées et les antislashs laissés tels quels: le fichier MySQL
+    active NO_BACKSLASH_ESCAPES pour que le même littéral soit valable partout.
+    """
+    if valeur is None:
+        return 'NULL'
+    if isinstance(valeur, bool):
+        return '1' if valeur else '0'
+    if isinstance(valeur, int):
+        return str(valeur)
+    if isinstance(valeur, float):
+        return repr(valeur)
+    texte = str(valeur).replace("'", "''")
+    return f"'{texte}'"
+
+
+def champ_texte(valeur):
+    """
+    Champ au format texte de COPY (PostgreSQL) et de LOAD DATA (MySQL, options par défaut):
+    NULL vaut \\N, antislash, tabulation et fins de ligne sont échappés.
+    """
+    if valeur is None:
+        return '\\N'
+    if isinstance(valeur, bool):
+        texte = '1' if valeur else '0'
+    elif isinstance(valeur, float):
+        texte = repr(valeur)
+    else:
+        texte = str(valeur)
+    return (texte.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+_ECHAPPEMENTS = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+
+
+def lire_champ_texte(champ):
+    """Inverse de champ_texte."""
+    if champ == '\\N':
+        return None
+    return re.sub(r'\\(.)', lambda m: _ECHAPPEMENTS.get(m.group(1), m.group(1)), champ)
+
+
+def _ligne_texte(ligne):
+    return '\t'.join(champ_texte(v) for v in ligne) + '\n'
+
+
+def _reinitialiser_sequences(f, schema):
+    """Recale les séquences SERIAL après l'import d'identifiants explicites (PostgreSQL)."""
+    for table_name, create_sql in schema.items():
+        m = re.search(r'(\w+)\s+SERIAL PRIMARY KEY', create_sql)
+        if m:
+            colonne = m.group(1)
+            f.write(f"SELECT setval(pg_get_serial_sequence('{table_name}', '{colonne}'), "
+                    f"COALESCE((SELECT MAX({colonne}) FROM {table_name}), 0) + 1, false);\n")
+
+
+def generate_sql_export_file(schema, db_type='postgresql', mode=None, source='mairie.db',
+                             taille_lot=TAILLE_LOT, dossier='.'):
+    """
+    Génère un fichier SQL d'export, en lisant SQLite en flux.
+
+    Args:
+        schema: {table: CREATE TABLE} converti pour db_type
+        db_type: 'postgresql' ou 'mysql'
+        mode: 'insert' (INSERT multi-lignes), 'copy' (COPY ... FROM stdin, PostgreSQL)
+              ou 'tsv' (un fichier par table chargé par LOAD DATA, MySQL)
+        source: Base SQLite
+        taille_lot: Lignes par INSERT
+        dossier: Dossier de sortie
+
+    Returns:
+        str: Chemin du fichier généré
+    """
+    mode = mode or FORMAT_DEFAUT[db_type]
+    if mode == 'copy' and db_type != 'postgresql':
+        raise ValueError("Le format COPY n'existe que pour PostgreSQL")
+    if mode == 'tsv' and db_type != 'mysql':
+        raise ValueError("Le format TSV (LOAD DATA) n'existe que pour MySQL")
+
+    print(f"\n[GENERATE] Generation du fichier SQL pour {db_type} (format {mode})...")
+
+    filename = os.path.join(dossier, f'export_{db_type}.sql')
+    dossier_tsv = os.path.join(dossier, f'export_{db_type}_tsv')
+    if mode == 'tsv':
+        os.makedirs(dossier_tsv, exist_ok=True)
+
+    debut = time.perf_counter()
+    total_rows = 0
 
-    with open(filename, 'w', encoding='utf-8') as f:
+    with open(filename, 'w', encoding='utf-8', newline='\n') as f:
         # Header
         f.write(f"-- Export de la base de donnees mairie vers {db_type.upper()}\n")
         f.write(f"-- Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        if db_type == 'mysql':
+            f.write("SET NAMES utf8mb4;\n")
+            f.write("SET SESSION sql_mode = CONCAT(@@SESSION.sql_mode, ',NO_BACKSLASH_ESCAPES');\n")
+            f.write("SET FOREIGN_KEY_CHECKS = 0;\n\n")
+        else:
+            f.write("SET client_encoding = 'UTF8';\n")
+            f.write("SET standard_conforming_strings = on;\n\n")
 
         # Schema
-        f.write("-- SCHEMA\n\n")
+        f.write(f"{DEBUT_SCHEMA}\n\n")
         for table_name, create_sql in schema.items():
             f.write(f"DROP TABLE IF EXISTS {table_name} CASCADE;\n")
-            f.write(f"{create_sql}\n\n")
+            f.write(f"{create_sql.rstrip().rstrip(';')};\n\n")
 
         # Data
-        f.write("\n-- DATA\n\n")
-        for table_name, rows in data.items():
-            if not rows:
-                continue
-
+        f.write(f"\n{DEBUT_DONNEES}\n\n")
+        for table_name, colonnes, lots in iterer_donnees_sqlite(source, taille_lot):
+            liste = ', '.join(colonnes)
+            nb_lignes = 0
             f.write(f"-- Table: {table_name}\n")
 
-            for row in rows:
-                columns = ', '.join(row.keys())
-                values = []
-
-                for value in row.values():
-                    if value is None:
-                        values.append('NULL')
-                    elif isinstance(value, str):
-                        # Échapper les apostrophes
-                        escaped = value.replace("'", "''")
-                        values.append(f"'{escaped}'")
-                    elif isinstance(value, (int, float)):
-                        values.append(str(value))
-                    else:
-                        values.append(f"'{str(value)}'")
-
-                values_str = ', '.join(values)
-                f.write(f"INSERT INTO {table_name} ({columns}) VALUES ({values_str});\n")
-
+            if mode == 'insert':
+                for lot in lots:
+                    valeurs = ',\n'.join(f"({', '.join(litteral_sql(v) for v in ligne)})" for ligne in lot)
+                    f.write(f"INSERT INTO {table_name} ({liste}) VALUES\n{valeurs};\n")
+                    nb_lignes += len(lot)
+
+            elif mode == 'copy':
+                f.write(f"COPY {table_name} ({liste}) FROM stdin;\n")
+                for lot in lots:
+                    f.writelines(_ligne_texte(ligne) for ligne in lot)
+                    nb_lignes += len(lot)
+                f.write("\\.\n")
+
+            else:
+                chemin_tsv = os.path.join(dossier_tsv, f"{table_name}.tsv")
+                with open(chemin_tsv, 'w', encoding='utf-8', newline='\n') as tsv:
+                    for lot in lots:
+                        tsv.writelines(_ligne_texte(ligne) for ligne in lot)
+                        nb_lignes += len(lot)
+                # Chemin relatif: lancer l'import depuis le dossier de l'export
+                relatif = os.path.relpath(chemin_tsv, dossier).replace(os.sep, '/')
+                f.write(f"LOAD DATA LOCAL INFILE '{relatif}' INTO TABLE {table_name} "
+                        f"CHARACTER SET utf8mb4 ({liste});\n")
+
+            total_rows += nb_lignes
             f.write("\n")
+            print(f"  [OK] {table_name}: {nb_lignes} lignes")
+        f.write(f"{FIN_DONNEES}\n\n")
 
+        if db_type == 'mysql':
+            f.write("SET FOREIGN_KEY_CHECKS = 1;\n")
+        else:
+            _reinitialiser_sequences(f, schema)
+
+    duree = time.perf_counter() - debut
+    print(f"  [TOTAL] {total_rows} lignes exportees en {duree:.1f}s")
     print(f"  [OK] Fichier genere: {filename}")
     return filename
 
 
+# ==================== VÉRIFICATION ALLER-RETOUR ====================
+
+def charger_export_dans_sqlite(filename, mode):
+    """
+    Recharge un export dans une base SQLite en mémoire: le schéma converti tel
+    qu'écrit dans le fichier (ordre des tables, découpage des instructions, colonnes),
+    puis la section données.
+
+    Seul ce que SQLite ne sait pas lire est retiré du DDL: CASCADE, AUTO_INCREMENT
+    et les options de table MySQL.
+
+    Returns:
+        sqlite3.Connection
+    """
+    with open(filename, encoding='utf-8', newline='\n') as f:
+        contenu = f.read()
+
+    schema = contenu[contenu.index(DEBUT_SCHEMA) + len(DEBUT_SCHEMA):contenu.index(DEBUT_DONNEES)]
+    schema = re.sub(r'\s+CASCADE;', ';', schema)
+    schema = re.sub(r'\s+AUTO_INCREMENT\b', '', schema)
+    schema = re.sub(r'\)\s*ENGINE=[^;]*;', ');', schema)
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(schema)
+
+    donnees = contenu[contenu.index(DEBUT_DONNEES) + len(DEBUT_DONNEES):contenu.index(FIN_DONNEES)]
+
+    if mode == 'insert':
+        conn.executescript(donnees)
+    elif mode == 'copy':
+        for m in re.finditer(r'^COPY (\w+) \(([^)]*)\) FROM stdin;\n(.*?)^\\\.$', donnees, re.M | re.S):
+            _inserer_lignes_texte(conn, m.group(1), m.group(2), m.group(3).split('\n')[:-1])
+    else:
+        dossier = os.path.dirname(filename)
+        for m in re.finditer(r"^LOAD DATA LOCAL INFILE '([^']*)' INTO TABLE (\w+) CHARACTER SET \w+ \(([^)]*)\);$",
+                             donnees, re.M):
+            with open(os.path.join(dossier, m.group(1)), encoding='utf-8', newline='\n') as tsv:
+                _inserer_lignes_texte(conn, m.group(2), m.group(3), tsv.read().split('\n')[:-1])
+    conn.commit()
+    return conn
+
+
+def _inserer_lignes_texte(conn, table, liste, lignes):
+    nb_colonnes = len(liste.split(','))
+    conn.executemany(
+        f"INSERT INTO {table} ({liste}) VALUES ({', '.join(['?'] * nb_colonnes)})",
+        ([lire_champ_texte(c) for c in ligne.split('\t')] for ligne in lignes)
+    )
+
+
+# (moteur, format) vérifiés par --verifier
+VERIFICATIONS = (('postgresql', 'copy'), ('postgresql', 'insert'), ('mysql', 'insert'), ('mysql', 'tsv'))
+
+
+def verifier_aller_retour(source='mairie.db', db_type='postgresql', mode=None, taille_lot=TAILLE_LOT):
+    """
+    Exporte la base dans un dossier temporaire, recharge l'export (schéma converti
+    et données) dans SQLite et compare chaque table ligne à ligne.
+
+    Returns:
+        bool: True si toutes les tables sont identiques
+    """
+    import tempfile
+
+    mode = mode or FORMAT_DEFAUT[db_type]
+    print(f"\n[VERIFICATION] Aller-retour {db_type} / {mode}...")
+
+    sqlite_schema = export_sqlite_schema(source)
+    convertir = convert_schema_to_postgresql if db_type == 'postgresql' else convert_schema_to_mysql
+
+    with tempfile.TemporaryDirectory(prefix="export_") as dossier:
+        filename = generate_sql_export_file(convertir(sqlite_schema), db_type, mode, source, taille_lot, dossier)
+        relu = charger_export_dans_sqlite(filename, mode)
+
+    origine = sqlite3.connect(source)
+    identique = True
+    for table in sqlite_schema:
+        attendu = origine.execute(f"SELECT * FROM {table} ORDER BY rowid").fetchall()
+        obtenu = relu.execute(f"SELECT * FROM {table} ORDER BY rowid").fetchall()
+        if attendu == obtenu:
+            print(f"  [OK] {table}: {len(obtenu)} lignes identiques")
+        else:
+            identique = False
+            differences = sum(a != b for a, b in zip(attendu, obtenu)) + abs(len(attendu) - len(obtenu))
+            print(f"  [ERROR] {table}: {differences} ligne(s) differente(s)")
+    origine.close()
+    relu.close()
+    return identique
+
+
 def create_migration_guide():
     """Crée un guide de migration."""
     guide = """
@@ -223,6 +433,10 @@ Pour PostgreSQL:
 Pour MySQL:
     mysql -u mairie_user -p mairie_db < export_mysql.sql
 
+    Avec --format tsv, lancer depuis le dossier de l'export et autoriser LOAD DATA LOCAL:
+    mysql --local-infile=1 -u mairie_user -p mairie_db < export_mysql.sql
+    (le serveur doit avoir local_infile=ON)
+
 ETAPE 3: MODIFIER L'APPLICATION
 -------------------------------
 
@@ -258,7 +472,21 @@ ETAPE 4: TESTER LA CONNEXION
 
 def main():
     """Fonction principale."""
-    from datetime import datetime
+    parser = argparse.ArgumentParser(description="Export de mairie.db vers PostgreSQL/MySQL")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="Format des données (defaut: copy pour PostgreSQL, insert pour MySQL)")
+    parser.add_argument('--lot', type=int, default=TAILLE_LOT, help="Lignes par INSERT multi-lignes")
+    parser.add_argument('--verifier', action='store_true',
+                        help="Verifie localement que l'export se recharge a l'identique")
+    args = parser.parse_args()
+
+    if args.verifier:
+        # Tous les formats sont vérifiés, même après un échec
+        echecs = [f"{db_type}/{mode}" for db_type, mode in VERIFICATIONS
+                  if not verifier_aller_retour('mairie.db', db_type, mode, args.lot)]
+        print("\n[OK] Aller-retour identique pour tous les formats" if not echecs
+              else f"\n[ERROR] Differences detectees: {', '.join(echecs)}")
+        sys.exit(1 if echecs else 0)
 
     print("=" * 60)
     print("MIGRATION DE LA BASE DE DONNEES MAIRIE")
@@ -284,17 +512,14 @@ def main():
     # Exporter le schéma SQLite
     sqlite_schema = export_sqlite_schema()
 
-    # Exporter les données
-    data = export_data_from_sqlite()
-
-    # Générer les fichiers SQL
-    if has_postgres:
+    # Générer les fichiers SQL (les données sont lues en flux)
+    if has_postgres and args.format != 'tsv':
         pg_schema = convert_schema_to_postgresql(sqlite_schema)
-        generate_sql_export_file(pg_schema, data, 'postgresql')
+        generate_sql_export_file(pg_schema, 'postgresql', args.format, taille_lot=args.lot)
 
-    if has_mysql:
+    if has_mysql and args.format != 'copy':
         mysql_schema = convert_schema_to_mysql(sqlite_schema)
-        generate_sql_export_file(mysql_schema, data, 'mysql')
+        generate_sql_export_file(mysql_schema, 'mysql', args.format, taille_lot=args.lot)
 
     # Créer le guide de migration
     create_migration_guide()
@@ -304,10 +529,12 @@ def main():
     print("MIGRATION TERMINEE AVEC SUCCES!")
     print("=" * 60)
     print("\nFichiers generes:")
-    if has_postgres:
+    if has_postgres and args.format != 'tsv':
         print("  - export_postgresql.sql")
-    if has_mysql:
+    if has_mysql and args.format != 'copy':
         print("  - export_mysql.sql")
+    if has_mysql and args.format == 'tsv':
+        print("  - export_mysql_tsv/ (fichiers charges par LOAD DATA)")
     print("  - GUIDE_MIGRATION.txt")
     print("\nConsultez GUIDE_MIGRATION.txt pour les etapes suivantes.")
     print("=" * 60)
@@ -3,15 +3,27 @@
 Script de migration automatique de SQLite vers WAMPSERVER MySQL
 Ce script va:
 1. Se connecter à WAMPSERVER MySQL
-2. Créer les tables
-3. Migrer toutes les données de SQLite vers MySQL
-4. Vérifier l'importation
+2. Créer les tables (découvertes dans mairie.db, dans l'ordre des clés étrangères)
+3. Migrer toutes les données de SQLite vers MySQL, en flux et par lots
+   (tables indépendantes en parallèle, reprise possible via migration_checkpoint.json)
+4. Vérifier l'importation (sommes de contrôle par lot de clés primaires)
+
+Benchmark du moteur (1M de transactions simulées, cible SQLite si MySQL absent):
+    python migrate_to_wampserver.py --benchmark
 """
 
+import hashlib
+import json
 import os
 import sys
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import journal_evenements
 
 def check_mysql_connector():
     """Vérifie si mysql-connector-python est installé."""
@@ -108,211 +120,254 @@ def create_database(config):
         return False
 
 
+# ==================== SCHÉMA SOURCE (SQLite) ====================
+
+# Base SQLite source
+SOURCE_SQLITE = 'mairie.db'
+
+# Lignes lues (fetchmany) et insérées (executemany) par lot; un commit par lot
+TAILLE_LOT = 5000
+
+
+def decouvrir_schema(sqlite_conn):
+    """
+    Découvre les tables de la base SQLite et leurs dépendances (clés étrangères).
+
+    Returns:
+        dict: table -> {
+            'colonnes': [{'name', 'type', 'notnull', 'dflt_value', 'pk'}],
+            'pk': colonnes de la clé primaire (dans l'ordre),
+            'auto_increment': True si la clé primaire est un INTEGER PRIMARY KEY,
+            'fks': [{'table', 'from', 'to'}],
+            'index': [{'nom', 'unique', 'colonnes'}],
+            'dependances': tables référencées (hors elle-même),
+            'sql': DDL SQLite d'origine
+        }
+    """
+    cursor = sqlite_conn.cursor()
+    cursor.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY name
+    """)
+    tables = cursor.fetchall()
+
+    schema = {}
+    for nom, sql in tables:
+        cursor.execute(f'PRAGMA table_info("{nom}")')
+        colonnes = [
+            {'name': c[1], 'type': c[2], 'notnull': c[3], 'dflt_value': c[4], 'pk': c[5]}
+            for c in cursor.fetchall()
+        ]
+        pk = [c['name'] for c in sorted(colonnes, key=lambda c: c['pk']) if c['pk']]
+        auto_increment = (len(pk) == 1 and next(c for c in colonnes if c['name'] == pk[0])['type'].upper() == 'INTEGER')
+
+        cursor.execute(f'PRAGMA foreign_key_list("{nom}")')
+        fks = [{'table': f[2], 'from': f[3], 'to': f[4]} for f in cursor.fetchall()]
+
+        cursor.execute(f'PRAGMA index_list("{nom}")')
+        index = []
+        for idx in cursor.fetchall():
+            nom_index, unique, origine = idx[1], idx[2], idx[3]
+            if origine == 'pk':
+                continue
+            cursor.execute(f'PRAGMA index_info("{nom_index}")')
+            index.append({
+                'nom': nom_index,
+                'unique': bool(unique),
+                'colonnes': [i[2] for i in sorted(cursor.fetchall())]
+            })
+
+        schema[nom] = {
+            'colonnes': colonnes,
+            'pk': pk,
+            'auto_increment': auto_increment,
+            'fks': fks,
+            'index': index,
+            'dependances': {f['table'] for f in fks if f['table'] != nom},
+            'sql': sql,
+        }
+
+    return schema
+
+
+def niveaux_dependances(schema):
+    """
+    Regroupe les tables par niveau de dépendance (tri topologique de Kahn).
+
+    Les tables d'un même niveau ne dépendent que des niveaux précédents. Les
+    références vers des tables absentes sont ignorées; un cycle éventuel est
+    placé dans un dernier niveau.
+    """
+    restantes = {t: {d for d in info['dependances'] if d in schema} for t, info in schema.items()}
+    niveaux = []
+    while restantes:
+        niveau = sorted(t for t, deps in restantes.items() if not deps)
+        if not niveau:
+            print(f"  [WARNING] Dépendances circulaires: {', '.join(sorted(restantes))}")
+            niveaux.append(sorted(restantes))
+            break
+        niveaux.append(niveau)
+        for t in niveau:
+            del restantes[t]
+        for deps in restantes.values():
+            deps.difference_update(niveau)
+    return niveaux
+
+
+def ordre_dependances(schema):
+    """Liste des tables dans un ordre compatible avec leurs clés étrangères."""
+    return [t for niveau in niveaux_dependances(schema) for t in niveau]
+
+
+# ==================== CIBLES (MySQL, ou SQLite pour les tests) ====================
+
+def type_mysql(declare, indexee=False):
+    """Traduit un type déclaré SQLite en type MySQL."""
+    t = (declare or '').upper().strip()
+    if t.startswith(('VARCHAR', 'CHAR', 'DECIMAL', 'NUMERIC')):
+        return t
+    if 'INT' in t:
+        return 'BIGINT' if 'BIG' in t else 'INT'
+    if t.startswith('BOOL'):
+        return 'TINYINT(1)'
+    if t in ('REAL', 'FLOAT', 'DOUBLE'):
+        return 'DOUBLE'
+    if t.startswith(('TIMESTAMP', 'DATETIME')):
+        return 'DATETIME'
+    if t == 'DATE':
+        return 'DATE'
+    if t == 'BLOB':
+        return 'LONGBLOB'
+    # TEXT (ou type inconnu): MySQL n'indexe pas un TEXT sans longueur
+    return 'VARCHAR(255)' if indexee else 'TEXT'
+
+
+def ddl_mysql(table, info):
+    """Construit le CREATE TABLE MySQL équivalent à une table SQLite découverte."""
+    indexees = set(info['pk']) | {f['from'] for f in info['fks']}
+    for idx in info['index']:
+        indexees.update(idx['colonnes'])
+
+    lignes = []
+    for col in info['colonnes']:
+        type_col = type_mysql(col['type'], col['name'] in indexees)
+        definition = f"`{col['name']}` {type_col}"
+        if col['notnull'] or col['name'] in info['pk']:
+            definition += " NOT NULL"
+        if info['auto_increment'] and col['name'] in info['pk']:
+            definition += " AUTO_INCREMENT"
+        elif col['dflt_value'] is not None and type_col not in ('TEXT', 'LONGBLOB'):
+            definition += f" DEFAULT {col['dflt_value']}"
+        lignes.append(definition)
+
+    if info['pk']:
+        lignes.append("PRIMARY KEY (" + ", ".join(f"`{c}`" for c in info['pk']) + ")")
+    for n, idx in enumerate(info['index']):
+        nom = idx['nom'] if not idx['nom'].startswith('sqlite_') else f"uq_{table}_{n}"
+        colonnes = ", ".join(f"`{c}`" for c in idx['colonnes'])
+        lignes.append(f"{'UNIQUE KEY' if idx['unique'] else 'KEY'} `{nom}` ({colonnes})")
+    for fk in info['fks']:
+        lignes.append(f"FOREIGN KEY (`{fk['from']}`) REFERENCES `{fk['table']}`(`{fk['to'] or 'id'}`)")
+
+    return (f"CREATE TABLE `{table}` (\n    " + ",\n    ".join(lignes)
+            + "\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+
+
+class CibleMySQL:
+    """Base cible MySQL (WAMPSERVER)."""
+
+    placeholder = '%s'
+
+    def __init__(self, config):
+        import mysql.connector
+        self.conn = mysql.connector.connect(**config)
+
+    @staticmethod
+    def quote(nom):
+        return f"`{nom}`"
+
+    def colonnes(self, table):
+        """Colonnes de la table cible (None si elle n'existe pas)."""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position",
+            (table,)
+        )
+        colonnes = [r[0] for r in cursor.fetchall()]
+        return colonnes or None
+
+    def supprimer_table(self, table):
+        self.conn.cursor().execute(f"DROP TABLE IF EXISTS `{table}`")
+
+    def creer_table(self, table, info):
+        self.conn.cursor().execute(ddl_mysql(table, info))
+
+    def close(self):
+        self.conn.close()
+
+
+class CibleSQLite:
+    """Base cible SQLite: sert de remplaçant à MySQL pour les essais et le benchmark."""
+
+    placeholder = '?'
+
+    def __init__(self, chemin):
+        # Délai d'attente: plusieurs threads écrivent dans le même fichier
+        self.conn = sqlite3.connect(chemin, timeout=60, check_same_thread=False)
+
+    @staticmethod
+    def quote(nom):
+        return f'"{nom}"'
+
+    def colonnes(self, table):
+        colonnes = [c[1] for c in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+        return colonnes or None
+
+    def supprimer_table(self, table):
+        self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+    def creer_table(self, table, info):
+        self.conn.execute(info['sql'])
+
+    def close(self):
+        self.conn.close()
+
+
+def preparer_tables(sqlite_conn, cible, schema=None, verbeux=True):
+    """Recrée dans la cible toutes les tables de la source, dans l'ordre des dépendances."""
+    schema = schema or decouvrir_schema(sqlite_conn)
+    ordre = ordre_dependances(schema)
+
+    for table in reversed(ordre):
+        cible.supprimer_table(table)
+    for table in ordre:
+        cible.creer_table(table, schema[table])
+        if verbeux:
+            print(f"  [OK] Table {table}")
+    cible.conn.commit()
+    return schema
+
+
 def create_tables(config):
-    """Crée les tables MySQL."""
+    """Crée les tables MySQL à partir du schéma réel de mairie.db."""
     import mysql.connector
 
     print("\n[TABLES] Création des tables MySQL...")
 
-    try:
-        conn = mysql.connector.connect(**config)
-        cursor = conn.cursor()
-
-        # Drop tables if exist (pour migration propre)
-        tables = [
-            'audit_log', 'alertes', 'reservations', 'transactions',
-            'agents', 'citoyens', 'locations', 'formulaires',
-            'taxes', 'services_municipaux'
-        ]
+    if not os.path.exists(SOURCE_SQLITE):
+        print(f"[ERROR] Fichier {SOURCE_SQLITE} non trouvé!")
+        return False
 
-        for table in tables:
-            cursor.execute(f"DROP TABLE IF EXISTS {table}")
-
-        # Créer les tables
-
-        # Table services_municipaux
-        cursor.execute("""
-            CREATE TABLE services_municipaux (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                nom VARCHAR(200) NOT NULL,
-                description TEXT,
-                responsable VARCHAR(200),
-                email VARCHAR(200),
-                telephone VARCHAR(50),
-                actif TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table services_municipaux")
-
-        # Table taxes
-        cursor.execute("""
-            CREATE TABLE taxes (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                nom_taxe VARCHAR(200) NOT NULL,
-                categorie VARCHAR(100),
-                montant_base DECIMAL(10,2),
-                montant_max DECIMAL(10,2),
-                periodicite VARCHAR(50),
-                description TEXT,
-                conditions_application TEXT,
-                mode_calcul TEXT,
-                actif TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table taxes")
-
-        # Table formulaires
-        cursor.execute("""
-            CREATE TABLE formulaires (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                nom_document VARCHAR(200) NOT NULL,
-                categorie VARCHAR(100),
-                tarif DECIMAL(10,2),
-                delai_traitement VARCHAR(100),
-                pieces_requises TEXT,
-                description TEXT,
-                conditions_obtention TEXT,
-                actif TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table formulaires")
-
-        # Table locations
-        cursor.execute("""
-            CREATE TABLE locations (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                type_location VARCHAR(100) NOT NULL,
-                designation VARCHAR(200) NOT NULL,
-                tarif_base DECIMAL(10,2),
-                unite VARCHAR(50),
-                capacite VARCHAR(100),
-                equipements TEXT,
-                conditions_location TEXT,
-                disponible TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table locations")
-
-        # Table citoyens
-        cursor.execute("""
-            CREATE TABLE citoyens (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                nom VARCHAR(200) NOT NULL,
-                prenom VARCHAR(200),
-                email VARCHAR(200),
-                telephone VARCHAR(50),
-                adresse TEXT,
-                numero_contribuable VARCHAR(100) UNIQUE,
-                date_naissance DATE,
-                lieu_naissance VARCHAR(200),
-                actif TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table citoyens")
-
-        # Table agents
-        cursor.execute("""
-            CREATE TABLE agents (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                nom VARCHAR(200) NOT NULL,
-                prenom VARCHAR(200),
-                email VARCHAR(200),
-                telephone VARCHAR(50),
-                poste VARCHAR(100),
-                service_id INT,
-                actif TINYINT(1) DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (service_id) REFERENCES services_municipaux(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table agents")
-
-        # Table transactions
-        cursor.execute("""
-            CREATE TABLE transactions (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                citoyen_id INT,
-                agent_id INT,
-                type VARCHAR(50) NOT NULL,
-                libelle VARCHAR(255) NOT NULL,
-                montant DECIMAL(10,2) NOT NULL,
-                mode_paiement VARCHAR(100) DEFAULT 'Espèces',
-                numero_recu VARCHAR(100) UNIQUE,
-                transaction_id VARCHAR(255),
-                hashscan_url TEXT,
-                statut VARCHAR(50) DEFAULT 'COMPLETE',
-                nom_commercant VARCHAR(200),
-                numero_commercant VARCHAR(100),
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (citoyen_id) REFERENCES citoyens(id),
-                FOREIGN KEY (agent_id) REFERENCES agents(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table transactions")
-
-        # Table reservations
-        cursor.execute("""
-            CREATE TABLE reservations (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                location_id INT NOT NULL,
-                citoyen_id INT,
-                agent_id INT,
-                date_debut DATE NOT NULL,
-                date_fin DATE NOT NULL,
-                montant_total DECIMAL(10,2),
-                statut VARCHAR(50) DEFAULT 'EN_ATTENTE',
-                commentaire TEXT,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (location_id) REFERENCES locations(id),
-                FOREIGN KEY (citoyen_id) REFERENCES citoyens(id),
-                FOREIGN KEY (agent_id) REFERENCES agents(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table reservations")
-
-        # Table alertes
-        cursor.execute("""
-            CREATE TABLE alertes (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                type_alerte VARCHAR(100) NOT NULL,
-                niveau_priorite VARCHAR(50) DEFAULT 'MOYEN',
-                titre VARCHAR(255) NOT NULL,
-                description TEXT,
-                transaction_id INT,
-                traitee TINYINT(1) DEFAULT 0,
-                date_traitement TIMESTAMP NULL,
-                responsable VARCHAR(200),
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (transaction_id) REFERENCES transactions(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table alertes")
-
-        # Table audit_log
-        cursor.execute("""
-            CREATE TABLE audit_log (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                user_id INT,
-                action VARCHAR(100) NOT NULL,
-                table_name VARCHAR(100),
-                record_id INT,
-                details TEXT,
-                ip_address VARCHAR(50),
-                date_action TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES agents(id)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-        """)
-        print("  [OK] Table audit_log")
-
-        conn.commit()
-        conn.close()
+    try:
+        sqlite_conn = sqlite3.connect(SOURCE_SQLITE)
+        cible = CibleMySQL(config)
+        schema = preparer_tables(sqlite_conn, cible)
+        cible.close()
+        sqlite_conn.close()
 
-        print(f"[OK] {len(tables)} tables créées avec succès")
+        print(f"[OK] {len(schema)} tables créées avec succès")
         return True
 
     except mysql.connector.Error as e:
@@ -320,122 +375,456 @@ def create_tables(config):
         return False
 
 
-def migrate_data(config):
-    """Migre les données de SQLite vers MySQL."""
-    import mysql.connector
+# ==================== POINT DE REPRISE ====================
+
+# Fichier de reprise d'une migration interrompue
+FICHIER_REPRISE = 'migration_checkpoint.json'
+
+
+class PointDeReprise:
+    """
+    Progression de la migration, table par table et lot par lot, enregistrée dans un fichier JSON.
+
+    Le fichier est réécrit de façon atomique après chaque lot validé dans la cible:
+    une migration interrompue reprend après le dernier lot enregistré. La liste des
+    tables prévues y est écrite dès le départ, si bien qu'une table pas encore
+    commencée compte comme restant à faire.
+    """
+
+    def __init__(self, chemin=FICHIER_REPRISE, source=None):
+        self.chemin = chemin
+        self._lock = threading.Lock()
+        self.donnees = {'source': source, 'tables': {}}
+        if chemin and os.path.exists(chemin):
+            with open(chemin, encoding='utf-8') as f:
+                self.donnees = json.load(f)
+
+    def planifier(self, tables):
+        """Enregistre les tables à copier (une reprise garde le plan d'origine)."""
+        with self._lock:
+            if 'planifiees' not in self.donnees:
+                self.donnees['planifiees'] = list(tables)
+                self._sauvegarder()
+
+    def table(self, table):
+        """État d'une table (créé à la première demande)."""
+        with self._lock:
+            return self.donnees['tables'].setdefault(table, {
+                'statut': 'A_FAIRE', 'derniere_cle': None, 'lignes': 0, 'chunks': [], 'erreurs': []
+            })
+
+    def enregistrer_lot(self, table, chunk, erreurs):
+        """Enregistre un lot validé dans la cible (et les lignes qu'elle a rejetées)."""
+        with self._lock:
+            etat = self.donnees['tables'][table]
+            etat['statut'] = 'EN_COURS'
+            etat['derniere_cle'] = chunk['derniere_cle']
+            etat['lignes'] += chunk['lignes']
+            etat['chunks'].append(chunk)
+            etat['erreurs'].extend(erreurs)
+            self._sauvegarder()
+
+    def recommencer_table(self, table):
+        """Oublie la progression d'une table copiée sans clé (elle repart de zéro)."""
+        with self._lock:
+            self.donnees['tables'][table].update({'derniere_cle': None, 'lignes': 0, 'chunks': [], 'erreurs': []})
+
+    def terminer_table(self, table):
+        with self._lock:
+            self.donnees['tables'][table]['statut'] = 'TERMINEE'
+            self._sauvegarder()
+
+    def est_terminee(self):
+        """True s'il n'y a rien à reprendre: toutes les tables prévues sont terminées, ou rien n'est prévu."""
+        tables = self.donnees['tables']
+        prevues = self.donnees.get('planifiees', list(tables))
+        return all(t in tables and tables[t]['statut'] == 'TERMINEE' for t in prevues)
+
+    def _sauvegarder(self):
+        if not self.chemin:
+            return
+        temporaire = f"{self.chemin}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(self.donnees, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(temporaire, self.chemin)
+
+
+# ==================== SOMMES DE CONTRÔLE ====================
+
+def _valeur_canonique(valeur):
+    """Représentation d'une valeur identique côté SQLite et côté MySQL."""
+    if valeur is None:
+        return '\x00'
+    if isinstance(valeur, int):
+        return str(int(valeur))
+    if isinstance(valeur, (float, Decimal)):
+        nombre = float(valeur)
+        return str(int(nombre)) if nombre.is_integer() else repr(nombre)
+    if isinstance(valeur, datetime):
+        return valeur.isoformat(sep=' ')
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, (bytes, bytearray)):
+        return bytes(valeur).hex()
+    return str(valeur)
+
+
+def empreinte_ligne(ligne):
+    """Empreinte 64 bits d'une ligne."""
+    texte = '\x1f'.join(_valeur_canonique(v) for v in ligne)
+    return int.from_bytes(hashlib.blake2b(texte.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def somme_controle(lignes):
+    """Somme des empreintes modulo 2^64: indépendante de l'ordre des lignes."""
+    return sum(empreinte_ligne(l) for l in lignes) % (1 << 64)
+
+
+# ==================== MOTEUR DE MIGRATION ====================
+
+def _inserer_lot(cible, requete, lot, table):
+    """
+    Insère un lot avec executemany; en cas d'échec, rejoue ligne par ligne
+    pour isoler les lignes fautives au lieu de perdre tout le lot.
+
+    Returns:
+        tuple: (lignes insérées, [(ligne, erreur)])
+    """
+    cursor = cible.conn.cursor()
+    try:
+        cursor.executemany(requete, lot)
+        cible.conn.commit()
+        return len(lot), []
+    except Exception:
+        cible.conn.rollback()
+
+    inserees, erreurs = 0, []
+    for ligne in lot:
+        try:
+            cursor.execute(requete, ligne)
+            inserees += 1
+        except Exception as e:
+            erreurs.append((ligne, str(e)))
+    cible.conn.commit()
+    for ligne, erreur in erreurs[:5]:
+        print(f"    [WARNING] {table}: ligne rejetée {ligne[:3]}...: {erreur}")
+    return inserees, erreurs
+
+
+def _cle_tri(info):
+    """Colonnes de parcours d'une table: sa clé primaire (le rowid à défaut, non reprenable)."""
+    return info['pk'] or None
+
+
+def _filtre_cle(quote, cle, placeholder, apres=True):
+    """Condition (c1, c2) > (?, ?) (ou <=) sur la clé de parcours."""
+    colonnes = ", ".join(quote(c) for c in cle)
+    operateur = '>' if apres else '<='
+    return f"({colonnes}) {operateur} ({', '.join([placeholder] * len(cle))})"
+
+
+def lire_par_lots(conn, quote, placeholder, table, colonnes, cle, taille_lot, apres=None, jusqua=None):
+    """
+    Parcourt une table par pagination sur la clé (keyset): chaque lot est une requête
+    indépendante, ce qui permet de reprendre après n'importe quelle clé.
+
+    Sans clé primaire, la table est lue d'un seul curseur (fetchmany), sans reprise possible.
+    """
+    liste = ", ".join(quote(c) for c in colonnes)
+    if not cle:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {liste} FROM {quote(table)}")
+        while True:
+            lot = cursor.fetchmany(taille_lot)
+            if not lot:
+                return
+            yield [tuple(r) for r in lot]
+
+    ordre = ", ".join(quote(c) for c in cle)
+    while True:
+        conditions, params = [], []
+        if apres is not None:
+            conditions.append(_filtre_cle(quote, cle, placeholder, apres=True))
+            params += list(apres)
+        if jusqua is not None:
+            conditions.append(_filtre_cle(quote, cle, placeholder, apres=False))
+            params += list(jusqua)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {liste} FROM {quote(table)}{where} ORDER BY {ordre} LIMIT {int(taille_lot)}", params)
+        lot = [tuple(r) for r in cursor.fetchall()]
+        if not lot:
+            return
+        yield lot
+        if len(lot) < taille_lot:
+            return
+        positions = [colonnes.index(c) for c in cle]
+        apres = [lot[-1][p] for p in positions]
+
+
+def _quote_sqlite(nom):
+    return f'"{nom}"'
+
+
+def copier_table(sqlite_path, cible, table, info, reprise, taille_lot=TAILLE_LOT):
+    """
+    Copie une table en flux: lecture par lots sur la clé primaire, insertion par executemany,
+    commit et point de reprise par lot.
+
+    Seules les colonnes présentes des deux côtés sont copiées. Les lignes rejetées par la
+    cible sont enregistrées (clé et erreur) dans le point de reprise.
+
+    Returns:
+        dict: {'table', 'lignes', 'erreurs', 'duree', 'lignes_par_s', 'colonnes_ignorees', 'reprise'}
+    """
+    etat = reprise.table(table)
+    if etat['statut'] == 'TERMINEE':
+        return {'table': table, 'lignes': 0, 'erreurs': 0, 'duree': 0.0, 'lignes_par_s': 0.0,
+                'colonnes_ignorees': [], 'reprise': True}
+
+    colonnes_source = [c['name'] for c in info['colonnes']]
+    colonnes_cible = cible.colonnes(table) or []
+    colonnes = [c for c in colonnes_source if c in colonnes_cible]
+    ignorees = [c for c in colonnes_source if c not in colonnes_cible]
+    if ignorees:
+        print(f"    [WARNING] {table}: colonnes absentes de la cible, ignorées: {', '.join(ignorees)}")
+
+    cle = _cle_tri(info)
+    if cle and not set(cle) <= set(colonnes):
+        cle = None
+    apres = etat['derniere_cle']
+    reprend = etat['statut'] == 'EN_COURS'
+
+    # Lot éventuellement validé dans la cible mais absent du point de reprise: on le retire
+    cursor = cible.conn.cursor()
+    if reprend and cle:
+        cursor.execute(f"DELETE FROM {cible.quote(table)} WHERE {_filtre_cle(cible.quote, cle, cible.placeholder)}",
+                       list(apres))
+    elif reprend or not cle:
+        cursor.execute(f"DELETE FROM {cible.quote(table)}")
+        apres = None
+        reprise.recommencer_table(table)
+    cible.conn.commit()
+    if reprend:
+        print(f"  [REPRISE] {table}: reprise après {etat['lignes']} lignes")
+
+    requete = (f"INSERT INTO {cible.quote(table)} ({', '.join(cible.quote(c) for c in colonnes)}) "
+               f"VALUES ({', '.join([cible.placeholder] * len(colonnes))})")
+    positions_cle = [colonnes.index(c) for c in cle] if cle else []
+
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    debut = time.perf_counter()
+    lignes, nb_erreurs = 0, 0
+    try:
+        lots = lire_par_lots(sqlite_conn, _quote_sqlite, '?', table, colonnes, cle, taille_lot, apres)
+        debut_lot = time.perf_counter()
+        for lot in lots:
+            inserees, rejetees = _inserer_lot(cible, requete, lot, table)
+            lignes += inserees
+            nb_erreurs += len(rejetees)
+            index = len(etat['chunks'])
+            reprise.enregistrer_lot(table, {
+                'index': index,
+                'premiere_cle': [lot[0][p] for p in positions_cle] if cle else None,
+                'derniere_cle': [lot[-1][p] for p in positions_cle] if cle else None,
+                'lignes': len(lot),
+                'somme_controle': somme_controle(lot),
+            }, [{'cle': [l[p] for p in positions_cle], 'erreur': e} for l, e in rejetees])
+            fin_lot = time.perf_counter()
+            journal_evenements.emettre('migration_lot', table=table, index=index, lignes=inserees,
+                                       erreurs=len(rejetees), duree_ms=round((fin_lot - debut_lot) * 1000, 1))
+            debut_lot = fin_lot
+    finally:
+        sqlite_conn.close()
+    reprise.terminer_table(table)
+
+    duree = time.perf_counter() - debut
+    return {
+        'table': table,
+        'lignes': lignes,
+        'erreurs': nb_erreurs,
+        'duree': duree,
+        'lignes_par_s': lignes / duree if duree > 0 else 0.0,
+        'colonnes_ignorees': ignorees,
+        'reprise': reprend,
+    }
 
+
+def migrer(sqlite_path, fabrique_cible, taille_lot=TAILLE_LOT, tables=None, reprise=None, nb_workers=4):
+    """
+    Copie les tables de la base SQLite vers la cible.
+
+    Les tables d'un même niveau de dépendance (voir niveaux_dependances) sont copiées
+    en parallèle, chacune dans un thread avec sa propre connexion; un niveau ne commence
+    qu'une fois le précédent terminé.
+
+    Args:
+        sqlite_path: Base SQLite source
+        fabrique_cible: Fonction sans argument retournant une nouvelle cible (tables déjà créées)
+        taille_lot: Lignes par lot (lecture / executemany / commit)
+        tables: Sous-ensemble de tables à copier (toutes par défaut)
+        reprise: PointDeReprise (en mémoire seulement si None)
+        nb_workers: Nombre de tables copiées simultanément
+
+    Returns:
+        list: Statistiques de chaque table (voir copier_table)
+    """
+    reprise = reprise or PointDeReprise(chemin=None, source=sqlite_path)
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    schema = decouvrir_schema(sqlite_conn)
+    sqlite_conn.close()
+
+    def copier(table):
+        cible = fabrique_cible()
+        try:
+            return copier_table(sqlite_path, cible, table, schema[table], reprise, taille_lot)
+        finally:
+            cible.close()
+
+    niveaux = [[t for t in niveau if not tables or t in tables] for niveau in niveaux_dependances(schema)]
+    reprise.planifier([t for niveau in niveaux for t in niveau])
+
+    resultats = []
+    for niveau in niveaux:
+        with ThreadPoolExecutor(max_workers=max(1, nb_workers)) as executor:
+            for stats in executor.map(copier, niveau):
+                resultats.append(stats)
+                statut = "[OK]" if not stats['erreurs'] else "[WARNING]"
+                print(f"  {statut} {stats['table']}: {stats['lignes']} lignes migrées "
+                      f"({stats['lignes_par_s']:,.0f} lignes/s, {stats['erreurs']} rejetée(s))")
+    return resultats
+
+
+def verifier_sommes_controle(sqlite_path, cible, taille_lot=TAILLE_LOT, tables=None):
+    """
+    Compare source et cible lot par lot: nombre de lignes et somme de contrôle de chaque
+    plage de clés primaires (indépendante de l'ordre de lecture).
+
+    Returns:
+        list: [{'table', 'lignes_source', 'lignes_cible', 'ok',
+                'differences': [{'index', 'de', 'a', 'lignes_source', 'lignes_cible'}]}]
+    """
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    schema = decouvrir_schema(sqlite_conn)
+    rapport = []
+
+    for table in ordre_dependances(schema):
+        if tables and table not in tables:
+            continue
+        info = schema[table]
+        colonnes_cible = cible.colonnes(table) or []
+        colonnes = [c['name'] for c in info['colonnes'] if c['name'] in colonnes_cible]
+        cle = _cle_tri(info)
+        if cle and not set(cle) <= set(colonnes):
+            cle = None
+        positions = [colonnes.index(c) for c in cle] if cle else []
+
+        differences, total_source, total_cible = [], 0, 0
+        precedente = None
+        lots = lire_par_lots(sqlite_conn, _quote_sqlite, '?', table, colonnes, cle, taille_lot)
+        for index, lot in enumerate(lots):
+            derniere = [lot[-1][p] for p in positions] if cle else None
+            if cle:
+                lignes_cible = [r for l in lire_par_lots(cible.conn, cible.quote, cible.placeholder, table,
+                                                         colonnes, cle, len(lot) + 1, precedente, derniere)
+                                for r in l]
+            else:
+                lignes_cible = [r for l in lire_par_lots(cible.conn, cible.quote, cible.placeholder, table,
+                                                         colonnes, None, taille_lot) for r in l]
+            total_source += len(lot)
+            total_cible += len(lignes_cible)
+            if len(lot) != len(lignes_cible) or somme_controle(lot) != somme_controle(lignes_cible):
+                differences.append({
+                    'index': index,
+                    'de': precedente,
+                    'a': derniere,
+                    'lignes_source': len(lot),
+                    'lignes_cible': len(lignes_cible),
+                })
+            precedente = derniere
+
+        # Lignes de la cible au-delà de la dernière clé source
+        if cle:
+            surplus = sum(len(l) for l in lire_par_lots(cible.conn, cible.quote, cible.placeholder, table,
+                                                        colonnes, cle, taille_lot, precedente))
+            if surplus:
+                total_cible += surplus
+                differences.append({'index': None, 'de': precedente, 'a': None,
+                                    'lignes_source': 0, 'lignes_cible': surplus})
+
+        rapport.append({
+            'table': table,
+            'lignes_source': total_source,
+            'lignes_cible': total_cible,
+            'ok': not differences,
+            'differences': differences,
+        })
+
+    sqlite_conn.close()
+    return rapport
+
+
+def _fabrique_mysql(config):
+    return lambda: CibleMySQL(config)
+
+
+def migrate_data(config, taille_lot=TAILLE_LOT, reprise=None, nb_workers=4):
+    """Migre les données de SQLite vers MySQL (reprend une migration interrompue si possible)."""
     print("\n[MIGRATION] Migration des données SQLite -> MySQL...")
 
     # Vérifier que mairie.db existe
-    if not os.path.exists('mairie.db'):
-        print("[ERROR] Fichier mairie.db non trouvé!")
+    if not os.path.exists(SOURCE_SQLITE):
+        print(f"[ERROR] Fichier {SOURCE_SQLITE} non trouvé!")
         return False
 
     try:
-        # Connexion SQLite
-        sqlite_conn = sqlite3.connect('mairie.db')
-        sqlite_conn.row_factory = sqlite3.Row
-        sqlite_cursor = sqlite_conn.cursor()
-
-        # Connexion MySQL
-        mysql_conn = mysql.connector.connect(**config)
-        mysql_cursor = mysql_conn.cursor()
-
-        # Tables à migrer (dans l'ordre des dépendances)
-        tables_to_migrate = [
-            'services_municipaux',
-            'taxes',
-            'formulaires',
-            'locations',
-            'citoyens',
-            'agents',
-            'transactions',
-            'reservations',
-            'alertes',
-            'audit_log'
-        ]
-
-        total_rows = 0
-
-        for table in tables_to_migrate:
-            # Récupérer les données de SQLite
-            sqlite_cursor.execute(f"SELECT * FROM {table}")
-            rows = sqlite_cursor.fetchall()
-
-            if not rows:
-                print(f"  [SKIP] {table}: 0 lignes")
-                continue
-
-            # Récupérer les noms de colonnes
-            columns = [description[0] for description in sqlite_cursor.description]
-
-            # Préparer la requête d'insertion
-            placeholders = ', '.join(['%s'] * len(columns))
-            columns_str = ', '.join(columns)
-            insert_query = f"INSERT INTO {table} ({columns_str}) VALUES ({placeholders})"
-
-            # Insérer les données
-            rows_inserted = 0
-            for row in rows:
-                try:
-                    values = tuple(row)
-                    mysql_cursor.execute(insert_query, values)
-                    rows_inserted += 1
-                except mysql.connector.Error as e:
-                    print(f"    [WARNING] Erreur insertion dans {table}: {e}")
-                    continue
-
-            mysql_conn.commit()
-            total_rows += rows_inserted
-            print(f"  [OK] {table}: {rows_inserted} lignes migrées")
-
-        sqlite_conn.close()
-        mysql_conn.close()
-
-        print(f"\n[OK] Migration terminée: {total_rows} lignes au total")
+        reprise = reprise or PointDeReprise(FICHIER_REPRISE, source=SOURCE_SQLITE)
+        debut = time.perf_counter()
+        resultats = migrer(SOURCE_SQLITE, _fabrique_mysql(config), taille_lot, reprise=reprise,
+                           nb_workers=nb_workers)
+        duree = time.perf_counter() - debut
+
+        total_rows = sum(r['lignes'] for r in resultats)
+        total_erreurs = sum(r['erreurs'] for r in resultats)
+        print(f"\n[OK] Migration terminée: {total_rows} lignes au total "
+              f"en {duree:.1f}s ({total_rows / max(duree, 1e-9):,.0f} lignes/s)")
+        if total_erreurs:
+            print(f"[WARNING] {total_erreurs} ligne(s) rejetée(s) par MySQL, "
+                  f"détail dans {reprise.chemin}")
         return True
 
     except Exception as e:
         print(f"[ERROR] Erreur lors de la migration: {e}")
+        print(f"        Relancez le script pour reprendre depuis {FICHIER_REPRISE}")
         return False
 
 
-def verify_migration(config):
-    """Vérifie que la migration s'est bien passée."""
+def afficher_verification(rapport):
+    """Affiche le rapport de verifier_sommes_controle; retourne True si tout concorde."""
+    all_ok = True
+    for r in rapport:
+        if r['ok']:
+            print(f"  [OK] {r['table']}: {r['lignes_cible']} lignes, sommes de contrôle identiques")
+            continue
+        all_ok = False
+        print(f"  [ERROR] {r['table']}: {r['lignes_cible']} lignes (attendu: {r['lignes_source']}), "
+              f"{len(r['differences'])} lot(s) différent(s)")
+        for d in r['differences'][:10]:
+            print(f"      lot {d['index']}: clés ]{d['de']}, {d['a']}] "
+                  f"source={d['lignes_source']} cible={d['lignes_cible']}")
+    return all_ok
+
+
+def verify_migration(config, taille_lot=TAILLE_LOT):
+    """Vérifie la migration: nombre de lignes et sommes de contrôle par lot, source vs cible."""
     import mysql.connector
 
     print("\n[VERIFICATION] Vérification de la migration...")
 
     try:
-        conn = mysql.connector.connect(**config)
-        cursor = conn.cursor()
-
-        # Vérifier chaque table
-        tables = [
-            'services_municipaux',
-            'taxes',
-            'formulaires',
-            'locations',
-            'citoyens',
-            'agents',
-            'transactions',
-            'reservations',
-            'alertes',
-            'audit_log'
-        ]
-
-        all_ok = True
-
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
-
-            if count > 0:
-                print(f"  [OK] {table}: {count} lignes")
-            else:
-                print(f"  [INFO] {table}: 0 lignes")
-
-        conn.close()
+        cible = CibleMySQL(config)
+        all_ok = afficher_verification(verifier_sommes_controle(SOURCE_SQLITE, cible, taille_lot))
+        cible.close()
 
         if all_ok:
             print("\n[OK] Vérification terminée avec succès!")
@@ -447,6 +836,66 @@ def verify_migration(config):
         return False
 
 
+# ==================== BENCHMARK ====================
+
+def benchmark_migration(nb_transactions=1_000_000, tailles_lot=(500, 2000, 5000, 20000),
+                        config=None, dossier=None):
+    """
+    Mesure le débit de migration d'une base de ~nb_transactions transactions simulées.
+
+    La base source est générée par generateur_donnees. La cible est MySQL si une
+    configuration est fournie, sinon une base SQLite de remplacement (mesure du
+    moteur seul, sans le réseau).
+
+    Returns:
+        list: [{'taille_lot', 'lignes', 'duree', 'lignes_par_s'}]
+    """
+    import tempfile
+    import generateur_donnees
+
+    dossier = dossier or tempfile.mkdtemp(prefix="bench_migration_")
+    os.makedirs(dossier, exist_ok=True)
+    source = os.path.join(dossier, "source.db")
+    if os.path.exists(source):
+        os.remove(source)
+
+    print(f"\n[BENCHMARK] Génération de ~{nb_transactions:,} transactions dans {source}...")
+    transactions = generateur_donnees.generer_transactions(365, nb_transactions / 365 / 1.1)
+    generateur_donnees.charger_dans_base(transactions, db_path=source)
+
+    resultats = []
+    for taille_lot in tailles_lot:
+        if config:
+            fabrique = _fabrique_mysql(config)
+        else:
+            chemin_cible = os.path.join(dossier, f"cible_{taille_lot}.db")
+            if os.path.exists(chemin_cible):
+                os.remove(chemin_cible)
+            fabrique = lambda chemin=chemin_cible: CibleSQLite(chemin)
+
+        sqlite_conn = sqlite3.connect(source)
+        cible = fabrique()
+        preparer_tables(sqlite_conn, cible, verbeux=False)
+        cible.close()
+        sqlite_conn.close()
+
+        print(f"\n  --- Lots de {taille_lot} lignes ---")
+        debut = time.perf_counter()
+        stats = migrer(source, fabrique, taille_lot)
+        duree = time.perf_counter() - debut
+
+        lignes = sum(r['lignes'] for r in stats)
+        resultats.append({'taille_lot': taille_lot, 'lignes': lignes, 'duree': duree,
+                          'lignes_par_s': lignes / duree if duree > 0 else 0.0})
+
+    print("\n[BENCHMARK] Résumé:")
+    for r in resultats:
+        print(f"  lot={r['taille_lot']:>6}: {r['lignes']:,} lignes en {r['duree']:.1f}s "
+              f"({r['lignes_par_s']:,.0f} lignes/s)")
+
+    return resultats
+
+
 def update_env_file():
     """Met à jour le fichier .env pour utiliser MySQL."""
     print("\n[CONFIG] Mise à jour du fichier .env...")
@@ -478,6 +927,10 @@ DB_PORT=3306
 
 def main():
     """Fonction principale."""
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        benchmark_migration()
+        return
+
     print("=" * 70)
     print("MIGRATION AUTOMATIQUE VERS WAMPSERVER MYSQL")
     print("=" * 70)
@@ -499,12 +952,19 @@ def main():
     if not create_database(config):
         return
 
-    # Créer les tables
-    if not create_tables(config):
-        return
+    # Reprendre une migration interrompue, sinon créer les tables
+    reprise = PointDeReprise(FICHIER_REPRISE, source=SOURCE_SQLITE)
+    if reprise.est_terminee():
+        if os.path.exists(FICHIER_REPRISE):
+            os.remove(FICHIER_REPRISE)
+        reprise = PointDeReprise(FICHIER_REPRISE, source=SOURCE_SQLITE)
+        if not create_tables(config):
+            return
+    else:
+        print(f"\n[REPRISE] Migration interrompue trouvée dans {FICHIER_REPRISE}")
 
     # Migrer les données
-    if not migrate_data(config):
+    if not migrate_data(config, reprise=reprise):
         return
 
     # Vérifier la migration
@@ -7,6 +7,7 @@ via mobile money (Airtel Money, MobiCash)
 import streamlit as st
 import database_mairie as db
 import services_mairie as services
+import disponibilites
 from datetime import datetime, date, timedelta
 
 def show_paiement_client_page():
@@ -392,6 +393,22 @@ def show_paiement_client_page():
                     help="Date de début de la location"
                 )
 
+            # Disponibilité de la période choisie
+            debut_periode, fin_periode = disponibilites.periode(location, date_debut, duree)
+            if disponibilites.est_disponible(location['id'], debut_periode, fin_periode):
+                st.success("✅ Location libre sur cette période")
+            else:
+                suivant = disponibilites.prochain_creneau(location['id'], (fin_periode - debut_periode).days, date_debut)
+                st.warning("⚠️ Période déjà réservée"
+                           + (f" - prochain créneau libre: {suivant.strftime('%d/%m/%Y')}" if suivant else ""))
+
+            st.markdown(disponibilites.legende_html(), unsafe_allow_html=True)
+            for col_mois, (annee, mois) in zip(st.columns(2), disponibilites.mois_affiches(date_debut)):
+                with col_mois:
+                    st.markdown(disponibilites.calendrier_html(location['id'], annee, mois,
+                                                               (debut_periode, fin_periode)),
+                                unsafe_allow_html=True)
+
             # Calcul du montant total
             montant_total = location['prix_base'] * duree
             st.markdown("### 💰 Montant Total")
@@ -491,15 +508,8 @@ def show_paiement_client_page():
                         st.markdown("---")
                         st.markdown("### 📝 Détails de votre paiement")
 
-                        # Calculer date de fin
-                        if 'Jour' in location['frequence']:
-                            date_fin = date_debut + timedelta(days=duree)
-                        elif 'Mois' in location['frequence']:
-                            date_fin = date_debut + timedelta(days=duree * 30)
-                        elif 'Heure' in location['frequence']:
-                            date_fin = date_debut  # Même jour
-                        else:
-                            date_fin = date_debut + timedelta(days=duree)
+                        # Dernier jour occupé (la période enregistrée exclut date_fin)
+                        date_fin = fin_periode - timedelta(days=1)
 
                         col_recu1, col_recu2 = st.columns(2)
 
@@ -0,0 +1,282 @@
+# prevision_series.py - Prévisions saisonnières de nombreuses séries de recettes
+"""
+Prévision vectorisée des recettes par famille, par type de transaction et par marché:
+- Toutes les séries partagent une même matrice de conception
+  (constante, tendance, jour de la semaine, mois)
+- Les moindres carrés sont résolus en lot (une seule passe NumPy pour toutes les séries)
+- Les jours de fermeture des marchés (marches.jours_ouverture) sont exclus de
+  l'ajustement et prévus à zéro
+- Prévisions à 30 et 90 jours avec intervalles de prévision
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import database_mairie as db
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+HORIZON_JOURS = 90
+HORIZONS_RESUME = (30, 90)
+
+# Historique utilisé pour l'ajustement (deux ans: capte les pics annuels des taxes)
+FENETRE_JOURS = 730
+
+# Pénalité ridge sur les effets (hors constante): rend l'ajustement stable
+# lorsque certains mois ou jours n'ont pas encore d'observations
+PENALITE_RIDGE = 1.0
+
+# Quantile normal de l'intervalle de prévision à 95 %
+Z_INTERVALLE = 1.96
+
+GROUPES = ('Famille', 'Type', 'Marché')
+
+JOURS_SEMAINE = {'lun': 0, 'mar': 1, 'mer': 2, 'jeu': 3, 'ven': 4, 'sam': 5, 'dim': 6}
+
+# Cache process: les séries ne changent qu'à la clôture d'une journée
+_cache_lock = threading.Lock()
+_cache = {'cle': None, 'resultat': None}
+
+
+def parse_jours_ouverture(texte: Optional[str]) -> np.ndarray:
+    """
+    Convertit un texte comme 'Lun-Sam' ou 'Lun, Mer, Ven' en masque de 7 booléens (lundi = 0).
+
+    Un texte absent ou illisible est interprété comme une ouverture tous les jours.
+    """
+    masque = np.zeros(7, dtype=bool)
+    if not texte:
+        return ~masque
+
+    for morceau in texte.replace(';', ',').split(','):
+        bornes = [JOURS_SEMAINE.get(b.strip().lower()[:3]) for b in morceau.split('-')]
+        if any(b is None for b in bornes):
+            return ~np.zeros(7, dtype=bool)
+        debut, fin = bornes[0], bornes[-1]
+        # Plage éventuellement à cheval sur le dimanche (ex: 'Sam-Mar')
+        longueur = (fin - debut) % 7 + 1
+        masque[[(debut + i) % 7 for i in range(longueur)]] = True
+
+    return masque if masque.any() else ~masque
+
+
+def matrice_conception(jours: pd.DatetimeIndex, origine: pd.Timestamp) -> np.ndarray:
+    """
+    Matrice de conception partagée par toutes les séries.
+
+    Colonnes: constante, tendance (en années), 6 indicatrices de jour de la semaine
+    (lundi en référence) et 11 indicatrices de mois (janvier en référence).
+    """
+    n = len(jours)
+    dow = jours.dayofweek.to_numpy()
+    mois = jours.month.to_numpy()
+
+    X = np.zeros((n, 2 + 6 + 11))
+    X[:, 0] = 1.0
+    X[:, 1] = (jours - origine).days.to_numpy() / 365.25
+    lignes = np.arange(n)
+    X[lignes[dow > 0], 1 + dow[dow > 0]] = 1.0
+    X[lignes[mois > 1], 6 + mois[mois > 1]] = 1.0
+    return X
+
+
+def ajuster_series(Y: np.ndarray, W: np.ndarray, X: np.ndarray,
+                   penalite: float = PENALITE_RIDGE) -> Dict[str, np.ndarray]:
+    """
+    Moindres carrés pondérés résolus en lot pour toutes les séries.
+
+    Args:
+        Y: Observations (séries x jours)
+        W: Poids 0/1 (séries x jours): 0 avant le début d'une série et les jours de fermeture;
+           chaque série doit avoir au moins un poids non nul (sinon X'WX est singulière)
+        X: Matrice de conception partagée (jours x p)
+        penalite: Pénalité ridge appliquée aux coefficients hors constante
+
+    Returns:
+        dict: beta (séries x p), inverse (séries x p x p), sigma2 (séries), n_obs (séries)
+    """
+    S, D = Y.shape
+    p = X.shape[1]
+
+    # X'WX de chaque série en un seul produit matriciel: W @ (x_d x_d') aplati
+    produits = (X[:, :, None] * X[:, None, :]).reshape(D, p * p)
+    A = (W @ produits).reshape(S, p, p)
+    A[:, np.arange(1, p), np.arange(1, p)] += penalite
+    b = (W * Y) @ X
+
+    inverse = np.linalg.inv(A)
+    beta = np.einsum('spq,sq->sp', inverse, b)
+
+    residus = W * (Y - beta @ X.T)
+    n_obs = W.sum(axis=1)
+    sigma2 = (residus ** 2).sum(axis=1) / np.maximum(n_obs - p, 1)
+
+    return {'beta': beta, 'inverse': inverse, 'sigma2': sigma2, 'n_obs': n_obs}
+
+
+def prevoir(modele: Dict[str, np.ndarray], X_futur: np.ndarray, ouvert_futur: np.ndarray,
+            z: float = Z_INTERVALLE) -> Dict[str, np.ndarray]:
+    """
+    Prévisions et intervalles de toutes les séries sur les jours futurs.
+
+    La variance de prévision combine le bruit résiduel et l'incertitude des coefficients.
+    Les jours de fermeture sont prévus à zéro.
+    """
+    prevision = modele['beta'] @ X_futur.T
+    variance_coef = np.einsum('hp,spq,hq->sh', X_futur, modele['inverse'], X_futur)
+    ecart = z * np.sqrt(modele['sigma2'][:, None] * (1.0 + variance_coef))
+
+    prevision = np.maximum(prevision, 0) * ouvert_futur
+    return {
+        'prevision': prevision,
+        'borne_basse': np.maximum(prevision - ecart, 0) * ouvert_futur,
+        'borne_haute': (prevision + ecart) * ouvert_futur,
+    }
+
+
+def charger_series(fenetre_jours: int = FENETRE_JOURS, horizon: int = HORIZON_JOURS):
+    """
+    Charge les séries journalières depuis les agrégats (jours clos uniquement).
+
+    Returns:
+        tuple: (series, jours, jours_futurs, Y, ouvert)
+            series: liste de {'groupe', 'cle', 'libelle'}
+            jours / jours_futurs: DatetimeIndex de l'historique et de l'horizon
+            Y: montants (séries x jours), 0 les jours sans encaissement
+            ouvert: masque d'ouverture (séries x (jours + horizon))
+    """
+    # Jour courant de la base: l'horloge qui date les agrégats
+    aujourd_hui = date.fromisoformat(db.get_jour_courant())
+    debut = aujourd_hui - timedelta(days=fenetre_jours)
+    jours = pd.date_range(debut, aujourd_hui - timedelta(days=1), freq='D')
+    jours_futurs = pd.date_range(aujourd_hui, periods=horizon, freq='D')
+    tous_jours = jours.append(jours_futurs)
+
+    bornes = dict(apres=(debut - timedelta(days=1)).isoformat(), avant=aujourd_hui.isoformat())
+    df_types = pd.DataFrame(db.get_recettes_par_jour_et_type(**bornes),
+                            columns=['jour', 'type', 'montant_total'])
+    df_marches = pd.DataFrame(db.get_recettes_marches_par_jour(**bornes),
+                              columns=['marche_id', 'jour', 'montant_total'])
+    marches = {m['id']: m for m in db.get_all_marches()}
+
+    df_types['famille'] = df_types['type'].str.split('_').str[0]
+    blocs = [
+        ('Famille', df_types, 'famille', lambda cle: cle),
+        ('Type', df_types, 'type', lambda cle: cle),
+        ('Marché', df_marches[df_marches['marche_id'].isin(marches)], 'marche_id',
+         lambda cle: marches[cle]['nom_marche']),
+    ]
+
+    series, matrices, masques = [], [], []
+    jours_semaine = tous_jours.dayofweek.to_numpy()
+    for groupe, df, colonne, libelle in blocs:
+        if df.empty:
+            continue
+        pivot = (df.pivot_table(index=colonne, columns='jour', values='montant_total', aggfunc='sum')
+                 .reindex(columns=jours.strftime('%Y-%m-%d'), fill_value=0).fillna(0))
+        for cle in pivot.index:
+            series.append({'groupe': groupe, 'cle': cle, 'libelle': libelle(cle)})
+            if groupe == 'Marché':
+                masques.append(parse_jours_ouverture(marches[cle]['jours_ouverture'])[jours_semaine])
+            else:
+                masques.append(np.ones(len(tous_jours), dtype=bool))
+        matrices.append(pivot.to_numpy(dtype=float))
+
+    if not series:
+        return [], jours, jours_futurs, np.zeros((0, len(jours))), np.zeros((0, len(tous_jours)), dtype=bool)
+
+    return series, jours, jours_futurs, np.vstack(matrices), np.vstack(masques)
+
+
+def prevoir_toutes_series(fenetre_jours: int = FENETRE_JOURS, horizon: int = HORIZON_JOURS) -> Dict:
+    """
+    Ajuste et prévoit toutes les séries de recettes en une passe.
+
+    Returns:
+        dict: {
+            'series': liste de {'groupe', 'cle', 'libelle'},
+            'jours', 'jours_futurs': DatetimeIndex,
+            'historique': montants observés (séries x jours),
+            'prevision', 'borne_basse', 'borne_haute': (séries x horizon),
+            'resume': DataFrame (une ligne par série, totaux 30/90 j),
+            'duree_calcul': secondes
+        }
+    """
+    debut_calcul = time.perf_counter()
+    series, jours, jours_futurs, Y, ouvert = charger_series(fenetre_jours, horizon)
+    D = len(jours)
+
+    # Une série ne compte qu'à partir de son premier encaissement
+    a_debute = np.maximum.accumulate(Y > 0, axis=1)
+    W = (a_debute & ouvert[:, :D]).astype(float)
+
+    # Sans aucun jour observé (montants nuls, encaissements seulement les jours de
+    # fermeture), une série n'a rien à ajuster: elle est écartée
+    observees = W.any(axis=1)
+    if not observees.all():
+        logger.info("%d série(s) sans jour observé écartée(s) de la prévision", int((~observees).sum()))
+        series = [serie for serie, garder in zip(series, observees) if garder]
+        Y, W, ouvert = Y[observees], W[observees], ouvert[observees]
+
+    resultat = {'series': series, 'jours': jours, 'jours_futurs': jours_futurs, 'historique': Y}
+    if series:
+        X = matrice_conception(jours.append(jours_futurs), jours[0])
+        modele = ajuster_series(Y, W, X[:D])
+        resultat.update(prevoir(modele, X[D:], ouvert[:, D:]))
+        resultat['n_obs'] = modele['n_obs']
+    else:
+        vide = np.zeros((0, horizon))
+        resultat.update({'prevision': vide, 'borne_basse': vide, 'borne_haute': vide,
+                         'n_obs': np.zeros(0)})
+
+    resume = pd.DataFrame(series, columns=['groupe', 'cle', 'libelle'])
+    resume['jours_observes'] = resultat['n_obs'].astype(int)
+    for h in HORIZONS_RESUME:
+        if h <= horizon:
+            resume[f'prevision_{h}j'] = resultat['prevision'][:, :h].sum(axis=1)
+            resume[f'basse_{h}j'] = resultat['borne_basse'][:, :h].sum(axis=1)
+            resume[f'haute_{h}j'] = resultat['borne_haute'][:, :h].sum(axis=1)
+    resultat['resume'] = resume
+    resultat['duree_calcul'] = time.perf_counter() - debut_calcul
+
+    logger.info(f"Prévision de {len(series)} séries en {resultat['duree_calcul'] * 1000:.0f} ms")
+    return resultat
+
+
+def get_previsions_series() -> Dict:
+    """Retourne les prévisions de toutes les séries, recalculées une fois par jour ou si les marchés changent."""
+    cle = (db.get_jour_courant(), db.get_marches_version())
+    with _cache_lock:
+        if _cache['cle'] != cle:
+            _cache['resultat'] = prevoir_toutes_series()
+            _cache['cle'] = cle
+        return _cache['resultat']
+
+
+def invalider_cache():
+    """Oublie les prévisions en cache (changement de base par exemple): le prochain appel les recalcule."""
+    with _cache_lock:
+        _cache['cle'] = None
+
+
+def serie_to_frame(resultat: Dict, index: int) -> pd.DataFrame:
+    """Historique et prévision d'une série sous forme de DataFrame (pour l'affichage)."""
+    historique = pd.DataFrame({
+        'date': resultat['jours'],
+        'revenue': resultat['historique'][index],
+        'type': 'HISTORIQUE',
+    })
+    prevision = pd.DataFrame({
+        'date': resultat['jours_futurs'],
+        'revenue': resultat['prevision'][index],
+        'borne_basse': resultat['borne_basse'][index],
+        'borne_haute': resultat['borne_haute'][index],
+        'type': 'PREDICTION',
+    })
+    return pd.concat([historique, prevision], ignore_index=True)
@@ -0,0 +1,229 @@
+# profil_rendu.py - Profilage des rendus du tableau de bord Streamlit
+"""
+Chronométrage des phases de chaque rerun du tableau de bord:
+- debut_rendu() / fin_rendu(page) délimitent un rerun, phase(nom) en
+  chronomètre une partie (context manager ou décorateur, imbricable)
+- Histogrammes glissants en mémoire par page et par phase (FENETRE derniers reruns)
+- Le rerun le plus lent de chaque page est conservé et exportable au format
+  Chrome trace (chrome://tracing, https://ui.perfetto.dev)
+- Panneau de diagnostic optionnel: ?debug=rendu dans l'URL ou PROFIL_RENDU=1
+
+Hors rerun (scripts, tests), phase() ne mesure rien.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import ContextDecorator
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config_helper import get_config
+
+# Nombre de reruns conservés par page et par phase
+FENETRE = 500
+
+# Nom de la phase qui couvre tout le rerun
+PHASE_TOTALE = "rerun"
+
+
+class Trace:
+    """Phases d'un rerun: (nom, profondeur, début, fin) en secondes perf_counter."""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.horodatage = time.time()
+        self.fin = None
+        self.page = None
+        self.phases: List[tuple] = []
+        self.ouvertes: List[float] = []
+        self.thread = threading.get_ident()
+
+    @property
+    def duree(self) -> float:
+        return (self.fin or time.perf_counter()) - self.debut
+
+    def vers_chrome(self) -> Dict:
+        """Trace au format Chrome trace (événements complets 'X', temps en microsecondes)."""
+        pid = os.getpid()
+        evenements = [{
+            'name': f"{PHASE_TOTALE} {self.page or ''}".strip(), 'cat': 'rerun', 'ph': 'X',
+            'ts': 0, 'dur': self.duree * 1e6, 'pid': pid, 'tid': self.thread,
+            'args': {'page': self.page, 'horodatage': self.horodatage},
+        }]
+        for nom, profondeur, debut, fin in self.phases:
+            evenements.append({
+                'name': nom, 'cat': 'phase', 'ph': 'X',
+                'ts': (debut - self.debut) * 1e6, 'dur': (fin - debut) * 1e6,
+                'pid': pid, 'tid': self.thread, 'args': {'profondeur': profondeur},
+            })
+        return {'traceEvents': evenements, 'displayTimeUnit': 'ms'}
+
+
+_local = threading.local()
+_durees: Dict[tuple, deque] = {}
+_plus_lents: Dict[str, Trace] = {}
+_lock = threading.Lock()
+
+
+# ==================== MESURE ====================
+
+def debut_rendu():
+    """Ouvre la trace du rerun courant (un rerun précédent interrompu est abandonné)."""
+    _local.trace = Trace()
+
+
+def fin_rendu(page: str) -> Optional[Trace]:
+    """Clôt la trace du rerun courant et l'ajoute aux statistiques de la page."""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return None
+    _local.trace = None
+    trace.fin = time.perf_counter()
+    trace.page = page
+
+    with _lock:
+        _ajouter(page, PHASE_TOTALE, trace.duree)
+        for nom, _, debut, fin in trace.phases:
+            _ajouter(page, nom, fin - debut)
+        plus_lent = _plus_lents.get(page)
+        if plus_lent is None or trace.duree > plus_lent.duree:
+            _plus_lents[page] = trace
+    _local.derniere = trace
+    return trace
+
+
+def _ajouter(page: str, phase_nom: str, duree: float):
+    durees = _durees.get((page, phase_nom))
+    if durees is None:
+        durees = _durees[(page, phase_nom)] = deque(maxlen=FENETRE)
+    durees.append(duree * 1000)
+
+
+class phase(ContextDecorator):
+    """
+    Chronomètre une phase du rerun courant.
+
+        with profil_rendu.phase("init_db"):
+            init_db()
+
+        @profil_rendu.phase("données: transactions")
+        def load_transactions_frame(...): ...
+    """
+
+    def __init__(self, nom: str):
+        self.nom = nom
+
+    # La pile des phases ouvertes est portée par la trace (propre au thread):
+    # une même instance peut servir de décorateur dans plusieurs sessions à la fois
+    def __enter__(self):
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.ouvertes.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        trace = getattr(_local, 'trace', None)
+        if trace is not None and trace.ouvertes:
+            debut = trace.ouvertes.pop()
+            trace.phases.append((self.nom, len(trace.ouvertes), debut, time.perf_counter()))
+        return False
+
+
+# ==================== STATISTIQUES ====================
+
+def statistiques(page: Optional[str] = None) -> List[Dict]:
+    """
+    Durées (ms) par page et par phase sur les FENETRE derniers reruns.
+
+    Returns:
+        list: [{'page', 'phase', 'n', 'moyenne_ms', 'p50_ms', 'p95_ms', 'max_ms'}]
+    """
+    with _lock:
+        series = {cle: np.fromiter(durees, dtype=float) for cle, durees in _durees.items()
+                  if page is None or cle[0] == page}
+    lignes = []
+    for (page_cle, nom), durees in sorted(series.items()):
+        p50, p95 = np.percentile(durees, [50, 95])
+        lignes.append({'page': page_cle, 'phase': nom, 'n': len(durees), 'moyenne_ms': float(durees.mean()),
+                       'p50_ms': float(p50), 'p95_ms': float(p95), 'max_ms': float(durees.max())})
+    return lignes
+
+
+def durees(page: str, phase_nom: str = PHASE_TOTALE) -> List[float]:
+    """Durées (ms) glissantes d'une phase, de la plus ancienne à la plus récente."""
+    with _lock:
+        return list(_durees.get((page, phase_nom), ()))
+
+
+def rerun_le_plus_lent(page: str) -> Optional[Trace]:
+    with _lock:
+        return _plus_lents.get(page)
+
+
+def exporter_trace_chrome(trace: Trace, chemin: str = None) -> str:
+    """Sérialise une trace au format Chrome trace; l'écrit dans chemin s'il est fourni."""
+    contenu = json.dumps(trace.vers_chrome(), ensure_ascii=False)
+    if chemin:
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+    return contenu
+
+
+def reinitialiser():
+    with _lock:
+        _durees.clear()
+        _plus_lents.clear()
+
+
+# ==================== PANNEAU DE DIAGNOSTIC ====================
+
+def panneau_demande() -> bool:
+    """Panneau affiché avec ?debug=rendu dans l'URL ou PROFIL_RENDU=1."""
+    if str(get_config('PROFIL_RENDU', default='0')).lower() in ('1', 'true', 'oui', 'yes'):
+        return True
+    import streamlit as st
+
+    return st.query_params.get("debug") == "rendu"
+
+
+def afficher_panneau(page: str):
+    """Panneau de la barre latérale: dernier rerun, statistiques de la page, export du plus lent."""
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Profil du rendu", expanded=True):
+        derniere = getattr(_local, 'derniere', None)
+        if derniere is not None:
+            st.caption(f"Dernier rerun: {derniere.duree * 1000:.0f} ms")
+            st.dataframe(pd.DataFrame([
+                {'Phase': '  ' * profondeur + nom, 'ms': (fin - debut) * 1000}
+                for nom, profondeur, debut, fin in sorted(derniere.phases, key=lambda p: p[2])
+            ]), hide_index=True, use_container_width=True,
+                column_config={'ms': st.column_config.NumberColumn(format="%.1f")})
+
+        lignes = statistiques(page)
+        if not lignes:
+            return
+        st.caption(f"{FENETRE} derniers reruns au plus")
+        df = pd.DataFrame(lignes).drop(columns='page')
+        st.dataframe(df, hide_index=True, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.1f")
+                                    for c in ('moyenne_ms', 'p50_ms', 'p95_ms', 'max_ms')})
+
+        totaux = durees(page)
+        if len(totaux) > 1:
+            comptes, bornes = np.histogram(totaux, bins=min(20, len(totaux)))
+            st.bar_chart(pd.DataFrame({'reruns': comptes}, index=[f"{b:.0f}" for b in bornes[:-1]]))
+
+        plus_lent = rerun_le_plus_lent(page)
+        if plus_lent is not None:
+            st.download_button(
+                f"📥 Trace du rerun le plus lent ({plus_lent.duree * 1000:.0f} ms)",
+                data=exporter_trace_chrome(plus_lent),
+                file_name=f"trace_{time.strftime('%Y%m%d_%H%M%S', time.localtime(plus_lent.horodatage))}.json",
+                mime="application/json",
+            )
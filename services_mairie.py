@@ -7,7 +7,9 @@ Ce module contient la logique métier RÉELLE pour:
 """
 
 import database_mairie as db
-from datetime import datetime, timedelta
+import disponibilites
+import stocks_formulaires
+from datetime import datetime
 import random
 from logger import get_logger
 
@@ -86,7 +88,7 @@ def calculer_montant_location(location_id: int, duree: int) -> float:
 def enregistrer_paiement_taxe(taxe_id: int, citoyen_id: int = None, agent_id: int = None,
                                 montant_custom: float = None, nom_commercant: str = None,
                                 numero_commercant: str = None, mode_paiement: str = 'Espèces',
-                                **params) -> int:
+                                marche_id: int = None, **params) -> int:
     """
     Enregistre un paiement de taxe municipale.
 
@@ -98,6 +100,7 @@ def enregistrer_paiement_taxe(taxe_id: int, citoyen_id: int = None, agent_id: in
         nom_commercant: Nom du commerçant/contribuable
         numero_commercant: Numéro du commerçant/contribuable
         mode_paiement: Mode de paiement (Espèces, Airtel Money, MobiCash, etc.)
+        marche_id: Marché où la taxe est perçue (optionnel, sinon déduit du commerçant)
         **params: Paramètres pour le calcul (ex: montant_base)
 
     Returns:
@@ -128,10 +131,11 @@ def enregistrer_paiement_taxe(taxe_id: int, citoyen_id: int = None, agent_id: in
         agent_id=agent_id,
         mode_paiement=mode_paiement,
         nom_commercant=nom_commercant,
-        numero_commercant=numero_commercant
+        numero_commercant=numero_commercant,
+        marche_id=marche_id
     )
 
-    logger.info(f"Paiement taxe enregistré: {libelle} - {montant} FCFA")
+    logger.info("Paiement taxe enregistré: %s - %s FCFA", libelle, montant)
 
     # Vérifier anomalies (passer tx_id pour inclure référence dans l'alerte si besoin)
     verifier_anomalie_montant(montant, taxe['montant_fixe'] or 0, libelle, transaction_db_id=tx_id)
@@ -166,19 +170,37 @@ def enregistrer_paiement_acte(formulaire_id: int, citoyen_id: int = None, agent_
     montant = formulaire['cout_standard']
     libelle = f"ACTE_{formulaire['nom_document'].upper()}"
 
-    # Enregistrer transaction
-    tx_id = db.create_transaction(
-        type_tx=f"ACTE_{formulaire['nom_document'][:20].upper()}",
-        libelle=libelle,
-        montant=montant,
-        citoyen_id=citoyen_id,
-        agent_id=agent_id,
-        mode_paiement=mode_paiement,
-        nom_commercant=nom_commercant,
-        numero_commercant=numero_commercant
-    )
-
-    logger.info(f"Paiement acte enregistré: {libelle} - {montant} FCFA")
+    # Enregistrer transaction et sortie du formulaire dans la même transaction SQL;
+    # un stock insuffisant ne bloque pas le paiement, il est signalé par une alerte
+    conn = db.get_connection()
+    try:
+        tx_id = db.create_transaction(
+            type_tx=f"ACTE_{formulaire['nom_document'][:20].upper()}",
+            libelle=libelle,
+            montant=montant,
+            citoyen_id=citoyen_id,
+            agent_id=agent_id,
+            mode_paiement=mode_paiement,
+            nom_commercant=nom_commercant,
+            numero_commercant=numero_commercant,
+            conn=conn
+        )
+        stock = db.sortir_stock_formulaire(formulaire_id, transaction_id=tx_id, conn=conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    db.notifier_transaction(tx_id)
+    logger.info("Paiement acte enregistré: %s - %s FCFA", libelle, montant)
+
+    if stock is not None:
+        stock = {**stock, 'nom_document': formulaire['nom_document']}
+        if stock['manque']:
+            signaler_manque_formulaire(stock)
+        verifier_stock_formulaire(stock)
 
     # Vérifier anomalies et inclure référence si besoin
     verifier_anomalie_montant(montant, formulaire.get('cout_standard', 0), libelle, transaction_db_id=tx_id)
@@ -206,6 +228,9 @@ def enregistrer_paiement_location(location_id: int, duree: int, date_debut: str,
 
     Returns:
         ID de la transaction créée
+
+    Raises:
+        ValueError: Si la location est déjà réservée sur la période (rien n'est écrit)
     """
     # Récupérer infos location
     locations = db.get_locations()
@@ -219,35 +244,94 @@ def enregistrer_paiement_location(location_id: int, duree: int, date_debut: str,
 
     libelle = f"LOCATION_{location['type_location'].upper()} - {location['designation']}"
 
-    # Enregistrer transaction
-    tx_id = db.create_transaction(
-        type_tx=f"LOCATION_{location['type_location'].upper()}",
-        libelle=libelle,
-        montant=montant_total,
-        citoyen_id=citoyen_id,
-        agent_id=agent_id,
-        mode_paiement=mode_paiement,
-        nom_commercant=nom_commercant,
-        numero_commercant=numero_commercant
+    # Paiement et réservation dans la même transaction SQL: une période déjà
+    # réservée annule le paiement
+    conn = db.get_connection()
+    try:
+        tx_id = db.create_transaction(
+            type_tx=f"LOCATION_{location['type_location'].upper()}",
+            libelle=libelle,
+            montant=montant_total,
+            citoyen_id=citoyen_id,
+            agent_id=agent_id,
+            mode_paiement=mode_paiement,
+            nom_commercant=nom_commercant,
+            numero_commercant=numero_commercant,
+            conn=conn
+        )
+        disponibilites.reserver(conn, location, date_debut, duree, demandeur, montant_total,
+                                transaction_id=f"TX-{tx_id}", citoyen_id=citoyen_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    db.notifier_transaction(tx_id)
+    disponibilites.noter_reservation(location_id, *disponibilites.periode(location, date_debut, duree))
+    logger.info("Location enregistrée: %s - %s FCFA", libelle, montant_total)
+
+    return tx_id
+
+
+def verifier_stock_formulaire(stock: dict) -> bool:
+    """
+    Crée une alerte de stock critique à partir de l'état courant d'un formulaire.
+
+    L'alerte n'est émise qu'une fois, jusqu'au prochain réapprovisionnement.
+
+    Args:
+        stock: Ligne de stocks_formulaires avec nom_document
+
+    Returns:
+        True si une alerte a été créée
+    """
+    prevision = stocks_formulaires.prevoir_rupture(stock)
+    if prevision['status'] != "CRITICAL":
+        return False
+    if not db.activer_alerte_stock(stock['formulaire_id']):
+        return False
+
+    description = f"Il ne reste que {prevision['quantite']} formulaire(s) « {stock['nom_document']} » en stock"
+    if prevision['predicted_date']:
+        description += (f" (~{prevision['consommation_journaliere']:.1f}/jour, "
+                        f"rupture prévue le {prevision['predicted_date'].strftime('%d/%m/%Y')})")
+    db.create_alerte(
+        titre=f"Stock formulaires {stock['nom_document']} faible",
+        description=description,
+        type_alerte="STOCK_CRITIQUE",
+        montant=prevision['quantite'],
+        niveau="URGENT"
     )
+    return True
 
-    # Créer réservation
-    date_debut_obj = datetime.strptime(date_debut, '%Y-%m-%d')
-    date_fin = date_debut_obj + timedelta(days=duree if 'Jour' in location['frequence'] else duree * 30)
 
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO reservations
-        (location_id, citoyen_id, demandeur, date_debut, date_fin, duree_jours, montant_total, transaction_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (location_id, citoyen_id, demandeur, date_debut, date_fin.strftime('%Y-%m-%d'), duree, montant_total, f"TX-{tx_id}"))
-    conn.commit()
-    conn.close()
+def signaler_manque_formulaire(stock: dict) -> bool:
+    """
+    Alerte sur un formulaire délivré au-delà du stock enregistré (inventaire à corriger
+    ou réapprovisionnement non saisi). Une seule alerte ouverte par formulaire.
 
-    logger.info(f"Location enregistrée: {libelle} - {montant_total} FCFA")
+    Returns:
+        True si une alerte a été créée
+    """
+    titre = f"Formulaire {stock['nom_document']} délivré sans stock enregistré"
+    if db.alerte_ouverte(titre):
+        return False
+    db.create_alerte(
+        titre=titre,
+        description=(f"{stock['manque']} exemplaire(s) « {stock['nom_document']} » délivré(s) alors que "
+                     f"le stock enregistré était épuisé: saisir le réapprovisionnement ou corriger l'inventaire"),
+        type_alerte="STOCK_CRITIQUE",
+        montant=stock['manque'],
+        niveau="URGENT"
+    )
+    return True
 
-    return tx_id
+
+def verifier_stocks_formulaires() -> int:
+    """Vérifie le stock de tous les formulaires (état courant, sans relire l'historique)."""
+    return sum(verifier_stock_formulaire(stock) for stock in db.get_stocks_formulaires())
 
 
 def verifier_anomalie_montant(montant_paye: float, montant_attendu: float, libelle: str, transaction_db_id: int = None):
@@ -298,7 +382,7 @@ def verifier_anomalie_montant(montant_paye: float, montant_attendu: float, libel
             niveau="CRITIQUE" if ecart_pct > 50 else "NORMAL",
             reference=reference
         )
-        logger.warning(f"Anomalie détectée: {libelle} - Écart de {ecart_pct:.1f}%")
+        logger.warning("Anomalie détectée: %s - Écart de %.1f%%", libelle, ecart_pct)
 
 
 def detecter_recettes_faibles():
@@ -325,7 +409,7 @@ def detecter_recettes_faibles():
             AND date_creation < DATE('now')
             AND statut = 'COMPLETE'
             GROUP BY DATE(date_creation)
-        )
+        ) AS jours
     ''')
     moyenne_semaine = cursor.fetchone()[0]
 
@@ -340,7 +424,7 @@ def detecter_recettes_faibles():
             montant=recettes_jour,
             niveau="NORMAL"
         )
-        logger.warning(f"Recettes faibles détectées: {recettes_jour} vs {moyenne_semaine}")
+        logger.warning("Recettes faibles détectées: %s vs %s", recettes_jour, moyenne_semaine)
 
 
 def get_rapport_journalier() -> dict:
@@ -395,12 +479,3 @@ def get_rapport_journalier() -> dict:
         'par_categorie': recettes_par_type
     }
 
-
-# Pour compatibilité avec l'ancien code (à supprimer après migration)
-def simulate_daily_revenue(nb_transactions: int = 10):
-    """
-    DEPRECATED: Fonction de simulation à supprimer.
-    Utiliser les fonctions réelles d'enregistrement de paiements.
-    """
-    logger.warning("simulate_daily_revenue est deprecated - Utilisez les fonctions réelles")
-    return 0
@@ -0,0 +1,106 @@
+# stocks_formulaires.py - Consommation et prévision de rupture des formulaires
+"""
+Statistiques de consommation des formulaires administratifs, tenues en O(1):
+- Moyenne mobile exponentielle (EWMA) de la consommation journalière,
+  mise à jour à chaque vente sans relire l'historique
+- Les jours sans vente sont intégrés comme des consommations nulles
+- Date de rupture estimée directement à partir de l'état du stock
+
+Ce module ne fait aucun accès à la base: il calcule sur les lignes
+de la table stocks_formulaires (voir database_mairie).
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+# Lissage équivalent à une moyenne sur ~14 jours
+ALPHA_CONSOMMATION = 2 / (14 + 1)
+
+STOCK_INITIAL = 200
+SEUIL_ALERTE = 20
+
+# En dessous de ce nombre de jours avant rupture, le stock est critique
+DELAI_CRITIQUE_JOURS = 7
+
+
+def avancer_consommation(etat: Dict, jour: str) -> Dict:
+    """
+    Clôture les journées écoulées entre etat['jour_courant'] et jour (exclu).
+
+    La journée courante entre dans la moyenne avec sa consommation, puis chaque
+    journée sans vente y entre avec une consommation nulle, le tout en O(1).
+    'poids_moyenne' accumule les poids pour corriger le biais de démarrage.
+
+    Args:
+        etat: Ligne de stocks_formulaires (dict)
+        jour: Jour de référence (YYYY-MM-DD)
+
+    Returns:
+        dict: Nouvel état (l'état d'origine n'est pas modifié)
+    """
+    etat = dict(etat)
+    if etat['jour_courant'] is None:
+        etat['jour_courant'] = jour
+        etat['conso_jour_courant'] = 0
+        return etat
+    if etat['jour_courant'] >= jour:
+        return etat
+
+    ecart = (date.fromisoformat(jour) - date.fromisoformat(etat['jour_courant'])).days
+    retention = 1 - ALPHA_CONSOMMATION
+
+    moyenne = retention * etat['conso_moyenne'] + ALPHA_CONSOMMATION * etat['conso_jour_courant']
+    poids = retention * etat['poids_moyenne'] + ALPHA_CONSOMMATION
+
+    decroissance = retention ** (ecart - 1)
+    etat['conso_moyenne'] = moyenne * decroissance
+    etat['poids_moyenne'] = poids * decroissance + (1 - decroissance)
+    etat['jour_courant'] = jour
+    etat['conso_jour_courant'] = 0
+    return etat
+
+
+def consommation_journaliere(etat: Dict) -> float:
+    """Consommation moyenne par jour calendaire (journées clôturées, biais corrigé)."""
+    if etat['poids_moyenne'] > 0:
+        return etat['conso_moyenne'] / etat['poids_moyenne']
+    # Aucune journée clôturée: la journée en cours est la seule information
+    return float(etat['conso_jour_courant'] or 0)
+
+
+def prevoir_rupture(etat: Dict, jour: Optional[date] = None) -> Dict:
+    """
+    Estime la date de rupture d'un formulaire à partir de son état de stock.
+
+    Returns:
+        dict: {
+            'quantite', 'consommation_journaliere',
+            'days_until_empty': jours restants (inf si aucune consommation),
+            'predicted_date': date de rupture ou None,
+            'status': 'CRITICAL' / 'OK' / 'STABLE',
+            'slope': variation journalière du stock
+        }
+    """
+    jour = jour or date.today()
+    etat = avancer_consommation(etat, jour.isoformat())
+    rythme = consommation_journaliere(etat)
+    quantite = etat['quantite']
+
+    if rythme <= 0:
+        jours_restants = float('inf')
+        predicted_date = None
+        status = "CRITICAL" if quantite <= etat['seuil_alerte'] else "STABLE"
+    else:
+        jours_restants = quantite / rythme
+        predicted_date = jour + timedelta(days=jours_restants)
+        critique = jours_restants < DELAI_CRITIQUE_JOURS or quantite <= etat['seuil_alerte']
+        status = "CRITICAL" if critique else "OK"
+
+    return {
+        "quantite": quantite,
+        "consommation_journaliere": rythme,
+        "days_until_empty": round(jours_restants, 1) if rythme > 0 else jours_restants,
+        "predicted_date": predicted_date,
+        "status": status,
+        "slope": -rythme,
+    }
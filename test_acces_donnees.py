@@ -0,0 +1,501 @@
+# test_acces_donnees.py - Tests de la couche d'accès aux données
+"""
+Traduction du SQL de l'application vers PostgreSQL et MySQL (chaînes attendues),
+pool de connexions, lignes Ligne, et fonctions publiques de database_mairie sur SQLite
+puis sur un pilote PostgreSQL / MySQL factice (SQL et paramètres réellement envoyés).
+"""
+
+import re
+import sqlite3
+import sys
+import time
+import types
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import acces_donnees
+import database_mairie as db
+import journal_audit
+from acces_donnees import DIALECTES, DialecteServeur, Ligne, PoolConnexions
+
+# ==================== TRADUCTION ====================
+
+# (requête SQLite, avec paramètres, attendu PostgreSQL, attendu MySQL)
+TRADUCTIONS = [
+    (
+        "SELECT * FROM t WHERE id = ? AND nom = :nom", True,
+        "SELECT * FROM t WHERE id = %s AND nom = %(nom)s",
+        "SELECT * FROM t WHERE id = %s AND nom = %(nom)s",
+    ),
+    (
+        "SELECT COUNT(*) FROM transactions WHERE DATE(date_creation) = DATE('now') AND statut = 'COMPLETE'", False,
+        "SELECT COUNT(*) FROM transactions WHERE DATE(date_creation) = CURRENT_DATE AND statut = 'COMPLETE'",
+        "SELECT COUNT(*) FROM transactions WHERE DATE(date_creation) = CURRENT_DATE AND statut = 'COMPLETE'",
+    ),
+    (
+        "SELECT * FROM transactions WHERE date_creation >= DATE('now', '-7 days')", False,
+        "SELECT * FROM transactions WHERE date_creation >= DATE((CURRENT_TIMESTAMP + -604800 * INTERVAL '1 second'))",
+        "SELECT * FROM transactions WHERE date_creation >= DATE((NOW() + INTERVAL -604800 SECOND))",
+    ),
+    (
+        "SELECT COUNT(*) FROM transactions WHERE strftime('%Y-%m', date_creation) = strftime('%Y-%m', 'now')", False,
+        "SELECT COUNT(*) FROM transactions WHERE TO_CHAR(CAST(date_creation AS TIMESTAMP), 'YYYY-MM') "
+        "= TO_CHAR(CAST(CURRENT_TIMESTAMP AS TIMESTAMP), 'YYYY-MM')",
+        "SELECT COUNT(*) FROM transactions WHERE DATE_FORMAT(date_creation, '%Y-%m') "
+        "= DATE_FORMAT(CURRENT_TIMESTAMP, '%Y-%m')",
+    ),
+    (
+        "SELECT CASE WHEN type LIKE '%TAXE%' THEN 'Taxes' END FROM transactions WHERE montant > ?", True,
+        "SELECT CASE WHEN type LIKE '%%TAXE%%' THEN 'Taxes' END FROM transactions WHERE montant > %s",
+        "SELECT CASE WHEN type LIKE '%TAXE%' THEN 'Taxes' END FROM transactions WHERE montant > %s",
+    ),
+    (
+        "INSERT OR IGNORE INTO taxes (nom, montant) VALUES (?, ?)", True,
+        "INSERT INTO taxes (nom, montant) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+        "INSERT IGNORE INTO taxes (nom, montant) VALUES (%s, %s)",
+    ),
+    (
+        "INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions) "
+        "VALUES (DATE('now'), ?, ?, 1) ON CONFLICT (jour, type) DO UPDATE SET "
+        "montant_total = montant_total + excluded.montant_total, "
+        "nb_transactions = nb_transactions + excluded.nb_transactions", True,
+        "INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions) "
+        "VALUES (CURRENT_DATE, %s, %s, 1) ON CONFLICT (jour, type) DO UPDATE SET "
+        "montant_total = recettes_journalieres.montant_total + excluded.montant_total, "
+        "nb_transactions = recettes_journalieres.nb_transactions + excluded.nb_transactions",
+        "INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions) "
+        "VALUES (CURRENT_DATE, %s, %s, 1) ON DUPLICATE KEY UPDATE "
+        "montant_total = montant_total + VALUES(montant_total), "
+        "nb_transactions = nb_transactions + VALUES(nb_transactions)",
+    ),
+    (
+        "CREATE TABLE IF NOT EXISTS alertes (id INTEGER PRIMARY KEY AUTOINCREMENT, titre TEXT NOT NULL, "
+        "montant REAL, traitee BOOLEAN DEFAULT 0)", False,
+        "CREATE TABLE IF NOT EXISTS alertes (id SERIAL PRIMARY KEY, titre TEXT NOT NULL, "
+        "montant DOUBLE PRECISION, traitee SMALLINT DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS alertes (id INTEGER PRIMARY KEY AUTO_INCREMENT, titre TEXT NOT NULL, "
+        "montant DOUBLE, traitee TINYINT(1) DEFAULT 0)",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date_creation)", False,
+        "CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date_creation)",
+        "CREATE INDEX idx_tx_date ON transactions(date_creation)",
+    ),
+    (
+        "SELECT * FROM reservations WHERE location_id = ? ORDER BY date_debut FOR UPDATE", True,
+        "SELECT * FROM reservations WHERE location_id = %s ORDER BY date_debut FOR UPDATE",
+        "SELECT * FROM reservations WHERE location_id = %s ORDER BY date_debut FOR UPDATE",
+    ),
+]
+
+
+@pytest.mark.parametrize('sql, avec_params, attendu_pg, attendu_mysql', TRADUCTIONS)
+def test_traduction(sql, avec_params, attendu_pg, attendu_mysql):
+    assert DIALECTES['postgresql'].traduire(sql, avec_params) == (attendu_pg, ())
+    assert DIALECTES['mysql'].traduire(sql, avec_params) == (attendu_mysql, ())
+
+
+def test_traduction_modificateur_en_parametre():
+    sql = "SELECT * FROM recettes_marches_jour r WHERE r.jour >= DATE('now', ?) AND r.marche_id = ?"
+    assert DIALECTES['postgresql'].traduire(sql, True) == (
+        "SELECT * FROM recettes_marches_jour r "
+        "WHERE r.jour >= DATE((CURRENT_TIMESTAMP + %s * INTERVAL '1 second')) AND r.marche_id = %s",
+        (0,),
+    )
+    assert DIALECTES['mysql'].traduire(sql, True) == (
+        "SELECT * FROM recettes_marches_jour r WHERE r.jour >= DATE((NOW() + INTERVAL %s SECOND)) AND r.marche_id = %s",
+        (0,),
+    )
+
+
+def test_secondes_modificateur():
+    assert acces_donnees._secondes_modificateur('-30 days') == -2592000
+    assert acces_donnees._secondes_modificateur('+2 hours') == 7200
+    assert acces_donnees._secondes_modificateur('1.5 minutes') == 90
+    with pytest.raises(ValueError):
+        acces_donnees._secondes_modificateur('start of month')
+
+
+def test_dialecte_serveur_abstrait():
+    with pytest.raises(TypeError):
+        DialecteServeur()
+
+
+# ==================== POOL ====================
+
+def test_pool_restitue_et_annule(tmp_path):
+    chemin = str(tmp_path / 'pool.db')
+    pool = PoolConnexions(lambda: DIALECTES['sqlite'].ouvrir(chemin), taille_max=1)
+
+    conn = pool.acquerir()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()  # rendue au pool: l'insertion non validée est annulée
+
+    reprise = pool.acquerir()
+    assert reprise is conn
+    assert reprise.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    assert pool.stats == {'ouvertes': 1, 'reutilisees': 1}
+
+    # Pool plein: la connexion en surplus est réellement fermée
+    autre = pool.acquerir()
+    reprise.close()
+    autre.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        autre.execute("SELECT 1")
+    pool.vider()
+
+
+# ==================== LIGNES ====================
+
+def test_ligne():
+    ligne = Ligne([7, 'Marché central'], {'id': 0, 'nom': 1})
+    assert ligne[0] == 7
+    assert ligne['nom'] == 'Marché central'
+    assert ligne['NOM'] == 'Marché central'
+    assert ligne.keys() == ['id', 'nom']
+    assert dict(zip(ligne.keys(), ligne)) == {'id': 7, 'nom': 'Marché central'}
+    with pytest.raises(KeyError):
+        ligne['absente']
+
+
+# ==================== DATABASE_MAIRIE (SQLITE) ====================
+
+def test_transactions_et_statistiques(base_sqlite):
+    tx_id = db.create_transaction('TAXE_MARCHE', 'Taxe de place', 1500.0, mode_paiement='Espèces')
+    db.create_transaction('ACTE_NAISSANCE', 'Extrait de naissance', 500.0)
+
+    transactions = db.get_all_transactions()
+    assert len(transactions) == 2
+    assert {t['id'] for t in transactions} >= {tx_id}
+    assert all(t['numero_recu'].startswith('REC-') for t in transactions)
+
+    stats = db.get_statistics()
+    assert stats['recettes_jour'] == 2000.0
+    assert stats['recettes_mois'] == 2000.0
+    assert stats['nb_transactions_jour'] == 2
+
+    # Agrégats tenus dans la même transaction SQL
+    jours = db.get_recettes_par_jour(prefixes=('TAXE', 'ACTE'))
+    assert sum(j['montant_total'] for j in jours) == 2000.0
+
+    journal_audit.vider()
+    chaine = journal_audit.verifier_chaine()
+    assert chaine['valide']
+    assert chaine['nb_entrees'] >= 2
+
+
+def test_alertes(base_sqlite):
+    alerte_id = db.create_alerte("Recette anormale", "Écart de caisse", niveau='CRITIQUE', reference='TX-1')
+    assert db.get_statistics()['incidents_critiques'] == 1
+    assert db.alerte_ouverte("Recette anormale")
+    assert any(a['id'] == alerte_id and 'Ref: TX-1' in a['description'] for a in db.get_pending_alertes())
+
+    db.mark_alerte_treated(alerte_id)
+    assert not db.alerte_ouverte("Recette anormale")
+    assert db.get_statistics()['alertes_pending'] == 0
+
+
+def test_referentiels(base_sqlite):
+    assert isinstance(db.get_taxes(), list)
+    assert isinstance(db.get_locations(), list)
+
+    version = db.get_marches_version()
+    assert version == db.get_marches_version()
+    conn = db.get_connection()
+    conn.execute("INSERT INTO marches (nom_marche, adresse, latitude, longitude) VALUES (?, ?, ?, ?)",
+                 ('Marché test', 'Centre-ville', 5.35, -4.0))
+    conn.commit()
+    conn.close()
+    assert db.get_marches_version() != version
+
+
+# ==================== ROUTAGE LECTURE / ÉCRITURE ====================
+
+def _dater_replica(chemin: str, age: float):
+    copie = sqlite3.connect(chemin)
+    copie.execute("UPDATE replication_etat SET horodatage = ? WHERE id = 1", (time.time() - age,))
+    copie.commit()
+    copie.close()
+
+
+def _fichier(conn) -> str:
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def test_routage_replica(base_sqlite, tmp_path, monkeypatch):
+    replica = str(tmp_path / 'replica.db')
+    monkeypatch.setenv('DB_REPLICA_PATH', replica)
+    monkeypatch.setenv('DB_REPLICA_MAX_RETARD', '5')
+    acces_donnees._config.cache_clear()
+    monkeypatch.setattr(acces_donnees, '_ecritures', {})
+    monkeypatch.setattr(acces_donnees, '_etat_replica', {'mesure_le': None, 'retard': None})
+    monkeypatch.setattr(acces_donnees, 'stats_routage', dict.fromkeys(acces_donnees.stats_routage, 0))
+    stats = acces_donnees.stats_routage
+
+    def lire():
+        # Nouvelle mesure du retard à chaque lecture (sinon mise en cache INTERVALLE_MESURE_RETARD)
+        acces_donnees._etat_replica['mesure_le'] = None
+        conn = db.get_connection(lecture=True)
+        fichier = _fichier(conn)
+        conn.close()
+        return fichier
+
+    acces_donnees.synchroniser_replica_sqlite(base_sqlite, replica)
+
+    # Réplica à jour: la lecture y est servie
+    assert lire() == replica
+    assert stats['replica'] == 1
+
+    # Retard sous DB_REPLICA_MAX_RETARD: toujours le réplica
+    _dater_replica(replica, 3)
+    assert lire() == replica
+    assert stats['replica'] == 2
+
+    # Écriture sur le primaire: la session relit ses écritures sur le primaire
+    conn = db.get_connection()
+    conn.execute("INSERT INTO alertes (titre, type) VALUES (?, ?)", ('Écriture', 'FINANCIERE'))
+    conn.commit()
+    assert _fichier(conn) == base_sqlite
+    conn.close()
+    assert lire() == base_sqlite
+    assert stats['apres_ecriture'] == 1
+
+    # Écriture plus ancienne que le retard du réplica: elle y est déjà
+    acces_donnees._ecritures.clear()
+    assert lire() == replica
+    assert stats['replica'] == 3
+
+    # Retard au-delà de DB_REPLICA_MAX_RETARD: retour au primaire
+    _dater_replica(replica, 10)
+    assert lire() == base_sqlite
+    assert stats['replica_en_retard'] == 1
+    assert stats['replica'] == 3
+
+
+# ==================== SERVEUR FACTICE (POSTGRESQL / MYSQL) ====================
+
+# Tables dont la clé n'est pas une colonne id alimentée par une séquence
+TABLES_SANS_SERIE = {'recettes_journalieres', 'recettes_marches_jour', 'audit_chaine'}
+
+
+class PiloteFactice:
+    """
+    Pilote DB-API factice: enregistre le SQL et les paramètres reçus et retourne des
+    lignes préparées. Les paramètres sont substitués comme le ferait le pilote réel
+    (psycopg2 interprète chaque %, mysql.connector seulement les %s).
+    """
+
+    def __init__(self, dialecte: str):
+        self.dialecte = dialecte
+        self.requetes = []
+        self.connexions = []
+        self.derniers_ids = {}
+        # Fragment de SQL -> (colonnes, lignes) ou exception levée
+        self.reponses = {'FROM audit_chaine': (['dernier_hash'], [(journal_audit.HASH_INITIAL,)])}
+        self.erreurs = {}
+        # psycopg2 lève UniqueViolation, mysql.connector IntegrityError
+        self.IntegrityError = type('UniqueViolation' if dialecte == 'postgresql' else 'IntegrityError',
+                                   (Exception,), {})
+
+    def connect(self, **parametres):
+        connexion = ConnexionFactice(self)
+        self.connexions.append(connexion)
+        return connexion
+
+    def nouvel_id(self, sql: str) -> int:
+        table = re.match(r'\s*INSERT\s+INTO\s+"?(\w+)', sql, re.I).group(1)
+        self.derniers_ids[table] = self.derniers_ids.get(table, 0) + 1
+        return self.derniers_ids[table]
+
+    def executees(self, fragment: str):
+        return [(sql, params) for sql, params in self.requetes if fragment in sql]
+
+
+class ConnexionFactice:
+    def __init__(self, pilote: PiloteFactice):
+        self.pilote = pilote
+        self.closed = 0
+
+    def cursor(self, **options):
+        return CurseurFactice(self.pilote)
+
+    def set_session(self, readonly=False):
+        pass
+
+    def is_connected(self):
+        return not self.closed
+
+    def commit(self):
+        self.pilote.requetes.append(('COMMIT', None))
+
+    def rollback(self):
+        self.pilote.requetes.append(('ROLLBACK', None))
+
+    def close(self):
+        self.closed = 1
+
+
+class CurseurFactice:
+    def __init__(self, pilote: PiloteFactice):
+        self.pilote = pilote
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = -1
+        self._lignes = []
+
+    def _substituer(self, sql: str, params):
+        if params is None:
+            return
+        if self.pilote.dialecte == 'postgresql':
+            sql % (params if isinstance(params, dict) else tuple(params))
+        elif not isinstance(params, dict) and sql.count('%s') != len(params):
+            raise TypeError("Nombre de paramètres incorrect")
+
+    def execute(self, sql: str, params=None):
+        pilote = self.pilote
+        pilote.requetes.append((sql, params))
+        self._substituer(sql, params)
+        for fragment, erreur in pilote.erreurs.items():
+            if fragment in sql:
+                raise erreur
+
+        colonnes, self._lignes = None, []
+        if "column_name = 'id'" in sql:
+            colonnes = ['?column?']
+            self._lignes = [] if params[0] in TABLES_SANS_SERIE else [(1,)]
+        elif sql.endswith('RETURNING id'):
+            colonnes, self._lignes = ['id'], [(pilote.nouvel_id(sql),)]
+        else:
+            for fragment, (colonnes_reponse, lignes) in pilote.reponses.items():
+                if fragment in sql:
+                    colonnes, self._lignes = colonnes_reponse, list(lignes)
+                    break
+        if sql.lstrip().upper().startswith('INSERT') and pilote.dialecte == 'mysql':
+            self.lastrowid = pilote.nouvel_id(sql)
+        self.description = [(c,) + (None,) * 6 for c in colonnes] if colonnes else None
+        self.rowcount = len(self._lignes) or 1
+
+    def executemany(self, sql: str, seq_params):
+        seq_params = list(seq_params)
+        self.pilote.requetes.append((sql, seq_params))
+        for params in seq_params:
+            self._substituer(sql, params)
+        self.description = None
+        self.rowcount = len(seq_params)
+
+    def fetchone(self):
+        return self._lignes.pop(0) if self._lignes else None
+
+    def fetchall(self):
+        lignes, self._lignes = self._lignes, []
+        return lignes
+
+    def fetchmany(self, taille=1):
+        lignes, self._lignes = self._lignes[:taille], self._lignes[taille:]
+        return lignes
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(params=['postgresql', 'mysql'])
+def serveur(request, tmp_path, monkeypatch):
+    """database_mairie branché sur un pilote factice, pour chaque moteur serveur."""
+    pilote = PiloteFactice(request.param)
+    module = types.ModuleType('pilote_factice')
+    module.connect = pilote.connect
+    if request.param == 'postgresql':
+        monkeypatch.setitem(sys.modules, 'psycopg2', module)
+    else:
+        paquet = types.ModuleType('mysql')
+        paquet.connector = module
+        monkeypatch.setitem(sys.modules, 'mysql', paquet)
+        monkeypatch.setitem(sys.modules, 'mysql.connector', module)
+
+    monkeypatch.setenv('DB_TYPE', request.param)
+    monkeypatch.setenv('DB_HOST', 'serveur-factice')
+    monkeypatch.delenv('DB_PORT', raising=False)
+    monkeypatch.delenv('DB_REPLICA_HOST', raising=False)
+    monkeypatch.setattr(acces_donnees, '_pools', {})
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'mairie.db'))
+    acces_donnees._config.cache_clear()
+    yield pilote
+
+    journal_audit.vider()
+    acces_donnees.fermer_pools()
+    acces_donnees._config.cache_clear()
+
+
+def test_serveur_transaction_et_upsert(serveur):
+    postgresql = serveur.dialecte == 'postgresql'
+    tx_id = db.create_transaction('TAXE_MARCHE', 'Taxe de place', 1500.0)
+    assert db.create_transaction('TAXE_MARCHE', 'Taxe de place', 500.0) == tx_id + 1
+
+    inserts = serveur.executees('INSERT INTO transactions')
+    assert [params[2:5] for _, params in inserts] == [['TAXE_MARCHE', 'Taxe de place', 1500.0],
+                                                       ['TAXE_MARCHE', 'Taxe de place', 500.0]]
+    assert all(sql.endswith('RETURNING id') == postgresql for sql, _ in inserts)
+    if postgresql:
+        # Présence d'une séquence lue une fois par table et par connexion, % doublé
+        series = serveur.executees("column_default LIKE 'nextval%%'")
+        assert [params for _, params in series] == [['transactions'], ['recettes_journalieres']]
+
+    # Agrégat journalier: upsert traduit, exécuté avec les paramètres de l'application
+    upserts = serveur.executees('INSERT INTO recettes_journalieres')
+    assert [params for _, params in upserts] == [['TAXE_MARCHE', 1500.0], ['TAXE_MARCHE', 500.0]]
+    sql = upserts[0][0]
+    assert 'CURRENT_DATE' in sql and 'RETURNING' not in sql
+    if postgresql:
+        assert 'montant_total = recettes_journalieres.montant_total + excluded.montant_total' in sql
+    else:
+        assert 'ON DUPLICATE KEY UPDATE' in sql and 'VALUES(montant_total)' in sql
+    assert len(serveur.executees('COMMIT')) == 2
+
+    # Journal d'audit vidé par lots sur le même serveur
+    journal_audit.vider()
+    assert sum(len(params) for _, params in serveur.executees('INSERT INTO audit_log')) == 2
+
+
+def test_serveur_lignes_et_pourcent(serveur):
+    serveur.reponses['FROM recettes_journalieres'] = (
+        ['jour', 'montant_total'], [(date(2026, 1, 5), Decimal('1500.00')), (date(2026, 1, 6), Decimal('12.50'))]
+    )
+    assert db.get_recettes_par_jour(prefixes=('TAXE',), apres='2026-01-01') == [
+        {'jour': '2026-01-05', 'montant_total': 1500}, {'jour': '2026-01-06', 'montant_total': 12.5}
+    ]
+    sql, params = serveur.executees('FROM recettes_journalieres')[0]
+    assert params == ['TAXE%', '2026-01-01']
+
+    # Un % littéral n'est doublé que pour psycopg2, et seulement avec des paramètres
+    conn = db.get_connection()
+    conn.execute("SELECT COUNT(*) FROM transactions WHERE type LIKE 'ACTE%' AND montant > ?", (0,))
+    conn.execute("SELECT COUNT(*) FROM transactions WHERE type LIKE 'ACTE%'")
+    conn.close()
+    avec_params, sans_params = [sql for sql, _ in serveur.executees("LIKE 'ACTE")]
+    assert ("'ACTE%%'" in avec_params) == (serveur.dialecte == 'postgresql')
+    assert "'ACTE%'" in sans_params
+
+
+def test_serveur_pool_connexion_perdue(serveur):
+    serveur.reponses['FROM formulaires'] = (
+        ['id', 'nom_document', 'cout_standard', 'actif'], [(1, 'Acte de naissance', Decimal('2000.00'), 1)]
+    )
+    attendu = [{'id': 1, 'nom_document': 'Acte de naissance', 'cout_standard': 2000, 'actif': 1}]
+    assert db.get_formulaires() == attendu
+    assert db.get_formulaires() == attendu
+    assert len(serveur.connexions) == 1
+
+    # Connexion coupée par le serveur pendant qu'elle attendait au pool: remplacée
+    serveur.connexions[0].closed = 1
+    assert db.get_formulaires() == attendu
+    assert len(serveur.connexions) == 2
+
+
+def test_serveur_erreur_integrite(serveur):
+    serveur.erreurs['INSERT INTO alertes'] = serveur.IntegrityError("duplicate key value")
+    with pytest.raises(sqlite3.IntegrityError, match="duplicate key value"):
+        db.create_alerte("Alerte en double")
@@ -0,0 +1,31 @@
+# test_ai_forecast.py - Tests du modèle de prévision incrémental
+from datetime import date, timedelta
+
+import ai_forecast
+import database_mairie as db
+
+
+def _recette(jour: str, montant: float):
+    conn = db.get_connection()
+    conn.execute('''
+        INSERT INTO recettes_journalieres (jour, type, montant_total, nb_transactions)
+        VALUES (?, 'TAXE_MARCHE', ?, 1)
+    ''', (jour, montant))
+    conn.commit()
+    conn.close()
+
+
+def test_jour_courant_de_la_base_jamais_integre(base_sqlite):
+    jour_base = date.fromisoformat(db.get_jour_courant())
+    veille = (jour_base - timedelta(days=1)).isoformat()
+    _recette((jour_base - timedelta(days=2)).isoformat(), 1000.0)
+    _recette(veille, 2000.0)
+    _recette(jour_base.isoformat(), 500.0)  # jour encore ouvert pour la base
+
+    modele = ai_forecast.mettre_a_jour_modele()
+    assert modele['dernier_jour'] == veille
+    assert modele['n'] == 2
+    assert modele['somme_y'] == 3000.0
+
+    # Rien de nouveau tant que la base n'a pas changé de jour
+    assert ai_forecast.mettre_a_jour_modele()['n'] == 2
@@ -0,0 +1,91 @@
+# test_ancrage_merkle.py - Tests de l'ancrage par arbres de Merkle
+import hashlib
+
+import pytest
+
+import ancrage_merkle
+import database_mairie as db
+from ancrage_merkle import RegistreFichier, construire_arbre, racine_depuis_preuve
+
+
+def _feuilles(n: int):
+    return [hashlib.sha256(f"tx-{i}".encode()).hexdigest() for i in range(n)]
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 5, 8, 13])
+def test_preuves_menent_a_la_racine(n):
+    feuilles = _feuilles(n)
+    racine, preuves = construire_arbre(feuilles)
+    for feuille, chemin in zip(feuilles, preuves):
+        assert racine_depuis_preuve(feuille, chemin) == racine
+    # Une feuille étrangère ne remonte pas à la racine
+    assert racine_depuis_preuve('0' * 64, preuves[0]) != racine
+
+
+def test_arbre_une_feuille():
+    feuille = _feuilles(1)[0]
+    assert construire_arbre([feuille]) == (feuille, [[]])
+    with pytest.raises(ValueError):
+        construire_arbre([])
+
+
+@pytest.fixture
+def registre(base_sqlite, tmp_path, monkeypatch):
+    registre = RegistreFichier(str(tmp_path / 'registre.jsonl'))
+    monkeypatch.setattr(ancrage_merkle, '_registre', registre)
+    return registre
+
+
+def _payer(n: int):
+    return [db.create_transaction('TAXE_MARCHE', f"Taxe {i}", 1000.0 + i) for i in range(n)]
+
+
+def _recu(tx_id: int) -> str:
+    conn = db.get_connection()
+    numero = conn.execute("SELECT numero_recu FROM transactions WHERE id = ?", (tx_id,)).fetchone()[0]
+    conn.close()
+    return numero
+
+
+def test_ancrer_et_verifier(registre):
+    ids = _payer(5)
+    assert ancrage_merkle.ancrer_tout(taille=2) == 3
+    assert registre.verifier_chaine()
+
+    for tx_id in ids:
+        resultat = ancrage_merkle.verifier_recu(_recu(tx_id))
+        assert resultat['valide'], resultat['raison']
+        assert resultat['reference'].startswith('fichier:')
+    assert ancrage_merkle.statut()['en_attente'] == 0
+
+
+def test_montant_modifie(registre):
+    tx_id = _payer(3)[1]
+    ancrage_merkle.ancrer_tout()
+
+    conn = db.get_connection()
+    conn.execute("UPDATE transactions SET montant = montant + 1 WHERE id = ?", (tx_id,))
+    conn.commit()
+    conn.close()
+
+    resultat = ancrage_merkle.verifier_recu(_recu(tx_id))
+    assert not resultat['valide']
+    assert resultat['raison'] == "Transaction modifiée depuis son ancrage"
+
+
+def test_registre_indisponible(registre, monkeypatch):
+    tx_id = _payer(2)[0]
+
+    def indisponible(message):
+        raise ConnectionError("registre injoignable")
+
+    monkeypatch.setattr(registre, 'publier', indisponible)
+    ancrage_id = ancrage_merkle.ancrer_lot()
+    assert ancrage_id is not None
+    assert ancrage_merkle.statut()['lots'] == {'EN_ATTENTE': {'lots': 1, 'transactions': 2}}
+    assert ancrage_merkle.verifier_recu(_recu(tx_id))['raison'] == "Racine pas encore publiée sur le registre"
+
+    # Registre revenu: le lot en attente est republié
+    monkeypatch.delattr(registre, 'publier')
+    assert ancrage_merkle.publier_en_attente() == 1
+    assert ancrage_merkle.verifier_recu(_recu(tx_id))['valide']
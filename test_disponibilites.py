@@ -0,0 +1,81 @@
+# test_disponibilites.py - Tests du contrôle des réservations de locations
+from datetime import date, timedelta
+
+import pytest
+
+import database_mairie as db
+import disponibilites
+import journal_audit
+import services_mairie
+from disponibilites import CalendrierLocation
+
+
+def _jour(n: int) -> date:
+    return date(2026, 3, 1) + timedelta(days=n)
+
+
+def _compter(requete: str, params=()) -> int:
+    conn = db.get_connection()
+    nombre = conn.execute(requete, params).fetchone()[0]
+    conn.close()
+    return nombre
+
+
+# ==================== CALENDRIER EN MÉMOIRE ====================
+
+def test_calendrier_fusionne_contigus_et_chevauchants():
+    cal = CalendrierLocation([(_jour(5), _jour(8)), (_jour(0), _jour(3)), (_jour(3), _jour(5)),
+                              (_jour(10), _jour(12)), (_jour(11), _jour(14))])
+    assert cal.debuts == [_jour(0), _jour(10)]
+    assert cal.fins == [_jour(8), _jour(14)]
+
+
+@pytest.mark.parametrize('debut, fin, libre', [
+    (8, 10, True),    # contigu aux deux réservations (fins exclues)
+    (-3, 0, True),
+    (14, 20, True),
+    (7, 9, False),
+    (9, 11, False),
+    (2, 3, False),    # à l'intérieur de l'intervalle fusionné
+])
+def test_calendrier_est_libre(debut, fin, libre):
+    cal = CalendrierLocation([(_jour(0), _jour(3)), (_jour(3), _jour(8)), (_jour(10), _jour(14))])
+    assert cal.est_libre(_jour(debut), _jour(fin)) is libre
+
+
+@pytest.mark.parametrize('nb_jours, a_partir_de, attendu', [
+    (2, 0, 8),      # le trou [8, 10[ suffit
+    (3, 0, 14),     # trop court: après l'intervalle suivant
+    (1, 9, 9),
+    (1, 3, 8),      # au milieu de l'intervalle fusionné [0, 8[
+    (1, 20, 20),
+])
+def test_calendrier_prochain_creneau(nb_jours, a_partir_de, attendu):
+    cal = CalendrierLocation([(_jour(0), _jour(3)), (_jour(3), _jour(8)), (_jour(10), _jour(14))])
+    assert cal.prochain_creneau(nb_jours, _jour(a_partir_de)) == _jour(attendu)
+
+
+# ==================== RÉSERVATION ET PAIEMENT ====================
+
+def test_reservation_chevauchante_refusee_et_annulee(base_sqlite):
+    disponibilites.invalider()
+    location = db.get_locations()[0]
+    debut = date.today() + timedelta(days=10)
+    fin = disponibilites.periode(location, debut, 2)[1]
+    services_mairie.enregistrer_paiement_location(location['id'], 2, debut.isoformat(), 'Premier demandeur')
+
+    with pytest.raises(ValueError, match=f"prochain créneau libre: {fin.strftime('%d/%m/%Y')}"):
+        services_mairie.enregistrer_paiement_location(location['id'], 1, (debut + timedelta(days=1)).isoformat(),
+                                                      'Second demandeur')
+
+    # Le paiement refusé n'a laissé ni transaction, ni agrégat, ni entrée d'audit
+    journal_audit.vider()
+    assert _compter("SELECT COUNT(*) FROM transactions") == 1
+    assert _compter("SELECT SUM(nb_transactions) FROM recettes_journalieres") == 1
+    assert _compter("SELECT COUNT(*) FROM reservations WHERE location_id = ?", (location['id'],)) == 1
+    assert _compter("SELECT COUNT(*) FROM audit_log WHERE action = 'TRANSACTION_CREEE'") == 1
+
+    # Une réservation qui commence le jour où la précédente se termine est acceptée
+    services_mairie.enregistrer_paiement_location(location['id'], 1, fin.isoformat(), 'Second demandeur')
+    assert not disponibilites.est_disponible(location['id'], fin, fin + timedelta(days=1))
+    assert _compter("SELECT COUNT(*) FROM reservations WHERE location_id = ?", (location['id'],)) == 2
@@ -0,0 +1,59 @@
+# test_logger.py - Tests de la journalisation par file d'attente
+import io
+import logging
+import os
+import queue
+from logging.handlers import QueueListener
+
+import logger
+
+
+def _journal(nom: str):
+    """Logger isolé branché sur sa propre file et un tampon mémoire."""
+    sortie = io.StringIO()
+    handler = logging.StreamHandler(sortie)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    file_attente = queue.Queue()
+    journal = logging.getLogger(f"test_logger.{nom}")
+    journal.propagate = False
+    journal.setLevel(logging.DEBUG)
+    journal.addHandler(logger.QueueHandlerBorne(file_attente))
+    return journal, QueueListener(file_attente, handler), sortie
+
+
+def test_argument_mutable_fige_a_l_appel():
+    journal, ecrivain, sortie = _journal('mutable')
+    details = {'montant': 1000}
+    journal.info("Détails: %s (%s FCFA)", details, 1000)
+    details['montant'] = 0  # modifié avant que le thread d'écriture ne formate
+
+    ecrivain.start()
+    ecrivain.stop()
+    assert sortie.getvalue() == "Détails: {'montant': 1000} (1000 FCFA)\n"
+
+
+def test_trace_exception_figee_a_l_appel():
+    journal, ecrivain, sortie = _journal('exception')
+    try:
+        raise ValueError("montant négatif")
+    except ValueError:
+        journal.exception("Paiement refusé")
+
+    ecrivain.start()
+    ecrivain.stop()
+    assert "Paiement refusé" in sortie.getvalue()
+    assert "ValueError: montant négatif" in sortie.getvalue()
+
+
+def test_ecriture_directe_apres_arret(journaux_temporaires, tmp_path):
+    logger.rediriger_journalisation(str(tmp_path))
+    try:
+        journal = logger.get_logger('test_logger.arret')
+        logger.arreter_journalisation()
+        journal.warning("Message tardif %s", 42)
+
+        with open(os.path.join(tmp_path, 'app.log'), encoding='utf-8') as f:
+            assert "Message tardif 42" in f.read()
+        assert logger.stats_journalisation()['en_attente'] == 0
+    finally:
+        logger.rediriger_journalisation(journaux_temporaires)
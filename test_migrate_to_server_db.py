@@ -0,0 +1,15 @@
+# test_migrate_to_server_db.py - Aller-retour local des exports PostgreSQL / MySQL
+import pytest
+
+import database_mairie as db
+import migrate_to_server_db
+
+
+@pytest.mark.parametrize('db_type, mode', migrate_to_server_db.VERIFICATIONS)
+def test_aller_retour(base_sqlite, db_type, mode):
+    # Textes qui éprouvent l'échappement des formats (apostrophe, antislash, tabulation, saut de ligne)
+    db.create_transaction('TAXE_MARCHE', "Taxe d'étal\tallée 3\\B\nligne 2", 1500.5)
+    db.create_transaction('ACTE_NAISSANCE', 'Extrait', 500.0, mode_paiement='Orange Money')
+    db.create_alerte("Écart", None, montant=None)
+
+    assert migrate_to_server_db.verifier_aller_retour(base_sqlite, db_type, mode, taille_lot=2)
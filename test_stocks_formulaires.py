@@ -0,0 +1,117 @@
+# test_stocks_formulaires.py - Tests du stock des formulaires
+import pandas as pd
+import pytest
+
+import database_mairie as db
+import services_mairie
+import stocks_formulaires
+from stocks_formulaires import ALPHA_CONSOMMATION, avancer_consommation, consommation_journaliere
+
+
+def _fixer_stock(formulaire_id: int, quantite: int):
+    conn = db.get_connection()
+    conn.execute("UPDATE stocks_formulaires SET quantite = ? WHERE formulaire_id = ?", (quantite, formulaire_id))
+    conn.commit()
+    conn.close()
+
+
+def _compter(requete: str, params=()) -> int:
+    conn = db.get_connection()
+    nombre = conn.execute(requete, params).fetchone()[0]
+    conn.close()
+    return nombre
+
+
+@pytest.fixture
+def formulaire(base_sqlite):
+    return db.get_formulaires()[0]
+
+
+# ==================== CONSOMMATION (EWMA) ====================
+
+def test_moyenne_mobile_sans_relire_l_historique():
+    etat = {'jour_courant': None, 'conso_jour_courant': 0, 'conso_moyenne': 0.0, 'poids_moyenne': 0.0}
+    etat = avancer_consommation(etat, '2026-01-01')
+    etat['conso_jour_courant'] = 10
+    etat = avancer_consommation(etat, '2026-01-02')
+    etat['conso_jour_courant'] = 4
+    # Saut de trois jours en O(1): les 03 et 04 entrent comme des journées sans vente
+    saute = avancer_consommation(etat, '2026-01-05')
+
+    pas_a_pas = etat
+    for jour in ('2026-01-03', '2026-01-04', '2026-01-05'):
+        pas_a_pas = avancer_consommation(pas_a_pas, jour)
+    assert saute['conso_moyenne'] == pytest.approx(pas_a_pas['conso_moyenne'])
+    assert saute['poids_moyenne'] == pytest.approx(pas_a_pas['poids_moyenne'])
+    assert etat['jour_courant'] == '2026-01-02'  # état d'origine intact
+
+    # Moyenne pondérée des journées clôturées (10, 4, 0, 0), biais de démarrage corrigé
+    poids = [ALPHA_CONSOMMATION * (1 - ALPHA_CONSOMMATION) ** k for k in (3, 2, 1, 0)]
+    attendu = sum(p * c for p, c in zip(poids, (10, 4, 0, 0))) / sum(poids)
+    assert consommation_journaliere(saute) == pytest.approx(attendu)
+
+
+# ==================== SORTIES DE STOCK ====================
+
+def test_sortie_conditionnelle(formulaire):
+    etat = db.sortir_stock_formulaire(formulaire['id'], 3)
+    assert etat['manque'] == 0
+    assert etat['quantite'] == stocks_formulaires.STOCK_INITIAL - 3
+
+    stock = db.get_stock_formulaire(formulaire['id'])
+    assert stock['quantite'] == stocks_formulaires.STOCK_INITIAL - 3
+    assert stock['conso_jour_courant'] == 3
+    assert _compter("SELECT SUM(quantite) FROM mouvements_stock_formulaires WHERE formulaire_id = ?",
+                    (formulaire['id'],)) == -3
+
+
+def test_manque_sans_bloquer_le_paiement(formulaire):
+    _fixer_stock(formulaire['id'], 1)
+    etat = db.sortir_stock_formulaire(formulaire['id'], 3)
+    assert (etat['quantite'], etat['manque']) == (0, 2)
+    assert db.get_stock_formulaire(formulaire['id'])['quantite'] == 0
+
+    # Stock épuisé: le paiement est validé, le manque signalé par une seule alerte
+    premier = services_mairie.enregistrer_paiement_acte(formulaire['id'])
+    second = services_mairie.enregistrer_paiement_acte(formulaire['id'])
+    assert _compter("SELECT COUNT(*) FROM transactions WHERE id IN (?, ?) AND statut = 'COMPLETE'",
+                    (premier, second)) == 2
+    assert _compter("SELECT COUNT(*) FROM mouvements_stock_formulaires WHERE transaction_id IN (?, ?)",
+                    (premier, second)) == 2
+    assert db.get_stock_formulaire(formulaire['id'])['quantite'] == 0
+    assert _compter("SELECT COUNT(*) FROM alertes WHERE titre LIKE ?",
+                    (f"Formulaire {formulaire['nom_document']} délivré sans stock%",)) == 1
+
+
+def test_alerte_stock_faible_une_fois(formulaire):
+    _fixer_stock(formulaire['id'], stocks_formulaires.SEUIL_ALERTE + 1)
+    for _ in range(3):
+        services_mairie.enregistrer_paiement_acte(formulaire['id'])
+
+    titre = f"Stock formulaires {formulaire['nom_document']} faible"
+    assert _compter("SELECT COUNT(*) FROM alertes WHERE titre = ?", (titre,)) == 1
+    assert db.get_stock_formulaire(formulaire['id'])['alerte_active'] == 1
+
+    # Le réapprovisionnement au-dessus du seuil réarme l'alerte
+    db.reapprovisionner_formulaire(formulaire['id'], 100)
+    assert db.get_stock_formulaire(formulaire['id'])['alerte_active'] == 0
+
+
+# ==================== MISE À JOUR DES TARIFS ====================
+
+def test_formulaire_retire_avec_historique_desactive(base_sqlite):
+    vendu, inutilise, *conserves = db.get_formulaires()
+    db.sortir_stock_formulaire(vendu['id'])
+
+    db.update_all_formulaires(pd.DataFrame(conserves))
+
+    assert {f['nom_document'] for f in db.get_formulaires()} == {f['nom_document'] for f in conserves}
+    assert _compter("SELECT actif FROM formulaires WHERE id = ?", (vendu['id'],)) == 0
+    assert _compter("SELECT COUNT(*) FROM mouvements_stock_formulaires WHERE formulaire_id = ?", (vendu['id'],)) == 1
+    assert _compter("SELECT COUNT(*) FROM formulaires WHERE id = ?", (inutilise['id'],)) == 0
+    assert db.get_stock_formulaire(inutilise['id']) is None
+
+    # Remis dans la liste: réactivé avec son stock
+    db.update_all_formulaires(pd.DataFrame([vendu, *conserves]))
+    assert db.get_stock_formulaire(vendu['id'])['quantite'] == stocks_formulaires.STOCK_INITIAL - 1
+    assert any(f['id'] == vendu['id'] for f in db.get_formulaires())